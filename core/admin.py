@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Conductor, Lugar
+from django.utils import timezone
+from .models import Conductor, Lugar, Tarea
 
 
 @admin.register(Conductor)
@@ -41,3 +42,19 @@ class LugarAdmin(admin.ModelAdmin):
         }),
     )
     readonly_fields = ('creado_en',)
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'intentos', 'max_intentos', 'disponible_en', 'creado_en')
+    list_filter = ('estado', 'tipo')
+    search_fields = ('tipo',)
+    readonly_fields = ('intentos', 'iniciada_en', 'finalizada_en', 'ultimo_error', 'creado_en', 'actualizado_en')
+    actions = ['reintentar']
+
+    @admin.action(description='Reintentar tareas seleccionadas')
+    def reintentar(self, request, queryset):
+        actualizadas = queryset.exclude(estado='en_proceso').update(
+            estado='pendiente', intentos=0, disponible_en=timezone.now()
+        )
+        self.message_user(request, f'{actualizadas} tarea(s) devueltas a la cola.')
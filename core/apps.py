@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (estadísticas del dashboard)
+        # Registrar los manejadores de tareas en segundo plano de cada app (tareas.py)
+        autodiscover_modules('tareas')
@@ -0,0 +1,159 @@
+"""
+Búsqueda indexada de pasajeros (autocompletado por RUT, nombre o correo).
+
+Cada pasajero guarda su RUT normalizado (solo dígitos y K, sin puntos ni guion)
+en `Pasajero.rut_normalizado` y sus palabras de búsqueda en PasajeroToken: cada
+palabra del nombre sin tildes y en minúsculas, más el correo completo en
+minúsculas. Todas las búsquedas son por prefijo y se resuelven como rangos
+(`>= prefijo` y `< prefijo + '\uffff'`) sobre índices B-tree, así que su costo
+depende de la cantidad de resultados y no del total de pasajeros.
+
+Pasajero.save() mantiene ambos; las cargas masivas (bulk_create) deben llamar a
+indexar_pasajeros() o ejecutar el comando `reindexar_pasajeros`.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Pasajero, PasajeroToken
+
+# Resultados por defecto y máximos de una búsqueda
+LIMITE_RESULTADOS = 10
+LIMITE_MAXIMO = 50
+# Caracteres mínimos para buscar (con menos, casi cualquier pasajero coincide)
+MIN_CARACTERES = 2
+# Coincidencias que se leen como máximo de cada índice (RUT y palabras); con más,
+# la búsqueda es demasiado amplia y conviene seguir escribiendo
+MAX_CANDIDATOS = 500
+
+_RUT = re.compile(r'[0-9.\s]+(-?[0-9kK])?')
+_FIN_RANGO = '\uffff'
+
+
+def normalizar_rut(rut):
+    """'12.345.678-k' -> '12345678K'."""
+    return re.sub(r'[^0-9K]', '', (rut or '').upper())
+
+
+def digito_verificador_rut(numero):
+    """Dígito verificador (módulo 11) de un RUT chileno."""
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    resto = 11 - suma % 11
+    return {11: '0', 10: 'K'}.get(resto, str(resto))
+
+
+def validar_rut(rut):
+    """
+    RUT normalizado ('12345678K') si el texto es un RUT con dígito verificador
+    correcto, o None si no lo es.
+    """
+    normalizado = normalizar_rut(rut)
+    numero, digito = normalizado[:-1], normalizado[-1:]
+    if not numero.isdigit() or not 6 <= len(numero.lstrip('0')) <= 8 or digito_verificador_rut(numero) != digito:
+        return None
+    return normalizado
+
+
+def formatear_rut(normalizado):
+    """'12345678K' -> '12345678-K' (formato con que se guardan los RUT)."""
+    return f'{normalizado[:-1]}-{normalizado[-1]}'
+
+
+def normalizar_texto(texto):
+    """Minúsculas y sin tildes: 'José Muñoz' -> 'jose munoz'."""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokens_pasajero(nombre_completo, correo):
+    """Palabras de búsqueda de un pasajero (sin repetir)."""
+    tokens = dict.fromkeys(re.findall(r'[a-z0-9]+', normalizar_texto(nombre_completo)))
+    if correo:
+        tokens[correo.strip().lower()[:PasajeroToken.LARGO_MAXIMO]] = None
+    return [token[:PasajeroToken.LARGO_MAXIMO] for token in tokens]
+
+
+def indexar_pasajeros(pasajeros):
+    """
+    Recalcula el RUT normalizado y las palabras de búsqueda de `pasajeros`
+    (instancias ya guardadas). Retorna la cantidad de palabras creadas.
+    """
+    pasajeros = list(pasajeros)
+    if not pasajeros:
+        return 0
+    cambiados = []
+    for pasajero in pasajeros:
+        rut = normalizar_rut(pasajero.rut)
+        if pasajero.rut_normalizado != rut:
+            pasajero.rut_normalizado = rut
+            cambiados.append(pasajero)
+    tokens = [
+        PasajeroToken(pasajero=pasajero, token=token)
+        for pasajero in pasajeros
+        for token in tokens_pasajero(pasajero.nombre_completo, pasajero.correo)
+    ]
+    with transaction.atomic():
+        if cambiados:
+            Pasajero.objects.bulk_update(cambiados, ['rut_normalizado'], batch_size=1000)
+        PasajeroToken.objects.filter(pasajero__in=[pasajero.pk for pasajero in pasajeros]).delete()
+        PasajeroToken.objects.bulk_create(tokens, batch_size=1000)
+    return len(tokens)
+
+
+def _prefijo(campo, valor):
+    return {f'{campo}__gte': valor, f'{campo}__lt': valor + _FIN_RANGO}
+
+
+def _terminos(texto):
+    """Palabras de la búsqueda; un correo se busca completo."""
+    if '@' in texto:
+        return [texto.strip().lower()]
+    return re.findall(r'[a-z0-9]+', normalizar_texto(texto))
+
+
+def pasajeros_coincidentes(texto):
+    """
+    Queryset de los pasajeros cuyo RUT, alguna palabra del nombre o el correo
+    empiezan por lo buscado (con varias palabras, deben coincidir todas).
+    Con menos de MIN_CARACTERES retorna un queryset vacío.
+    """
+    texto = (texto or '').strip()
+    if len(texto) < MIN_CARACTERES:
+        return Pasajero.objects.none()
+
+    ids = set()
+    rut = normalizar_rut(texto)
+    if _RUT.fullmatch(texto) and len(rut) >= MIN_CARACTERES:
+        ids.update(Pasajero.objects.filter(**_prefijo('rut_normalizado', rut)).order_by(
+            'rut_normalizado').values_list('pk', flat=True)[:MAX_CANDIDATOS])
+
+    terminos = sorted(_terminos(texto), key=len, reverse=True)
+    if terminos:
+        # Se recorre el índice por la palabra más larga (la más selectiva) y las demás se
+        # verifican por pasajero con EXISTS (índice de la FK), así la lectura se detiene
+        # al llegar a MAX_CANDIDATOS sin materializar las coincidencias de cada palabra
+        candidatos = PasajeroToken.objects.filter(**_prefijo('token', terminos[0]))
+        for termino in terminos[1:]:
+            candidatos = candidatos.filter(Exists(PasajeroToken.objects.filter(
+                pasajero_id=OuterRef('pasajero_id'), **_prefijo('token', termino))))
+        ids.update(candidatos.order_by('token', 'pasajero_id').values_list(
+            'pasajero_id', flat=True)[:MAX_CANDIDATOS])
+
+    return Pasajero.objects.filter(pk__in=ids) if ids else Pasajero.objects.none()
+
+
+def buscar_pasajeros(texto, limite=LIMITE_RESULTADOS, excluir_viaje=None):
+    """
+    Hasta `limite` pasajeros de pasajeros_coincidentes(texto), ordenados por nombre.
+    `excluir_viaje` omite a los pasajeros ya registrados en ese viaje.
+    """
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    pasajeros = pasajeros_coincidentes(texto)
+    if excluir_viaje is not None:
+        pasajeros = pasajeros.exclude(viajepasajero__viaje=excluir_viaje)
+    return list(pasajeros.order_by('nombre_completo', 'pk')[:limite])
@@ -0,0 +1,28 @@
+from django.utils.functional import SimpleLazyObject
+
+from .permissions import get_user_role, obtener_grupos
+
+
+def permisos(request):
+    """
+    Expone el rol del usuario a las plantillas. Los valores se resuelven solo si
+    la plantilla los usa, y los grupos se consultan una vez por request.
+
+    - rol_usuario: 'admin', 'usuario' o None
+    - muestra_admin: si se muestran las opciones de administración (superusuario,
+      grupo Admin o usuario sin grupos asignados)
+    """
+    user = getattr(request, 'user', None)
+    if user is None:
+        return {}
+
+    def muestra_admin():
+        if not user.is_authenticated:
+            return False
+        grupos = obtener_grupos(user)
+        return user.is_superuser or not grupos or 'Admin' in grupos
+
+    return {
+        'rol_usuario': SimpleLazyObject(lambda: get_user_role(user)),
+        'muestra_admin': SimpleLazyObject(muestra_admin),
+    }
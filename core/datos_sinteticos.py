@@ -0,0 +1,398 @@
+"""
+Generador de datos sintéticos para pruebas de carga (ver `seed_data --scale`).
+
+Con escala 1 crea una flota realista: 500 buses, 100.000 viajes y alrededor de
+un millón de pasajeros en viajes, con historial de recargas, peajes y
+mantenimientos. Todo se inserta por lotes con executemany y con ids asignados
+de antemano (así los registros hijos no necesitan releer la base de datos y
+funciona igual en MySQL, que no retorna ids al insertar en lote).
+
+Con la misma semilla y la misma fecha de referencia se generan los mismos datos.
+"""
+import math
+import random
+import time
+from datetime import date, datetime, time as dtime, timedelta
+from itertools import islice
+from operator import itemgetter
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from costos.models import CostosViaje, Peaje, PuntoRecarga
+from flota.models import Bus, DocumentoVehiculo, Mantenimiento
+from viajes.asientos import MapaAsientos
+from viajes.models import Viaje, ViajePasajero
+from .busqueda import digito_verificador_rut, tokens_pasajero
+from .estadisticas import reconstruir_estadisticas
+from .models import Conductor, Lugar, Pasajero, PasajeroToken
+
+# Volumen con escala 1
+VOLUMEN_BASE = {
+    'buses': 500,
+    'conductores': 800,
+    'lugares': 200,
+    'pasajeros': 50000,
+    'viajes': 100000,
+}
+PASAJEROS_POR_VIAJE_MAX = 20     # promedio ~10 -> ~1M filas de ViajePasajero
+MANTENIMIENTOS_POR_BUS = 20
+DIAS_HISTORIA = 730              # los viajes se reparten en los últimos 2 años
+DIAS_FUTURO = 30
+
+MARCAS = [('Mercedes', 'Sprinter'), ('Volvo', 'B9R'), ('Scania', 'K360'), ('Iveco', 'Urbanway'),
+          ('Marcopolo', 'Paradiso'), ('Hyundai', 'County'), ('Yutong', 'ZK6122')]
+NOMBRES = ['Juan', 'María', 'Luis', 'Ana', 'José', 'Carmen', 'Pedro', 'Lucía', 'Carlos', 'Sofía',
+           'Diego', 'Valentina', 'Jorge', 'Camila', 'Andrés', 'Paula']
+APELLIDOS = ['Pérez', 'González', 'Muñoz', 'Rojas', 'Díaz', 'Soto', 'Contreras', 'Silva',
+             'Martínez', 'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes']
+CIUDADES = [('Santiago', 'Metropolitana', -33.45, -70.66), ('Valparaíso', 'Valparaíso', -33.05, -71.62),
+            ('Concepción', 'Biobío', -36.83, -73.05), ('La Serena', 'Coquimbo', -29.90, -71.25),
+            ('Temuco', 'Araucanía', -38.74, -72.60), ('Antofagasta', 'Antofagasta', -23.65, -70.40),
+            ('Talca', 'Maule', -35.43, -71.66), ('Puerto Montt', 'Los Lagos', -41.47, -72.94),
+            ('Rancagua', "O'Higgins", -34.17, -70.74), ('Arica', 'Arica y Parinacota', -18.48, -70.31)]
+TIPOS_MANTENIMIENTO = ['preventivo', 'correctivo', 'predictivo', 'mecanico', 'electrico', 'otro']
+TIPOS_DOCUMENTO = ['soat', 'revision', 'circulacion', 'seguro']
+
+
+def _distancia_km(lat1, lon1, lat2, lon2):
+    """Distancia por carretera aproximada (haversine x 1,25)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a)) * 1.25
+
+
+class GeneradorDatos:
+    """
+    Genera e inserta los datos. `progreso(modelo, filas, segundos)` se llama al
+    terminar cada tabla.
+    """
+    def __init__(self, escala=1.0, semilla=42, tamano_lote=5000, fecha_referencia=None, progreso=None):
+        self.escala = escala
+        self.rng = random.Random(semilla)
+        self.tamano_lote = tamano_lote
+        self.hoy = fecha_referencia or date.today()
+        self.progreso = progreso
+        self.cantidades = {
+            nombre: max(2, int(round(valor * escala))) for nombre, valor in VOLUMEN_BASE.items()
+        }
+        self.totales = {}
+        self.tiempos = {}
+        self._planes = {}
+        zona = timezone.get_current_timezone()
+        self.ahora = timezone.make_aware(datetime.combine(self.hoy, dtime(12, 0)), zona)
+
+    # -- utilidades --------------------------------------------------------
+
+    def _siguiente_id(self, modelo):
+        return (modelo.objects.aggregate(maximo=Max('id'))['maximo'] or 0) + 1
+
+    def _plan_columnas(self, modelo):
+        """
+        Columnas de la tabla: (atributo, nombre, columna, adaptador, valor por defecto).
+        El valor por defecto (o `ahora` si el campo es auto_now) se prepara una sola vez.
+        """
+        if modelo in self._planes:
+            return self._planes[modelo]
+        ops = connection.ops
+        ahora = ops.adapt_datetimefield_value(timezone.now())
+        plan = []
+        for campo in modelo._meta.concrete_fields:
+            tipo = campo.get_internal_type()
+            if tipo == 'DateTimeField':
+                adaptar = ops.adapt_datetimefield_value
+            elif tipo == 'DateField':
+                adaptar = ops.adapt_datefield_value
+            else:
+                adaptar = None
+            if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False):
+                defecto = ahora
+            elif campo.primary_key:
+                defecto = None
+            else:
+                defecto = campo.get_db_prep_save(campo.get_default(), connection)
+            plan.append((campo.attname, campo.name, campo.column, adaptar, defecto))
+        self._planes[modelo] = plan
+        return plan
+
+    def _guardar_lote(self, modelo, lote):
+        """
+        Inserta un lote de filas (dicts con las mismas claves) con un solo executemany.
+        Equivale a bulk_create pero sin instanciar modelos ni preparar cada campo por
+        separado, que con millones de filas es lo que más tiempo consume.
+        """
+        if not lote:
+            return
+        inicio = time.perf_counter()
+        claves, columnas, adaptadores, constantes, columnas_defecto = [], [], [], [], []
+        for atributo, nombre, columna, adaptar, defecto in self._plan_columnas(modelo):
+            clave = atributo if atributo in lote[0] else nombre if nombre in lote[0] else None
+            if clave is not None:
+                if adaptar is not None:
+                    adaptadores.append((len(claves), adaptar))
+                claves.append(clave)
+                columnas.append(columna)
+            elif not modelo._meta.get_field(nombre).primary_key:
+                columnas_defecto.append(columna)
+                constantes.append(defecto)
+
+        qn = connection.ops.quote_name
+        columnas += columnas_defecto
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            qn(modelo._meta.db_table), ', '.join(qn(c) for c in columnas), ', '.join(['%s'] * len(columnas)),
+        )
+        extraer = itemgetter(*claves) if len(claves) > 1 else (lambda fila: (fila[claves[0]],))
+        constantes = tuple(constantes)
+        if adaptadores:
+            valores = []
+            for fila in lote:
+                registro = list(extraer(fila))
+                for indice, adaptar in adaptadores:
+                    if registro[indice] is not None:
+                        registro[indice] = adaptar(registro[indice])
+                valores.append(tuple(registro) + constantes)
+        else:
+            valores = [extraer(fila) + constantes for fila in lote]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, valores)
+        nombre = modelo.__name__
+        self.totales[nombre] = self.totales.get(nombre, 0) + len(lote)
+        self.tiempos[nombre] = self.tiempos.get(nombre, 0) + time.perf_counter() - inicio
+
+    def _informar(self, *modelos):
+        if self.progreso:
+            for modelo in modelos:
+                self.progreso(modelo, self.totales.get(modelo.__name__, 0), self.tiempos.get(modelo.__name__, 0))
+
+    def _insertar(self, modelo, filas):
+        """Inserta las filas de un generador en lotes (el tiempo incluye generarlas)."""
+        inicio = time.perf_counter()
+        filas = iter(filas)
+        while True:
+            lote = list(islice(filas, self.tamano_lote))
+            if not lote:
+                break
+            self._guardar_lote(modelo, lote)
+        self.tiempos[modelo.__name__] = time.perf_counter() - inicio
+        self._informar(modelo)
+
+    # -- generación ----------------------------------------------------------
+
+    def generar(self):
+        """Crea todos los datos en una transacción y reconstruye las estadísticas del dashboard."""
+        with transaction.atomic():
+            self._buses()
+            self._conductores()
+            self._lugares()
+            self._pasajeros()
+            self._viajes()
+            self._costos()
+            self._mantenimientos()
+            self._documentos()
+            self._reiniciar_secuencias()
+            reconstruir_estadisticas()
+        return self.totales
+
+    def _buses(self):
+        rng, inicio = self.rng, self._siguiente_id(Bus)
+        self.buses = []
+
+        def filas():
+            for bus_id in range(inicio, inicio + self.cantidades['buses']):
+                marca, modelo = rng.choice(MARCAS)
+                capacidad = rng.choice([20, 30, 40, 45, 50])
+                anio = rng.randint(2008, self.hoy.year)
+                self.buses.append((bus_id, capacidad))
+                yield dict(
+                    id=bus_id, placa=f'SD-{bus_id:06d}', marca=marca, modelo=modelo,
+                    año_fabricacion=anio, capacidad_pasajeros=capacidad,
+                    kilometraje_ingreso=rng.randint(0, 300000),
+                    numero_chasis=f'SD-CHS-{bus_id:08d}', numero_motor=f'SD-MOT-{bus_id:08d}',
+                    estado=rng.choices(['activo', 'mantenimiento', 'inactivo'], [90, 7, 3])[0],
+                    fecha_adquisicion=self.hoy - timedelta(days=rng.randint(60, 3650)),
+                )
+        self._insertar(Bus, filas())
+
+    def _conductores(self):
+        rng, inicio = self.rng, self._siguiente_id(Conductor)
+        self.conductores = list(range(inicio, inicio + self.cantidades['conductores']))
+
+        def filas():
+            for conductor_id in self.conductores:
+                yield dict(
+                    id=conductor_id, nombre=rng.choice(NOMBRES), apellido=rng.choice(APELLIDOS),
+                    cedula=f'SD{conductor_id:010d}', email=f'conductor{conductor_id}@flota.example.com',
+                    telefono=f'09{rng.randint(10000000, 99999999)}',
+                    fecha_contratacion=self.hoy - timedelta(days=rng.randint(30, 5000)),
+                    licencias=rng.choice(['A2', 'A3', 'A4', 'A3, A4']),
+                )
+        self._insertar(Conductor, filas())
+
+    def _lugares(self):
+        rng, inicio = self.rng, self._siguiente_id(Lugar)
+        self.lugares = []
+
+        def filas():
+            for lugar_id in range(inicio, inicio + self.cantidades['lugares']):
+                ciudad, region, lat, lon = rng.choice(CIUDADES)
+                lat, lon = round(lat + rng.uniform(-0.2, 0.2), 6), round(lon + rng.uniform(-0.2, 0.2), 6)
+                nombre = f'{rng.choice(["Terminal", "Parada", "Estación"])} {lugar_id}'
+                self.lugares.append((lugar_id, nombre, ciudad, region, lat, lon))
+                yield dict(id=lugar_id, nombre=nombre, ciudad=ciudad, provincia=region, pais='Chile',
+                            latitud=lat, longitud=lon)
+        self._insertar(Lugar, filas())
+
+    def _pasajeros(self):
+        rng, inicio = self.rng, self._siguiente_id(Pasajero)
+        self.pasajeros = range(inicio, inicio + self.cantidades['pasajeros'])
+
+        tokens = []   # palabras de búsqueda (ver core/busqueda.py); se insertan después de los pasajeros
+
+        def filas():
+            for pasajero_id in self.pasajeros:
+                numero = 10000000 + pasajero_id
+                digito = digito_verificador_rut(numero)
+                nombre = f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}'
+                correo = f'pasajero{pasajero_id}@example.com'
+                tokens.extend(dict(pasajero_id=pasajero_id, token=token) for token in tokens_pasajero(nombre, correo))
+                yield dict(
+                    id=pasajero_id, nombre_completo=nombre, rut=f'{numero}-{digito}', rut_normalizado=f'{numero}{digito}',
+                    telefono=f'09{rng.randint(10000000, 99999999)}', correo=correo,
+                )
+        self._insertar(Pasajero, filas())
+        self._insertar(PasajeroToken, tokens)
+
+    def _viajes(self):
+        rng, inicio = self.rng, self._siguiente_id(Viaje)
+        total = self.cantidades['viajes']
+        ventana = timedelta(days=DIAS_HISTORIA + DIAS_FUTURO)
+        desde = self.ahora - timedelta(days=DIAS_HISTORIA)
+        self.viajes = []      # (viaje_id, bus_id, fecha_salida, distancia_km, cantidad_pasajeros) de viajes completados
+
+        pasajeros_por_viaje = {}
+
+        def filas():
+            for n, viaje_id in enumerate(range(inicio, inicio + total)):
+                salida = desde + ventana * (n / total) + timedelta(minutes=rng.randint(0, 59))
+                duracion = timedelta(hours=rng.randint(2, 14))
+                bus_id, capacidad = rng.choice(self.buses)
+                origen, destino = rng.sample(self.lugares, 2)
+                distancia = round(max(_distancia_km(origen[4], origen[5], destino[4], destino[5]), 15), 2)
+                if salida > self.ahora:
+                    estado = 'programado'
+                elif salida + duracion > self.ahora:
+                    estado = 'en_curso'
+                else:
+                    estado = 'cancelado' if rng.random() < 0.05 else 'completado'
+                cantidad = 0 if estado == 'cancelado' else rng.randint(0, min(capacidad, PASAJEROS_POR_VIAJE_MAX))
+                pasajeros_por_viaje[viaje_id] = cantidad
+                if estado == 'completado':
+                    self.viajes.append((viaje_id, bus_id, salida, distancia))
+                yield dict(
+                    id=viaje_id, bus_id=bus_id, conductor_id=rng.choice(self.conductores),
+                    lugar_origen_id=origen[0], lugar_destino_id=destino[0],
+                    origen_nombre=origen[1], origen_ciudad=origen[2], origen_provincia=origen[3], origen_pais='Chile',
+                    latitud_origen=origen[4], longitud_origen=origen[5],
+                    destino_nombre=destino[1], destino_ciudad=destino[2], destino_provincia=destino[3], destino_pais='Chile',
+                    latitud_destino=destino[4], longitud_destino=destino[5],
+                    fecha_salida=salida, fecha_llegada_estimada=salida + duracion,
+                    fecha_llegada_real=salida + duracion if estado == 'completado' else None,
+                    estado=estado, pasajeros_confirmados=cantidad, distancia_km=distancia,
+                    # Los pasajeros ocupan los asientos 1..cantidad (ver filas_pasajeros)
+                    asientos_ocupados=MapaAsientos.bits_a_bytes((1 << cantidad) - 1),
+                )
+        self._insertar(Viaje, filas())
+
+        pasajeros = self.pasajeros
+
+        def filas_pasajeros():
+            for viaje_id, cantidad in pasajeros_por_viaje.items():
+                for asiento, indice in enumerate(rng.sample(range(len(pasajeros)), cantidad), 1):
+                    yield dict(viaje_id=viaje_id, pasajero_id=pasajeros[indice], asiento=str(asiento))
+        self._insertar(ViajePasajero, filas_pasajeros())
+
+    def _costos(self):
+        """Costos de los viajes completados, con sus recargas y peajes (por lotes de viajes)."""
+        rng, costos_id = self.rng, self._siguiente_id(CostosViaje)
+        inicio = time.perf_counter()
+        for desde in range(0, len(self.viajes), self.tamano_lote):
+            costos, recargas, peajes = [], [], []
+            for viaje_id, bus_id, salida, distancia in self.viajes[desde:desde + self.tamano_lote]:
+                km_inicial = rng.randint(50000, 900000)
+                precio = rng.randint(950, 1350)
+                combustible = 0
+                kilometraje = km_inicial
+                for orden in range(1, rng.randint(1, 3) + 1):
+                    tramo = max(1, int(distancia / 3 * rng.uniform(0.6, 1.2)))
+                    kilometraje += tramo
+                    litros = max(5, int(tramo * rng.uniform(0.25, 0.40)))
+                    combustible += litros * precio
+                    recargas.append(dict(
+                        costos_viaje_id=costos_id, orden=orden, kilometraje=kilometraje, precio_combustible=precio,
+                        litros_cargados=litros, kilometros_recorridos=tramo, costo_total=litros * precio,
+                        ubicacion=f'Servicentro {rng.randint(1, 400)}',
+                    ))
+                total_peajes = 0
+                for n in range(rng.randint(0, 3)):
+                    monto = rng.choice([1400, 2200, 3100, 4300, 5800])
+                    total_peajes += monto
+                    peajes.append(dict(
+                        viaje_id=viaje_id, costos_viaje_id=costos_id, lugar=f'Plaza de peaje {rng.randint(1, 60)}',
+                        monto=monto, fecha_pago=salida + timedelta(minutes=30 * (n + 1)),
+                    ))
+                otros = rng.choice([0, 0, 0, 5000, 12000])
+                costos.append(dict(
+                    id=costos_id, viaje_id=viaje_id, km_inicial=km_inicial, km_final=km_inicial + int(distancia),
+                    combustible=combustible, peajes=total_peajes, otros_costos=otros,
+                    costo_total=combustible + total_peajes + otros,
+                ))
+                costos_id += 1
+            self._guardar_lote(CostosViaje, costos)
+            self._guardar_lote(PuntoRecarga, recargas)
+            self._guardar_lote(Peaje, peajes)
+        # El tiempo de generación se atribuye a CostosViaje
+        self.tiempos['CostosViaje'] = time.perf_counter() - inicio - self.tiempos.get('PuntoRecarga', 0) - self.tiempos.get('Peaje', 0)
+        self._informar(CostosViaje, PuntoRecarga, Peaje)
+
+    def _mantenimientos(self):
+        rng = self.rng
+
+        def filas():
+            for bus_id, _ in self.buses:
+                kilometraje = rng.randint(0, 200000)
+                for _ in range(rng.randint(MANTENIMIENTOS_POR_BUS // 2, MANTENIMIENTOS_POR_BUS * 3 // 2)):
+                    kilometraje += rng.randint(3000, 15000)
+                    tipo = rng.choice(TIPOS_MANTENIMIENTO)
+                    yield dict(
+                        bus_id=bus_id, tipo=tipo, descripcion=f'Mantenimiento {tipo}',
+                        fecha_mantenimiento=self.hoy - timedelta(days=rng.randint(0, DIAS_HISTORIA)),
+                        kilometraje=kilometraje, costo=rng.randint(40000, 1500000),
+                        taller=f'Taller {rng.randint(1, 40)}',
+                    )
+        self._insertar(Mantenimiento, filas())
+
+    def _documentos(self):
+        rng = self.rng
+
+        def filas():
+            for bus_id, _ in self.buses:
+                for tipo in TIPOS_DOCUMENTO:
+                    vencimiento = self.hoy + timedelta(days=rng.randint(-60, 365))
+                    dias = (vencimiento - self.hoy).days
+                    yield dict(
+                        bus_id=bus_id, tipo=tipo, numero_documento=f'{tipo.upper()}-{bus_id}',
+                        fecha_emision=vencimiento - timedelta(days=365), fecha_vencimiento=vencimiento,
+                        estado='vencido' if dias < 0 else 'por_vencer' if dias <= 30 else 'vigente',
+                    )
+        self._insertar(DocumentoVehiculo, filas())
+
+    def _reiniciar_secuencias(self):
+        """Ajusta las secuencias de ids (PostgreSQL) después de insertar ids explícitos."""
+        sentencias = connection.ops.sequence_reset_sql(no_style(), [Bus, Conductor, Lugar, Pasajero, Viaje, CostosViaje])
+        if sentencias:
+            with connection.cursor() as cursor:
+                for sql in sentencias:
+                    cursor.execute(sql)
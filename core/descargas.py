@@ -0,0 +1,163 @@
+"""
+Descarga de archivos subidos (documentos de buses y comprobantes) a través de
+vistas con control de permisos.
+
+El envío lo hace el backend configurado en DESCARGAS_BACKEND:
+
+- 'python' (por defecto): Django lee el archivo y lo envía por bloques.
+  Responde 304 a If-None-Match / If-Modified-Since (ETag del tamaño y la fecha
+  de modificación) y 206 a peticiones Range de un tramo, para que los visores
+  de PDF y las descargas interrumpidas no vuelvan a bajar el archivo entero.
+- 'nginx': la vista solo valida permisos y responde con X-Accel-Redirect; nginx
+  envía el archivo desde DESCARGAS_NGINX_PREFIJO (una location `internal` que
+  apunta a MEDIA_ROOT) y resuelve él mismo Range y ETag.
+- 'apache': igual, con la cabecera X-Sendfile de mod_xsendfile.
+
+Con nginx o apache, el archivo de un storage sin ruta local (p. ej. remoto)
+se envía igualmente con el backend de Python.
+"""
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_etags
+
+BACKENDS = ('python', 'nginx', 'apache')
+
+# Bytes leídos por iteración al enviar un tramo
+TAMANO_BLOQUE = 64 * 1024
+
+# Un solo tramo: bytes=inicio-fin, bytes=inicio- o bytes=-sufijo
+RANGO = re.compile(r'bytes=(\d*)-(\d*)', re.IGNORECASE)
+
+# Tipos que se pueden mostrar en el navegador; el resto (HTML, SVG...) siempre se descarga
+TIPOS_EN_LINEA = ('application/pdf', 'image/jpeg', 'image/png', 'image/gif', 'image/webp')
+
+
+def _backend():
+    backend = getattr(settings, 'DESCARGAS_BACKEND', 'python')
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(f'DESCARGAS_BACKEND debe ser uno de {", ".join(BACKENDS)} (es {backend!r}).')
+    return backend
+
+
+def _ruta_local(archivo):
+    try:
+        return archivo.path
+    except NotImplementedError:
+        return None
+
+
+def _preparar(response, nombre, adjunto):
+    """Cabeceras comunes: Content-Disposition y caché solo en el navegador, revalidando."""
+    response['Content-Disposition'] = content_disposition_header(adjunto, nombre)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _tipo(nombre):
+    return mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+
+
+def _tramo(cabecera, tamano):
+    """
+    (inicio, fin) inclusivos de una cabecera Range de un solo tramo en bytes.
+    None si la cabecera no aplica (se ignora y se envía el archivo entero) y
+    False si el tramo queda fuera del archivo (416).
+    """
+    coincidencia = RANGO.fullmatch(cabecera.strip())
+    if coincidencia is None or coincidencia.groups() == ('', ''):
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio:
+        # bytes=-N: los últimos N bytes
+        sufijo = int(fin)
+        if not sufijo or not tamano:
+            return False
+        return max(tamano - sufijo, 0), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, fin
+
+
+def _leer_tramo(fichero, inicio, largo):
+    try:
+        fichero.seek(inicio)
+        while largo > 0:
+            bloque = fichero.read(min(TAMANO_BLOQUE, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+    finally:
+        fichero.close()
+
+
+def _respuesta_python(request, archivo, nombre, adjunto):
+    storage = archivo.storage
+    try:
+        tamano = storage.size(archivo.name)
+        modificado = storage.get_modified_time(archivo.name).timestamp()
+    except (FileNotFoundError, NotImplementedError):
+        raise Http404('El archivo no se encontró en el servidor.')
+    etag = f'"{int(modificado):x}-{tamano:x}"'
+    ultima_modificacion = http_date(modificado)
+
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=int(modificado))
+    if no_modificado is not None:
+        no_modificado['ETag'] = etag
+        return _preparar(no_modificado, nombre, adjunto)
+
+    tramo = None
+    cabecera_range = request.META.get('HTTP_RANGE')
+    si_range = request.META.get('HTTP_IF_RANGE')
+    # If-Range: el tramo solo vale si el cliente tiene la versión actual del archivo
+    if cabecera_range and (not si_range or si_range == ultima_modificacion or etag in parse_etags(si_range)):
+        tramo = _tramo(cabecera_range, tamano)
+
+    if tramo is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamano}'
+    elif tramo:
+        inicio, fin = tramo
+        response = StreamingHttpResponse(
+            _leer_tramo(storage.open(archivo.name, 'rb'), inicio, fin - inicio + 1),
+            status=206, content_type=_tipo(nombre),
+        )
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        response['Content-Length'] = fin - inicio + 1
+    else:
+        response = FileResponse(storage.open(archivo.name, 'rb'), content_type=_tipo(nombre))
+        response['Content-Length'] = tamano
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = ultima_modificacion
+    return _preparar(response, nombre, adjunto)
+
+
+def respuesta_descarga(request, archivo, nombre=None, adjunto=True):
+    """
+    Respuesta que envía el archivo de un FileField con el backend configurado.
+    Los permisos se validan en la vista antes de llamarla. `adjunto=False`
+    permite mostrarlo en el navegador si es una imagen o un PDF.
+    """
+    nombre = nombre or archivo.name.rsplit('/', 1)[-1]
+    adjunto = adjunto or _tipo(nombre) not in TIPOS_EN_LINEA
+    backend = _backend()
+    ruta = _ruta_local(archivo) if backend != 'python' else None
+    if ruta is None:
+        return _respuesta_python(request, archivo, nombre, adjunto)
+
+    response = HttpResponse(content_type=_tipo(nombre))
+    if backend == 'nginx':
+        prefijo = getattr(settings, 'DESCARGAS_NGINX_PREFIJO', '/media-protegido/')
+        response['X-Accel-Redirect'] = prefijo.rstrip('/') + '/' + quote(archivo.name.lstrip('/'))
+    else:
+        response['X-Sendfile'] = ruta
+    return _preparar(response, nombre, adjunto)
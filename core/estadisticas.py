@@ -0,0 +1,154 @@
+"""
+Estadísticas materializadas del dashboard.
+
+Los totales se guardan en EstadisticasFlota y CostosDiarios y se actualizan con
+incrementos F() desde las señales de core/signals.py, de modo que `home_view`
+lee un número constante de filas sin importar el tamaño de las tablas.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Conductor, CostosDiarios, EstadisticasFlota, Lugar, Pasajero
+
+# Estado del viaje -> contador en EstadisticasFlota
+CAMPOS_ESTADO_VIAJE = {
+    'programado': 'viajes_programados',
+    'en_curso': 'viajes_en_curso',
+    'completado': 'viajes_completados',
+    'cancelado': 'viajes_cancelados',
+}
+
+# Campo de CostosViaje -> acumulado en EstadisticasFlota
+CAMPOS_COSTOS = {
+    'combustible': 'total_combustible',
+    'mantenimiento': 'total_mantenimiento',
+    'peajes': 'total_peajes',
+    'otros_costos': 'total_otros',
+    'costo_total': 'total_general',
+}
+
+
+def calcular_estadisticas():
+    """Recalcula todos los totales desde las tablas de origen."""
+    from flota.models import Bus, DocumentoVehiculo
+    from viajes.models import Viaje
+    from costos.models import CostosViaje
+
+    valores = {
+        'total_buses': Bus.objects.count(),
+        'total_conductores': Conductor.objects.count(),
+        'total_lugares': Lugar.objects.count(),
+        'total_pasajeros': Pasajero.objects.count(),
+        'total_documentos': DocumentoVehiculo.objects.count(),
+    }
+    valores.update({campo: 0 for campo in CAMPOS_ESTADO_VIAJE.values()})
+    por_estado = Viaje.objects.order_by().values('estado').annotate(total=Count('id'))
+    for fila in por_estado:
+        if fila['estado'] in CAMPOS_ESTADO_VIAJE:
+            valores[CAMPOS_ESTADO_VIAJE[fila['estado']]] = fila['total']
+    valores['total_viajes'] = sum(fila['total'] for fila in por_estado)
+
+    totales = CostosViaje.objects.aggregate(
+        total_costos_registrados=Count('id'),
+        **{destino: Sum(origen) for origen, destino in CAMPOS_COSTOS.items()}
+    )
+    valores.update({campo: valor or 0 for campo, valor in totales.items()})
+    return valores
+
+
+def calcular_costos_diarios():
+    """Agrupa los costos registrados por día local de creación."""
+    from costos.models import CostosViaje
+
+    por_dia = {}
+    for creado_en, costo_total in CostosViaje.objects.values_list('creado_en', 'costo_total').iterator(chunk_size=2000):
+        fecha = timezone.localdate(creado_en)
+        total, viajes = por_dia.get(fecha, (0, 0))
+        por_dia[fecha] = (total + costo_total, viajes + 1)
+    return por_dia
+
+
+@transaction.atomic
+def reconstruir_estadisticas():
+    """
+    Recalcula desde cero las estadísticas y los costos diarios.
+    Retorna (estadisticas, diferencias) donde diferencias es {campo: (guardado, real)}.
+    """
+    valores = calcular_estadisticas()
+    estadisticas, _ = EstadisticasFlota.objects.select_for_update().get_or_create(pk=1)
+    diferencias = {
+        campo: (getattr(estadisticas, campo), valor)
+        for campo, valor in valores.items()
+        if getattr(estadisticas, campo) != valor
+    }
+    for campo, valor in valores.items():
+        setattr(estadisticas, campo, valor)
+    estadisticas.save()
+
+    por_dia = calcular_costos_diarios()
+    guardados = {c.fecha: (c.total, c.viajes) for c in CostosDiarios.objects.all()}
+    for fecha, (total, viajes) in guardados.items():
+        if fecha not in por_dia:
+            diferencias[f'costos_diarios[{fecha}]'] = ((total, viajes), (0, 0))
+    for fecha, real in por_dia.items():
+        if guardados.get(fecha, (0, 0)) != real:
+            diferencias[f'costos_diarios[{fecha}]'] = (guardados.get(fecha, (0, 0)), real)
+    CostosDiarios.objects.all().delete()
+    CostosDiarios.objects.bulk_create(
+        CostosDiarios(fecha=fecha, total=total, viajes=viajes) for fecha, (total, viajes) in por_dia.items()
+    )
+    return estadisticas, diferencias
+
+
+def obtener_estadisticas():
+    """Lee la fila de estadísticas (la construye si aún no existe)."""
+    estadisticas = EstadisticasFlota.objects.filter(pk=1).first()
+    if estadisticas is None:
+        estadisticas, _ = reconstruir_estadisticas()
+    return estadisticas
+
+
+def incrementar(**deltas):
+    """
+    Aplica incrementos atómicos (pueden ser negativos) a los contadores.
+    Retorna False si en su lugar hubo que reconstruir todo desde cero.
+    """
+    deltas = {campo: delta for campo, delta in deltas.items() if delta}
+    if not deltas:
+        return True
+    actualizadas = EstadisticasFlota.objects.filter(pk=1).update(
+        **{campo: F(campo) + delta for campo, delta in deltas.items()}
+    )
+    if not actualizadas:
+        # Primera escritura: construir desde cero (ya incluye este cambio)
+        reconstruir_estadisticas()
+        return False
+    return True
+
+
+def registrar_costo_diario(fecha, total, viajes):
+    """Acumula un costo (o su reversión, con valores negativos) en el día indicado."""
+    if not total and not viajes:
+        return
+    actualizadas = CostosDiarios.objects.filter(fecha=fecha).update(
+        total=F('total') + total, viajes=F('viajes') + viajes
+    )
+    if actualizadas:
+        return
+    try:
+        with transaction.atomic():
+            CostosDiarios.objects.create(fecha=fecha, total=total, viajes=viajes)
+    except IntegrityError:
+        CostosDiarios.objects.filter(fecha=fecha).update(total=F('total') + total, viajes=F('viajes') + viajes)
+
+
+def costos_ultimos_dias(dias=30):
+    """Total y cantidad de viajes con costos registrados en los últimos `dias` días."""
+    desde = timezone.localdate() - timedelta(days=dias)
+    return CostosDiarios.objects.filter(fecha__gte=desde).aggregate(
+        total_mes=Sum('total'),
+        viajes_mes=Sum('viajes'),
+    )
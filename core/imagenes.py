@@ -0,0 +1,134 @@
+"""
+Procesamiento de las fotos de cédula y licencia de los conductores.
+
+Los teléfonos suben fotos de varios MB, a veces giradas (la orientación solo
+viene en el EXIF) y con metadatos como la ubicación GPS. Al subir una foto se
+encola la tarea `core.procesar_imagen_conductor` (ver core/tareas.py), que en
+el worker:
+
+- endereza la imagen según su EXIF y la guarda sin metadatos,
+- la reduce a IMAGENES_LADO_MAXIMO px por lado como JPEG (reemplaza al original),
+- genera una miniatura de IMAGENES_LADO_MINIATURA px que usan el listado y el
+  detalle de conductores.
+
+La miniatura se guarda en un campo del conductor (`<campo>_miniatura`), de modo
+que solo se genera una vez. El comando `procesar_imagenes_conductores` procesa
+las fotos existentes.
+"""
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Conductor
+
+logger = logging.getLogger(__name__)
+
+# Campo de imagen -> campo de su miniatura
+CAMPOS_IMAGEN = {
+    'cedula_frontal': 'cedula_frontal_miniatura',
+    'cedula_trasera': 'cedula_trasera_miniatura',
+    'licencia_conducir_frontal': 'licencia_conducir_frontal_miniatura',
+    'licencia_conducir_trasera': 'licencia_conducir_trasera_miniatura',
+}
+
+
+def _opcion(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def _a_rgb(imagen):
+    """RGB para JPEG; la transparencia se compone sobre fondo blanco."""
+    if imagen.mode in ('RGBA', 'LA') or (imagen.mode == 'P' and 'transparency' in imagen.info):
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, 'white')
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen if imagen.mode == 'RGB' else imagen.convert('RGB')
+
+
+def _jpeg(imagen, calidad):
+    salida = io.BytesIO()
+    imagen.save(salida, 'JPEG', quality=calidad, optimize=True, progressive=True)
+    return salida.getvalue()
+
+
+def procesar_imagen(datos):
+    """
+    A partir de los bytes de una foto retorna (imagen reducida o None si el
+    original ya cumple, miniatura), ambas en JPEG y sin metadatos.
+    Lanza UnidentifiedImageError si los bytes no son una imagen.
+    """
+    lado_maximo = _opcion('IMAGENES_LADO_MAXIMO', 1600)
+    lado_miniatura = _opcion('IMAGENES_LADO_MINIATURA', 320)
+    with Image.open(io.BytesIO(datos)) as original:
+        formato = original.format
+        orientacion = original.getexif().get(0x0112, 1)
+        tiene_metadatos = bool(original.getexif()) or 'icc_profile' in original.info
+        # En JPEG, decodificar ya a escala reducida (mucho más rápido que leer la foto completa)
+        original.draft('RGB', (lado_maximo, lado_maximo))
+        imagen = _a_rgb(ImageOps.exif_transpose(original))
+
+    ya_procesada = (formato == 'JPEG' and orientacion == 1 and not tiene_metadatos
+                    and max(imagen.size) <= lado_maximo)
+    reducida = None
+    if not ya_procesada:
+        imagen.thumbnail((lado_maximo, lado_maximo), Image.LANCZOS)
+        reducida = _jpeg(imagen, _opcion('IMAGENES_CALIDAD', 85))
+    imagen.thumbnail((lado_miniatura, lado_miniatura), Image.LANCZOS)
+    return reducida, _jpeg(imagen, _opcion('IMAGENES_CALIDAD_MINIATURA', 75))
+
+
+def _nombre_jpeg(nombre):
+    return os.path.splitext(os.path.basename(nombre))[0] + '.jpg'
+
+
+def procesar_imagen_conductor(conductor_id, campo):
+    """
+    Procesa la foto `campo` del conductor y guarda la miniatura. Retorna
+    (bytes antes, bytes después) de la foto, o None si no había nada que hacer.
+    """
+    campo_miniatura = CAMPOS_IMAGEN[campo]
+    conductor = Conductor.objects.filter(pk=conductor_id).only(campo, campo_miniatura).first()
+    archivo = getattr(conductor, campo, None)
+    if not archivo:
+        return None
+    nombre_original = archivo.name
+    storage = archivo.storage
+    with archivo.open('rb') as origen:
+        datos = origen.read()
+    try:
+        reducida, miniatura = procesar_imagen(datos)
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        # Un PDF o una imagen inválida: se sirve tal cual (reintentar no lo arreglaría)
+        logger.warning('No se procesó %s del conductor %s: %s', campo, conductor_id, e)
+        return None
+
+    nuevos = []
+    nombre = nombre_original
+    if reducida is not None:
+        nombre = storage.save(os.path.join(os.path.dirname(nombre_original), _nombre_jpeg(nombre_original)),
+                              ContentFile(reducida))
+        nuevos.append(nombre)
+    campo_archivo = Conductor._meta.get_field(campo_miniatura)
+    nombre_miniatura = campo_archivo.storage.save(campo_archivo.generate_filename(conductor, _nombre_jpeg(nombre_original)),
+                                                  ContentFile(miniatura))
+    nuevos.append(nombre_miniatura)
+
+    # Solo si la foto no cambió mientras se procesaba (si cambió, su propia tarea la procesará)
+    actualizados = Conductor.objects.filter(pk=conductor_id, **{campo: nombre_original}).update(
+        **{campo: nombre, campo_miniatura: nombre_miniatura}
+    )
+    if not actualizados:
+        for ruta in nuevos:
+            storage.delete(ruta)
+        return None
+    anterior = getattr(conductor, campo_miniatura)
+    if anterior and anterior.name != nombre_miniatura:
+        anterior.storage.delete(anterior.name)
+    if nombre != nombre_original:
+        storage.delete(nombre_original)
+    return len(datos), len(reducida) if reducida is not None else len(datos)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from core.imagenes import CAMPOS_IMAGEN, procesar_imagen_conductor
+from core.models import Conductor
+from core.tareas import encolar
+
+
+class Command(BaseCommand):
+    help = ('Procesa las fotos de cédula y licencia existentes (orientación, sin EXIF, tamaño máximo) '
+            'y genera sus miniaturas.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--encolar', action='store_true',
+                            help='Encolar una tarea por foto para el worker en lugar de procesarlas aquí.')
+        parser.add_argument('--todas', action='store_true',
+                            help='Procesar también las fotos que ya tienen miniatura.')
+        parser.add_argument('--lote', type=int, default=500, help='Conductores por lote (por defecto 500).')
+
+    def handle(self, *args, **options):
+        campos = [campo for par in CAMPOS_IMAGEN.items() for campo in par]
+        pendientes = procesadas = antes = despues = 0
+        ultimo = 0
+        while True:
+            lote = list(Conductor.objects.filter(pk__gt=ultimo).order_by('pk').values_list('pk', *campos)[:options['lote']])
+            if not lote:
+                break
+            for conductor_id, *nombres in lote:
+                for (campo, _), (nombre, miniatura) in zip(CAMPOS_IMAGEN.items(), zip(nombres[::2], nombres[1::2])):
+                    if not nombre or (miniatura and not options['todas']):
+                        continue
+                    pendientes += 1
+                    if options['encolar']:
+                        encolar('core.procesar_imagen_conductor', conductor_id=conductor_id, campo=campo)
+                        continue
+                    tamanos = procesar_imagen_conductor(conductor_id, campo)
+                    if tamanos:
+                        procesadas += 1
+                        antes += tamanos[0]
+                        despues += tamanos[1]
+            ultimo = lote[-1][0]
+
+        if options['encolar']:
+            self.stdout.write(self.style.SUCCESS(f'✓ {pendientes} foto(s) encoladas para el worker (procesar_tareas).'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {procesadas} de {pendientes} foto(s) procesadas: {antes / 1048576:.1f} MB → {despues / 1048576:.1f} MB.'
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.tareas import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Worker de la cola de tareas en segundo plano (cálculo de distancias, etc.).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesa las tareas disponibles y termina.')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando la cola está vacía.')
+        parser.add_argument('--max-tareas', type=int, default=None, help='Termina después de procesar esta cantidad de tareas.')
+
+    def handle(self, *args, **options):
+        total = 0
+        self.stdout.write('Worker de tareas iniciado...')
+        try:
+            while True:
+                close_old_connections()
+                restantes = None if options['max_tareas'] is None else options['max_tareas'] - total
+                procesadas = procesar_pendientes(limite=restantes)
+                total += procesadas
+                if procesadas:
+                    self.stdout.write(f'{procesadas} tarea(s) procesada(s)')
+                if options['una_vez'] or (options['max_tareas'] is not None and total >= options['max_tareas']):
+                    break
+                if not procesadas:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido.')
+        self.stdout.write(self.style.SUCCESS(f'Total de tareas procesadas: {total}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.estadisticas import reconstruir_estadisticas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero las estadísticas del dashboard e informa las diferencias encontradas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fallar-si-hay-diferencias', action='store_true',
+            help='Termina con error si los totales guardados no coincidían (útil en tareas programadas).'
+        )
+
+    def handle(self, *args, **options):
+        _, diferencias = reconstruir_estadisticas()
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('✓ Estadísticas al día: no se encontraron diferencias.'))
+            return
+        self.stdout.write(self.style.WARNING(f'Se corrigieron {len(diferencias)} diferencia(s):'))
+        for campo, (guardado, real) in sorted(diferencias.items()):
+            self.stdout.write(f'  {campo}: {guardado} -> {real}')
+        if options['fallar_si_hay_diferencias']:
+            raise CommandError('Las estadísticas del dashboard tenían diferencias.')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.busqueda import indexar_pasajeros
+from core.models import Pasajero
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el RUT normalizado y las palabras de búsqueda de todos los pasajeros (tras cargas masivas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help='Pasajeros por lote (por defecto 2000).')
+
+    def handle(self, *args, **options):
+        ultimo = 0
+        pasajeros = tokens = 0
+        while True:
+            lote = list(Pasajero.objects.filter(pk__gt=ultimo).order_by('pk')[:options['lote']])
+            if not lote:
+                break
+            tokens += indexar_pasajeros(lote)
+            pasajeros += len(lote)
+            ultimo = lote[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'✓ {pasajeros} pasajero(s) reindexados ({tokens} palabras de búsqueda).'))
@@ -1,4 +1,6 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta, date
@@ -7,13 +9,56 @@ from flota.models import Bus, DocumentoVehiculo, Mantenimiento
 from core.models import Conductor, Lugar, Pasajero
 from viajes.models import Viaje
 from costos.models import CostosViaje
+from core.datos_sinteticos import GeneradorDatos
+from core.estadisticas import reconstruir_estadisticas
 
 
 class Command(BaseCommand):
-    help = 'Siembra datos de ejemplo para desarrollo: buses, conductores, lugares, pasajeros, viajes y costos.'
+    help = (
+        'Siembra datos de ejemplo para desarrollo: buses, conductores, lugares, pasajeros, viajes y costos. '
+        'Con --scale genera datos sintéticos masivos para pruebas de carga '
+        '(escala 1 = 500 buses, 100.000 viajes y ~1.000.000 de pasajeros en viajes).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=None,
+                            help='Genera datos sintéticos con esta escala (p. ej. 0.01, 1, 5).')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla: la misma semilla produce los mismos datos.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas por lote: se generan y se insertan con un solo executemany.')
+        parser.add_argument('--fecha-referencia', type=date.fromisoformat, default=None,
+                            help='Fecha "hoy" de los datos sintéticos (AAAA-MM-DD); por defecto la fecha actual.')
 
-    @transaction.atomic
     def handle(self, *args, **options):
+        if options['scale'] is None:
+            self.sembrar_ejemplos()
+            reconstruir_estadisticas()
+            return
+
+        if options['scale'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError('--scale y --batch-size deben ser mayores que cero.')
+
+        def progreso(modelo, filas, segundos):
+            velocidad = filas / segundos if segundos else 0
+            self.stdout.write(f'  {modelo._meta.verbose_name_plural}: {filas:,} filas en {segundos:.1f} s ({velocidad:,.0f} filas/s)')
+
+        self.stdout.write(f'Generando datos sintéticos (escala {options["scale"]}, semilla {options["seed"]})...')
+        inicio = time.perf_counter()
+        generador = GeneradorDatos(
+            escala=options['scale'],
+            semilla=options['seed'],
+            tamano_lote=options['batch_size'],
+            fecha_referencia=options['fecha_referencia'],
+            progreso=progreso,
+        )
+        totales = generador.generar()
+        segundos = time.perf_counter() - inicio
+        filas = sum(totales.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Siembra completada: {filas:,} filas en {segundos:.1f} s ({filas / segundos:,.0f} filas/s).'
+        ))
+
+    @transaction.atomic
+    def sembrar_ejemplos(self):
         self.stdout.write('Iniciando siembra de datos de ejemplo...')
 
         # Buses
@@ -24,7 +69,7 @@ class Command(BaseCommand):
                 'modelo': 'Sprinter 2018',
                 'año_fabricacion': 2018,
                 'capacidad_pasajeros': 20,
-                'kilometraje_inicial': 120000,
+                'kilometraje_ingreso': 120000,
                 'numero_chasis': 'CHS-PQR-123',
                 'numero_motor': 'ENG-PQR-01',
                 'estado': 'activo',
@@ -36,7 +81,7 @@ class Command(BaseCommand):
                 'modelo': 'B9R',
                 'año_fabricacion': 2015,
                 'capacidad_pasajeros': 45,
-                'kilometraje_inicial': 300000,
+                'kilometraje_ingreso': 300000,
                 'numero_chasis': 'CHS-ABC-999',
                 'numero_motor': 'ENG-ABC-09',
                 'estado': 'activo',
@@ -48,7 +93,7 @@ class Command(BaseCommand):
                 'modelo': 'K360',
                 'año_fabricacion': 2017,
                 'capacidad_pasajeros': 40,
-                'kilometraje_inicial': 200000,
+                'kilometraje_ingreso': 200000,
                 'numero_chasis': 'CHS-DEF-456',
                 'numero_motor': 'ENG-DEF-02',
                 'estado': 'activo',
@@ -60,7 +105,7 @@ class Command(BaseCommand):
                 'modelo': 'Urbanway',
                 'año_fabricacion': 2019,
                 'capacidad_pasajeros': 30,
-                'kilometraje_inicial': 90000,
+                'kilometraje_ingreso': 90000,
                 'numero_chasis': 'CHS-GHI-321',
                 'numero_motor': 'ENG-GHI-03',
                 'estado': 'mantenimiento',
@@ -77,7 +122,7 @@ class Command(BaseCommand):
                     'modelo': b['modelo'],
                     'año_fabricacion': b['año_fabricacion'],
                     'capacidad_pasajeros': b['capacidad_pasajeros'],
-                    'kilometraje_inicial': b['kilometraje_inicial'],
+                    'kilometraje_ingreso': b['kilometraje_ingreso'],
                     'numero_chasis': b['numero_chasis'],
                     'numero_motor': b['numero_motor'],
                     'estado': b['estado'],
@@ -217,7 +262,7 @@ class Command(BaseCommand):
                 tipo='preventivo',
                 descripcion=f'Mantenimiento {idx+1} - revisión general',
                 fecha_mantenimiento=date.today() - timedelta(days=30 + idx * 10),
-                defaults={'kilometraje': busx.kilometraje_inicial + 100 * (idx+1), 'costo': 80.00 + idx * 20, 'taller': 'Taller Central'}
+                defaults={'kilometraje': busx.kilometraje_ingreso + 100 * (idx+1), 'costo': 80.00 + idx * 20, 'taller': 'Taller Central'}
             )
             self.stdout.write(f"{'Creado' if created else 'Existe'} Mantenimiento: {mant}")
 
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_tarea'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CostosDiarios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('total', models.BigIntegerField(default=0)),
+                ('viajes', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Costos Diarios',
+                'verbose_name_plural': 'Costos Diarios',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadisticasFlota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_buses', models.IntegerField(default=0)),
+                ('total_conductores', models.IntegerField(default=0)),
+                ('total_lugares', models.IntegerField(default=0)),
+                ('total_pasajeros', models.IntegerField(default=0)),
+                ('total_documentos', models.IntegerField(default=0)),
+                ('total_viajes', models.IntegerField(default=0)),
+                ('viajes_programados', models.IntegerField(default=0)),
+                ('viajes_en_curso', models.IntegerField(default=0)),
+                ('viajes_completados', models.IntegerField(default=0)),
+                ('viajes_cancelados', models.IntegerField(default=0)),
+                ('total_costos_registrados', models.IntegerField(default=0)),
+                ('total_combustible', models.BigIntegerField(default=0)),
+                ('total_mantenimiento', models.BigIntegerField(default=0)),
+                ('total_peajes', models.BigIntegerField(default=0)),
+                ('total_otros', models.BigIntegerField(default=0)),
+                ('total_general', models.BigIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estadísticas de Flota',
+                'verbose_name_plural': 'Estadísticas de Flota',
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:53
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia de core.busqueda al momento de la migración: la migración no debe
+# cambiar si después cambia la forma de indexar
+LARGO_TOKEN = 100
+
+
+def normalizar_rut(rut):
+    return re.sub(r'[^0-9K]', '', (rut or '').upper())
+
+
+def tokens_pasajero(nombre_completo, correo):
+    descompuesto = unicodedata.normalize('NFKD', nombre_completo or '')
+    texto = ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+    tokens = dict.fromkeys(re.findall(r'[a-z0-9]+', texto))
+    if correo:
+        tokens[correo.strip().lower()[:LARGO_TOKEN]] = None
+    return [token[:LARGO_TOKEN] for token in tokens]
+
+
+def indexar_pasajeros_existentes(apps, schema_editor):
+    """Completa rut_normalizado y las palabras de búsqueda de los pasajeros ya cargados, por lotes."""
+    Pasajero = apps.get_model('core', 'Pasajero')
+    PasajeroToken = apps.get_model('core', 'PasajeroToken')
+    ultimo = 0
+    while True:
+        lote = list(Pasajero.objects.filter(pk__gt=ultimo).order_by('pk')[:2000])
+        if not lote:
+            return
+        for pasajero in lote:
+            pasajero.rut_normalizado = normalizar_rut(pasajero.rut)
+        Pasajero.objects.bulk_update(lote, ['rut_normalizado'], batch_size=1000)
+        PasajeroToken.objects.bulk_create([
+            PasajeroToken(pasajero_id=pasajero.pk, token=token)
+            for pasajero in lote
+            for token in tokens_pasajero(pasajero.nombre_completo, pasajero.correo)
+        ], batch_size=1000)
+        ultimo = lote[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_estadisticasflota_costosdiarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pasajero',
+            name='rut_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='RUT sin puntos ni guion, para buscar por prefijo', max_length=12),
+        ),
+        migrations.CreateModel(
+            name='PasajeroToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('pasajero', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to='core.pasajero')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'pasajero'], name='pasajero_token_idx')],
+            },
+        ),
+        migrations.RunPython(indexar_pasajeros_existentes, migrations.RunPython.noop),
+    ]
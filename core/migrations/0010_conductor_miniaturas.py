@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_pasajero_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conductor',
+            name='cedula_frontal_miniatura',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='miniaturas/cedulas/'),
+        ),
+        migrations.AddField(
+            model_name='conductor',
+            name='cedula_trasera_miniatura',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='miniaturas/cedulas/'),
+        ),
+        migrations.AddField(
+            model_name='conductor',
+            name='licencia_conducir_frontal_miniatura',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='miniaturas/licencias/'),
+        ),
+        migrations.AddField(
+            model_name='conductor',
+            name='licencia_conducir_trasera_miniatura',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='miniaturas/licencias/'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Conductor(models.Model):
@@ -15,6 +16,11 @@ class Conductor(models.Model):
     fecha_contratacion = models.DateField()
     licencia_conducir_frontal = models.ImageField(upload_to='licencias/', null=True, blank=True, help_text='Foto frontal de la licencia de conducir')
     licencia_conducir_trasera = models.ImageField(upload_to='licencias/', null=True, blank=True, help_text='Foto trasera de la licencia de conducir')
+    # Miniaturas de las fotos, generadas en segundo plano (ver core/imagenes.py)
+    cedula_frontal_miniatura = models.ImageField(upload_to='miniaturas/cedulas/', null=True, blank=True, editable=False)
+    cedula_trasera_miniatura = models.ImageField(upload_to='miniaturas/cedulas/', null=True, blank=True, editable=False)
+    licencia_conducir_frontal_miniatura = models.ImageField(upload_to='miniaturas/licencias/', null=True, blank=True, editable=False)
+    licencia_conducir_trasera_miniatura = models.ImageField(upload_to='miniaturas/licencias/', null=True, blank=True, editable=False)
     licencias = models.CharField(
         max_length=50,
         help_text='Tipos de licencias (A, B, C, etc.)',
@@ -63,6 +69,7 @@ class Pasajero(models.Model):
     rut = models.CharField(max_length=12, unique=True)
     telefono = models.CharField(max_length=15)
     correo = models.EmailField()
+    rut_normalizado = models.CharField(max_length=12, editable=False, db_index=True, default='', help_text='RUT sin puntos ni guion, para buscar por prefijo')
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
 
@@ -73,3 +80,110 @@ class Pasajero(models.Model):
 
     def __str__(self):
         return self.nombre_completo
+
+    def save(self, *args, **kwargs):
+        from .busqueda import indexar_pasajeros, normalizar_rut
+        self.rut_normalizado = normalizar_rut(self.rut)
+        super().save(*args, **kwargs)
+        indexar_pasajeros([self])
+
+
+class PasajeroToken(models.Model):
+    """
+    Palabra de búsqueda de un pasajero (palabras del nombre sin tildes y correo),
+    indexada para autocompletar por prefijo (ver core/busqueda.py).
+    """
+    LARGO_MAXIMO = 100
+
+    pasajero = models.ForeignKey(Pasajero, on_delete=models.CASCADE, related_name='tokens')
+    token = models.CharField(max_length=LARGO_MAXIMO)
+
+    class Meta:
+        indexes = [models.Index(fields=['token', 'pasajero'], name='pasajero_token_idx')]
+
+    def __str__(self):
+        return f"{self.token} ({self.pasajero_id})"
+
+
+class Tarea(models.Model):
+    """
+    Tarea en segundo plano encolada en la base de datos.
+    La procesa el comando `procesar_tareas` (ver core/tareas.py).
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En Proceso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+
+    tipo = models.CharField(max_length=100)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    disponible_en = models.DateTimeField(default=timezone.now, help_text='No se ejecuta antes de este momento (reintentos con espera)')
+    iniciada_en = models.DateTimeField(null=True, blank=True)
+    finalizada_en = models.DateTimeField(null=True, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['disponible_en', 'id']
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en'], name='tarea_estado_disponible_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_estado_display()})"
+
+
+class EstadisticasFlota(models.Model):
+    """
+    Totales del dashboard mantenidos incrementalmente por señales (core/signals.py).
+    Existe una única fila (pk=1); `rebuild_dashboard_stats` la recalcula desde cero.
+    """
+    total_buses = models.IntegerField(default=0)
+    total_conductores = models.IntegerField(default=0)
+    total_lugares = models.IntegerField(default=0)
+    total_pasajeros = models.IntegerField(default=0)
+    total_documentos = models.IntegerField(default=0)
+    total_viajes = models.IntegerField(default=0)
+    viajes_programados = models.IntegerField(default=0)
+    viajes_en_curso = models.IntegerField(default=0)
+    viajes_completados = models.IntegerField(default=0)
+    viajes_cancelados = models.IntegerField(default=0)
+    total_costos_registrados = models.IntegerField(default=0)
+    total_combustible = models.BigIntegerField(default=0)
+    total_mantenimiento = models.BigIntegerField(default=0)
+    total_peajes = models.BigIntegerField(default=0)
+    total_otros = models.BigIntegerField(default=0)
+    total_general = models.BigIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Estadísticas de Flota'
+        verbose_name_plural = 'Estadísticas de Flota'
+
+    def __str__(self):
+        return f"Estadísticas de flota (actualizado {self.actualizado_en})"
+
+
+class CostosDiarios(models.Model):
+    """
+    Costos registrados por día de creación, para los totales móviles del dashboard.
+    """
+    fecha = models.DateField(unique=True)
+    total = models.BigIntegerField(default=0)
+    viajes = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Costos Diarios'
+        verbose_name_plural = 'Costos Diarios'
+
+    def __str__(self):
+        return f"{self.fecha}: ${self.total} ({self.viajes} viajes)"
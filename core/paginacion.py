@@ -0,0 +1,109 @@
+"""
+Paginación por cursor (keyset) para listados grandes.
+
+En lugar de OFFSET, cada página se pide a partir de los valores de orden de la
+última fila mostrada, de modo que el costo de la consulta no crece con el número
+de página. El orden debe terminar en un campo único (normalmente 'pk').
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class PaginaCursor:
+    """Resultado de una página: filas y cursores para la siguiente y la anterior."""
+    def __init__(self, filas, cursor_siguiente=None, cursor_anterior=None):
+        self.filas = filas
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.filas)
+
+    def __len__(self):
+        return len(self.filas)
+
+
+def codificar_cursor(direccion, valores):
+    # str() conserva los microsegundos de las fechas (DjangoJSONEncoder los trunca)
+    datos = json.dumps([direccion, valores], default=str)
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, cantidad_campos):
+    """Retorna (direccion, valores) o (None, None) si el cursor falta o no es válido."""
+    if not cursor:
+        return None, None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        direccion, valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        return None, None
+    if direccion not in ('siguiente', 'anterior') or not isinstance(valores, list) or len(valores) != cantidad_campos:
+        return None, None
+    return direccion, valores
+
+
+def _valor_campo(objeto, campo):
+    for parte in campo.lstrip('-').split('__'):
+        objeto = getattr(objeto, parte)
+    return objeto
+
+
+def _condicion(orden, valores, hacia_adelante):
+    """(a, b) después de (x, y) en el orden dado: a > x OR (a = x AND b > y)."""
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        mayor = campo.startswith('-') != hacia_adelante
+        condicion |= Q(**iguales, **{f'{nombre}__{"gt" if mayor else "lt"}': valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def paginar_por_cursor(queryset, orden, cursor=None, por_pagina=25):
+    """
+    Retorna una PaginaCursor de `queryset` ordenado por `orden`
+    (p. ej. ['-viaje__fecha_salida', '-pk']). Ejecuta una sola consulta.
+    """
+    direccion, valores = decodificar_cursor(cursor, len(orden))
+    try:
+        return _paginar(queryset, orden, direccion, valores, por_pagina)
+    except ValidationError:
+        # Cursor manipulado con valores que no corresponden a los campos: primera página
+        return _paginar(queryset, orden, None, None, por_pagina)
+
+
+def _paginar(queryset, orden, direccion, valores, por_pagina):
+    if direccion == 'anterior':
+        invertido = [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden]
+        filas = list(queryset.filter(_condicion(orden, valores, False)).order_by(*invertido)[:por_pagina + 1])
+        hay_anterior = len(filas) > por_pagina
+        filas = filas[:por_pagina][::-1]
+        hay_siguiente = True
+    else:
+        queryset = queryset.order_by(*orden)
+        if valores is not None:
+            queryset = queryset.filter(_condicion(orden, valores, True))
+        filas = list(queryset[:por_pagina + 1])
+        hay_siguiente = len(filas) > por_pagina
+        filas = filas[:por_pagina]
+        hay_anterior = valores is not None
+
+    pagina = PaginaCursor(filas)
+    if filas and hay_siguiente:
+        pagina.cursor_siguiente = codificar_cursor('siguiente', [_valor_campo(filas[-1], c) for c in orden])
+    if filas and hay_anterior:
+        pagina.cursor_anterior = codificar_cursor('anterior', [_valor_campo(filas[0], c) for c in orden])
+    return pagina
@@ -4,6 +4,31 @@ from django.contrib import messages
 from functools import wraps
 
 
+def obtener_grupos(user):
+    """
+    Retorna los nombres de los grupos del usuario. Se consultan una sola vez por
+    request y quedan guardados en el propio objeto `user` (ver core/signals.py
+    para la invalidación cuando cambian los grupos).
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    grupos = getattr(user, '_grupos_cache', None)
+    if grupos is None:
+        grupos = frozenset(user.groups.values_list('name', flat=True))
+        user._grupos_cache = grupos
+    return grupos
+
+
+def es_admin(user):
+    """Verifica si el usuario es Admin (superusuario o grupo Admin)"""
+    return user.is_authenticated and (user.is_superuser or 'Admin' in obtener_grupos(user))
+
+
+def es_usuario_o_admin(user):
+    """Verifica si el usuario pertenece a los grupos Usuario o Admin"""
+    return user.is_authenticated and (user.is_superuser or bool(obtener_grupos(user) & {'Admin', 'Usuario'}))
+
+
 def admin_required(view_func):
     """Decorador que verifica si el usuario es Admin"""
     @wraps(view_func)
@@ -11,7 +36,7 @@ def admin_required(view_func):
         if not request.user.is_authenticated:
             return redirect('login')
         
-        if request.user.is_superuser or request.user.groups.filter(name='Admin').exists():
+        if es_admin(request.user):
             return view_func(request, *args, **kwargs)
         
         messages.error(request, 'No tienes permiso para acceder a esta sección. Se requiere acceso de Administrador.')
@@ -27,7 +52,7 @@ def usuario_or_admin_required(view_func):
         if not request.user.is_authenticated:
             return redirect('login')
         
-        if request.user.is_superuser or request.user.groups.filter(name__in=['Admin', 'Usuario']).exists():
+        if es_usuario_o_admin(request.user):
             return view_func(request, *args, **kwargs)
         
         messages.error(request, 'No tienes permiso para acceder a esta sección.')
@@ -41,13 +66,10 @@ def get_user_role(user):
     if not user.is_authenticated:
         return None
     
-    if user.is_superuser:
-        return 'admin'
-    
-    if user.groups.filter(name='Admin').exists():
+    if es_admin(user):
         return 'admin'
     
-    if user.groups.filter(name='Usuario').exists():
+    if 'Usuario' in obtener_grupos(user):
         return 'usuario'
     
     return None
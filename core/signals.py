@@ -0,0 +1,164 @@
+"""
+Señales que mantienen al día las estadísticas del dashboard (ver core/estadisticas.py),
+la caché de grupos de core/permissions.py y el procesamiento de las fotos de los
+conductores (ver core/imagenes.py).
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from costos.models import CostosViaje
+from flota.models import Bus, DocumentoVehiculo
+from viajes.models import Viaje
+from .estadisticas import CAMPOS_COSTOS, CAMPOS_ESTADO_VIAJE, incrementar, registrar_costo_diario
+from .imagenes import CAMPOS_IMAGEN
+from .models import Conductor, Lugar, Pasajero
+from .tareas import encolar
+
+# Modelos cuyo único aporte al dashboard es su cantidad de filas
+CONTADORES = {
+    Bus: 'total_buses',
+    Conductor: 'total_conductores',
+    Lugar: 'total_lugares',
+    Pasajero: 'total_pasajeros',
+    DocumentoVehiculo: 'total_documentos',
+}
+
+
+def _contador_creado(sender, instance, created, **kwargs):
+    if created:
+        incrementar(**{CONTADORES[sender]: 1})
+
+
+def _contador_eliminado(sender, instance, **kwargs):
+    incrementar(**{CONTADORES[sender]: -1})
+
+
+for _modelo in CONTADORES:
+    post_save.connect(_contador_creado, sender=_modelo, dispatch_uid=f'estadisticas_alta_{_modelo.__name__}')
+    post_delete.connect(_contador_eliminado, sender=_modelo, dispatch_uid=f'estadisticas_baja_{_modelo.__name__}')
+
+
+@receiver(pre_save, sender=Viaje, dispatch_uid='estadisticas_viaje_pre_save')
+def recordar_estado_viaje(sender, instance, update_fields=None, **kwargs):
+    instance._estado_anterior = None
+    if instance.pk and (update_fields is None or 'estado' in update_fields):
+        instance._estado_anterior = Viaje.objects.filter(pk=instance.pk).values_list('estado', flat=True).first()
+
+
+@receiver(post_save, sender=Viaje, dispatch_uid='estadisticas_viaje_post_save')
+def actualizar_estadisticas_viaje(sender, instance, created, update_fields=None, **kwargs):
+    deltas = {}
+    if created:
+        deltas['total_viajes'] = 1
+        deltas[CAMPOS_ESTADO_VIAJE.get(instance.estado)] = 1
+    else:
+        anterior = getattr(instance, '_estado_anterior', None)
+        if anterior and anterior != instance.estado:
+            deltas[CAMPOS_ESTADO_VIAJE.get(anterior)] = -1
+            deltas[CAMPOS_ESTADO_VIAJE.get(instance.estado)] = 1
+    deltas.pop(None, None)
+    incrementar(**deltas)
+
+
+@receiver(post_delete, sender=Viaje, dispatch_uid='estadisticas_viaje_post_delete')
+def descontar_viaje(sender, instance, **kwargs):
+    deltas = {'total_viajes': -1, CAMPOS_ESTADO_VIAJE.get(instance.estado): -1}
+    deltas.pop(None, None)
+    incrementar(**deltas)
+
+
+@receiver(pre_save, sender=CostosViaje, dispatch_uid='estadisticas_costos_pre_save')
+def recordar_costos(sender, instance, **kwargs):
+    instance._costos_anteriores = None
+    if instance.pk:
+        instance._costos_anteriores = CostosViaje.objects.filter(pk=instance.pk).values(*CAMPOS_COSTOS).first()
+
+
+@receiver(post_save, sender=CostosViaje, dispatch_uid='estadisticas_costos_post_save')
+def actualizar_estadisticas_costos(sender, instance, created, **kwargs):
+    anteriores = getattr(instance, '_costos_anteriores', None) or {}
+    deltas = {
+        destino: int(getattr(instance, origen) or 0) - int(anteriores.get(origen) or 0)
+        for origen, destino in CAMPOS_COSTOS.items()
+    }
+    deltas['total_costos_registrados'] = 1 if created else 0
+    if incrementar(**deltas):
+        registrar_costo_diario(
+            timezone.localdate(instance.creado_en),
+            deltas['total_general'],
+            1 if created else 0,
+        )
+
+
+@receiver(post_delete, sender=CostosViaje, dispatch_uid='estadisticas_costos_post_delete')
+def descontar_costos(sender, instance, **kwargs):
+    deltas = {destino: -int(getattr(instance, origen) or 0) for origen, destino in CAMPOS_COSTOS.items()}
+    deltas['total_costos_registrados'] = -1
+    if incrementar(**deltas):
+        registrar_costo_diario(timezone.localdate(instance.creado_en), deltas['total_general'], -1)
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid='permisos_grupos_cambiados')
+def invalidar_grupos_usuario(sender, instance, action, **kwargs):
+    """Descarta los grupos guardados en el usuario cuando cambia su membresía."""
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, User):
+        instance.__dict__.pop('_grupos_cache', None)
+
+
+@receiver(pre_save, sender=Conductor, dispatch_uid='imagenes_conductor_pre_save')
+def detectar_imagenes_conductor(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Fotos subidas o quitadas en este guardado: su miniatura queda obsoleta y los
+    archivos anteriores se eliminan después (ver encolar_imagenes_conductor).
+    """
+    instance._imagenes_nuevas = []
+    instance._miniaturas_obsoletas = []
+    instance._archivos_obsoletos = []
+    cambiados = []
+    for campo, campo_miniatura in CAMPOS_IMAGEN.items():
+        if raw or (update_fields is not None and campo not in update_fields):
+            continue
+        archivo = getattr(instance, campo)
+        if archivo and not archivo._committed:
+            instance._imagenes_nuevas.append(campo)
+            cambiados.append(campo)
+        elif not archivo and getattr(instance, campo_miniatura):
+            cambiados.append(campo)
+    if not cambiados:
+        return
+
+    obsoletos = []
+    if instance.pk:
+        campos = cambiados + [CAMPOS_IMAGEN[campo] for campo in cambiados]
+        anteriores = Conductor.objects.filter(pk=instance.pk).values(*campos).first() or {}
+        obsoletos = [(campo, nombre) for campo, nombre in anteriores.items() if nombre]
+    for campo in cambiados:
+        setattr(instance, CAMPOS_IMAGEN[campo], None)
+    instance._miniaturas_obsoletas = [CAMPOS_IMAGEN[campo] for campo in cambiados]
+    instance._archivos_obsoletos = obsoletos
+
+
+@receiver(post_save, sender=Conductor, dispatch_uid='imagenes_conductor_post_save')
+def encolar_imagenes_conductor(sender, instance, update_fields=None, **kwargs):
+    obsoletas = getattr(instance, '_miniaturas_obsoletas', [])
+    if update_fields is not None and set(obsoletas) - set(update_fields):
+        # Guardado parcial: las miniaturas obsoletas no se escribieron con el resto
+        Conductor.objects.filter(pk=instance.pk).update(**{campo: None for campo in obsoletas})
+    for campo in getattr(instance, '_imagenes_nuevas', ()):
+        encolar('core.procesar_imagen_conductor', conductor_id=instance.pk, campo=campo)
+    instance._imagenes_nuevas = []
+
+    # Los archivos anteriores se eliminan recién aquí, con la foto nueva ya escrita y la
+    # fila actualizada: pre_save corre fuera de la transacción del guardado y, en
+    # autocommit, on_commit ejecutaría la eliminación de inmediato
+    obsoletos = getattr(instance, '_archivos_obsoletos', [])
+    instance._archivos_obsoletos = []
+
+    def eliminar_obsoletos():
+        for campo, nombre in obsoletos:
+            Conductor._meta.get_field(campo).storage.delete(nombre)
+    if obsoletos:
+        transaction.on_commit(eliminar_obsoletos)
@@ -0,0 +1,132 @@
+"""
+Cola de tareas en segundo plano respaldada por la base de datos.
+
+Cada app registra sus tareas en un módulo `tareas.py` con el decorador `@tarea`;
+esos módulos se cargan al iniciar Django (ver CoreConfig.ready). Las vistas solo
+encolan con `encolar()` y el comando `procesar_tareas` las ejecuta, reintentando
+con espera exponencial y dejando como 'fallida' (dead-letter) las que agotan sus intentos.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .imagenes import procesar_imagen_conductor
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+_registro = {}
+
+
+class TareaPospuesta(Exception):
+    """
+    Permite a una tarea pedir ser ejecutada más tarde sin consumir un intento
+    (por ejemplo, al alcanzar un límite de envíos).
+    """
+    def __init__(self, segundos, mensaje=''):
+        super().__init__(mensaje or f'Tarea pospuesta {segundos} s')
+        self.segundos = segundos
+
+
+def tarea(nombre):
+    """Decorador que registra una función como manejador del tipo de tarea `nombre`."""
+    def decorador(func):
+        _registro[nombre] = func
+        return func
+    return decorador
+
+
+def encolar(tipo, max_intentos=None, disponible_en=None, **parametros):
+    """Crea una tarea pendiente. Los parámetros deben ser serializables a JSON."""
+    if tipo not in _registro:
+        raise ValueError(f'Tipo de tarea no registrado: {tipo}')
+    return Tarea.objects.create(
+        tipo=tipo,
+        parametros=parametros,
+        max_intentos=max_intentos or getattr(settings, 'TAREAS_MAX_INTENTOS', 5),
+        disponible_en=disponible_en or timezone.now(),
+    )
+
+
+def calcular_espera(intentos):
+    """Espera exponencial (con jitter) antes del siguiente reintento."""
+    base = getattr(settings, 'TAREAS_BACKOFF_BASE', 30)
+    maximo = getattr(settings, 'TAREAS_BACKOFF_MAX', 3600)
+    espera = min(base * (2 ** max(intentos - 1, 0)), maximo)
+    return timedelta(seconds=espera * random.uniform(0.8, 1.2))
+
+
+def liberar_bloqueadas():
+    """Devuelve a la cola las tareas 'en_proceso' de un worker que murió a mitad de ejecución."""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'TAREAS_TIMEOUT_BLOQUEO', 600))
+    return Tarea.objects.filter(estado='en_proceso', iniciada_en__lt=limite).update(estado='pendiente')
+
+
+def reclamar_siguiente():
+    """
+    Toma la siguiente tarea disponible. El UPDATE condicionado al estado garantiza
+    que dos workers concurrentes no ejecuten la misma tarea.
+    """
+    ahora = timezone.now()
+    candidatas = Tarea.objects.filter(estado='pendiente', disponible_en__lte=ahora).values_list('id', flat=True)[:10]
+    for tarea_id in candidatas:
+        reclamada = Tarea.objects.filter(id=tarea_id, estado='pendiente').update(
+            estado='en_proceso', iniciada_en=ahora, intentos=F('intentos') + 1
+        )
+        if reclamada:
+            return Tarea.objects.get(id=tarea_id)
+    return None
+
+
+def ejecutar(tarea_obj):
+    """Ejecuta una tarea ya reclamada y registra su resultado."""
+    manejador = _registro.get(tarea_obj.tipo)
+    ahora = timezone.now()
+    try:
+        if manejador is None:
+            raise LookupError(f'Tipo de tarea no registrado: {tarea_obj.tipo}')
+        manejador(**tarea_obj.parametros)
+    except TareaPospuesta as e:
+        tarea_obj.estado = 'pendiente'
+        tarea_obj.intentos -= 1
+        tarea_obj.disponible_en = ahora + timedelta(seconds=e.segundos)
+    except Exception as e:
+        tarea_obj.ultimo_error = ''.join(traceback.format_exception(e))[-4000:]
+        if manejador is None or tarea_obj.intentos >= tarea_obj.max_intentos:
+            tarea_obj.estado = 'fallida'
+            tarea_obj.finalizada_en = ahora
+            logger.error('Tarea %s fallida definitivamente: %s', tarea_obj, e)
+        else:
+            tarea_obj.estado = 'pendiente'
+            tarea_obj.disponible_en = ahora + calcular_espera(tarea_obj.intentos)
+            logger.warning('Tarea %s falló (intento %s), se reintentará: %s', tarea_obj, tarea_obj.intentos, e)
+    else:
+        tarea_obj.estado = 'completada'
+        tarea_obj.finalizada_en = ahora
+        tarea_obj.ultimo_error = ''
+    tarea_obj.save(update_fields=['estado', 'intentos', 'disponible_en', 'finalizada_en', 'ultimo_error', 'actualizado_en'])
+    return tarea_obj
+
+
+def procesar_pendientes(limite=None):
+    """Ejecuta tareas disponibles hasta vaciar la cola (o hasta `limite`). Retorna cuántas procesó."""
+    liberar_bloqueadas()
+    procesadas = 0
+    while limite is None or procesadas < limite:
+        tarea_obj = reclamar_siguiente()
+        if tarea_obj is None:
+            break
+        ejecutar(tarea_obj)
+        procesadas += 1
+    return procesadas
+
+
+@tarea('core.procesar_imagen_conductor')
+def procesar_imagen_conductor_tarea(conductor_id, campo):
+    """Endereza, reduce y genera la miniatura de una foto de conductor (ver core/imagenes.py)."""
+    procesar_imagen_conductor(conductor_id, campo)
@@ -1,5 +1,29 @@
-from django.test import TestCase
-from .models import Conductor, Lugar
+from datetime import date, timedelta
+import csv
+import io
+import zipfile
+from unittest import mock
+from io import StringIO
+from PIL import Image
+from django.contrib.auth.models import Group, User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .models import Conductor, Lugar, Pasajero, Tarea, EstadisticasFlota
+from . import tareas
+from .permissions import get_user_role, es_admin, es_usuario_o_admin
+from costos.models import CostosViaje
+from flota.models import Bus
+from viajes.models import Viaje, ViajePasajero
+from .estadisticas import calcular_estadisticas, reconstruir_estadisticas, costos_ultimos_dias
+from .busqueda import buscar_pasajeros
+from .imagenes import procesar_imagen_conductor
+from .exportacion import csv_en_streaming, iterar_por_lotes, xlsx_en_streaming
 
 
 class ConductorTestCase(TestCase):
@@ -27,3 +51,339 @@ class LugarTestCase(TestCase):
 
     def test_lugar_creation(self):
         self.assertEqual(self.lugar.nombre, 'Terminal Central')
+
+
+class TareaTestCase(TestCase):
+    def setUp(self):
+        self.llamadas = []
+
+        @tareas.tarea('test.ok')
+        def ok(valor):
+            self.llamadas.append(valor)
+
+        @tareas.tarea('test.falla')
+        def falla():
+            raise RuntimeError('servicio caído')
+
+        self.addCleanup(tareas._registro.pop, 'test.ok')
+        self.addCleanup(tareas._registro.pop, 'test.falla')
+
+    def test_encolar_y_procesar(self):
+        tarea = tareas.encolar('test.ok', valor=7)
+        self.assertEqual(tareas.procesar_pendientes(), 1)
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'completada')
+        self.assertEqual(self.llamadas, [7])
+
+    def test_reintento_con_espera_y_dead_letter(self):
+        tarea = tareas.encolar('test.falla', max_intentos=2)
+        tareas.procesar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('pendiente', 1))
+        self.assertGreater(tarea.disponible_en, timezone.now())
+        self.assertIn('servicio caído', tarea.ultimo_error)
+
+        # Aún no está disponible: el worker no la vuelve a tomar
+        self.assertEqual(tareas.procesar_pendientes(), 0)
+
+        Tarea.objects.filter(pk=tarea.pk).update(disponible_en=timezone.now() - timedelta(seconds=1))
+        tareas.procesar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 2))
+
+    def test_tipo_no_registrado(self):
+        with self.assertRaises(ValueError):
+            tareas.encolar('test.inexistente')
+
+
+class EstadisticasFlotaTestCase(TestCase):
+    def setUp(self):
+        from flota.models import Bus
+        self.conductor = Conductor.objects.create(
+            nombre='Juan', apellido='Pérez', cedula='1', email='j@example.com',
+            telefono='1', fecha_contratacion='2024-01-01'
+        )
+        self.bus = Bus.objects.create(
+            placa='ABC123', marca='Volvo', modelo='B9R', año_fabricacion=2020, capacidad_pasajeros=40,
+            numero_chasis='CH1', numero_motor='MO1', fecha_adquisicion='2020-05-15'
+        )
+
+    def _crear_viaje(self, **kwargs):
+        from viajes.models import Viaje
+        return Viaje.objects.create(
+            bus=self.bus, conductor=self.conductor,
+            fecha_salida=timezone.now(), fecha_llegada_estimada=timezone.now(), **kwargs
+        )
+
+    def assertEstadisticasCoinciden(self):
+        estadisticas = EstadisticasFlota.objects.get(pk=1)
+        for campo, valor in calcular_estadisticas().items():
+            self.assertEqual(getattr(estadisticas, campo), valor, campo)
+
+    def test_contadores_incrementales(self):
+        from costos.models import CostosViaje
+        viaje = self._crear_viaje()
+        otro = self._crear_viaje(estado='completado')
+        Pasajero.objects.create(nombre_completo='Ana', rut='1-9', telefono='1', correo='a@example.com')
+        costos = CostosViaje.objects.create(viaje=viaje, combustible=1000, peajes=200, otros_costos=50)
+        self.assertEstadisticasCoinciden()
+
+        viaje.estado = 'en_curso'
+        viaje.save()
+        costos.combustible = 3000
+        costos.save()
+        otro.delete()
+        self.assertEstadisticasCoinciden()
+        estadisticas = EstadisticasFlota.objects.get(pk=1)
+        self.assertEqual(estadisticas.total_general, 3250)
+        self.assertEqual(costos_ultimos_dias(30), {'total_mes': 3250, 'viajes_mes': 1})
+
+        viaje.delete()  # elimina también sus costos en cascada
+        self.assertEstadisticasCoinciden()
+        self.assertEqual(costos_ultimos_dias(30)['viajes_mes'], 0)
+
+    def test_reconstruir_informa_diferencias(self):
+        self._crear_viaje()
+        EstadisticasFlota.objects.filter(pk=1).update(total_viajes=99)
+        _, diferencias = reconstruir_estadisticas()
+        self.assertEqual(diferencias, {'total_viajes': (99, 1)})
+        _, diferencias = reconstruir_estadisticas()
+        self.assertEqual(diferencias, {})
+
+
+class PermisosTestCase(TestCase):
+    def setUp(self):
+        self.grupo_usuario = Group.objects.create(name='Usuario')
+        self.grupo_admin = Group.objects.create(name='Admin')
+        self.user = User.objects.create_user('operador', 'operador@example.com', 'clave')
+        self.user.groups.add(self.grupo_usuario)
+
+    def test_grupos_se_consultan_una_vez(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_role(user), 'usuario')
+            self.assertFalse(es_admin(user))
+            self.assertTrue(es_usuario_o_admin(user))
+
+    def test_cambio_de_grupos_invalida_la_cache(self):
+        self.assertEqual(get_user_role(self.user), 'usuario')
+        self.user.groups.add(self.grupo_admin)
+        self.assertEqual(get_user_role(self.user), 'admin')
+        self.user.groups.clear()
+        self.assertIsNone(get_user_role(self.user))
+
+    def test_plantilla_consulta_grupos_una_sola_vez(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(reverse('pasajero_list'))
+        self.assertEqual(response.status_code, 200)
+        consultas_grupos = [q for q in contexto.captured_queries if 'auth_user_groups' in q['sql']]
+        self.assertEqual(len(consultas_grupos), 1)
+        self.assertEqual(response.context['rol_usuario'], 'usuario')
+        self.assertContains(response, 'USUARIO')
+
+
+class DatosSinteticosTestCase(TestCase):
+    def _sembrar(self):
+        call_command('seed_data', scale=0.001, seed=7, batch_size=50,
+                     fecha_referencia=date(2026, 1, 15), stdout=StringIO())
+        return (
+            list(Viaje.objects.order_by('pk').values_list('bus_id', 'fecha_salida', 'estado', 'pasajeros_confirmados')),
+            list(ViajePasajero.objects.order_by('pk').values_list('viaje_id', 'pasajero_id', 'asiento')),
+        )
+
+    def test_escala_y_estadisticas(self):
+        self._sembrar()
+        self.assertEqual(Bus.objects.count(), 2)
+        self.assertEqual(Viaje.objects.count(), 100)
+        self.assertEqual(Pasajero.objects.count(), 50)
+        for viaje in Viaje.objects.all()[:20]:
+            self.assertEqual(viaje.pasajeros.count(), viaje.pasajeros_confirmados)
+        self.assertEqual(EstadisticasFlota.objects.get().total_viajes, 100)
+
+    def test_misma_semilla_mismos_datos(self):
+        primera = self._sembrar()
+        for modelo in (ViajePasajero, CostosViaje, Viaje, Pasajero, Bus):
+            modelo.objects.all().delete()
+        self.assertEqual(self._sembrar(), primera)
+
+
+class ExportacionTestCase(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Lugar.objects.create(nombre=f'Lugar {i}', ciudad='Quito')
+
+    def test_iterar_por_lotes_recorre_todo_con_una_consulta_por_lote(self):
+        with self.assertNumQueries(3):
+            filas = list(iterar_por_lotes(Lugar.objects.all(), ['nombre'], tamano=2))
+        self.assertEqual(filas, [(f'Lugar {i}',) for i in range(5)])
+
+    def test_csv_escapa_formulas_y_fechas(self):
+        contenido = b''.join(csv_en_streaming(['A', 'B'], [['=1+1', date(2024, 3, 5)], [None, 7]]))
+        self.assertTrue(contenido.startswith('\ufeff'.encode()))
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8-sig'))))
+        self.assertEqual(filas, [['A', 'B'], ["'=1+1", '2024-03-05'], ['', '7']])
+
+    def test_xlsx_valido(self):
+        contenido = b''.join(xlsx_en_streaming(['Nombre', 'Total'], [['Ñandú & <Co>', 10], ['x', None]], hoja='datos'))
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo:
+            self.assertIsNone(archivo.testzip())
+            hoja = archivo.read('xl/worksheets/sheet1.xml').decode()
+            self.assertIn('[Content_Types].xml', archivo.namelist())
+        self.assertEqual(hoja.count('<row>'), 3)
+        self.assertIn('Ñandú &amp; &lt;Co&gt;', hoja)
+        self.assertIn('<c><v>10</v></c>', hoja)
+
+
+class BusquedaPasajerosTestCase(TestCase):
+    def setUp(self):
+        self.jose = Pasajero.objects.create(nombre_completo='José Muñoz Soto', rut='12.345.678-K', telefono='1',
+                                            correo='JMunoz@Example.com')
+        self.josefa = Pasajero.objects.create(nombre_completo='Josefa Pérez', rut='9876543-2', telefono='2',
+                                              correo='josefa@example.com')
+        self.ana = Pasajero.objects.create(nombre_completo='Ana Soto', rut='11111111-1', telefono='3',
+                                           correo='ana@example.com')
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+
+    def _nombres(self, texto, **kwargs):
+        return [pasajero.nombre_completo for pasajero in buscar_pasajeros(texto, **kwargs)]
+
+    def test_indexa_al_guardar(self):
+        self.assertEqual(self.jose.rut_normalizado, '12345678K')
+        self.assertEqual(sorted(self.jose.tokens.values_list('token', flat=True)),
+                         ['jmunoz@example.com', 'jose', 'munoz', 'soto'])
+        self.jose.nombre_completo = 'Pedro Soto'
+        self.jose.save()
+        self.assertEqual(self._nombres('jose'), ['Josefa Pérez'])
+
+    def test_prefijos_de_nombre_rut_y_correo(self):
+        self.assertCountEqual(self._nombres('jos'), ['José Muñoz Soto', 'Josefa Pérez'])
+        self.assertEqual(self._nombres('MUÑ'), ['José Muñoz Soto'])
+        self.assertEqual(self._nombres('soto jo'), ['José Muñoz Soto'])
+        self.assertEqual(self._nombres('12.345'), ['José Muñoz Soto'])
+        self.assertEqual(self._nombres('12345678-k'), ['José Muñoz Soto'])
+        self.assertEqual(self._nombres('josefa@ex'), ['Josefa Pérez'])
+        self.assertEqual(self._nombres('j'), [])
+        self.assertEqual(self._nombres('so', limite=1), ['Ana Soto'])
+
+    def test_excluye_pasajeros_del_viaje(self):
+        bus = Bus.objects.create(placa='AAA-001', marca='M', modelo='S', año_fabricacion=2020, capacidad_pasajeros=40,
+                                 kilometraje_ingreso=0, numero_chasis='C1', numero_motor='M1',
+                                 fecha_adquisicion=date(2020, 1, 1))
+        conductor = Conductor.objects.create(nombre='C', apellido='P', cedula='1', email='c@example.com',
+                                             telefono='1', fecha_contratacion=date(2020, 1, 1))
+        viaje = Viaje.objects.create(bus=bus, conductor=conductor, fecha_salida=timezone.now(),
+                                     fecha_llegada_estimada=timezone.now() + timedelta(hours=2))
+        ViajePasajero.objects.create(viaje=viaje, pasajero=self.jose)
+        self.assertEqual(self._nombres('jos', excluir_viaje=viaje.pk), ['Josefa Pérez'])
+
+    def test_endpoint_json(self):
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('pasajero_buscar'), {'q': 'soto'})
+        self.assertEqual([r['nombre_completo'] for r in respuesta.json()['resultados']],
+                         ['Ana Soto', 'José Muñoz Soto'])
+        self.assertEqual(respuesta.json()['resultados'][0]['rut'], '11111111-1')
+        self.assertNotIn('LIKE', ' '.join(consulta['sql'] for consulta in consultas.captured_queries))
+        self.assertEqual(self.client.get(reverse('pasajero_buscar'), {'q': 'so', 'limite': 'x'}).status_code, 400)
+
+    def test_lista_filtra_por_busqueda(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('pasajero_list'), {'q': 'pérez'})
+        self.assertEqual(list(respuesta.context['pasajeros']), [self.josefa])
+
+    def test_reindexar_pasajeros_cargados_en_bloque(self):
+        Pasajero.objects.bulk_create([Pasajero(nombre_completo='Carla Ríos', rut='5555555-5', telefono='4',
+                                               correo='carla@example.com')])
+        self.assertEqual(self._nombres('carla'), [])
+        call_command('reindexar_pasajeros', stdout=StringIO())
+        self.assertEqual(self._nombres('rios'), ['Carla Ríos'])
+        self.assertEqual(self._nombres('5555'), ['Carla Ríos'])
+
+
+@override_settings(IMAGENES_LADO_MAXIMO=400, IMAGENES_LADO_MINIATURA=80)
+class ImagenesConductorTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.conductor = Conductor.objects.create(nombre='Juan', apellido='Pérez', cedula='55', email='juan@example.com',
+                                                  telefono='099', fecha_contratacion='2024-01-01')
+
+    def _foto(self, ancho=1200, alto=800, orientacion=6):
+        """JPEG con EXIF: orientación 6 (girar 90°) y un dato GPS."""
+        imagen = Image.effect_noise((ancho, alto), 60).convert('RGB')
+        exif = Image.Exif()
+        exif[0x0112] = orientacion
+        exif[0x010F] = 'Telefono'
+        salida = io.BytesIO()
+        imagen.save(salida, 'JPEG', quality=95, exif=exif)
+        return SimpleUploadedFile('foto.jpg', salida.getvalue(), content_type='image/jpeg')
+
+    def _subir(self, **fotos):
+        self.client.force_login(self.admin)
+        datos = {'nombre': 'Juan', 'apellido': 'Pérez', 'cedula': '55', 'email': 'juan@example.com',
+                 'telefono': '099', 'fecha_contratacion': '2024-01-01', 'activo': 'on', 'licencias': ['A2'], **fotos}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('conductor_update', args=[self.conductor.pk]), datos)
+        self.assertEqual(response.status_code, 302)
+        self.conductor.refresh_from_db()
+
+    def test_subida_procesada_en_segundo_plano(self):
+        self._subir(cedula_frontal=self._foto())
+        original = self.conductor.cedula_frontal
+        self.assertFalse(self.conductor.cedula_frontal_miniatura)
+        self.assertEqual(Tarea.objects.get().tipo, 'core.procesar_imagen_conductor')
+        tamano_original = original.size
+
+        tareas.procesar_pendientes()
+        self.conductor.refresh_from_db()
+        foto, miniatura = self.conductor.cedula_frontal, self.conductor.cedula_frontal_miniatura
+        with Image.open(foto) as imagen:
+            # Enderezada (era 1200x800 con orientación 6), reducida y sin EXIF
+            self.assertEqual(imagen.size, (267, 400))
+            self.assertFalse(imagen.getexif())
+        with Image.open(miniatura) as imagen:
+            self.assertEqual(imagen.size, (53, 80))
+        self.assertLess(foto.size * 5, tamano_original)
+        self.assertFalse(default_storage.exists(original.name))
+
+        response = self.client.get(reverse('conductor_detail', args=[self.conductor.pk]))
+        self.assertContains(response, miniatura.url)
+        self.assertContains(self.client.get(reverse('conductor_list')), miniatura.url)
+
+        # Reemplazar la foto descarta la miniatura anterior y encola otra vez
+        self._subir(cedula_frontal=self._foto(orientacion=1))
+        self.assertFalse(self.conductor.cedula_frontal_miniatura)
+        self.assertFalse(default_storage.exists(miniatura.name))
+        self.assertFalse(default_storage.exists(foto.name))
+        self.assertEqual(Tarea.objects.filter(estado='pendiente').count(), 1)
+
+    def test_guardado_fallido_conserva_la_foto_anterior(self):
+        self._subir(cedula_frontal=self._foto())
+        anterior = self.conductor.cedula_frontal.name
+        self.conductor.cedula_frontal = self._foto(orientacion=1)
+        with mock.patch.object(Conductor, '_do_update', side_effect=DatabaseError('caída')):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(DatabaseError):
+                self.conductor.save()
+        self.assertTrue(default_storage.exists(anterior))
+
+    def test_archivo_que_no_es_imagen_se_ignora(self):
+        Conductor.objects.filter(pk=self.conductor.pk).update(licencia_conducir_frontal='licencias/doc.pdf')
+        default_storage.save('licencias/doc.pdf', io.BytesIO(b'%PDF-1.4 no es imagen'))
+        self.assertIsNone(procesar_imagen_conductor(self.conductor.pk, 'licencia_conducir_frontal'))
+
+    def test_comando_de_procesamiento(self):
+        nombre = default_storage.save('cedulas/antigua.jpg', self._foto(orientacion=1))
+        Conductor.objects.filter(pk=self.conductor.pk).update(cedula_trasera=nombre)
+        salida = StringIO()
+        call_command('procesar_imagenes_conductores', stdout=salida)
+        self.assertIn('1 de 1 foto(s) procesadas', salida.getvalue())
+        self.conductor.refresh_from_db()
+        self.assertTrue(self.conductor.cedula_trasera_miniatura)
+
+        # Ya procesadas: una segunda pasada no hace nada salvo con --todas, que no vuelve a comprimir
+        call_command('procesar_imagenes_conductores', stdout=salida)
+        self.assertIn('0 de 0 foto(s)', salida.getvalue())
+        foto = self.conductor.cedula_trasera.name
+        call_command('procesar_imagenes_conductores', todas=True, stdout=StringIO())
+        self.conductor.refresh_from_db()
+        self.assertEqual(self.conductor.cedula_trasera.name, foto)
@@ -0,0 +1,577 @@
+"""
+Suite de rendimiento y regresión de consultas.
+
+Siembra un conjunto de datos grande y recorre todas las URLs de core, flota,
+viajes y costos como superusuario (con POST las que solo aceptan POST). Por
+cada vista registra la cantidad de consultas, el tiempo de SQL, la latencia
+total y el pico de memoria, y falla si la vista supera su presupuesto de
+consultas declarado en PRESUPUESTOS o si ejecuta más consultas después de
+duplicar los datos (y los registros relacionados con los objetos que se ven).
+
+    python manage.py test core.tests_rendimiento --settings=sistema_flota.settings_test
+
+Las clases con la etiqueta 'benchmark' miden la analítica de costos
+(costos.analitica) sobre datos sintéticos: 10.000 viajes por unidad de escala
+y, con BENCHMARK_TIEMPOS=1, al menos 100.000 viajes con costos; el formulario
+PDF de costos (costos.formulario_pdf) con y sin plantilla en caché; y la
+importación de una nómina de 200 pasajeros (viajes.importacion). Siempre verifican resultados y
+consultas, pero los límites de tiempo solo se exigen con BENCHMARK_TIEMPOS=1
+(en CI se pueden omitir con --exclude-tag benchmark). Las mediciones se
+registran en el logger de este módulo (nivel INFO).
+
+Variables de entorno opcionales:
+    BENCHMARK_ESCALA   multiplica el tamaño de los datos (por defecto 1)
+    BENCHMARK_REPORTE  ruta de un archivo JSON donde guardar las mediciones
+    BENCHMARK_TIEMPOS  con 1, falla si se superan los límites de tiempo
+"""
+import json
+import logging
+import os
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test import TestCase, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from costos.models import CostosViaje, Peaje, PuntoRecarga
+from flota.models import Bus, DocumentoVehiculo, Mantenimiento
+from viajes.models import Viaje, ViajePasajero
+from costos.analitica import calcular_analitica
+from costos.formulario_pdf import formulario_costos_pdf, renderizar_completo
+from viajes.asientos import MapaAsientos, reconstruir_mapa
+from viajes.contadores import reconstruir_contadores
+from viajes.importacion import importar_nomina
+from .datos_sinteticos import GeneradorDatos
+from .exportacion import TAMANO_LOTE
+from .busqueda import digito_verificador_rut, indexar_pasajeros
+from .estadisticas import reconstruir_estadisticas
+from .models import Conductor, Lugar, Pasajero
+
+logger = logging.getLogger(__name__)
+
+ESCALA = int(os.environ.get('BENCHMARK_ESCALA', '1'))
+EXIGIR_TIEMPOS = os.environ.get('BENCHMARK_TIEMPOS') == '1'
+
+# Apps (o namespaces) cuyas URLs se recorren
+APPS_MEDIDAS = {'core', 'flota', 'viajes', 'costos'}
+
+# URL -> máximo de consultas permitido, sin contar la sesión ni la carga del usuario
+# autenticado. No depende del tamaño de los datos (test_consultas_no_crecen_con_los_datos
+# lo verifica): una vista que consulta por fila de un listado no cabe en su presupuesto.
+PRESUPUESTOS = {
+    'home': 5,
+    'login': 0,
+    'logout': 0,
+    'conductor_list': 3,
+    'conductor_create': 1,
+    'conductor_detail': 2,
+    'conductor_update': 2,
+    'conductor_delete': 2,
+    'lugar_list': 3,
+    'lugar_create': 1,
+    'lugar_detail': 2,
+    'lugar_update': 2,
+    'lugar_delete': 2,
+    'pasajero_list': 3,
+    'pasajero_buscar': 2,
+    'pasajero_create': 1,
+    'pasajero_detail': 2,
+    'pasajero_update': 2,
+    'pasajero_delete': 2,
+    'flota:bus_list': 3,
+    'flota:bus_create': 1,
+    'flota:bus_detail': 7,
+    'flota:bus_update': 2,
+    'flota:bus_delete': 6,
+    'flota:mantenimiento_crear': 2,
+    'flota:mantenimiento_editar': 3,
+    'flota:mantenimiento_eliminar': 3,
+    'flota:documento_crear': 2,
+    'flota:documento_editar': 3,
+    'flota:documento_eliminar': 3,
+    'flota:documento_descargar': 1,
+    'viajes:viaje_list': 4,
+    'viajes:viaje_create': 3,
+    'viajes:viaje_detail': 6,
+    'viajes:viaje_update': 4,
+    'viajes:viaje_delete': 6,
+    'viajes:viaje_pasajeros': 7,
+    'viajes:agregar_pasajero_viaje': 9,
+    'viajes:crear_pasajero_desde_viaje': 1,
+    'viajes:importar_pasajeros_viaje': 2,
+    'viajes:quitar_pasajero_viaje': 9,
+    'viajes:editar_pasajero_viaje': 7,
+    'viajes:generar_pdf_pasajeros': 6,
+    'viajes:exportar_viajes': 1,
+    'viajes:exportar_pasajeros': 1,
+    'costos:gestion': 6,
+    'costos:viajes_sin_costos': 3,
+    'costos:crear': 2,
+    'costos:registrar_completo': 11,
+    'costos:enviar_email': 6,
+    'costos:mantenimiento_costos': 5,
+    'costos:otros_costos': 2,
+    'costos:eliminar_peaje': 4,
+    'costos:comprobante': 1,
+    'costos:detalle': 5,
+    'costos:editar': 6,
+    'costos:eliminar': 7,
+    'costos:agregar_punto': 2,
+    'costos:editar_punto': 3,
+    'costos:eliminar_punto': 3,
+    'costos:calcular_distancia': 3,
+    'costos:formulario_pdf': 4,
+    'costos:informe_costos_pdf': 11,
+    'costos:exportar_informes': 9,
+    'costos:exportar_costos': 1,
+    'costos:analitica': 10,
+    'costos:analitica_json': 9,
+    'costos:anomalias_consumo': 3,
+    'costos:registrar_peajes': 3,
+    'costos:registrar_puntos_recarga': 3,
+    'costos:registrar_km_inicial': 2,
+    'costos:registrar_km_final': 2,
+}
+
+# Parámetros de ruta y de consulta para las URLs que los necesitan
+PARAMETROS = {
+    'conductor_detail': lambda d: {'pk': d['conductor'].pk},
+    'conductor_update': lambda d: {'pk': d['conductor'].pk},
+    'conductor_delete': lambda d: {'pk': d['conductor'].pk},
+    'lugar_detail': lambda d: {'pk': d['lugar'].pk},
+    'lugar_update': lambda d: {'pk': d['lugar'].pk},
+    'lugar_delete': lambda d: {'pk': d['lugar'].pk},
+    'pasajero_detail': lambda d: {'pk': d['pasajero'].pk},
+    'pasajero_update': lambda d: {'pk': d['pasajero'].pk},
+    'pasajero_delete': lambda d: {'pk': d['pasajero'].pk},
+    'flota:bus_detail': lambda d: {'pk': d['bus'].pk},
+    'flota:bus_update': lambda d: {'pk': d['bus'].pk},
+    'flota:bus_delete': lambda d: {'pk': d['bus'].pk},
+    'flota:mantenimiento_crear': lambda d: {'bus_id': d['bus'].pk},
+    'flota:mantenimiento_editar': lambda d: {'pk': d['mantenimiento'].pk},
+    'flota:mantenimiento_eliminar': lambda d: {'pk': d['mantenimiento'].pk},
+    'flota:documento_crear': lambda d: {'bus_id': d['bus'].pk},
+    'flota:documento_editar': lambda d: {'pk': d['documento'].pk},
+    'flota:documento_eliminar': lambda d: {'pk': d['documento'].pk},
+    'flota:documento_descargar': lambda d: {'pk': d['documento'].pk},
+    'viajes:viaje_detail': lambda d: {'pk': d['viaje'].pk},
+    'viajes:viaje_update': lambda d: {'pk': d['viaje'].pk},
+    'viajes:viaje_delete': lambda d: {'pk': d['viaje'].pk},
+    'viajes:viaje_pasajeros': lambda d: {'pk': d['viaje'].pk},
+    'viajes:agregar_pasajero_viaje': lambda d: {'pk': d['viaje'].pk},
+    'viajes:crear_pasajero_desde_viaje': lambda d: {'pk': d['viaje'].pk},
+    'viajes:importar_pasajeros_viaje': lambda d: {'pk': d['viaje'].pk},
+    'viajes:quitar_pasajero_viaje': lambda d: {'pk': d['viaje'].pk, 'pasajero_pk': d['pasajero_viaje'].pk},
+    'viajes:editar_pasajero_viaje': lambda d: {'pk': d['viaje'].pk, 'pasajero_pk': d['pasajero_viaje'].pk},
+    'viajes:generar_pdf_pasajeros': lambda d: {'pk': d['viaje'].pk},
+    'costos:registrar_completo': lambda d: {'viaje_id': d['viaje'].pk},
+    'costos:enviar_email': lambda d: {'viaje_id': d['viaje_sin_costos'].pk},
+    'costos:mantenimiento_costos': lambda d: {'costos_pk': d['costos'].pk},
+    'costos:otros_costos': lambda d: {'costos_pk': d['costos'].pk},
+    'costos:eliminar_peaje': lambda d: {'pk': d['peaje'].pk},
+    'costos:comprobante': lambda d: {'tipo': 'peaje', 'pk': d['peaje'].pk},
+    'costos:detalle': lambda d: {'pk': d['costos'].pk},
+    'costos:editar': lambda d: {'pk': d['costos'].pk},
+    'costos:eliminar': lambda d: {'pk': d['costos'].pk},
+    'costos:agregar_punto': lambda d: {'costos_pk': d['costos'].pk},
+    'costos:editar_punto': lambda d: {'pk': d['punto'].pk},
+    'costos:eliminar_punto': lambda d: {'pk': d['punto'].pk},
+    'costos:calcular_distancia': lambda d: {'viaje_id': d['viaje'].pk},
+    'costos:formulario_pdf': lambda d: {'viaje_id': d['viaje_sin_costos'].pk},
+    'costos:informe_costos_pdf': lambda d: {'costos_pk': d['costos'].pk},
+    'costos:registrar_peajes': lambda d: {'costos_pk': d['costos'].pk},
+    'costos:registrar_puntos_recarga': lambda d: {'costos_pk': d['costos'].pk},
+    'costos:registrar_km_inicial': lambda d: {'costos_pk': d['costos'].pk},
+    'costos:registrar_km_final': lambda d: {'costos_pk': d['costos'].pk},
+}
+CONSULTA = {
+    'costos:exportar_informes': lambda d: {'ids': str(d['costos'].pk), 'formato': 'pdf'},
+    'viajes:exportar_pasajeros': lambda d: {'formato': 'xlsx'},
+    'pasajero_buscar': lambda d: {'q': 'pasajero 1', 'viaje': d['viaje'].pk},
+}
+# URLs que solo aceptan POST -> datos del formulario
+DATOS_POST = {
+    'logout': lambda d: {},
+    'viajes:agregar_pasajero_viaje': lambda d: {'pasajero_id': d['pasajero'].pk},
+    'viajes:quitar_pasajero_viaje': lambda d: {},
+    'costos:calcular_distancia': lambda d: {},
+}
+# Exportaciones en streaming: leen una consulta por lote de filas (core.exportacion.TAMANO_LOTE),
+# así que sus consultas crecen con los datos, aunque no por fila. Su presupuesto es por lote
+# y se multiplica por los lotes que ocupan las filas del modelo que recorren.
+POR_LOTES = {
+    'viajes:exportar_viajes': Viaje,
+    'viajes:exportar_pasajeros': ViajePasajero,
+    'costos:exportar_costos': CostosViaje,
+}
+
+
+def rutas_medidas():
+    """Nombres ('namespace:nombre' o 'nombre') de las URLs cuyas vistas pertenecen a las apps medidas."""
+    nombres = set()
+
+    def recorrer(patrones, namespace):
+        for patron in patrones:
+            if isinstance(patron, URLResolver):
+                recorrer(patron.url_patterns, ':'.join(filter(None, [namespace, patron.namespace])))
+            elif isinstance(patron, URLPattern) and patron.name:
+                if patron.lookup_str.split('.')[0] in APPS_MEDIDAS:
+                    nombres.add(f'{namespace}:{patron.name}' if namespace else patron.name)
+
+    recorrer(get_resolver().url_patterns, '')
+    return nombres
+
+
+def poblar_datos(escala=1, lote=0):
+    """
+    Crea un conjunto de datos representativo con bulk_create (sin señales).
+    Cada `lote` crea registros nuevos (placas, cédulas y RUT distintos), de modo
+    que se puede llamar otra vez para duplicar los datos.
+    """
+    hoy = date.today()
+    ahora = timezone.now()
+    n = lote * 100000
+
+    buses = Bus.objects.bulk_create([
+        Bus(placa=f'BUS-{n + i:04d}', marca='Mercedes', modelo='Sprinter', año_fabricacion=2015 + i % 8,
+            capacidad_pasajeros=40, kilometraje_ingreso=100000 + i, numero_chasis=f'CH-{n + i:05d}',
+            numero_motor=f'MO-{n + i:05d}', fecha_adquisicion=hoy - timedelta(days=365 + i))
+        for i in range(30 * escala)
+    ])
+    conductores = Conductor.objects.bulk_create([
+        Conductor(nombre=f'Conductor{i}', apellido='Prueba', cedula=f'{10000000 + n + i}',
+                  email=f'conductor{n + i}@example.com', telefono='0999999999',
+                  fecha_contratacion=hoy - timedelta(days=400))
+        for i in range(40 * escala)
+    ])
+    lugares = Lugar.objects.bulk_create([
+        Lugar(nombre=f'Terminal {i}', ciudad=f'Ciudad {i % 12}', latitud=-33 + i / 100, longitud=-70 + i / 100)
+        for i in range(30 * escala)
+    ])
+    pasajeros = Pasajero.objects.bulk_create([
+        Pasajero(nombre_completo=f'Pasajero {i}', rut=f'{5000000 + n + i}-{i % 10}', telefono='0988888888',
+                 correo=f'pasajero{n + i}@example.com')
+        for i in range(500 * escala)
+    ])
+    indexar_pasajeros(pasajeros)
+    estados = ['programado', 'en_curso', 'completado', 'cancelado']
+    viajes = Viaje.objects.bulk_create([
+        Viaje(bus=buses[i % len(buses)], conductor=conductores[i % len(conductores)],
+              lugar_origen=lugares[i % len(lugares)], lugar_destino=lugares[(i + 1) % len(lugares)],
+              fecha_salida=ahora - timedelta(hours=6 * i), fecha_llegada_estimada=ahora - timedelta(hours=6 * i - 4),
+              estado=estados[i % 4], pasajeros_confirmados=i % 10,
+              asientos_ocupados=MapaAsientos.bits_a_bytes((1 << i % 10) - 1))
+        for i in range(300 * escala)
+    ])
+    ViajePasajero.objects.bulk_create([
+        ViajePasajero(viaje=viaje, pasajero=pasajeros[(i * 10 + j) % len(pasajeros)], asiento=str(j + 1))
+        for i, viaje in enumerate(viajes) for j in range(i % 10)
+    ])
+    mantenimientos = Mantenimiento.objects.bulk_create([
+        Mantenimiento(bus=buses[i % len(buses)], tipo='preventivo', descripcion='Cambio de aceite',
+                      fecha_mantenimiento=hoy - timedelta(days=i), kilometraje=100000 + i * 500, costo=150000)
+        for i in range(60 * escala)
+    ])
+    documentos = DocumentoVehiculo.objects.bulk_create([
+        DocumentoVehiculo(bus=buses[i % len(buses)], tipo='soat', numero_documento=f'DOC-{n + i}',
+                          fecha_emision=hoy - timedelta(days=300), fecha_vencimiento=hoy + timedelta(days=i - 30))
+        for i in range(90 * escala)
+    ])
+    con_costos = [viaje for i, viaje in enumerate(viajes) if i % 3]
+    costos = CostosViaje.objects.bulk_create([
+        CostosViaje(viaje=viaje, km_inicial=1000, km_final=1500, combustible=80000, peajes=8000,
+                    otros_costos=5000, costo_total=93000)
+        for viaje in con_costos
+    ])
+    puntos = PuntoRecarga.objects.bulk_create([
+        PuntoRecarga(costos_viaje=c, orden=orden, kilometraje=1000 + orden * 200, precio_combustible=1000,
+                     litros_cargados=40, kilometros_recorridos=200, costo_total=40000)
+        for c in costos for orden in (1, 2)
+    ])
+    peajes = Peaje.objects.bulk_create([
+        Peaje(viaje=c.viaje, costos_viaje=c, lugar=f'Peaje {n}', monto=4000, fecha_pago=c.viaje.fecha_salida)
+        for c in costos for n in (1, 2)
+    ])
+    reconstruir_estadisticas()
+
+    viaje = con_costos[0]
+    return {
+        'bus': buses[0],
+        'conductor': conductores[0],
+        'lugar': lugares[0],
+        'pasajero': pasajeros[0],
+        'viaje': viaje,
+        'pasajero_viaje': ViajePasajero.objects.filter(viaje=viaje).first().pasajero,
+        'viaje_sin_costos': viajes[0],
+        'mantenimiento': mantenimientos[0],
+        'documento': documentos[0],
+        'costos': costos[0],
+        'punto': puntos[0],
+        'peaje': peajes[0],
+    }
+
+
+def ampliar_datos(datos, cantidad=20):
+    """
+    Agrega `cantidad` registros relacionados a los objetos que se ven en las
+    vistas medidas (viajes del bus, del conductor y del lugar, pasajeros del
+    viaje, mantenimientos, documentos, recargas y peajes), para que una consulta
+    por registro relacionado también se note.
+    """
+    hoy = date.today()
+    ahora = timezone.now()
+    bus, viaje, costos = datos['bus'], datos['viaje'], datos['costos']
+    viajes = Viaje.objects.bulk_create([
+        Viaje(bus=bus, conductor=datos['conductor'], lugar_origen=datos['lugar'], lugar_destino=datos['lugar'],
+              fecha_salida=ahora + timedelta(days=i + 1), fecha_llegada_estimada=ahora + timedelta(days=i + 1, hours=4))
+        for i in range(cantidad)
+    ])
+    pasajeros = Pasajero.objects.bulk_create([
+        Pasajero(nombre_completo=f'Acompañante {i}', rut=f'{9000000 + i}-{i % 10}', telefono='0988888888',
+                 correo=f'acompanante{i}@example.com')
+        for i in range(cantidad)
+    ])
+    indexar_pasajeros(pasajeros)
+    ocupados = {int(asiento) for asiento in ViajePasajero.objects.filter(viaje=viaje).values_list('asiento', flat=True)}
+    libres = [asiento for asiento in range(1, viaje.bus.capacidad_pasajeros + 1) if asiento not in ocupados]
+    ViajePasajero.objects.bulk_create(
+        [ViajePasajero(viaje=viaje, pasajero=pasajero, asiento=str(asiento))
+         for pasajero, asiento in zip(pasajeros, libres)]
+        + [ViajePasajero(viaje=otro, pasajero=datos['pasajero'], asiento='1') for otro in viajes]
+    )
+    for con_pasajeros in [viaje, *viajes]:
+        reconstruir_mapa(con_pasajeros)
+    reconstruir_contadores()
+    mantenimientos = Mantenimiento.objects.bulk_create([
+        Mantenimiento(bus=bus, tipo='correctivo', descripcion='Frenos', fecha_mantenimiento=hoy - timedelta(days=i),
+                      kilometraje=200000 + i, costo=90000)
+        for i in range(cantidad)
+    ])
+    costos.mantenimientos.add(*mantenimientos)
+    DocumentoVehiculo.objects.bulk_create([
+        DocumentoVehiculo(bus=bus, tipo='revision', numero_documento=f'REV-{i}',
+                          fecha_emision=hoy - timedelta(days=300), fecha_vencimiento=hoy + timedelta(days=i))
+        for i in range(cantidad)
+    ])
+    PuntoRecarga.objects.bulk_create([
+        PuntoRecarga(costos_viaje=costos, orden=orden, kilometraje=1000 + orden * 200, precio_combustible=1000,
+                     litros_cargados=40, kilometros_recorridos=200, costo_total=40000)
+        for orden in range(3, cantidad + 3)
+    ])
+    Peaje.objects.bulk_create([
+        Peaje(viaje=viaje, costos_viaje=costos, lugar=f'Peaje extra {i}', monto=4000, fecha_pago=viaje.fecha_salida)
+        for i in range(cantidad)
+    ])
+    reconstruir_estadisticas()
+
+
+class PresupuestoConsultasTestCase(TestCase):
+    """Recorre cada URL y verifica su presupuesto de consultas."""
+    mediciones = []
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.datos = poblar_datos(ESCALA)
+        cls.admin = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'clave')
+        # Archivos para medir las descargas completas (no la redirección por archivo faltante)
+        cls.datos['documento'].archivo.save('soat.pdf', ContentFile(b'%PDF-1.4 soat'))
+        cls.datos['peaje'].comprobante.save('voucher.pdf', ContentFile(b'%PDF-1.4 voucher'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.datos['documento'].archivo.delete(save=False)
+        cls.datos['peaje'].comprobante.delete(save=False)
+        super().tearDownClass()
+        if not cls.mediciones:
+            return
+        filas = sorted(cls.mediciones, key=lambda m: -m['consultas'])
+        lineas = [f'{"URL":40} {"estado":>6} {"consultas":>9} {"presup.":>7} {"SQL ms":>8} {"total ms":>9} {"pico KiB":>9}']
+        lineas += [
+            f'{m["url"]:40} {m["estado"]:>6} {m["consultas"]:>9} {m["presupuesto"]:>7} '
+            f'{m["sql_ms"]:>8.1f} {m["total_ms"]:>9.1f} {m["pico_kib"]:>9.0f}'
+            for m in filas
+        ]
+        logger.info('Consultas por vista (escala %s):\n%s', ESCALA, '\n'.join(lineas))
+        ruta = os.environ.get('BENCHMARK_REPORTE')
+        if ruta:
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                json.dump({'escala': ESCALA, 'mediciones': filas}, archivo, indent=2)
+
+    def medir(self, nombre):
+        kwargs = PARAMETROS.get(nombre, lambda d: {})(self.datos)
+        consulta = CONSULTA.get(nombre, lambda d: {})(self.datos)
+        url = reverse(nombre, kwargs=kwargs)
+        self.client.force_login(self.admin)
+
+        lotes = POR_LOTES[nombre].objects.count() // TAMANO_LOTE + 1 if nombre in POR_LOTES else 1
+        # Cada petición se deshace al terminar, para que ninguna cambie los datos de las siguientes
+        with transaction.atomic():
+            tracemalloc.start()
+            inicio = time.perf_counter()
+            with CaptureQueriesContext(connection) as contexto:
+                if nombre in DATOS_POST:
+                    response = self.client.post(url, DATOS_POST[nombre](self.datos))
+                else:
+                    response = self.client.get(url, consulta)
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+            total = time.perf_counter() - inicio
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            transaction.set_rollback(True)
+
+        # Sesión y usuario autenticado no son parte del costo de la vista
+        consultas = [q for q in contexto.captured_queries if 'django_session' not in q['sql']
+                     and not q['sql'].startswith('SELECT "auth_user"."id"')]
+        return {
+            'url': nombre,
+            'estado': response.status_code,
+            'consultas': len(consultas),
+            'presupuesto': PRESUPUESTOS[nombre] * lotes,
+            'sql_ms': sum(float(q['time']) for q in consultas) * 1000,
+            'total_ms': total * 1000,
+            'pico_kib': pico / 1024,
+        }
+
+    def test_todas_las_urls_tienen_presupuesto(self):
+        faltantes = rutas_medidas() - set(PRESUPUESTOS)
+        self.assertFalse(faltantes, f'URLs sin presupuesto de consultas: {sorted(faltantes)}')
+
+    def test_presupuesto_de_consultas(self):
+        for nombre in PRESUPUESTOS:
+            with self.subTest(url=nombre):
+                medicion = self.medir(nombre)
+                self.mediciones.append(medicion)
+                self.assertLess(medicion['estado'], 500)
+                if nombre in DATOS_POST:
+                    self.assertNotEqual(medicion['estado'], 405, f'{nombre} no aceptó el POST')
+                self.assertLessEqual(
+                    medicion['consultas'], medicion['presupuesto'],
+                    f'{nombre} ejecutó {medicion["consultas"]} consultas (presupuesto {medicion["presupuesto"]})'
+                )
+
+    def test_consultas_no_crecen_con_los_datos(self):
+        nombres = sorted(set(PRESUPUESTOS) - set(POR_LOTES))
+        antes = {nombre: self.medir(nombre)['consultas'] for nombre in nombres}
+        poblar_datos(ESCALA, lote=1)
+        ampliar_datos(self.datos)
+        for nombre in nombres:
+            with self.subTest(url=nombre):
+                despues = self.medir(nombre)['consultas']
+                self.assertEqual(
+                    despues, antes[nombre],
+                    f'{nombre} pasó de {antes[nombre]} a {despues} consultas al duplicar los datos'
+                )
+
+
+@tag('benchmark')
+class AnaliticaCostosRendimientoTestCase(TestCase):
+    """
+    La analítica de costos debe tomar bastante menos de un segundo por cada
+    100.000 viajes con costos. Con BENCHMARK_TIEMPOS=1 se siembran al menos
+    MINIMO_VIAJES_EXIGIDOS viajes con costos, sea cual sea BENCHMARK_ESCALA.
+    """
+    VIAJES_POR_ESCALA = 10000
+    SEGUNDOS_POR_100K_VIAJES = 0.8
+    MINIMO_VIAJES_EXIGIDOS = 100000
+    # Escala del generador con la que se superan los MINIMO_VIAJES_EXIGIDOS (un ~91 % de los viajes tiene costos)
+    ESCALA_EXIGIDA = 1.2
+
+    @classmethod
+    def setUpTestData(cls):
+        escala = ESCALA * cls.VIAJES_POR_ESCALA / 100000
+        if EXIGIR_TIEMPOS:
+            escala = max(escala, cls.ESCALA_EXIGIDA)
+        GeneradorDatos(escala=escala, semilla=42, tamano_lote=5000).generar()
+
+    def test_analitica_de_costos(self):
+        viajes = CostosViaje.objects.count()
+        tiempos = []
+        for _ in range(3):
+            inicio = time.perf_counter()
+            analitica = calcular_analitica()
+            tiempos.append(time.perf_counter() - inicio)
+        self.assertEqual(analitica['resumen']['viajes'], viajes)
+
+        # Límite proporcional a los viajes: el mismo costo por viaje a cualquier escala
+        limite = self.SEGUNDOS_POR_100K_VIAJES * viajes / 100000
+        logger.info('Analítica de costos: %s viajes en %.0f ms (límite %.0f ms)', viajes, min(tiempos) * 1000,
+                    limite * 1000)
+        if EXIGIR_TIEMPOS:
+            self.assertGreaterEqual(viajes, self.MINIMO_VIAJES_EXIGIDOS)
+            self.assertLess(min(tiempos), limite)
+
+
+@tag('benchmark')
+class FormularioCostosRendimientoTestCase(TestCase):
+    """El formulario PDF sobre la plantilla en caché debe ser mucho más rápido que generarlo entero."""
+    REPETICIONES = 20
+    ACELERACION_MINIMA = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        GeneradorDatos(escala=0.01, semilla=42).generar()
+
+    def test_formulario_costos(self):
+        viaje = Viaje.objects.select_related('bus', 'conductor').filter(costos__isnull=False).first()
+        tiempos = {}
+        for nombre, generar in (('completo', renderizar_completo), ('plantilla', formulario_costos_pdf)):
+            generar(viaje, 'descarga')  # la primera llamada arma la plantilla
+            inicio = time.perf_counter()
+            for _ in range(self.REPETICIONES):
+                generar(viaje, 'descarga')
+            tiempos[nombre] = (time.perf_counter() - inicio) / self.REPETICIONES
+
+        aceleracion = tiempos['completo'] / tiempos['plantilla']
+        logger.info('Formulario de costos: %.1f ms completo, %.2f ms con plantilla (%.0fx)',
+                    tiempos['completo'] * 1000, tiempos['plantilla'] * 1000, aceleracion)
+        if EXIGIR_TIEMPOS:
+            self.assertGreater(aceleracion, self.ACELERACION_MINIMA)
+
+
+@tag('benchmark')
+class ImportacionNominaRendimientoTestCase(TestCase):
+    """Una nómina de 200 filas (mitad pasajeros existentes) debe importarse en mucho menos de un segundo."""
+    FILAS = 200
+    SEGUNDOS_MAXIMOS = 0.5
+    CONSULTAS_MAXIMAS = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        GeneradorDatos(escala=0.01, semilla=42).generar()
+        viaje = Viaje.objects.select_related('conductor').first()
+        bus = Bus.objects.create(placa='NOMINA', marca='Volvo', modelo='B9R', año_fabricacion=2022,
+                                 capacidad_pasajeros=cls.FILAS + 10, numero_chasis='CH-NOMINA',
+                                 numero_motor='MO-NOMINA', fecha_adquisicion=date.today())
+        cls.viaje = Viaje.objects.create(bus=bus, conductor=viaje.conductor, fecha_salida=timezone.now(),
+                                         fecha_llegada_estimada=timezone.now() + timedelta(hours=5))
+
+    def test_importar_nomina(self):
+        mitad = self.FILAS // 2
+        existentes = Pasajero.objects.order_by('pk').values_list('rut', flat=True)[:mitad]
+        filas = [(n, {'rut': rut}) for n, rut in enumerate(existentes, start=2)]
+        for i in range(mitad):
+            numero = 30000000 + i
+            filas.append((mitad + i + 2, {
+                'rut': f'{numero}-{digito_verificador_rut(numero)}', 'nombre_completo': f'Turista {i} Nómina',
+                'telefono': '0999999999', 'correo': f'turista{i}@example.com',
+            }))
+
+        inicio = time.perf_counter()
+        with CaptureQueriesContext(connection) as contexto:
+            resultado = importar_nomina(self.viaje, filas)
+        total = time.perf_counter() - inicio
+
+        logger.info('Importación de nómina: %s filas en %.0f ms, %s consultas', len(filas), total * 1000,
+                    len(contexto.captured_queries))
+        self.assertEqual(resultado.errores, [])
+        self.assertEqual((resultado.creados, resultado.existentes), (mitad, mitad))
+        self.assertLessEqual(len(contexto.captured_queries), self.CONSULTAS_MAXIMAS)
+        if EXIGIR_TIEMPOS:
+            self.assertLess(total, self.SEGUNDOS_MAXIMOS)
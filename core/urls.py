@@ -23,6 +23,7 @@ urlpatterns = [
     
     # Pasajeros
     path('pasajeros/', views.PasajeroListView.as_view(), name='pasajero_list'),
+    path('pasajeros/buscar/', views.buscar_pasajeros_view, name='pasajero_buscar'),
     path('pasajeros/nuevo/', views.PasajeroCreateView.as_view(), name='pasajero_create'),
     path('pasajeros/<int:pk>/', views.PasajeroDetailView.as_view(), name='pasajero_detail'),
     path('pasajeros/<int:pk>/editar/', views.PasajeroUpdateView.as_view(), name='pasajero_update'),
@@ -1,4 +1,5 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import JsonResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django.contrib import messages
@@ -7,6 +8,7 @@ from django.utils.decorators import method_decorator
 from django.forms import ModelForm
 from django import forms
 from django.utils import timezone
+from .busqueda import LIMITE_RESULTADOS, buscar_pasajeros, pasajeros_coincidentes
 from .models import Conductor, Lugar, Pasajero
 from .permissions import admin_required, usuario_or_admin_required
 
@@ -299,8 +301,40 @@ class PasajeroListView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
+        busqueda = self.request.GET.get('q', '').strip()
+        if busqueda:
+            return pasajeros_coincidentes(busqueda).order_by('nombre_completo', 'pk')
         return Pasajero.objects.all().order_by('-creado_en')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['busqueda'] = self.request.GET.get('q', '').strip()
+        return context
+
+
+@usuario_or_admin_required
+def buscar_pasajeros_view(request):
+    """
+    Autocompletado de pasajeros por RUT, nombre o correo (JSON).
+    Parámetros: q (texto), viaje (excluye a los pasajeros ya registrados en ese viaje) y limite.
+    """
+    try:
+        limite = int(request.GET.get('limite', LIMITE_RESULTADOS))
+        viaje = int(request.GET['viaje']) if request.GET.get('viaje') else None
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    pasajeros = buscar_pasajeros(request.GET.get('q', ''), limite=limite, excluir_viaje=viaje)
+    return JsonResponse({'resultados': [
+        {
+            'id': pasajero.pk,
+            'nombre_completo': pasajero.nombre_completo,
+            'rut': pasajero.rut,
+            'correo': pasajero.correo,
+            'telefono': pasajero.telefono,
+        }
+        for pasajero in pasajeros
+    ]})
+
 
 @method_decorator(usuario_or_admin_required, name='dispatch')
 class PasajeroDetailView(DetailView):
@@ -351,72 +385,56 @@ def home_view(request):
     from flota.models import Bus, DocumentoVehiculo
     from viajes.models import Viaje
     from costos.models import CostosViaje
-    from datetime import date, timedelta
-    from django.db.models import Sum, Avg, Count, Q
-    from decimal import Decimal
+    from .estadisticas import obtener_estadisticas, costos_ultimos_dias
+    
+    # Totales materializados (mantenidos por señales, ver core/estadisticas.py)
+    estadisticas = obtener_estadisticas()
     
     # Obtener buses con sus placas
     buses = Bus.objects.all()
     
     # Obtener viajes
-    viajes = Viaje.objects.all()
-    viajes_activos = viajes.filter(estado__in=['programado', 'en_curso']).count()
-    viajes_completados = viajes.filter(estado='completado').count()
-    ultimos_viajes = viajes.select_related('bus', 'conductor').order_by('-creado_en')[:5]
-    
-    # Estadísticas de costos
-    costos = CostosViaje.objects.all()
+    ultimos_viajes = Viaje.objects.select_related(
+        'bus', 'conductor', 'lugar_origen', 'lugar_destino').order_by('-creado_en')[:5]
     
     # Costos totales
-    total_costos = costos.aggregate(
-        total_combustible=Sum('combustible'),
-        total_mantenimiento=Sum('mantenimiento'),
-        total_peajes=Sum('peajes'),
-        total_otros=Sum('otros_costos'),
-        total_general=Sum('costo_total')
-    )
+    total_costos = {
+        'total_combustible': estadisticas.total_combustible,
+        'total_mantenimiento': estadisticas.total_mantenimiento,
+        'total_peajes': estadisticas.total_peajes,
+        'total_otros': estadisticas.total_otros,
+        'total_general': estadisticas.total_general,
+    }
     
     # Viajes con mayor costo
-    viajes_mayor_costo = costos.select_related('viaje__bus', 'viaje__conductor').order_by('-costo_total')[:5]
+    viajes_mayor_costo = CostosViaje.objects.select_related(
+        'viaje__bus', 'viaje__conductor', 'viaje__lugar_origen', 'viaje__lugar_destino').order_by('-costo_total')[:5]
     
     # Promedio de costos
-    promedio_costos = costos.aggregate(
-        promedio_combustible=Avg('combustible'),
-        promedio_total=Avg('costo_total')
-    )
+    registrados = estadisticas.total_costos_registrados
+    promedio_costos = {
+        'promedio_combustible': estadisticas.total_combustible / registrados if registrados else None,
+        'promedio_total': estadisticas.total_general / registrados if registrados else None,
+    }
     
     # Costos del último mes
-    fecha_mes_atras = date.today() - timedelta(days=30)
-    costos_mes = costos.filter(creado_en__gte=fecha_mes_atras).aggregate(
-        total_mes=Sum('costo_total'),
-        viajes_mes=Count('id')
-    )
+    costos_mes = costos_ultimos_dias(30)
     
-    # Obtener documentos próximos a vencer (en los próximos 30 días)
-    hoy = date.today()
-    fecha_limite = hoy + timedelta(days=30)
-    
-    documentos_proximos_vencer = DocumentoVehiculo.objects.filter(
-        fecha_vencimiento__gte=hoy,
-        fecha_vencimiento__lte=fecha_limite,
-        estado__in=['por_vencer', 'vigente']
-    ).select_related('bus').order_by('fecha_vencimiento')[:5]  # Últimos 5
-    
-    # Documentos ya vencidos
-    documentos_vencidos = DocumentoVehiculo.objects.filter(
-        fecha_vencimiento__lt=hoy,
-        estado='vencido'
-    ).select_related('bus').order_by('-fecha_vencimiento')[:5]  # Últimos 5
+    # Documentos próximos a vencer (en los próximos 30 días) y ya vencidos. El estado
+    # se deriva de la fecha de hoy: el guardado puede estar desactualizado
+    documentos = DocumentoVehiculo.objects.con_estado_actual().select_related('bus')
+    documentos_proximos_vencer = documentos.por_vencer().order_by('fecha_vencimiento')[:5]  # Últimos 5
+    documentos_vencidos = documentos.vencidos().order_by('-fecha_vencimiento')[:5]  # Últimos 5
     
     context = {
-        'total_buses': buses.count(),
+        'total_buses': estadisticas.total_buses,
         'buses': buses,
-        'total_conductores': Conductor.objects.count(),
-        'total_lugares': Lugar.objects.count(),
-        'total_pasajeros': Pasajero.objects.count(),
-        'total_viajes': viajes.count(),
-        'viajes_activos': viajes_activos,
-        'viajes_completados': viajes_completados,
+        'total_conductores': estadisticas.total_conductores,
+        'total_lugares': estadisticas.total_lugares,
+        'total_pasajeros': estadisticas.total_pasajeros,
+        'total_viajes': estadisticas.total_viajes,
+        'viajes_activos': estadisticas.viajes_programados + estadisticas.viajes_en_curso,
+        'viajes_completados': estadisticas.viajes_completados,
         'ultimos_viajes': ultimos_viajes,
         'documentos_proximos_vencer': documentos_proximos_vencer,
         'documentos_vencidos': documentos_vencidos,
@@ -425,8 +443,6 @@ def home_view(request):
         'viajes_mayor_costo': viajes_mayor_costo,
         'promedio_costos': promedio_costos,
         'costos_mes': costos_mes,
-        'total_costos_registrados': costos.count(),
+        'total_costos_registrados': registrados,
     }
     return render(request, 'home_new.html', context)
-
-
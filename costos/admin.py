@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import CostosViaje, Peaje, PuntoRecarga
+from .models import AnomaliaConsumo, CorreoFormulario, CostosViaje, Peaje, PuntoRecarga
+from .services import recalcular_kilometros
 
 
 class PuntoRecargaInline(admin.TabularInline):
@@ -31,6 +32,12 @@ class CostosViajeAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('combustible', 'costo_total', 'creado_en', 'actualizado_en')
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Los puntos del inline pueden haber cambiado: recalcular el viaje completo
+        recalcular_kilometros(form.instance)
+        form.instance.save()
+
     def num_puntos_recarga(self, obj):
         return obj.puntos_recarga.count()
     num_puntos_recarga.short_description = 'Puntos Recarga'
@@ -54,6 +61,17 @@ class PuntoRecargaAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recalcular_kilometros(obj.costos_viaje)
+        obj.costos_viaje.save()
+
+    def delete_model(self, request, obj):
+        costos_viaje = obj.costos_viaje
+        super().delete_model(request, obj)
+        recalcular_kilometros(costos_viaje)
+        costos_viaje.save()
+
 
 @admin.register(Peaje)
 class PeajeAdmin(admin.ModelAdmin):
@@ -68,3 +86,24 @@ class PeajeAdmin(admin.ModelAdmin):
             'fields': ('fecha_pago', 'comprobante')
         }),
     )
+
+
+@admin.register(AnomaliaConsumo)
+class AnomaliaConsumoAdmin(admin.ModelAdmin):
+    list_display = ('bus', 'fecha', 'tipo', 'km_por_litro', 'linea_base', 'puntaje', 'detectado_en')
+    list_filter = ('tipo', 'fecha')
+    search_fields = ('bus__placa',)
+    list_select_related = ('bus',)
+    # La tabla la mantiene costos.anomalias
+    readonly_fields = ('punto_recarga', 'bus', 'fecha', 'tipo', 'km_por_litro', 'linea_base', 'puntaje', 'detectado_en')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(CorreoFormulario)
+class CorreoFormularioAdmin(admin.ModelAdmin):
+    list_display = ('viaje', 'destinatario', 'estado', 'intentos', 'enviado_en', 'creado_en')
+    list_filter = ('estado', 'creado_en')
+    search_fields = ('destinatario', 'viaje__bus__placa')
+    readonly_fields = ('viaje', 'destinatario', 'estado', 'intentos', 'ultimo_error', 'enviado_en', 'creado_en', 'actualizado_en')
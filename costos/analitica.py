@@ -0,0 +1,248 @@
+"""
+Analítica de costos de la flota.
+
+Carga los costos (junto con su viaje) y los puntos de recarga en arreglos NumPy
+con consultas directas, sin instanciar modelos, y calcula con operaciones
+vectorizadas el costo por km, el costo por pasajero y la participación del
+combustible y del mantenimiento, agrupados por bus, conductor, ruta y mes.
+La ruta es el par de ciudades de origen y destino del viaje (la ciudad escrita
+en el viaje o, en viajes antiguos, la de su Lugar).
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import CharField, FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from core.models import Conductor, Lugar
+from flota.models import Bus
+from .models import CostosViaje, PuntoRecarga
+
+AGRUPACIONES = ('bus', 'conductor', 'ruta', 'mes')
+
+# Métricas que se suman por grupo
+METRICAS = ('km', 'pasajeros', 'litros', 'combustible', 'mantenimiento', 'peajes', 'otros', 'costo_total')
+
+# Cantidad de filas por agrupación (las de mayor costo); los meses se entregan completos
+LIMITE_FILAS = 100
+
+# Clave de los viajes sin bus (Viaje.bus se anula al eliminar el bus)
+SIN_BUS = -1
+
+
+def _ejecutar(queryset, *campos):
+    sql, params = queryset.values_list(*campos).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def columnas_numericas(queryset, *campos):
+    """
+    Ejecuta `queryset.values_list(*campos)` directamente con el cursor (sin los
+    conversores de Django) y retorna un arreglo float por campo; NULL queda como NaN.
+    """
+    filas = _ejecutar(queryset, *campos)
+    if not filas:
+        return [np.zeros(0) for _ in campos]
+    return list(np.array(filas, dtype=float).T)
+
+
+def _meses_locales(queryset, campo):
+    """
+    Mes (año * 12 + mes - 1) en la zona horaria local de cada fecha de `campo`.
+    La fecha se lee como texto y se convierte con NumPy: extraer el mes en la base
+    de datos cuesta una llamada a Python por fila en SQLite.
+    """
+    filas = _ejecutar(queryset.annotate(fecha_texto=Cast(campo, CharField())), 'fecha_texto')
+    fechas = np.array([fila[0][:19] for fila in filas], dtype='datetime64[s]')
+    if settings.USE_TZ and len(fechas):
+        # Las fechas están en UTC. El desfase horario solo cambia con el horario de
+        # verano, así que se calcula una vez por hora distinta y no por fila
+        horas, indice = np.unique(fechas.astype('datetime64[h]'), return_inverse=True)
+        zona = timezone.get_current_timezone()
+        desfases = np.array([
+            datetime.fromtimestamp(segundos, dt_timezone.utc).astimezone(zona).utcoffset().total_seconds()
+            for segundos in horas.astype('datetime64[s]').astype(np.int64).tolist()
+        ], dtype=np.int64)
+        fechas = fechas + desfases[indice].astype('timedelta64[s]')
+    # datetime64[M] cuenta los meses desde enero de 1970
+    return (fechas.astype('datetime64[M]').astype(np.int64) + 1970 * 12).astype(float)
+
+
+def _rutas(filas):
+    """
+    Código de ruta de cada fila (ciudad de origen, ciudad de destino, id del
+    lugar de origen, id del lugar de destino) y las rutas (origen, destino) en
+    orden de código. La ciudad del Lugar solo se usa si el viaje no tiene la
+    suya, y se consulta una vez por lugar distinto, no por viaje.
+    """
+    distintas = {}
+    codigos = np.fromiter((distintas.setdefault(fila, len(distintas)) for fila in filas),
+                          dtype=np.int64, count=len(filas))
+    ciudades = dict(Lugar.objects.filter(
+        pk__in={lugar for fila in distintas for lugar in fila[2:] if lugar}).values_list('pk', 'ciudad'))
+    rutas = {}
+    por_fila = np.array([
+        rutas.setdefault((origen or ciudades.get(lugar_origen, ''), destino or ciudades.get(lugar_destino, '')),
+                         len(rutas))
+        for origen, destino, lugar_origen, lugar_destino in distintas
+    ], dtype=np.int64)
+    return por_fila[codigos], list(rutas)
+
+
+def _posiciones(ids, buscados):
+    """Posición en `ids` de cada valor de `buscados` (todos deben estar presentes)."""
+    orden = np.argsort(ids, kind='stable')
+    return orden[np.searchsorted(ids, buscados, sorter=orden)]
+
+
+def _dividir(numerador, denominador):
+    """División elemento a elemento; NaN donde el denominador es 0."""
+    resultado = np.full(numerador.shape, np.nan)
+    np.divide(numerador, denominador, out=resultado, where=denominador > 0)
+    return resultado
+
+
+def _filtro_fechas(prefijo, desde, hasta):
+    """Filtro por fecha de salida (inclusive) como rango de datetimes, que aprovecha el índice."""
+    filtro = {}
+    if desde:
+        filtro[f'{prefijo}fecha_salida__gte'] = timezone.make_aware(datetime.combine(desde, datetime.min.time()))
+    if hasta:
+        filtro[f'{prefijo}fecha_salida__lt'] = timezone.make_aware(
+            datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+    return filtro
+
+
+def cargar_datos(desde=None, hasta=None):
+    """
+    Retorna un dict de arreglos alineados por registro de costos (un viaje por
+    registro), filtrando por fecha de salida del viaje si se indica.
+    """
+    costos = CostosViaje.objects.filter(**_filtro_fechas('viaje__', desde, hasta)).order_by('pk')
+    recargas = PuntoRecarga.objects.filter(**_filtro_fechas('costos_viaje__viaje__', desde, hasta))
+
+    # Todas las consultas en la misma transacción, para que vean los mismos datos
+    with transaction.atomic():
+        (costos_id, viaje_id, combustible, mantenimiento, peajes, otros, total, km_inicial, km_final,
+         bus, conductor, distancia, pasajeros) = columnas_numericas(
+            costos.annotate(distancia=Cast('viaje__distancia_km', FloatField())),
+            'id', 'viaje_id', 'combustible', 'mantenimiento', 'peajes', 'otros_costos', 'costo_total',
+            'km_inicial', 'km_final', 'viaje__bus_id', 'viaje__conductor_id', 'distancia',
+            'viaje__pasajeros_confirmados',
+        )
+        filas_ruta = _ejecutar(costos, 'viaje__origen_ciudad', 'viaje__destino_ciudad',
+                               'viaje__lugar_origen_id', 'viaje__lugar_destino_id')
+        mes = _meses_locales(costos, 'viaje__fecha_salida')
+        recarga_costos, recarga_km, recarga_litros = columnas_numericas(
+            recargas, 'costos_viaje_id', 'kilometros_recorridos', 'litros_cargados',
+        )
+
+    # Kilómetros y litros de las recargas, sumados por registro de costos
+    fila_costos = _posiciones(costos_id, recarga_costos)
+    km_recargas = np.bincount(fila_costos, weights=recarga_km, minlength=len(costos_id))
+    litros = np.bincount(fila_costos, weights=recarga_litros, minlength=len(costos_id))
+
+    # Kilómetros del viaje: odómetro real; si falta, recargas; si no, distancia de la ruta
+    km = km_final - km_inicial
+    km = np.where(np.isnan(km) | (km <= 0), km_recargas, km)
+    km = np.where(km <= 0, np.nan_to_num(distancia), km)
+
+    ruta, rutas = _rutas(filas_ruta)
+
+    return {
+        'viaje': viaje_id, 'bus': np.where(np.isnan(bus), SIN_BUS, bus), 'conductor': conductor,
+        'ruta': ruta, 'rutas': rutas,
+        'mes': mes, 'km': km, 'pasajeros': pasajeros, 'litros': litros,
+        'combustible': combustible, 'mantenimiento': mantenimiento, 'peajes': peajes,
+        'otros': otros, 'costo_total': total,
+    }
+
+
+def _agrupar(datos, claves):
+    """Suma las métricas por clave. Retorna (claves_unicas, sumas)."""
+    unicas, indice = np.unique(claves, return_inverse=True)
+    sumas = {campo: np.bincount(indice, weights=datos[campo], minlength=len(unicas)) for campo in METRICAS}
+    sumas['viajes'] = np.bincount(indice, minlength=len(unicas)).astype(float)
+    return unicas, sumas
+
+
+def _lista(valores, decimales):
+    """Redondea y convierte a lista de Python; NaN pasa a None."""
+    resultado = np.round(valores, decimales).astype(object)
+    resultado[np.isnan(valores)] = None
+    return resultado.tolist()
+
+
+def _filas(claves, sumas, limite=None):
+    """Filas con sumas e indicadores, ordenadas por costo total descendente."""
+    orden = np.argsort(-sumas['costo_total'], kind='stable')[:limite]
+    sumas = {campo: valores[orden] for campo, valores in sumas.items()}
+    columnas = {
+        'viajes': sumas['viajes'].astype(np.int64).tolist(),
+        'km': _lista(sumas['km'], 1),
+        'pasajeros': sumas['pasajeros'].astype(np.int64).tolist(),
+        'costo_total': sumas['costo_total'].astype(np.int64).tolist(),
+        'costo_por_km': _lista(_dividir(sumas['costo_total'], sumas['km']), 2),
+        'costo_por_pasajero': _lista(_dividir(sumas['costo_total'], sumas['pasajeros']), 2),
+        'participacion_combustible': _lista(_dividir(sumas['combustible'], sumas['costo_total']), 4),
+        'participacion_mantenimiento': _lista(_dividir(sumas['mantenimiento'], sumas['costo_total']), 4),
+        'km_por_litro': _lista(_dividir(sumas['km'], sumas['litros']), 2),
+    }
+    return [
+        {'clave': clave, **{nombre: valores[i] for nombre, valores in columnas.items()}}
+        for i, clave in enumerate(claves[orden].tolist())
+    ]
+
+
+def calcular_analitica(desde=None, hasta=None, limite=LIMITE_FILAS):
+    """
+    Retorna el resumen de la flota y las filas por bus, conductor, ruta (las
+    `limite` de mayor costo) y mes (todas, en orden cronológico), listas para
+    serializar a JSON.
+    """
+    datos = cargar_datos(desde, hasta)
+    claves = {nombre: datos[nombre] for nombre in AGRUPACIONES}
+
+    totales = {campo: np.array([datos[campo].sum()]) for campo in METRICAS}
+    totales['viajes'] = np.array([float(len(datos['viaje']))])
+    resultado = {'resumen': _filas(np.array([0]), totales)[0]}
+    for nombre in AGRUPACIONES:
+        unicas, sumas = _agrupar(datos, claves[nombre].astype(np.int64))
+        resultado[f'por_{nombre}'] = _filas(unicas, sumas, None if nombre == 'mes' else limite)
+    resultado['por_mes'].sort(key=lambda fila: fila['clave'])
+
+    _etiquetar(resultado, datos['rutas'])
+    return resultado
+
+
+def _etiquetar(resultado, rutas):
+    """Agrega nombres legibles (una consulta por tabla, solo de las filas entregadas)."""
+    resultado['resumen']['etiqueta'] = 'Flota completa'
+
+    buses = dict(Bus.objects.filter(
+        pk__in=[fila['clave'] for fila in resultado['por_bus']]).values_list('pk', 'placa'))
+    for fila in resultado['por_bus']:
+        if fila['clave'] == SIN_BUS:
+            fila['clave'], fila['etiqueta'] = None, 'Sin bus'
+        else:
+            fila['etiqueta'] = buses.get(fila['clave'], str(fila['clave']))
+
+    conductores = {
+        pk: f'{nombre} {apellido}' for pk, nombre, apellido in Conductor.objects.filter(
+            pk__in=[fila['clave'] for fila in resultado['por_conductor']]).values_list('pk', 'nombre', 'apellido')
+    }
+    for fila in resultado['por_conductor']:
+        fila['etiqueta'] = conductores.get(fila['clave'], str(fila['clave']))
+
+    for fila in resultado['por_ruta']:
+        origen, destino = rutas[fila['clave']]
+        fila['etiqueta'] = f"{origen or 'Sin origen'} → {destino or 'Sin destino'}"
+
+    for fila in resultado['por_mes']:
+        anio, mes = divmod(fila['clave'], 12)
+        fila['etiqueta'] = f'{anio}-{mes + 1:02d}'
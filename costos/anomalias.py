@@ -0,0 +1,137 @@
+"""
+Detección de anomalías de rendimiento de combustible.
+
+Cada punto de recarga cierra un tramo con `kilometros_recorridos` y
+`litros_cargados`, de modo que su rendimiento es km/L. Para cada bus se ordenan
+sus tramos por fecha de salida del viaje y cada tramo se compara con la línea
+base de los VENTANA tramos anteriores del mismo bus mediante un puntaje z
+robusto (mediana y desviación absoluta mediana). Un rendimiento muy bajo sugiere
+robo de combustible o una falla mecánica; uno muy alto, un error de odómetro o
+una recarga no registrada. Los hallazgos se guardan en AnomaliaConsumo.
+
+El cálculo es vectorizado con NumPy sobre todos los tramos de los buses pedidos,
+y solo se escriben en la tabla las diferencias con lo ya guardado.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .analitica import columnas_numericas
+from .models import AnomaliaConsumo, PuntoRecarga
+
+# Tramos anteriores que forman la línea base de cada tramo
+VENTANA = 30
+# Tramos válidos anteriores mínimos para evaluar un tramo
+MIN_HISTORIA = 8
+# |z| sobre el cual el tramo es anómalo (criterio habitual de Iglewicz y Hoaglin)
+UMBRAL_Z = 3.5
+# La desviación absoluta mediana nunca se toma menor a esta fracción de la mediana,
+# para que un bus de rendimiento muy estable no marque variaciones mínimas
+PISO_DESVIACION = 0.05
+# En cargas menores a esto el redondeo de los litros domina el rendimiento: no se evalúan
+MIN_LITROS = 10
+
+
+def _tramos(bus_ids=None):
+    """
+    Arreglos (punto, bus, km, litros) ordenados por bus y fecha de salida del viaje.
+    Los viajes sin bus (Viaje.bus se anula al eliminar el bus) no tienen línea base.
+    """
+    puntos = PuntoRecarga.objects.filter(costos_viaje__viaje__bus__isnull=False).order_by(
+        'costos_viaje__viaje__bus_id', 'costos_viaje__viaje__fecha_salida', 'costos_viaje_id', 'orden', 'pk')
+    if bus_ids is not None:
+        puntos = puntos.filter(costos_viaje__viaje__bus_id__in=bus_ids)
+    return columnas_numericas(puntos, 'pk', 'costos_viaje__viaje__bus_id', 'kilometros_recorridos',
+                              'litros_cargados')
+
+
+def calcular_anomalias(bus_ids=None):
+    """
+    Retorna {punto_recarga_id: (bus_id, tipo, km_por_litro, linea_base, puntaje)}
+    con los tramos anómalos de los buses indicados (todos si bus_ids es None).
+    """
+    punto, bus, km, litros = _tramos(bus_ids)
+    total = len(punto)
+    if not total:
+        return {}
+
+    # Los tramos sin kilómetros o con pocos litros no tienen rendimiento ni entran en la línea base
+    rendimiento = np.full(total, np.nan)
+    np.divide(km, litros, out=rendimiento, where=(km > 0) & (litros >= MIN_LITROS))
+
+    # Ventana de los VENTANA tramos anteriores de cada tramo; los que son de otro bus quedan en NaN
+    relleno = np.full(VENTANA, np.nan)
+    ventanas = sliding_window_view(np.concatenate([relleno, rendimiento]), VENTANA)[:total]
+    buses_ventana = sliding_window_view(np.concatenate([relleno, bus]), VENTANA)[:total]
+    ventanas = np.where(buses_ventana == bus[:, None], ventanas, np.nan)
+
+    historia = (~np.isnan(ventanas)).sum(axis=1)
+    evaluables = np.flatnonzero((historia >= MIN_HISTORIA) & ~np.isnan(rendimiento))
+    linea_base = np.full(total, np.nan)
+    puntaje = np.full(total, np.nan)
+    if len(evaluables):
+        muestra = ventanas[evaluables]
+        mediana = np.nanmedian(muestra, axis=1)
+        desviacion = np.nanmedian(np.abs(muestra - mediana[:, None]), axis=1)
+        desviacion = np.maximum(desviacion, PISO_DESVIACION * mediana)
+        linea_base[evaluables] = mediana
+        # 0.6745 hace la desviación absoluta mediana comparable a la desviación estándar
+        puntaje[evaluables] = 0.6745 * (rendimiento[evaluables] - mediana) / desviacion
+
+    tipo = np.full(total, '', dtype=object)
+    tipo[puntaje < -UMBRAL_Z] = 'rendimiento_bajo'
+    tipo[puntaje > UMBRAL_Z] = 'rendimiento_alto'
+    tipo[km < 0] = 'kilometraje_negativo'
+
+    def _valor(arreglo, i):
+        return None if np.isnan(arreglo[i]) else round(float(arreglo[i]), 4)
+
+    return {
+        int(punto[i]): (int(bus[i]), tipo[i], _valor(rendimiento, i), _valor(linea_base, i), _valor(puntaje, i))
+        for i in np.flatnonzero(tipo != '').tolist()
+    }
+
+
+def detectar_anomalias(bus_ids=None):
+    """
+    Recalcula las anomalías de los buses indicados (todos si bus_ids es None) y
+    sincroniza AnomaliaConsumo: crea las nuevas, actualiza las que cambiaron y
+    elimina las que dejaron de serlo. Retorna (creadas, actualizadas, eliminadas).
+    """
+    campos = ['bus_id', 'tipo', 'km_por_litro', 'linea_base', 'puntaje']
+    ahora = timezone.now()
+    with transaction.atomic():
+        hallazgos = calcular_anomalias(bus_ids)
+        existentes = AnomaliaConsumo.objects.all()
+        if bus_ids is not None:
+            # También las de puntos cuyo viaje cambió de bus
+            existentes = existentes.filter(
+                Q(bus_id__in=bus_ids) | Q(punto_recarga__costos_viaje__viaje__bus_id__in=bus_ids))
+        existentes = {
+            fila[1]: fila for fila in existentes.values_list('pk', 'punto_recarga_id', *campos, 'fecha')
+        }
+        # La fecha se toma del viaje, igual para hallazgos nuevos y existentes (el viaje pudo reprogramarse)
+        fechas = dict(PuntoRecarga.objects.filter(pk__in=hallazgos).values_list(
+            'pk', 'costos_viaje__viaje__fecha_salida')) if hallazgos else {}
+
+        eliminadas = [fila[0] for punto_id, fila in existentes.items() if punto_id not in hallazgos]
+        modificadas = [
+            AnomaliaConsumo(pk=existentes[punto_id][0], fecha=fechas[punto_id], detectado_en=ahora,
+                            **dict(zip(campos, valores)))
+            for punto_id, valores in hallazgos.items()
+            if punto_id in existentes and tuple(existentes[punto_id][2:]) != (*valores, fechas[punto_id])
+        ]
+        nuevas = {punto_id: valores for punto_id, valores in hallazgos.items() if punto_id not in existentes}
+
+        if eliminadas:
+            AnomaliaConsumo.objects.filter(pk__in=eliminadas).delete()
+        if modificadas:
+            AnomaliaConsumo.objects.bulk_update(modificadas, campos + ['fecha', 'detectado_en'])
+        if nuevas:
+            AnomaliaConsumo.objects.bulk_create([
+                AnomaliaConsumo(punto_recarga_id=punto_id, fecha=fechas[punto_id], **dict(zip(campos, valores)))
+                for punto_id, valores in nuevas.items()
+            ], batch_size=1000)
+    return len(nuevas), len(modificadas), len(eliminadas)
@@ -0,0 +1,35 @@
+"""
+Filas de exportación de los costos de viaje con su desglose (ver core/exportacion.py).
+"""
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from core.exportacion import iterar_por_lotes
+from viajes.exportacion import CAMPOS_RUTA, ESTADOS, ruta_display
+from .models import PuntoRecarga
+
+ENCABEZADOS_COSTOS = [
+    'ID costos', 'ID viaje', 'Fecha salida', 'Estado viaje', 'Bus', 'Conductor', 'Origen', 'Destino',
+    'Km inicial', 'Km final', 'Recargas', 'Litros cargados', 'Combustible', 'Mantenimiento', 'Peajes',
+    'Otros costos', 'Costo total', 'Ganancia neta', 'Observaciones',
+]
+
+
+def filas_costos(queryset):
+    """Filas de ENCABEZADOS_COSTOS para los CostosViaje de `queryset`, leídas por lotes."""
+    recargas = PuntoRecarga.objects.filter(costos_viaje=OuterRef('pk')).values('costos_viaje')
+    queryset = queryset.annotate(
+        total_recargas=Subquery(recargas.annotate(total=Count('pk')).values('total')),
+        total_litros=Subquery(recargas.annotate(total=Sum('litros_cargados')).values('total')),
+    )
+    campos = [
+        'pk', 'viaje_id', 'viaje__fecha_salida', 'viaje__estado', 'viaje__bus__placa',
+        'viaje__conductor__nombre', 'viaje__conductor__apellido', *[f'viaje__{campo}' for campo in CAMPOS_RUTA],
+        'km_inicial', 'km_final', 'total_recargas', 'total_litros', 'combustible', 'mantenimiento', 'peajes',
+        'otros_costos', 'costo_total', 'ganancia_neta', 'observaciones',
+    ]
+    for pk, viaje_id, salida, estado, placa, nombre, apellido, *resto in iterar_por_lotes(queryset, campos):
+        ruta, (km_inicial, km_final, total_recargas, *montos) = resto[:len(CAMPOS_RUTA)], resto[len(CAMPOS_RUTA):]
+        yield [
+            pk, viaje_id, salida, ESTADOS.get(estado, estado), placa or 'Sin bus', f'{nombre} {apellido}',
+            *ruta_display(ruta), km_inicial, km_final, total_recargas or 0, *montos,
+        ]
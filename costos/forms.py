@@ -1,6 +1,10 @@
+from datetime import datetime, timedelta
+
 from django import forms
-from .models import CostosViaje, PuntoRecarga
+from django.utils import timezone
+from .models import AnomaliaConsumo, CostosViaje, PuntoRecarga
 from viajes.models import Viaje
+from flota.models import Bus
 from django.forms import formset_factory
 
 
@@ -33,10 +37,12 @@ class CostosViajeForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # Las opciones muestran bus y lugares del viaje: se leen en la misma consulta
+        self.fields['viaje'].queryset = Viaje.objects.select_related('bus', 'lugar_origen', 'lugar_destino')
         # Filtrar solo viajes que no tengan costos asignados (si es creación)
         if not self.instance.pk:
             viajes_con_costos = CostosViaje.objects.values_list('viaje_id', flat=True)
-            self.fields['viaje'].queryset = Viaje.objects.exclude(id__in=viajes_con_costos)
+            self.fields['viaje'].queryset = self.fields['viaje'].queryset.exclude(id__in=viajes_con_costos)
 
         # Filtrar mantenimientos por bus del viaje seleccionado
         from flota.models import Mantenimiento
@@ -46,13 +52,13 @@ class CostosViajeForm(forms.ModelForm):
                 viaje_id = int(self.data.get('viaje'))
                 from flota.models import Mantenimiento, Bus
                 bus = Viaje.objects.get(pk=viaje_id).bus
-                self.fields['mantenimientos'].queryset = Mantenimiento.objects.filter(bus=bus)
+                self.fields['mantenimientos'].queryset = Mantenimiento.objects.filter(bus=bus).select_related('bus')
             except Exception:
                 self.fields['mantenimientos'].queryset = Mantenimiento.objects.none()
         elif self.instance.pk and self.instance.viaje:
             bus = self.instance.viaje.bus
             from flota.models import Mantenimiento
-            self.fields['mantenimientos'].queryset = Mantenimiento.objects.filter(bus=bus)
+            self.fields['mantenimientos'].queryset = Mantenimiento.objects.filter(bus=bus).select_related('bus')
 
 
 class PuntoRecargaForm(forms.ModelForm):
@@ -201,6 +207,62 @@ class PuntoRecargaFormularioForm(forms.Form):
     precio = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '0', 'placeholder': 'Precio/litro en pesos'}))
 
 
+class FiltroCostosForm(forms.Form):
+    """Filtros del listado de costos registrados (fecha de salida, bus y estado del viaje)."""
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}), label='Desde')
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}), label='Hasta')
+    bus = forms.ModelChoiceField(queryset=Bus.objects.order_by('placa'), required=False,
+                                 empty_label='Todos', widget=forms.Select(attrs={'class': 'form-control'}), label='Bus')
+    estado = forms.ChoiceField(choices=[('', 'Todos')] + list(Viaje.ESTADO_VIAJE), required=False,
+                               widget=forms.Select(attrs={'class': 'form-control'}), label='Estado')
+
+    def filtrar(self, queryset):
+        """Aplica los filtros válidos a un queryset de CostosViaje."""
+        if not self.is_valid():
+            return queryset
+        datos = self.cleaned_data
+        # Rango de datetimes (y no __date) para que la consulta use el índice de fecha_salida
+        if datos.get('desde'):
+            queryset = queryset.filter(viaje__fecha_salida__gte=timezone.make_aware(
+                datetime.combine(datos['desde'], datetime.min.time())))
+        if datos.get('hasta'):
+            queryset = queryset.filter(viaje__fecha_salida__lt=timezone.make_aware(
+                datetime.combine(datos['hasta'] + timedelta(days=1), datetime.min.time())))
+        if datos.get('bus'):
+            queryset = queryset.filter(viaje__bus=datos['bus'])
+        if datos.get('estado'):
+            queryset = queryset.filter(viaje__estado=datos['estado'])
+        return queryset
+
+
+class ExportarInformesForm(forms.Form):
+    """Selección de informes de costos para exportar en lote (por rango de fechas o ids)."""
+    FORMATO_CHOICES = [
+        ('zip', 'ZIP (un PDF por viaje)'),
+        ('pdf', 'PDF combinado'),
+    ]
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}), label='Desde')
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}), label='Hasta')
+    ids = forms.CharField(required=False, widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: 12, 15, 20'}), label='IDs de costos')
+    formato = forms.ChoiceField(choices=FORMATO_CHOICES, initial='zip', widget=forms.Select(attrs={'class': 'form-control'}), label='Formato')
+
+    def clean_ids(self):
+        valor = self.cleaned_data.get('ids', '')
+        try:
+            return [int(parte) for parte in valor.replace(';', ',').split(',') if parte.strip()]
+        except ValueError:
+            raise forms.ValidationError('Ingresa los IDs como números separados por coma.')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde, hasta = cleaned_data.get('desde'), cleaned_data.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError('La fecha "desde" no puede ser posterior a "hasta".')
+        if not desde and not hasta and not cleaned_data.get('ids'):
+            raise forms.ValidationError('Indica un rango de fechas o una lista de IDs.')
+        return cleaned_data
+
+
 class CostosViajeFormCompleto(forms.ModelForm):
     """Formulario completo para registrar todos los costos de un viaje en una sola vista."""
 
@@ -233,3 +295,27 @@ class CostosViajeFormCompleto(forms.ModelForm):
                 raise forms.ValidationError('El kilometraje final debe ser mayor al kilometraje inicial.')
         
         return cleaned_data
+
+
+class AnaliticaCostosForm(forms.Form):
+    """Rango de fechas de salida para la analítica de costos."""
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}), label='Desde')
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}), label='Hasta')
+
+
+class FiltroAnomaliasForm(forms.Form):
+    """Filtros del listado de anomalías de consumo (bus y tipo)."""
+    bus = forms.ModelChoiceField(queryset=Bus.objects.order_by('placa'), required=False,
+                                 empty_label='Todos', widget=forms.Select(attrs={'class': 'form-control'}), label='Bus')
+    tipo = forms.ChoiceField(choices=[('', 'Todos')] + AnomaliaConsumo.TIPO_CHOICES, required=False,
+                             widget=forms.Select(attrs={'class': 'form-control'}), label='Tipo')
+
+    def filtrar(self, queryset):
+        """Aplica los filtros válidos a un queryset de AnomaliaConsumo."""
+        if not self.is_valid():
+            return queryset
+        if self.cleaned_data.get('bus'):
+            queryset = queryset.filter(bus=self.cleaned_data['bus'])
+        if self.cleaned_data.get('tipo'):
+            queryset = queryset.filter(tipo=self.cleaned_data['tipo'])
+        return queryset
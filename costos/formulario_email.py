@@ -0,0 +1,55 @@
+"""
+Formulario de costos que se envía por correo al conductor de un viaje.
+
+El correo no se envía dentro de la petición: la vista registra un CorreoFormulario
+y encola la tarea 'costos.enviar_formulario' (ver costos/tareas.py), que genera
+el PDF y lo entrega con reintentos y límite de envíos por minuto.
+"""
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from .formulario_pdf import formulario_costos_pdf
+
+
+def construir_correo_formulario(viaje, destinatario, connection=None):
+    """Correo para el conductor con el formulario de costos del viaje adjunto."""
+    conductor = viaje.conductor
+    subject = f'Formulario de Costos - Viaje {viaje.bus.placa} ({viaje.fecha_salida.strftime("%d/%m/%Y")})'
+    body = f"""Estimado/a {conductor.nombre} {conductor.apellido},
+
+Por medio de la presente, adjunto encontrará el formulario para el registro de los costos correspondientes al viaje asignado.
+
+DETALLES DEL VIAJE:
+- Bus: {viaje.bus.placa} - {viaje.bus.modelo}
+- Ruta: {viaje.get_origen_display()} a {viaje.get_destino_display()}
+- Fecha de salida: {viaje.fecha_salida.strftime('%d/%m/%Y %H:%M')}
+- Estado: {viaje.get_estado_display()}
+
+INSTRUCCIONES PARA COMPLETAR EL FORMULARIO:
+
+Para editar el formulario PDF en dispositivos móviles (celulares o tablets), es necesario contar con una aplicación compatible. Las aplicaciones recomendadas son:
+
+- Adobe Acrobat Reader
+- Xodo PDF (recomendado para Android)
+- Foxit PDF
+
+Puede descargar estas aplicaciones desde:
+- Android: Google Play Store
+- iOS: Apple App Store
+
+Por favor, complete el formulario con todos los costos del viaje y envíelo de vuelta a la brevedad posible.
+
+Quedamos atentos a cualquier consulta.
+
+Cordialmente,
+Sistema de Gestión de Flota - FlotaGest"""
+    
+    email = EmailMessage(
+        subject=subject,
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[destinatario],
+        connection=connection,
+    )
+    email.attach(f'formulario_costos_viaje_{viaje.id}.pdf', formulario_costos_pdf(viaje, 'correo'), 'application/pdf')
+    return email
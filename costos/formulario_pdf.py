@@ -0,0 +1,465 @@
+"""
+Formulario PDF de costos de viaje, para descargar o enviar por correo al conductor.
+
+Casi todo el formulario es fijo: títulos, tablas y unos 170 campos AcroForm, cuya
+serialización es lo que más cuesta al generarlo con ReportLab. Esa parte fija se
+genera una sola vez por versión del diseño y variante y queda en memoria; cada
+formulario se arma agregándole una actualización incremental de PDF (nuevos
+objetos y una sección xref que apunta a la anterior) con los datos del viaje:
+bus, ruta, conductor, fecha, kilometraje inicial y fecha de generación.
+
+Al cambiar el diseño (_dibujar_plantilla) se debe incrementar VERSION_DISENO.
+"""
+import io
+from datetime import datetime
+from functools import lru_cache
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, TextStringObject
+from reportlab.lib import colors
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas as pdf_canvas
+
+from .models import CostosViaje
+
+VERSION_DISENO = 1
+
+# Pie de página de cada variante: líneas fijas (fuente, tamaño, color, y, texto) y
+# altura de la línea variable "Formulario generado el ..."
+VARIANTES = {
+    'descarga': {
+        'pie': [
+            ('Helvetica-Oblique', 8, colors.grey, 20,
+             "PDF interactivo - Complete los campos directamente en Adobe Reader, Foxit o cualquier visor PDF"),
+        ],
+        'y_generado': 30,
+    },
+    'correo': {
+        'pie': [
+            ('Helvetica-Bold', 9, HexColor('#dc2626'), 40,
+             "📱 IMPORTANTE: Para editar en celulares necesitas Adobe Acrobat Reader, Xodo PDF o Foxit PDF"),
+            ('Helvetica-Oblique', 8, colors.grey, 17, "Android: Descarga desde Play Store | iOS: Descarga desde App Store"),
+        ],
+        'y_generado': 27,
+    },
+}
+
+# Altura de cada línea de datos del viaje en la página 1 (Helvetica 10, x = 50)
+Y_DATOS_VIAJE = (677, 659, 641, 623)
+
+# Final de la apariencia vacía que ReportLab genera para el campo km_inicial; el
+# texto del valor se inserta justo antes (depende de la versión de ReportLab)
+MARCA_APARIENCIA = b'Q\nEMC\n'
+
+
+def datos_formulario(viaje):
+    """Textos propios del viaje que van sobre la plantilla."""
+    costos_viaje = CostosViaje.objects.filter(viaje=viaje).first()
+    km_inicial = costos_viaje.km_inicial if costos_viaje and costos_viaje.km_inicial is not None else ''
+    return {
+        'lineas': [
+            f"Bus: {viaje.bus.placa}    Modelo: {viaje.bus.modelo}",
+            f"Origen: {viaje.get_origen_display()}    Destino: {viaje.get_destino_display()}",
+            f"Conductor: {viaje.conductor.nombre} {viaje.conductor.apellido}",
+            f"Fecha: {viaje.fecha_salida.strftime('%d/%m/%Y')}",
+        ],
+        'km_inicial': str(km_inicial) if km_inicial else '',
+        'generado': f"Formulario generado el {datetime.now().strftime('%d/%m/%Y %H:%M')} - Sistema FlotaGest",
+    }
+
+
+def _dibujar_plantilla(c, variante, km_inicial=''):
+    """Dibuja la parte fija del formulario (las dos páginas, con sus campos editables)."""
+    width, height = letter
+    color_azul = HexColor('#1e40af')
+
+    # PÁGINA 1
+    y = height - 50
+    c.setFillColor(color_azul)
+    c.setFont("Helvetica-Bold", 18)
+    c.drawCentredString(width/2, y, "FORMULARIO DE REGISTRO DE COSTOS DE VIAJE")
+
+    y -= 40
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, y, "INFORMACIÓN DEL VIAJE")
+
+    # Datos del viaje (capa variable, ver _dibujar_datos)
+    y = Y_DATOS_VIAJE[-1]
+
+    y -= 25
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(50, y, "Kilometraje Inicial:")
+    c.drawString(300, y, "Kilometraje Final:")
+
+    form = c.acroForm
+    y_campo = y - 18
+
+    form.textfield(name='km_inicial', tooltip='Kilometraje Inicial', x=180, y=y_campo, width=100, height=18,
+                  borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white,
+                  textColor=colors.black, forceBorder=True, value=km_inicial)
+
+    form.textfield(name='km_final', tooltip='Kilometraje Final', x=430, y=y_campo, width=100, height=18,
+                  borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white,
+                  textColor=colors.black, forceBorder=True)
+
+    # TABLA RECARGAS
+    y = y_campo - 30
+    c.setFont("Helvetica-Bold", 12)
+    c.setFillColor(color_azul)
+    c.drawString(50, y, "PUNTOS DE RECARGA DE COMBUSTIBLE")
+
+    y -= 25
+    c.setFillColor(color_azul)
+    c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica-Bold", 8)
+    headers = ['N°', 'Lugar', 'Sucursal', 'KM', 'Fecha', 'Litros', 'Precio']
+    x_pos = [55, 85, 175, 255, 310, 370, 430]
+    for i, header in enumerate(headers):
+        c.drawString(x_pos[i], y - 12, header)
+
+    y -= 18
+    c.setFillColor(colors.black)
+
+    for i in range(1, 10):
+        y -= 22
+        c.setFont("Helvetica", 8)
+        c.drawString(58, y + 5, str(i))
+        form.textfield(name=f'recarga_lugar_{i}', x=80, y=y, width=90, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'recarga_sucursal_{i}', x=172, y=y, width=80, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'recarga_km_{i}', x=254, y=y, width=50, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'recarga_fecha_{i}', x=306, y=y, width=60, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'recarga_litros_{i}', x=368, y=y, width=60, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'recarga_precio_{i}', x=430, y=y, width=60, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+
+    y -= 25
+    c.setFont("Helvetica-Oblique", 7)
+    c.setFillColor(colors.grey)
+    c.drawString(50, y, "* Sucursal: COPEC, Shell, Petrobras, ENEX, Terpel, Otro")
+
+    # TABLA MANTENIMIENTOS
+    y -= 25
+    c.setFont("Helvetica-Bold", 12)
+    c.setFillColor(color_azul)
+    c.drawString(50, y, "MANTENIMIENTOS")
+
+    y -= 25
+    c.setFillColor(color_azul)
+    c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica-Bold", 7)
+    headers_mant = ['N°', 'Fecha', 'Tipo', 'Descripción', 'Costo', 'Proveedor', 'KM', 'Taller']
+    x_pos_mant = [55, 80, 130, 180, 290, 340, 420, 455]
+    for i, header in enumerate(headers_mant):
+        c.drawString(x_pos_mant[i], y - 12, header)
+
+    y -= 18
+    c.setFillColor(colors.black)
+
+    for i in range(1, 6):
+        y -= 22
+        c.setFont("Helvetica", 7)
+        c.drawString(58, y + 5, str(i))
+        form.textfield(name=f'mant_fecha_{i}', x=75, y=y, width=50, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'mant_tipo_{i}', x=127, y=y, width=50, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'mant_desc_{i}', x=179, y=y, width=108, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'mant_costo_{i}', x=289, y=y, width=48, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'mant_prov_{i}', x=339, y=y, width=78, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'mant_km_{i}', x=419, y=y, width=33, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'mant_taller_{i}', x=454, y=y, width=88, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+
+    c.showPage()
+
+    # PÁGINA 2
+    y = height - 50
+    c.setFont("Helvetica-Bold", 14)
+    c.setFillColor(color_azul)
+    c.drawString(50, y, "REGISTRO DE PEAJES")
+
+    y -= 30
+    c.setFillColor(color_azul)
+    c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(60, y - 12, "N°")
+    c.drawString(120, y - 12, "Lugar")
+    c.drawString(350, y - 12, "Monto (CLP)")
+    c.drawString(460, y - 12, "Fecha")
+
+    y -= 18
+    c.setFillColor(colors.black)
+
+    for i in range(1, 10):
+        y -= 22
+        c.setFont("Helvetica", 9)
+        c.drawString(63, y + 5, str(i))
+        form.textfield(name=f'peaje_lugar_{i}', x=90, y=y, width=255, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'peaje_monto_{i}', x=347, y=y, width=110, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'peaje_fecha_{i}', x=459, y=y, width=85, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+
+    # OTROS COSTOS
+    y -= 35
+    c.setFont("Helvetica-Bold", 12)
+    c.setFillColor(color_azul)
+    c.drawString(50, y, "OTROS COSTOS")
+
+    y -= 25
+    c.setFillColor(color_azul)
+    c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(60, y - 12, "N°")
+    c.drawString(120, y - 12, "Tipo de Costo")
+    c.drawString(280, y - 12, "Descripción")
+    c.drawString(470, y - 12, "Monto")
+
+    y -= 18
+    c.setFillColor(colors.black)
+
+    for i in range(1, 6):
+        y -= 22
+        c.setFont("Helvetica", 9)
+        c.drawString(63, y + 5, str(i))
+        form.textfield(name=f'otro_tipo_{i}', x=90, y=y, width=185, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'otro_desc_{i}', x=277, y=y, width=185, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+        form.textfield(name=f'otro_monto_{i}', x=464, y=y, width=80, height=18,
+                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
+
+    # OBSERVACIONES
+    y -= 35
+    c.setFont("Helvetica-Bold", 11)
+    c.setFillColor(color_azul)
+    c.drawString(50, y, "OBSERVACIONES GENERALES")
+
+    y -= 15
+    form.textfield(name='observaciones', tooltip='Observaciones generales del viaje',
+                  x=50, y=y - 65, width=width - 100, height=70,
+                  borderStyle='solid', borderWidth=1, borderColor=colors.grey,
+                  fillColor=colors.white, textColor=colors.black, forceBorder=True)
+
+    # FIRMA
+    y -= 95
+    c.setStrokeColor(colors.black)
+    c.setLineWidth(1)
+    c.line(80, y, 250, y)
+    c.line(350, y, 520, y)
+
+    c.setFont("Helvetica", 9)
+    c.setFillColor(colors.black)
+    c.drawCentredString(165, y - 15, "Firma del Conductor")
+    c.drawCentredString(435, y - 15, "Fecha")
+
+    # Footer
+    for fuente, tamano, color, y_pie, texto in VARIANTES[variante]['pie']:
+        c.setFont(fuente, tamano)
+        c.setFillColor(color)
+        c.drawCentredString(width/2, y_pie, texto)
+
+
+def renderizar_completo(viaje, variante):
+    """
+    Genera el formulario entero con ReportLab, sin usar la plantilla en memoria.
+    Es la referencia con la que se compara la versión en caché (ver tests_rendimiento).
+    """
+    datos = datos_formulario(viaje)
+    buffer = io.BytesIO()
+    c = pdf_canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    # Los datos del viaje quedan bajo la plantilla, igual que en la versión en caché
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica", 10)
+    for y, linea in zip(Y_DATOS_VIAJE, datos['lineas']):
+        c.drawString(50, y, linea)
+    _dibujar_plantilla(c, variante, datos['km_inicial'])
+    c.setFont("Helvetica-Oblique", 8)
+    c.setFillColor(colors.grey)
+    c.drawCentredString(width/2, VARIANTES[variante]['y_generado'], datos['generado'])
+    c.save()
+    return buffer.getvalue()
+
+
+def _serializar(objeto):
+    salida = io.BytesIO()
+    objeto.write_to_stream(salida, None)
+    return salida.getvalue()
+
+
+def _texto_pdf(texto):
+    """Cadena literal de PDF (WinAnsi) con los caracteres especiales escapados."""
+    datos = texto.encode('cp1252', 'replace')
+    return b'(' + datos.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _stream(contenido, diccionario=b''):
+    return b'<< ' + diccionario + b' /Length %d >>\nstream\n' % len(contenido) + contenido + b'\nendstream'
+
+
+class _Plantilla:
+    """
+    PDF de la parte fija de una variante, ya generado, más lo necesario para
+    agregarle una actualización incremental: números de objeto, diccionarios de
+    página reescritos (con la capa de datos en /Contents) y el campo km_inicial.
+    """
+
+    def __init__(self, variante):
+        buffer = io.BytesIO()
+        c = pdf_canvas.Canvas(buffer, pagesize=letter)
+        _dibujar_plantilla(c, variante)
+        c.save()
+        self.variante = variante
+        self.pdf = buffer.getvalue()
+        self.xref_anterior = int(self.pdf[self.pdf.rindex(b'startxref') + len('startxref'):].split()[0])
+
+        lector = PdfReader(io.BytesIO(self.pdf))
+        trailer = lector.trailer
+        self.tamano = trailer['/Size']
+        # Objetos nuevos: dos fuentes, el "q" que aísla el contenido original,
+        # la capa de datos de cada página y la apariencia de km_inicial
+        n = self.tamano
+        self.fuente_normal, self.fuente_oblicua, self.num_q = n, n + 1, n + 2
+        self.num_capas = [n + 3 + i for i in range(len(lector.pages))]
+        self.num_apariencia = n + 3 + len(lector.pages)
+        self.tamano_final = self.num_apariencia + 1
+        self.trailer = (
+            b'/Root ' + _serializar(dict.__getitem__(trailer, '/Root'))
+            + b' /Info ' + _serializar(dict.__getitem__(trailer, '/Info'))
+            + b' /ID ' + _serializar(dict.__getitem__(trailer, '/ID'))
+        )
+
+        # Parte fija de la actualización: fuentes, "q" y páginas reescritas
+        objetos = [
+            (self.fuente_normal, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'),
+            (self.fuente_oblicua,
+             b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Oblique /Encoding /WinAnsiEncoding >>'),
+            (self.num_q, _stream(b'q\n')),
+        ]
+        for pagina, num_capa in zip(lector.pages, self.num_capas):
+            nueva = DictionaryObject(dict.items(pagina))
+            contenido = dict.__getitem__(pagina, '/Contents')
+            contenido = list(contenido) if isinstance(contenido, ArrayObject) else [contenido]
+            nueva[NameObject('/Contents')] = ArrayObject(
+                [IndirectObject(self.num_q, 0, lector), *contenido, IndirectObject(num_capa, 0, lector)])
+            recursos = DictionaryObject(dict.items(pagina['/Resources']))
+            fuentes = DictionaryObject(dict.items(recursos['/Font']))
+            fuentes[NameObject('/FV1')] = IndirectObject(self.fuente_normal, 0, lector)
+            fuentes[NameObject('/FV2')] = IndirectObject(self.fuente_oblicua, 0, lector)
+            recursos[NameObject('/Font')] = fuentes
+            nueva[NameObject('/Resources')] = recursos
+            objetos.append((pagina.indirect_reference.idnum, _serializar(nueva)))
+        self.fijo, self.posiciones_fijas = self._objetos(objetos, 0)
+
+        # Campo km_inicial: se reescribe con su valor y una apariencia nueva
+        for referencia in trailer['/Root']['/AcroForm']['/Fields']:
+            campo = referencia.get_object()
+            if campo['/T'] == 'km_inicial':
+                break
+        self.num_campo = referencia.idnum
+        self.campo = DictionaryObject(dict.items(campo))
+        self.campo[NameObject('/AP')] = DictionaryObject(
+            {NameObject('/N'): IndirectObject(self.num_apariencia, 0, lector)})
+        apariencia = campo['/AP']['/N'].get_object()
+        self.apariencia = b' '.join(
+            _serializar(NameObject(clave)) + b' ' + _serializar(valor)
+            for clave, valor in dict.items(apariencia) if clave not in ('/Filter', '/Length', '/DecodeParms')
+        )
+        self.apariencia_vacia = apariencia.get_data()
+        if self.apariencia_vacia.count(MARCA_APARIENCIA) != 1:
+            raise RuntimeError(
+                'La apariencia del campo km_inicial no tiene el formato esperado; '
+                'revise MARCA_APARIENCIA para esta versión de ReportLab.')
+
+    @staticmethod
+    def _objetos(objetos, inicio):
+        """Serializa (número, cuerpo); retorna los bytes y {número: posición desde `inicio`}."""
+        partes, posiciones = [], {}
+        for numero, cuerpo in objetos:
+            posiciones[numero] = inicio + sum(len(parte) for parte in partes)
+            partes.append(b'%d 0 obj\n' % numero + cuerpo + b'\nendobj\n')
+        return b''.join(partes), posiciones
+
+    def _capas(self, datos):
+        """Contenido de la capa de datos de cada página."""
+        # Página 1: datos del viaje (Helvetica 10, negro)
+        lineas = b''.join(
+            b'1 0 0 1 50 %d Tm %s Tj\n' % (y, _texto_pdf(linea)) for y, linea in zip(Y_DATOS_VIAJE, datos['lineas'])
+        )
+        primera = b'\nQ\nBT\n/FV1 10 Tf\n0 0 0 rg\n' + lineas + b'ET'
+        # Última página: fecha de generación centrada (Helvetica-Oblique 8, gris)
+        ancho = stringWidth(datos['generado'], 'Helvetica-Oblique', 8)
+        x = letter[0] / 2 - ancho / 2
+        ultima = (b'\nQ\nBT\n/FV2 8 Tf\n.501961 .501961 .501961 rg\n1 0 0 1 %s %d Tm %s Tj\nET' % (
+            ('%.3f' % x).encode(), VARIANTES[self.variante]['y_generado'], _texto_pdf(datos['generado'])))
+        capas = [b'\nQ'] * len(self.num_capas)
+        capas[0], capas[-1] = primera, ultima
+        return capas
+
+    def completar(self, datos):
+        """PDF final: la plantilla más una actualización incremental con los datos del viaje."""
+        km_inicial = datos['km_inicial']
+        campo = DictionaryObject(self.campo)
+        campo[NameObject('/V')] = TextStringObject(km_inicial)
+        campo[NameObject('/DV')] = TextStringObject(km_inicial)
+        apariencia = self.apariencia_vacia
+        if km_inicial:
+            apariencia = apariencia.replace(
+                MARCA_APARIENCIA,
+                b'BT\n/Helv 12 Tf\n0 0 0 rg\n1 0 0 1 4 4 Tm\n' + _texto_pdf(km_inicial) + b' Tj\nET\n' + MARCA_APARIENCIA)
+
+        objetos = [(num, _stream(capa)) for num, capa in zip(self.num_capas, self._capas(datos))]
+        objetos.append((self.num_apariencia, _stream(apariencia, self.apariencia)))
+        objetos.append((self.num_campo, _serializar(campo)))
+        inicio = len(self.pdf) + len(self.fijo)
+        variable, posiciones = self._objetos(objetos, inicio)
+        posiciones.update({num: len(self.pdf) + pos for num, pos in self.posiciones_fijas.items()})
+
+        # Tabla xref: la cabeza de la lista de objetos libres (como en la tabla
+        # original) y una subsección por cada grupo de números consecutivos
+        xref = [b'xref\n0 1\n0000000000 65535 f \n']
+        numeros = sorted(posiciones)
+        grupo = [numeros[0]]
+        for numero in numeros[1:] + [None]:
+            if numero is not None and numero == grupo[-1] + 1:
+                grupo.append(numero)
+                continue
+            xref.append(b'%d %d\n' % (grupo[0], len(grupo)))
+            xref.extend(b'%010d 00000 n \n' % posiciones[num] for num in grupo)
+            grupo = [numero]
+        inicio_xref = inicio + len(variable)
+        xref.append(b'trailer\n<< /Size %d %s /Prev %d >>\nstartxref\n%d\n%%%%EOF\n' % (
+            self.tamano_final, self.trailer, self.xref_anterior, inicio_xref))
+        return b''.join([self.pdf, self.fijo, variable, *xref])
+
+
+@lru_cache(maxsize=None)
+def _plantilla(variante, version):
+    return _Plantilla(variante)
+
+
+def formulario_costos_pdf(viaje, variante='descarga'):
+    """
+    PDF (bytes) con campos editables para que el conductor registre los costos
+    del viaje. `variante` es 'descarga' o 'correo' (cambia el pie de página).
+    """
+    return _plantilla(variante, VERSION_DISENO).completar(datos_formulario(viaje))
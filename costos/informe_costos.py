@@ -9,17 +9,31 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
 from datetime import datetime
 from .models import CostosViaje
 
+def nombre_informe_costos(costos):
+    """Nombre de archivo del informe de costos de un viaje."""
+    return f'informe_costos_viaje_{costos.viaje_id}_{datetime.now().strftime("%Y%m%d")}.pdf'
+
+
 def informe_costos_pdf(request, costos_pk):
     costos = get_object_or_404(CostosViaje, pk=costos_pk)
+    
+    response = HttpResponse(content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_informe_costos(costos)}"'
+    construir_informe_costos(costos, response)
+    return response
+
+
+def construir_informe_costos(costos, destino):
+    """
+    Genera el informe PDF de costos de un viaje y lo escribe en `destino`
+    (cualquier objeto tipo archivo: HttpResponse, BytesIO, archivo en disco).
+    """
     viaje = costos.viaje
     bus = viaje.bus
     conductor = viaje.conductor
     
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="informe_costos_viaje_{viaje.id}_{datetime.now().strftime("%Y%m%d")}.pdf"'
-    
     doc = SimpleDocTemplate(
-        response,
+        destino,
         pagesize=letter,
         rightMargin=40,
         leftMargin=40,
@@ -122,7 +136,7 @@ def informe_costos_pdf(request, costos_pk):
         ["Kilometraje Recorrido", f"{km_recorridos:,.2f} km"],
         ["Combustible Consumido", f"{total_litros:,.2f} litros"],
         ["Consumo Promedio", f"{consumo_promedio:,.1f} km/L" if consumo_promedio > 0 else "N/A"],
-        ["Número de Pasajeros", f"{viaje.get_pasajeros_count()} / {bus.capacidad_pasajeros}"],
+        ["Número de Pasajeros", f"{viaje.pasajeros_confirmados} / {bus.capacidad_pasajeros}"],
     ]
     
     resumen_table = Table(resumen_ejecutivo, colWidths=[3*inch, 3*inch])
@@ -541,4 +555,4 @@ def informe_costos_pdf(request, costos_pk):
     
     # Construir el PDF
     doc.build(elements)
-    return response
+    return destino
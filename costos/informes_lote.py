@@ -0,0 +1,149 @@
+"""
+Exportación en lote de informes de costos (cierre de mes).
+
+Los informes se entregan como un ZIP que se va escribiendo a medida que terminan,
+o como un único PDF combinado. La vista los genera uno a uno dentro de la petición;
+el comando exportar_informes_costos puede generarlos en paralelo en un pool de
+procesos (ReportLab es CPU-bound).
+"""
+import io
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+from core.exportacion import SalidaStreaming
+
+from .informe_costos import construir_informe_costos, nombre_informe_costos
+from .models import CostosViaje
+
+
+def seleccionar_costos(desde=None, hasta=None, ids=None):
+    """
+    Retorna los ids de CostosViaje a exportar, filtrando por fecha de salida
+    del viaje (`desde`/`hasta`, inclusive) y/o por una lista de ids.
+    """
+    queryset = CostosViaje.objects.all()
+    if ids:
+        queryset = queryset.filter(pk__in=ids)
+    if desde:
+        queryset = queryset.filter(viaje__fecha_salida__date__gte=desde)
+    if hasta:
+        queryset = queryset.filter(viaje__fecha_salida__date__lte=hasta)
+    return list(queryset.order_by('viaje__fecha_salida', 'pk').values_list('pk', flat=True))
+
+
+def renderizar_informe(costos_pk):
+    """Genera el informe de un CostosViaje. Retorna (nombre_archivo, contenido_pdf)."""
+    costos = CostosViaje.objects.select_related('viaje__bus', 'viaje__conductor').get(pk=costos_pk)
+    buffer = io.BytesIO()
+    construir_informe_costos(costos, buffer)
+    return nombre_informe_costos(costos), buffer.getvalue()
+
+
+def _inicializar_worker():
+    """Prepara Django en cada proceso del pool (necesario con los métodos spawn/forkserver)."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def workers_por_defecto():
+    return getattr(settings, 'INFORMES_LOTE_WORKERS', None) or 1
+
+
+def generar_informes(costos_ids, workers=None, progreso=None):
+    """
+    Genera los informes y los entrega (nombre, pdf) a medida que terminan.
+
+    Con `workers` > 1 usa un pool de procesos; como mucho hay `workers * 2`
+    informes en vuelo para mantener acotada la memoria. `progreso(hechos, total, nombre)`
+    se llama después de cada informe.
+    """
+    workers = workers or workers_por_defecto()
+    total = len(costos_ids)
+
+    if workers <= 1 or total <= 1:
+        for hechos, pk in enumerate(costos_ids, 1):
+            nombre, contenido = renderizar_informe(pk)
+            if progreso:
+                progreso(hechos, total, nombre)
+            yield nombre, contenido
+        return
+
+    # Los procesos hijos no deben heredar conexiones abiertas a la base de datos
+    connections.close_all()
+    pendientes_ids = iter(costos_ids)
+    hechos = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as pool:
+        en_vuelo = set()
+        for pk in pendientes_ids:
+            en_vuelo.add(pool.submit(renderizar_informe, pk))
+            if len(en_vuelo) >= workers * 2:
+                break
+        while en_vuelo:
+            terminados, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre, contenido = futuro.result()
+                hechos += 1
+                if progreso:
+                    progreso(hechos, total, nombre)
+                yield nombre, contenido
+                siguiente = next(pendientes_ids, None)
+                if siguiente is not None:
+                    en_vuelo.add(pool.submit(renderizar_informe, siguiente))
+
+
+def zip_en_streaming(informes):
+    """
+    Genera los bytes de un ZIP con los informes a medida que se producen,
+    para usarlo en un StreamingHttpResponse.
+    """
+    salida = SalidaStreaming()
+    with zipfile.ZipFile(salida, mode='w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        for nombre, contenido in _nombres_unicos(informes):
+            archivo_zip.writestr(nombre, contenido)
+            datos = salida.vaciar()
+            if datos:
+                yield datos
+    datos = salida.vaciar()
+    if datos:
+        yield datos
+
+
+def escribir_zip(informes, destino):
+    """Escribe los informes en un ZIP en `destino` (ruta o archivo). Retorna la cantidad."""
+    cantidad = 0
+    with zipfile.ZipFile(destino, mode='w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        for nombre, contenido in _nombres_unicos(informes):
+            archivo_zip.writestr(nombre, contenido)
+            cantidad += 1
+    return cantidad
+
+
+def combinar_pdf(informes, destino):
+    """Combina los informes en un único PDF escrito en `destino`. Retorna la cantidad."""
+    from PyPDF2 import PdfWriter
+
+    escritor = PdfWriter()
+    cantidad = 0
+    for _, contenido in informes:
+        escritor.append(io.BytesIO(contenido))
+        cantidad += 1
+    escritor.write(destino)
+    return cantidad
+
+
+def _nombres_unicos(informes):
+    """Evita nombres repetidos dentro del ZIP (el nombre incluye solo el id del viaje)."""
+    usados = set()
+    for nombre, contenido in informes:
+        base, extension = nombre.rsplit('.', 1)
+        candidato, n = nombre, 1
+        while candidato in usados:
+            n += 1
+            candidato = f'{base}_{n}.{extension}'
+        usados.add(candidato)
+        yield candidato, contenido
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from costos.anomalias import detectar_anomalias
+
+
+class Command(BaseCommand):
+    help = ('Recalcula las anomalías de rendimiento de combustible (km/L) de toda la flota o de los buses '
+            'indicados. Las recargas nuevas se evalúan solas mediante la cola de tareas.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bus', type=int, action='append', dest='buses',
+                            help='ID del bus a recalcular (se puede repetir). Por defecto, todos.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        creadas, actualizadas, eliminadas = detectar_anomalias(options['buses'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Anomalías de consumo: {creadas} nuevas, {actualizadas} actualizadas, {eliminadas} eliminadas '
+            f'({time.perf_counter() - inicio:.1f} s).'
+        ))
@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from costos.informes_lote import combinar_pdf, escribir_zip, generar_informes, seleccionar_costos
+
+
+class Command(BaseCommand):
+    help = 'Exporta en lote los informes de costos (ZIP o PDF combinado) generándolos en paralelo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help='Fecha de salida inicial (AAAA-MM-DD).')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Fecha de salida final (AAAA-MM-DD).')
+        parser.add_argument('--ids', type=int, nargs='+', help='IDs de CostosViaje a exportar.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Procesos en paralelo (por defecto INFORMES_LOTE_WORKERS).')
+        parser.add_argument('--formato', choices=['zip', 'pdf'], default='zip', help='ZIP con un PDF por viaje o un PDF combinado.')
+        parser.add_argument('--salida', required=True, help='Ruta del archivo a generar.')
+
+    def handle(self, *args, **options):
+        if not (options['desde'] or options['hasta'] or options['ids']):
+            raise CommandError('Indica --desde/--hasta o --ids.')
+
+        costos_ids = seleccionar_costos(options['desde'], options['hasta'], options['ids'])
+        if not costos_ids:
+            raise CommandError('No hay costos registrados para los criterios indicados.')
+
+        self.stdout.write(f'Generando {len(costos_ids)} informe(s)...')
+
+        def progreso(hechos, total, nombre):
+            self.stdout.write(f'  [{hechos}/{total}] {nombre}')
+
+        informes = generar_informes(costos_ids, workers=options['workers'], progreso=progreso)
+        if options['formato'] == 'pdf':
+            with open(options['salida'], 'wb') as destino:
+                cantidad = combinar_pdf(informes, destino)
+        else:
+            cantidad = escribir_zip(informes, options['salida'])
+
+        self.stdout.write(self.style.SUCCESS(f'{cantidad} informe(s) exportado(s) en {options["salida"]}'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0011_alter_costosviaje_combustible_and_more'),
+        ('flota', '0007_alter_mantenimiento_costo'),
+        ('viajes', '0008_distanciarutacache'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='costosviaje',
+            index=models.Index(fields=['-costo_total'], name='costos_costo_total_idx'),
+        ),
+    ]
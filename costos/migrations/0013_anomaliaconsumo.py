@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0012_costosviaje_costos_costo_total_idx'),
+        ('flota', '0007_alter_mantenimiento_costo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomaliaConsumo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(help_text='Fecha de salida del viaje')),
+                ('tipo', models.CharField(choices=[('rendimiento_bajo', 'Rendimiento bajo (posible robo de combustible o falla mecánica)'), ('rendimiento_alto', 'Rendimiento alto (posible error de odómetro o recarga no registrada)'), ('kilometraje_negativo', 'Kilometraje menor al del punto anterior (error de odómetro)')], max_length=30)),
+                ('km_por_litro', models.FloatField(blank=True, help_text='Rendimiento del tramo', null=True)),
+                ('linea_base', models.FloatField(blank=True, help_text='Mediana de km/L de los tramos anteriores del bus', null=True)),
+                ('puntaje', models.FloatField(blank=True, help_text='Puntaje z robusto respecto de la línea base', null=True)),
+                ('detectado_en', models.DateTimeField(auto_now=True)),
+                ('bus', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalias_consumo', to='flota.bus')),
+                ('punto_recarga', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='anomalia', to='costos.puntorecarga')),
+            ],
+            options={
+                'verbose_name': 'Anomalía de Consumo',
+                'verbose_name_plural': 'Anomalías de Consumo',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['-fecha', '-id'], name='costos_anomalia_fecha_idx'), models.Index(fields=['bus', '-fecha', '-id'], name='costos_anomalia_bus_idx')],
+            },
+        ),
+    ]
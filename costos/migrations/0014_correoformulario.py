@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0013_anomaliaconsumo'),
+        ('viajes', '0009_viaje_viaje_creado_en_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoFormulario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('estado', models.CharField(choices=[('pendiente', 'En cola'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('enviado_en', models.DateTimeField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('viaje', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='correos_formulario', to='viajes.viaje')),
+            ],
+            options={
+                'verbose_name': 'Correo de Formulario',
+                'verbose_name_plural': 'Correos de Formulario',
+                'ordering': ['-creado_en'],
+                'indexes': [models.Index(fields=['viaje', '-creado_en'], name='costos_correo_viaje_idx'), models.Index(fields=['estado', 'enviado_en'], name='costos_correo_estado_idx')],
+            },
+        ),
+    ]
@@ -23,6 +23,9 @@ class CostosViaje(models.Model):
     class Meta:
         verbose_name = 'Costo Viaje'
         verbose_name_plural = 'Costos Viajes'
+        indexes = [
+            models.Index(fields=['-costo_total'], name='costos_costo_total_idx'),
+        ]
 
     def calcular_costo_combustible(self):
         """Calcula el costo total de combustible sumando todos los puntos de recarga."""
@@ -64,28 +67,9 @@ class PuntoRecarga(models.Model):
         verbose_name_plural = 'Puntos de Recarga'
 
     def save(self, *args, **kwargs):
-        # Calcular costo total de esta recarga
+        # Calcular costo total de esta recarga. Los kilómetros recorridos dependen de
+        # los demás puntos del viaje: los recalcula costos.services.recalcular_kilometros
         self.costo_total = self.litros_cargados * self.precio_combustible
-
-        # Calcular kilómetros recorridos desde el punto anterior
-        if self.orden == 1:
-            # Primer punto: calcular desde el kilometraje inicial REAL del viaje
-            if self.costos_viaje.km_inicial is not None:
-                self.kilometros_recorridos = self.kilometraje - self.costos_viaje.km_inicial
-            else:
-                # Si no hay km_inicial registrado, no podemos calcular kilómetros recorridos
-                self.kilometros_recorridos = 0
-        else:
-            # Puntos posteriores: calcular desde el punto anterior
-            punto_anterior = PuntoRecarga.objects.filter(
-                costos_viaje=self.costos_viaje,
-                orden__lt=self.orden
-            ).order_by('-orden').first()
-            if punto_anterior:
-                self.kilometros_recorridos = self.kilometraje - punto_anterior.kilometraje
-            else:
-                self.kilometros_recorridos = 0
-
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -111,3 +95,69 @@ class Peaje(models.Model):
 
     def __str__(self):
         return f"Peaje en {self.lugar} - ${self.monto}"
+
+
+class AnomaliaConsumo(models.Model):
+    """
+    Tramo de recarga con un rendimiento (km/L) fuera de lo normal para su bus.
+    La tabla la mantiene costos.anomalias; cada punto de recarga tiene a lo sumo una.
+    """
+    TIPO_CHOICES = [
+        ('rendimiento_bajo', 'Rendimiento bajo (posible robo de combustible o falla mecánica)'),
+        ('rendimiento_alto', 'Rendimiento alto (posible error de odómetro o recarga no registrada)'),
+        ('kilometraje_negativo', 'Kilometraje menor al del punto anterior (error de odómetro)'),
+    ]
+
+    punto_recarga = models.OneToOneField(PuntoRecarga, on_delete=models.CASCADE, related_name='anomalia')
+    bus = models.ForeignKey('flota.Bus', on_delete=models.CASCADE, related_name='anomalias_consumo')
+    fecha = models.DateTimeField(help_text='Fecha de salida del viaje')
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    km_por_litro = models.FloatField(null=True, blank=True, help_text='Rendimiento del tramo')
+    linea_base = models.FloatField(null=True, blank=True, help_text='Mediana de km/L de los tramos anteriores del bus')
+    puntaje = models.FloatField(null=True, blank=True, help_text='Puntaje z robusto respecto de la línea base')
+    detectado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-fecha']
+        verbose_name = 'Anomalía de Consumo'
+        verbose_name_plural = 'Anomalías de Consumo'
+        indexes = [
+            models.Index(fields=['-fecha', '-id'], name='costos_anomalia_fecha_idx'),
+            models.Index(fields=['bus', '-fecha', '-id'], name='costos_anomalia_bus_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.bus.placa} ({self.fecha.date()})"
+
+
+class CorreoFormulario(models.Model):
+    """
+    Envío del formulario de costos al conductor de un viaje (bandeja de salida).
+    Lo entrega en segundo plano la tarea 'costos.enviar_formulario'.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'En cola'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    viaje = models.ForeignKey(Viaje, on_delete=models.CASCADE, related_name='correos_formulario')
+    destinatario = models.EmailField()
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    ultimo_error = models.TextField(blank=True)
+    enviado_en = models.DateTimeField(null=True, blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-creado_en']
+        verbose_name = 'Correo de Formulario'
+        verbose_name_plural = 'Correos de Formulario'
+        indexes = [
+            models.Index(fields=['viaje', '-creado_en'], name='costos_correo_viaje_idx'),
+            models.Index(fields=['estado', 'enviado_en'], name='costos_correo_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Formulario viaje {self.viaje_id} → {self.destinatario} ({self.get_estado_display()})"
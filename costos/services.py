@@ -0,0 +1,38 @@
+"""
+Servicios de costos: recálculo de los puntos de recarga de un viaje.
+"""
+from core.tareas import encolar
+from .models import PuntoRecarga
+
+
+def recalcular_kilometros(costos_viaje):
+    """
+    Recalcula `kilometros_recorridos` y `costo_total` de todos los puntos de recarga
+    de `costos_viaje` en una sola pasada ordenada: el primer punto se mide desde
+    `km_inicial` (0 si no está registrado) y cada uno de los siguientes desde el
+    anterior. Solo se escriben los puntos que cambiaron, con un único bulk_update.
+
+    También actualiza `costos_viaje.combustible` (sin guardarlo), encola la
+    detección de anomalías de consumo del bus y retorna los puntos en orden.
+    """
+    puntos = list(costos_viaje.puntos_recarga.order_by('orden', 'pk'))
+    kilometraje_anterior = costos_viaje.km_inicial
+    modificados = []
+    for punto in puntos:
+        if kilometraje_anterior is None:
+            kilometros = 0
+        else:
+            kilometros = punto.kilometraje - kilometraje_anterior
+        costo = punto.litros_cargados * punto.precio_combustible
+        if punto.kilometros_recorridos != kilometros or punto.costo_total != costo:
+            punto.kilometros_recorridos = kilometros
+            punto.costo_total = costo
+            modificados.append(punto)
+        kilometraje_anterior = punto.kilometraje
+
+    if modificados:
+        PuntoRecarga.objects.bulk_update(modificados, ['kilometros_recorridos', 'costo_total'])
+    costos_viaje.combustible = sum(punto.costo_total for punto in puntos)
+    # Todas las altas, ediciones y bajas de recargas pasan por aquí: el bus se reevalúa en segundo plano
+    encolar('costos.detectar_anomalias', costos_viaje_id=costos_viaje.pk)
+    return puntos
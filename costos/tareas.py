@@ -0,0 +1,61 @@
+"""
+Tareas en segundo plano de la app costos (ver core/tareas.py).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.tareas import TareaPospuesta, tarea
+from .anomalias import detectar_anomalias
+from .formulario_email import construir_correo_formulario
+from .models import CorreoFormulario, CostosViaje
+
+# Ventana del límite de envíos de CORREOS_POR_MINUTO
+VENTANA_LIMITE = timedelta(minutes=1)
+
+
+@tarea('costos.detectar_anomalias')
+def detectar_anomalias_viaje(costos_viaje_id):
+    """Recalcula las anomalías de consumo del bus del viaje cuyas recargas cambiaron."""
+    bus_id = CostosViaje.objects.filter(pk=costos_viaje_id).values_list('viaje__bus_id', flat=True).first()
+    if bus_id is not None:
+        detectar_anomalias([bus_id])
+
+
+def _esperar_limite_envios(ahora):
+    """Pospone la tarea si en el último minuto ya se enviaron CORREOS_POR_MINUTO correos."""
+    limite = getattr(settings, 'CORREOS_POR_MINUTO', 20)
+    recientes = list(CorreoFormulario.objects.filter(
+        estado='enviado', enviado_en__gt=ahora - VENTANA_LIMITE
+    ).order_by('-enviado_en').values_list('enviado_en', flat=True)[:limite])
+    if len(recientes) >= limite:
+        # Se libera un cupo cuando el más antiguo de esos envíos sale de la ventana
+        espera = (recientes[-1] + VENTANA_LIMITE - ahora).total_seconds()
+        raise TareaPospuesta(max(1, int(espera) + 1), 'Límite de correos por minuto alcanzado')
+
+
+@tarea('costos.enviar_formulario')
+def enviar_formulario(correo_id):
+    """Genera el formulario PDF del viaje y lo envía al conductor, registrando el resultado."""
+    correo = CorreoFormulario.objects.select_related(
+        'viaje__bus', 'viaje__conductor', 'viaje__lugar_origen', 'viaje__lugar_destino'
+    ).filter(pk=correo_id).first()
+    if correo is None or correo.estado == 'enviado':
+        return
+    _esperar_limite_envios(timezone.now())
+
+    correo.intentos += 1
+    try:
+        construir_correo_formulario(correo.viaje, correo.destinatario).send()
+    except Exception as e:
+        # La cola reintenta con espera exponencial; el último intento deja el correo como fallido
+        correo.ultimo_error = str(e)[:1000]
+        if correo.intentos >= getattr(settings, 'TAREAS_MAX_INTENTOS', 5):
+            correo.estado = 'fallido'
+        correo.save(update_fields=['intentos', 'ultimo_error', 'estado', 'actualizado_en'])
+        raise
+    correo.estado = 'enviado'
+    correo.enviado_en = timezone.now()
+    correo.ultimo_error = ''
+    correo.save(update_fields=['intentos', 'ultimo_error', 'estado', 'enviado_en', 'actualizado_en'])
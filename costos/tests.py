@@ -1,8 +1,624 @@
-from django.test import TestCase
-from .models import CostosViaje, Peaje
+import csv
+import io
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PyPDF2 import PdfReader
+
+from .analitica import calcular_analitica
+from .anomalias import detectar_anomalias
+from .forms import FiltroCostosForm
+from .formulario_pdf import _Plantilla, formulario_costos_pdf, renderizar_completo
+from .informes_lote import generar_informes, seleccionar_costos, zip_en_streaming
+from .models import AnomaliaConsumo, CorreoFormulario, CostosViaje, Peaje, PuntoRecarga
+from core.models import Conductor, Lugar, Tarea
+from core.tareas import procesar_pendientes
+from flota.models import Bus
+from viajes.models import Viaje
 
 
 class CostosViajeTestCase(TestCase):
     def test_costo_total_calculation(self):
         # Los tests se implementarán después de migrar los modelos
         pass
+
+
+class CostosFixtureMixin:
+    """Crea un bus, un conductor y viajes con costos registrados."""
+    def crear_base(self):
+        self.conductor = Conductor.objects.create(
+            nombre='Juan', apellido='Pérez', cedula='1234567890', email='juan@example.com',
+            telefono='0987654321', fecha_contratacion='2024-01-01'
+        )
+        self.bus = Bus.objects.create(
+            placa='ABC123', modelo='Mercedes Benz', año_fabricacion=2020, capacidad_pasajeros=50,
+            numero_chasis='CH123', numero_motor='MO123', fecha_adquisicion='2020-05-15'
+        )
+        self.origen = Lugar.objects.create(nombre='Quito', ciudad='Quito')
+        self.destino = Lugar.objects.create(nombre='Cuenca', ciudad='Cuenca')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+
+    def crear_costos(self, dias_atras, bus=None, estado='programado'):
+        salida = timezone.now() - timedelta(days=dias_atras)
+        viaje = Viaje.objects.create(
+            bus=bus or self.bus, conductor=self.conductor, lugar_origen=self.origen, lugar_destino=self.destino,
+            fecha_salida=salida, fecha_llegada_estimada=salida + timedelta(hours=8), estado=estado
+        )
+        Peaje.objects.create(viaje=viaje, lugar='Peaje Norte', monto=4000, fecha_pago=salida)
+        return CostosViaje.objects.create(viaje=viaje, combustible=50000, peajes=8000)
+
+
+class ExportarInformesCostosTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        self.costos = [self.crear_costos(dias) for dias in (40, 10, 5)]
+
+    def test_seleccion_por_rango_e_ids(self):
+        hoy = timezone.localdate()
+        self.assertEqual(
+            seleccionar_costos(desde=hoy - timedelta(days=15), hasta=hoy),
+            [self.costos[1].pk, self.costos[2].pk],
+        )
+        self.assertEqual(seleccionar_costos(ids=[self.costos[0].pk]), [self.costos[0].pk])
+
+    def test_zip_en_streaming_con_progreso(self):
+        avances = []
+        ids = [c.pk for c in self.costos]
+        informes = generar_informes(ids, workers=1, progreso=lambda hechos, total, nombre: avances.append((hechos, total)))
+        contenido = b''.join(zip_en_streaming(informes))
+
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo_zip:
+            nombres = archivo_zip.namelist()
+            self.assertEqual(len(nombres), 3)
+            self.assertTrue(archivo_zip.read(nombres[0]).startswith(b'%PDF'))
+        self.assertEqual(avances, [(1, 3), (2, 3), (3, 3)])
+
+    def test_vista_pdf_combinado(self):
+        self.client.force_login(self.admin)
+        ids = ','.join(str(c.pk) for c in self.costos)
+        response = self.client.get(reverse('costos:exportar_informes'), {'ids': ids, 'formato': 'pdf'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertGreaterEqual(len(PdfReader(io.BytesIO(response.content)).pages), 3)
+
+    @override_settings(INFORMES_LOTE_WORKERS=4)
+    def test_vista_no_usa_pool_de_procesos(self):
+        self.client.force_login(self.admin)
+        ids = ','.join(str(c.pk) for c in self.costos)
+        with mock.patch('costos.informes_lote.ProcessPoolExecutor', side_effect=AssertionError('pool en la vista')):
+            response = self.client.get(reverse('costos:exportar_informes'), {'ids': ids, 'formato': 'zip'})
+            contenido = b''.join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo_zip:
+            self.assertEqual(len(archivo_zip.namelist()), len(self.costos))
+
+    def test_vista_sin_criterios_redirige(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('costos:exportar_informes'))
+        self.assertRedirects(response, reverse('costos:gestion'))
+
+    def test_comando_exporta_zip(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'informes.zip')
+            call_command('exportar_informes_costos', ids=[self.costos[0].pk], workers=1, salida=salida, stdout=io.StringIO())
+            with zipfile.ZipFile(salida) as archivo_zip:
+                self.assertEqual(len(archivo_zip.namelist()), 1)
+
+
+class GestionCostosViewTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        self.client.force_login(self.admin)
+
+    def _consultas_listado(self, **params):
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(reverse('costos:gestion'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(contexto.captured_queries), response
+
+    def test_consultas_constantes(self):
+        for dias in range(3):
+            self.crear_costos(dias)
+        pocas, _ = self._consultas_listado()
+        for dias in range(3, 30):
+            self.crear_costos(dias)
+        muchas, response = self._consultas_listado()
+        self.assertEqual(pocas, muchas)
+        self.assertContains(response, 'Siguiente')
+
+    def test_paginacion_por_cursor_recorre_todo(self):
+        creados = {self.crear_costos(dias).pk for dias in range(60)}
+        vistos, cursor = [], None
+        while True:
+            _, response = self._consultas_listado(**({'cursor': cursor} if cursor else {}))
+            pagina = response.context['pagina']
+            vistos.extend(c.pk for c in pagina)
+            if not pagina.has_next:
+                break
+            cursor = pagina.cursor_siguiente
+        self.assertEqual(len(vistos), 60)
+        self.assertEqual(set(vistos), creados)
+
+        # Volver una página atrás devuelve las mismas filas que la penúltima
+        _, response = self._consultas_listado(cursor=pagina.cursor_anterior)
+        self.assertEqual([c.pk for c in response.context['pagina']], vistos[25:50])
+
+    def test_filtros_y_conteos(self):
+        otro_bus = Bus.objects.create(
+            placa='XYZ789', modelo='Volvo', año_fabricacion=2021, capacidad_pasajeros=40,
+            numero_chasis='CH789', numero_motor='MO789', fecha_adquisicion='2021-01-10'
+        )
+        self.crear_costos(2)
+        objetivo = self.crear_costos(3, bus=otro_bus, estado='completado')
+        self.crear_costos(20, bus=otro_bus, estado='completado')
+
+        desde = (timezone.localdate() - timedelta(days=7)).isoformat()
+        _, response = self._consultas_listado(bus=otro_bus.pk, estado='completado', desde=desde)
+        filas = list(response.context['pagina'])
+        self.assertEqual([c.pk for c in filas], [objetivo.pk])
+        self.assertEqual((filas[0].num_peajes, filas[0].num_puntos_recarga), (1, 0))
+
+    def test_filtro_por_fechas_incluye_el_dia_hasta(self):
+        hoy_costos = self.crear_costos(0)
+        ayer_costos = self.crear_costos(1)
+        self.crear_costos(3)
+        hoy = timezone.localdate()
+        form = FiltroCostosForm({'desde': hoy - timedelta(days=1), 'hasta': hoy})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(
+            set(form.filtrar(CostosViaje.objects.all()).values_list('pk', flat=True)),
+            {hoy_costos.pk, ayer_costos.pk},
+        )
+
+
+class RecalculoKilometrosTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        self.costos = self.crear_costos(1)
+        self.costos.km_inicial = 1000
+        self.costos.save()
+        self.client.force_login(self.admin)
+
+    def _agregar(self, kilometrajes):
+        datos = {}
+        for idx, km in enumerate(kilometrajes, 1):
+            datos.update({f'recarga_ubicacion_{idx}': f'Servicentro {idx}', f'recarga_kilometraje_{idx}': km,
+                          f'recarga_litros_{idx}': 100, f'recarga_valor_{idx}': 1000})
+        return self.client.post(reverse('costos:agregar_punto', args=[self.costos.pk]), datos)
+
+    def _kilometros(self):
+        return list(self.costos.puntos_recarga.order_by('orden').values_list('kilometros_recorridos', flat=True))
+
+    def test_consultas_no_dependen_de_la_cantidad_de_puntos(self):
+        with CaptureQueriesContext(connection) as pocos:
+            self._agregar([1100, 1250])
+        PuntoRecarga.objects.all().delete()
+        with CaptureQueriesContext(connection) as muchos:
+            self._agregar([1100 + 50 * n for n in range(12)])
+        self.assertEqual(len(pocos), len(muchos))
+        self.assertEqual(self._kilometros(), [100] + [50] * 11)
+        self.costos.refresh_from_db()
+        self.assertEqual(self.costos.combustible, 12 * 100 * 1000)
+
+    def test_editar_y_eliminar_recalculan_el_viaje(self):
+        self._agregar([1100, 1300, 1600])
+        primero, segundo, _ = self.costos.puntos_recarga.order_by('orden')
+
+        self.client.post(reverse('costos:editar_punto', args=[primero.pk]), {
+            'orden': 1, 'kilometraje': 1200, 'precio_combustible': 1000, 'litros_cargados': 50,
+            'ubicacion': 'Servicentro 1', 'observaciones': '',
+        })
+        self.assertEqual(self._kilometros(), [200, 100, 300])
+        self.costos.refresh_from_db()
+        self.assertEqual(self.costos.combustible, 250000)
+
+        self.client.post(reverse('costos:eliminar_punto', args=[segundo.pk]))
+        self.assertEqual(self._kilometros(), [200, 400])
+        self.costos.refresh_from_db()
+        self.assertEqual(self.costos.combustible, 150000)
+
+
+class RegistrarCostosCompletoTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        self.costos = self.crear_costos(1)
+        self.costos.km_inicial = 1000
+        self.costos.save()
+        self.url = reverse('costos:registrar_completo', args=[self.costos.viaje_id])
+        self.client.force_login(self.admin)
+
+    def _datos(self, puntos, peajes=()):
+        datos = {'km_inicial': 1000, 'km_final': 5000, 'otros_costos': 0, 'observaciones': ''}
+        for idx, (pk, km) in enumerate(puntos, 1):
+            datos.update({f'recarga_lugar_{idx}': f'Servicentro {idx}', f'recarga_kilometraje_{idx}': km,
+                          f'recarga_litros_{idx}': 100, f'recarga_precio_{idx}': 1000})
+            if pk:
+                datos[f'recarga_id_{idx}'] = pk
+        for idx, (pk, monto) in enumerate(peajes, 1):
+            datos.update({f'peaje_lugar_{idx}': 'Peaje Norte', f'peaje_monto_{idx}': monto,
+                          f'peaje_fecha_{idx}': '2026-01-10'})
+            if pk:
+                datos[f'peaje_id_{idx}'] = pk
+        return datos
+
+    def test_edicion_solo_modifica_filas_cambiadas(self):
+        peaje = self.costos.viaje.peajes.get()
+        self.client.post(self.url, self._datos([(None, 1100 + 100 * n) for n in range(30)], [(peaje.pk, 4000)]))
+        puntos = list(self.costos.puntos_recarga.order_by('orden'))
+        self.assertEqual(len(puntos), 30)
+
+        # Se cambia el punto 5, se elimina el último y se agrega uno nuevo
+        filas = [(p.pk, p.kilometraje) for p in puntos[:-1]]
+        filas[4] = (puntos[4].pk, puntos[4].kilometraje + 50)
+        filas.append((None, 4500))
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.post(self.url, self._datos(filas, [(peaje.pk, 4000)]))
+        self.assertRedirects(response, reverse('costos:gestion'), fetch_redirect_response=False)
+        self.assertLess(len(contexto), 25)
+
+        actuales = list(self.costos.puntos_recarga.order_by('orden'))
+        self.assertEqual([p.pk for p in actuales[:29]], [p.pk for p in puntos[:29]])
+        self.assertFalse(PuntoRecarga.objects.filter(pk=puntos[-1].pk).exists())
+        self.assertEqual([p.kilometros_recorridos for p in actuales[3:7]], [100, 150, 50, 100])
+        self.assertEqual(actuales[-1].kilometros_recorridos, 4500 - 3900)
+        self.assertEqual(list(self.costos.viaje.peajes.values_list('pk', flat=True)), [peaje.pk])
+
+    def test_error_revierte_la_transaccion(self):
+        self.client.post(self.url, self._datos([(None, 1100)]))
+        punto = self.costos.puntos_recarga.get()
+        datos = self._datos([(punto.pk, 1200), (None, 1300)])
+        with mock.patch.object(PuntoRecarga.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(self.url, datos)
+        punto.refresh_from_db()
+        self.assertEqual(punto.kilometraje, 1100)
+
+
+class AnaliticaCostosTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        self.otro_bus = Bus.objects.create(
+            placa='XYZ789', modelo='Volvo', año_fabricacion=2021, capacidad_pasajeros=40,
+            numero_chasis='CH789', numero_motor='MO789', fecha_adquisicion='2021-01-10'
+        )
+        # Bus ABC123: dos viajes de 100 km con odómetro; XYZ789: un viaje medido por recargas
+        for dias in (3, 4):
+            costos = self.crear_costos(dias)
+            # El contador lo mantienen las señales de ViajePasajero; aquí se fija directamente
+            Viaje.objects.filter(pk=costos.viaje_id).update(pasajeros_confirmados=10)
+            costos.km_inicial, costos.km_final = 1000, 1100
+            costos.mantenimiento = 0
+            costos.save()
+        costos = self.crear_costos(5, bus=self.otro_bus)
+        PuntoRecarga.objects.bulk_create([
+            PuntoRecarga(costos_viaje=costos, orden=1, kilometraje=1200, precio_combustible=1000, litros_cargados=50,
+                         kilometros_recorridos=200),
+            PuntoRecarga(costos_viaje=costos, orden=2, kilometraje=1500, precio_combustible=1000, litros_cargados=50,
+                         kilometros_recorridos=300),
+        ])
+        self.client.force_login(self.admin)
+
+    def test_indicadores_por_bus(self):
+        analitica = calcular_analitica()
+        self.assertEqual(analitica['resumen']['viajes'], 3)
+        self.assertEqual(analitica['resumen']['costo_total'], 3 * 58000)
+        primero, segundo = analitica['por_bus']
+        self.assertEqual((primero['etiqueta'], primero['viajes'], primero['km']), ('ABC123', 2, 200.0))
+        self.assertEqual(primero['costo_por_km'], 580.0)
+        self.assertEqual(primero['costo_por_pasajero'], 5800.0)
+        self.assertEqual(primero['participacion_combustible'], round(50000 / 58000, 4))
+        self.assertEqual((segundo['etiqueta'], segundo['km'], segundo['km_por_litro']), ('XYZ789', 500.0, 5.0))
+        self.assertIsNone(segundo['costo_por_pasajero'])
+        self.assertEqual(analitica['por_ruta'][0]['etiqueta'], 'Quito → Cuenca')
+        self.assertEqual(sum(fila['viajes'] for fila in analitica['por_mes']), 3)
+
+    def test_filtro_por_fecha(self):
+        hoy = timezone.localdate()
+        analitica = calcular_analitica(desde=hoy - timedelta(days=4), hasta=hoy - timedelta(days=3))
+        self.assertEqual(analitica['resumen']['viajes'], 2)
+        self.assertEqual([fila['etiqueta'] for fila in analitica['por_bus']], ['ABC123'])
+
+    def test_json_y_pagina(self):
+        response = self.client.get(reverse('costos:analitica_json'))
+        self.assertEqual(response.json()['resumen']['viajes'], 3)
+        response = self.client.get(reverse('costos:analitica'))
+        self.assertContains(response, 'XYZ789')
+        self.assertContains(response, 'Quito → Cuenca')
+
+    def test_ruta_por_ciudad_y_viaje_sin_bus(self):
+        # Viaje creado desde el formulario: ciudades escritas en el viaje, sin Lugar ni bus
+        salida = timezone.now() - timedelta(days=2)
+        viaje = Viaje.objects.create(
+            conductor=self.conductor, origen_nombre='Terminal Sur', origen_ciudad='Quito',
+            destino_nombre='Terminal Terrestre', destino_ciudad='Guayaquil',
+            fecha_salida=salida, fecha_llegada_estimada=salida + timedelta(hours=8)
+        )
+        CostosViaje.objects.create(viaje=viaje, combustible=70000, peajes=0)
+        analitica = calcular_analitica()
+        rutas = {fila['etiqueta']: fila['viajes'] for fila in analitica['por_ruta']}
+        self.assertEqual(rutas, {'Quito → Cuenca': 3, 'Quito → Guayaquil': 1})
+        sin_bus = [fila for fila in analitica['por_bus'] if fila['etiqueta'] == 'Sin bus']
+        self.assertEqual(len(sin_bus), 1)
+        self.assertIsNone(sin_bus[0]['clave'])
+        self.assertEqual(sin_bus[0]['viajes'], 1)
+
+    def test_sin_datos(self):
+        CostosViaje.objects.all().delete()
+        analitica = calcular_analitica()
+        self.assertEqual(analitica['resumen']['viajes'], 0)
+        self.assertIsNone(analitica['resumen']['costo_por_km'])
+        self.assertEqual(analitica['por_bus'], [])
+
+
+class AnomaliasConsumoTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        # Doce viajes con un rendimiento normal de entre 2,9 y 3,1 km/L
+        for n in range(12):
+            self._viaje_con_recarga(40 - n, 290 + 2 * n, 100)
+        self.client.force_login(self.admin)
+
+    def _viaje_con_recarga(self, dias_atras, kilometros, litros):
+        costos = self.crear_costos(dias_atras)
+        return PuntoRecarga.objects.create(costos_viaje=costos, orden=1, kilometraje=1000 + kilometros,
+                                           precio_combustible=1000, litros_cargados=litros,
+                                           kilometros_recorridos=kilometros)
+
+    def test_detecta_tramos_anomalos(self):
+        robo = self._viaje_con_recarga(10, 300, 200)
+        odometro = self._viaje_con_recarga(9, 3000, 100)
+        negativo = self._viaje_con_recarga(8, -50, 100)
+        normal = self._viaje_con_recarga(7, 305, 100)
+
+        self.assertEqual(detectar_anomalias(), (3, 0, 0))
+        anomalias = {a.punto_recarga_id: a for a in AnomaliaConsumo.objects.all()}
+        self.assertEqual(anomalias[robo.pk].tipo, 'rendimiento_bajo')
+        self.assertEqual(anomalias[robo.pk].km_por_litro, 1.5)
+        self.assertAlmostEqual(anomalias[robo.pk].linea_base, 3.01)
+        self.assertEqual(anomalias[odometro.pk].tipo, 'rendimiento_alto')
+        self.assertEqual(anomalias[negativo.pk].tipo, 'kilometraje_negativo')
+        self.assertNotIn(normal.pk, anomalias)
+        self.assertEqual(anomalias[robo.pk].fecha, robo.costos_viaje.viaje.fecha_salida)
+
+        # Sin cambios no se reescribe nada
+        self.assertEqual(detectar_anomalias([self.bus.pk]), (0, 0, 0))
+
+        # Reprogramar el viaje actualiza la fecha de la anomalía existente
+        nueva_salida = robo.costos_viaje.viaje.fecha_salida + timedelta(hours=2)
+        Viaje.objects.filter(pk=robo.costos_viaje.viaje_id).update(fecha_salida=nueva_salida)
+        self.assertEqual(detectar_anomalias([self.bus.pk]), (0, 1, 0))
+        self.assertEqual(AnomaliaConsumo.objects.get(punto_recarga=robo).fecha, nueva_salida)
+
+    def test_ignora_viajes_sin_bus(self):
+        negativo = self._viaje_con_recarga(8, -50, 100)
+        Viaje.objects.filter(pk=negativo.costos_viaje.viaje_id).update(bus=None)
+        self.assertEqual(detectar_anomalias(), (0, 0, 0))
+
+    def test_sin_historia_suficiente_no_evalua(self):
+        PuntoRecarga.objects.all().delete()
+        for n in range(5):
+            self._viaje_con_recarga(20 - n, 300, 100)
+        self._viaje_con_recarga(1, 300, 250)
+        self.assertEqual(detectar_anomalias(), (0, 0, 0))
+
+    def test_recargas_nuevas_se_evaluan_en_segundo_plano(self):
+        costos = self.crear_costos(1)
+        costos.km_inicial = 1000
+        costos.save()
+        self.client.post(reverse('costos:agregar_punto', args=[costos.pk]), {
+            'recarga_ubicacion_1': 'Servicentro', 'recarga_kilometraje_1': 1300,
+            'recarga_litros_1': 200, 'recarga_valor_1': 1000,
+        })
+        self.assertTrue(Tarea.objects.filter(tipo='costos.detectar_anomalias', estado='pendiente').exists())
+        procesar_pendientes()
+        punto = costos.puntos_recarga.get()
+        self.assertEqual(punto.anomalia.tipo, 'rendimiento_bajo')
+
+        # Al corregir los litros la anomalía desaparece
+        self.client.post(reverse('costos:editar_punto', args=[punto.pk]), {
+            'orden': 1, 'kilometraje': 1300, 'precio_combustible': 1000, 'litros_cargados': 100,
+            'ubicacion': 'Servicentro', 'observaciones': '',
+        })
+        procesar_pendientes()
+        self.assertFalse(AnomaliaConsumo.objects.exists())
+
+    def test_listado(self):
+        robo = self._viaje_con_recarga(10, 300, 200)
+        detectar_anomalias()
+        response = self.client.get(reverse('costos:anomalias_consumo'), {'bus': self.bus.pk})
+        self.assertContains(response, 'Rendimiento bajo')
+        self.assertContains(response, reverse('costos:detalle', args=[robo.costos_viaje_id]))
+        response = self.client.get(reverse('costos:anomalias_consumo'), {'tipo': 'rendimiento_alto'})
+        self.assertContains(response, 'No se detectaron anomalías')
+
+
+class CorreoFormularioTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        self.viaje = self._viaje(1)
+        self.client.force_login(self.admin)
+
+    def _viaje(self, dias_atras):
+        salida = timezone.now() - timedelta(days=dias_atras)
+        return Viaje.objects.create(
+            bus=self.bus, conductor=self.conductor, lugar_origen=self.origen, lugar_destino=self.destino,
+            fecha_salida=salida, fecha_llegada_estimada=salida + timedelta(hours=8)
+        )
+
+    def _encolar(self, viaje):
+        return self.client.get(reverse('costos:enviar_email', args=[viaje.pk]))
+
+    def test_la_vista_encola_y_el_worker_envia(self):
+        response = self._encolar(self.viaje)
+        self.assertRedirects(response, reverse('costos:gestion'), fetch_redirect_response=False)
+        self.assertEqual(mail.outbox, [])
+        correo = CorreoFormulario.objects.get()
+        self.assertEqual((correo.estado, correo.destinatario), ('pendiente', 'juan@example.com'))
+        self.assertContains(self.client.get(reverse('costos:gestion')), 'En cola')
+
+        # Volver a pedirlo mientras está en cola no duplica el envío
+        self._encolar(self.viaje)
+        self.assertEqual(Tarea.objects.filter(tipo='costos.enviar_formulario').count(), 1)
+
+        procesar_pendientes()
+        self.assertEqual(len(mail.outbox), 1)
+        nombre, contenido, tipo = mail.outbox[0].attachments[0]
+        self.assertEqual((nombre, tipo), (f'formulario_costos_viaje_{self.viaje.pk}.pdf', 'application/pdf'))
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        correo.refresh_from_db()
+        self.assertEqual((correo.estado, correo.intentos), ('enviado', 1))
+        self.assertContains(self.client.get(reverse('costos:gestion')), 'Enviado')
+
+    @override_settings(CORREOS_POR_MINUTO=1)
+    def test_limite_de_envios_pospone_sin_consumir_intentos(self):
+        self._encolar(self.viaje)
+        self._encolar(self._viaje(2))
+        procesar_pendientes()
+        self.assertEqual(len(mail.outbox), 1)
+        pospuesta = Tarea.objects.get(tipo='costos.enviar_formulario', estado='pendiente')
+        self.assertEqual(pospuesta.intentos, 0)
+        self.assertGreater(pospuesta.disponible_en, timezone.now())
+        self.assertEqual(CorreoFormulario.objects.filter(estado='pendiente').count(), 1)
+
+    @override_settings(TAREAS_MAX_INTENTOS=1)
+    def test_fallo_definitivo_queda_registrado(self):
+        self._encolar(self.viaje)
+        with mock.patch('costos.tareas.construir_correo_formulario', side_effect=ConnectionRefusedError('SMTP caído')):
+            procesar_pendientes()
+        correo = CorreoFormulario.objects.get()
+        self.assertEqual((correo.estado, correo.ultimo_error), ('fallido', 'SMTP caído'))
+        self.assertContains(self.client.get(reverse('costos:gestion')), 'Falló el envío')
+
+
+class FormularioCostosPdfTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        self.costos = self.crear_costos(1)
+        self.costos.km_inicial = 15230
+        self.costos.save()
+        self.viaje = self.costos.viaje
+
+    def _leer(self, pdf):
+        lector = PdfReader(io.BytesIO(pdf), strict=True)
+        return lector, [pagina.extract_text() for pagina in lector.pages]
+
+    def test_plantilla_con_datos_equivale_al_render_completo(self):
+        for variante in ('descarga', 'correo'):
+            with self.subTest(variante=variante):
+                lector, textos = self._leer(formulario_costos_pdf(self.viaje, variante))
+                referencia, textos_referencia = self._leer(renderizar_completo(self.viaje, variante))
+                self.assertEqual(len(textos), 2)
+                self.assertIn('Bus: ABC123    Modelo: Mercedes Benz', textos[0])
+                self.assertIn('Conductor: Juan Pérez', textos[0])
+                self.assertIn('Formulario generado el', textos[1])
+                for linea in textos_referencia[0].splitlines() + textos_referencia[1].splitlines():
+                    self.assertIn(linea, textos[0] + textos[1])
+                campos = lector.get_fields()
+                self.assertEqual(set(campos), set(referencia.get_fields()))
+                self.assertEqual(campos['km_inicial']['/V'], '15230')
+                # Los visores muestran la apariencia (/AP), no /V: también debe llevar el valor
+                widget = next(anotacion.get_object() for anotacion in lector.pages[0]['/Annots']
+                              if anotacion.get_object().get('/T') == 'km_inicial')
+                self.assertIn(b'(15230) Tj', widget['/AP']['/N'].get_object().get_data())
+                self.assertEqual(campos['km_final'].get('/V'), '')
+
+        self.assertIn('IMPORTANTE', self._leer(formulario_costos_pdf(self.viaje, 'correo'))[1][1])
+        self.assertNotIn('IMPORTANTE', self._leer(formulario_costos_pdf(self.viaje, 'descarga'))[1][1])
+
+    def test_apariencia_con_formato_inesperado(self):
+        with mock.patch('costos.formulario_pdf.MARCA_APARIENCIA', b'Q\nEMC\nXX'):
+            with self.assertRaisesMessage(RuntimeError, 'MARCA_APARIENCIA'):
+                _Plantilla('descarga')
+
+    def test_viaje_sin_kilometraje_y_texto_con_caracteres_especiales(self):
+        self.conductor.nombre = 'José (Pepe)'
+        self.conductor.save()
+        self.costos.delete()
+        lector, textos = self._leer(formulario_costos_pdf(self.viaje))
+        self.assertIn('Conductor: José (Pepe) Pérez', textos[0])
+        self.assertEqual(lector.get_fields()['km_inicial']['/V'], '')
+
+    def test_descarga(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('costos:formulario_pdf', args=[self.viaje.pk]))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(
+            response['Content-Disposition'], f'attachment; filename="formulario_costos_viaje_{self.viaje.pk}.pdf"')
+        self.assertIn('Bus: ABC123', self._leer(response.content)[1][0])
+
+
+class ExportarCostosTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        self.costos = self.crear_costos(1)
+        PuntoRecarga.objects.create(
+            costos_viaje=self.costos, orden=1, ubicacion='Copec Norte', kilometraje=1200, litros_cargados=80,
+            precio_combustible=1000)
+        self.crear_costos(5, estado='cancelado')
+        self.client.force_login(self.admin)
+
+    def test_exportar_costos_csv_con_desglose_y_filtros(self):
+        response = self.client.get(reverse('costos:exportar_costos'), {'formato': 'csv', 'estado': 'programado'})
+        filas = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(len(filas), 2)
+        fila = dict(zip(filas[0], filas[1]))
+        self.assertEqual(fila['ID costos'], str(self.costos.pk))
+        self.assertEqual((fila['Recargas'], fila['Litros cargados']), ('1', '80'))
+        self.assertEqual((fila['Combustible'], fila['Peajes'], fila['Costo total']), ('50000', '8000', '58000'))
+        self.assertEqual((fila['Origen'], fila['Destino']), ('Quito, Quito', 'Cuenca, Cuenca'))
+
+
+class ComprobantesTestCase(CostosFixtureMixin, TestCase):
+    def setUp(self):
+        self.crear_base()
+        self.peaje = self.crear_costos(1).viaje.peajes.get()
+        self.peaje.comprobante.save('voucher.pdf', ContentFile(b'%PDF-1.4 voucher'))
+        self.url = reverse('costos:comprobante', args=['peaje', self.peaje.pk])
+
+    def tearDown(self):
+        self.peaje.comprobante.delete(save=False)
+
+    def test_requiere_sesion(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_se_muestra_en_el_navegador(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 voucher')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-3').status_code, 206)
+
+    def test_html_se_descarga(self):
+        self.peaje.comprobante.save('voucher.html', ContentFile(b'<script></script>'))
+        self.client.force_login(self.admin)
+        self.assertTrue(self.client.get(self.url)['Content-Disposition'].startswith('attachment'))
+
+    def test_sin_comprobante_o_tipo_desconocido(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('costos:comprobante', args=['factura', self.peaje.pk])).status_code, 404)
+        sin_archivo = Peaje.objects.create(viaje=self.peaje.viaje, lugar='Peaje Sur', monto=3000,
+                                           fecha_pago=self.peaje.fecha_pago)
+        self.assertEqual(self.client.get(reverse('costos:comprobante', args=['peaje', sin_archivo.pk])).status_code, 404)
+
+    def test_detalle_enlaza_a_la_vista(self):
+        self.client.force_login(self.admin)
+        costos = CostosViaje.objects.get(viaje=self.peaje.viaje)
+        PuntoRecarga.objects.create(costos_viaje=costos, orden=1, kilometraje=1200, precio_combustible=1000,
+                                    litros_cargados=40, kilometros_recorridos=200, costo_total=40000,
+                                    comprobante='combustible/comprobantes/boleta.jpg')
+        response = self.client.get(reverse('costos:detalle', args=[costos.pk]))
+        self.assertNotContains(response, '/media/combustible/')
+        self.assertContains(response, reverse('costos:comprobante', args=['recarga', costos.puntos_recarga.get().pk]))
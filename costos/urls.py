@@ -21,6 +21,9 @@ urlpatterns = [
     path('mantenimiento/<int:costos_pk>/', views.mantenimiento_costos, name='mantenimiento_costos'),
     path('otros-costos/<int:costos_pk>/', views.otros_costos, name='otros_costos'),
     
+    # Comprobantes de recargas, peajes y mantenimientos
+    path('comprobante/<str:tipo>/<int:pk>/', views.descargar_comprobante, name='comprobante'),
+
     # Peajes
     path('peaje/<int:pk>/eliminar/', views.PeajeDeleteView.as_view(), name='eliminar_peaje'),
     
@@ -40,6 +43,15 @@ urlpatterns = [
     # Generar PDF
     path('viaje/<int:viaje_id>/formulario-pdf/', views.generar_formulario_costos_pdf, name='formulario_pdf'),
     path('informe-costos/<int:costos_pk>/', views.informe_costos_pdf, name='informe_costos_pdf'),
+    path('informes-costos/exportar/', views.exportar_informes_costos, name='exportar_informes'),
+    path('exportar/', views.exportar_costos, name='exportar_costos'),
+
+    # Analítica de costos (página y JSON)
+    path('analitica/', views.AnaliticaCostosView.as_view(), name='analitica'),
+    path('analitica/json/', views.AnaliticaCostosView.as_view(formato='json'), name='analitica_json'),
+
+    # Anomalías de rendimiento de combustible
+    path('anomalias-consumo/', views.AnomaliasConsumoView.as_view(), name='anomalias_consumo'),
 
     # Registrar peajes y puntos de recarga
     path('registrar-peajes/<int:costos_pk>/', views.registrar_peajes, name='registrar_peajes'),
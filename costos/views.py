@@ -26,26 +26,38 @@ from django.views import View
 from django.views.generic import ListView, UpdateView, DeleteView, DetailView, RedirectView
 from django.urls import reverse_lazy
 from django.contrib import messages
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum, Count
-from django.http import JsonResponse, HttpResponse
-from django.core.mail import EmailMessage
-from django.conf import settings
-from .models import CostosViaje, Peaje, PuntoRecarga
-from .forms import CostosViajeForm, PuntoRecargaForm, KmInicialForm, KmFinalForm, CostosViajeFormCompleto
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
+from django.utils import timezone
+from .models import AnomaliaConsumo, CorreoFormulario, CostosViaje, Peaje, PuntoRecarga
+from .forms import CostosViajeForm, PuntoRecargaForm, KmInicialForm, KmFinalForm, CostosViajeFormCompleto, ExportarInformesForm, FiltroCostosForm, AnaliticaCostosForm, FiltroAnomaliasForm
 from flota.models import Mantenimiento
 from flota.forms import MantenimientoForm
 from viajes.models import Viaje
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
+from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from datetime import datetime
-import io
+from datetime import date, datetime
+from decimal import Decimal
 from flota.models import Mantenimiento
 from .informe_costos import informe_costos_pdf
+from .formulario_pdf import formulario_costos_pdf
+from .exportacion import ENCABEZADOS_COSTOS, filas_costos
+from .services import recalcular_kilometros
+from .analitica import calcular_analitica
+from .informes_lote import combinar_pdf, generar_informes, seleccionar_costos, zip_en_streaming
+from core.permissions import admin_required
+from core.paginacion import paginar_por_cursor
+from core.exportacion import respuesta_exportacion
+from core.tareas import encolar
+from core.descargas import respuesta_descarga
 
 
 class ViajesSinCostosListView(LoginRequiredMixin, ListView):
@@ -57,7 +69,8 @@ class ViajesSinCostosListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         viajes_con_costos = CostosViaje.objects.values_list('viaje_id', flat=True)
-        return Viaje.objects.exclude(id__in=viajes_con_costos).select_related('bus', 'conductor')
+        return Viaje.objects.exclude(id__in=viajes_con_costos).select_related(
+            'bus', 'conductor', 'lugar_origen', 'lugar_destino')
 
 
 class CostosViajeCreateView(LoginRequiredMixin, View):
@@ -65,7 +78,7 @@ class CostosViajeCreateView(LoginRequiredMixin, View):
 
     def get(self, request):
         viajes_con_costos = CostosViaje.objects.values_list('viaje_id', flat=True)
-        viajes = Viaje.objects.exclude(id__in=viajes_con_costos)
+        viajes = Viaje.objects.exclude(id__in=viajes_con_costos).select_related('bus', 'lugar_origen', 'lugar_destino')
         return render(request, self.template_name, {'viajes': viajes})
 
     def post(self, request):
@@ -75,7 +88,7 @@ class CostosViajeCreateView(LoginRequiredMixin, View):
             costos_viaje = CostosViaje.objects.create(viaje=viaje)
             return redirect('costos:registrar_km_inicial', costos_pk=costos_viaje.pk)
         viajes_con_costos = CostosViaje.objects.values_list('viaje_id', flat=True)
-        viajes = Viaje.objects.exclude(id__in=viajes_con_costos)
+        viajes = Viaje.objects.exclude(id__in=viajes_con_costos).select_related('bus', 'lugar_origen', 'lugar_destino')
         messages.error(request, 'Debes seleccionar un viaje.')
         return render(request, self.template_name, {'viajes': viajes})
 
@@ -126,9 +139,16 @@ class CostosViajeDetailView(LoginRequiredMixin, DetailView):
     template_name = 'costos/costos_detail.html'
     context_object_name = 'costos'
 
+    def get_queryset(self):
+        return CostosViaje.objects.select_related(
+            'viaje__bus', 'viaje__conductor', 'viaje__lugar_origen', 'viaje__lugar_destino')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['puntos_recarga'] = self.object.puntos_recarga.all()
+        # Listas ya leídas: la plantilla las cuenta y recorre sin repetir consultas
+        context['peajes'] = list(self.object.viaje.peajes.all())
+        context['mantenimientos'] = list(self.object.mantenimientos.all())
         context['total_kilometros'] = sum(p.kilometros_recorridos for p in context['puntos_recarga'])
         context['total_litros'] = sum(p.litros_cargados for p in context['puntos_recarga'])
         # Calculo real de km recorridos
@@ -146,6 +166,27 @@ class CostosViajeDetailView(LoginRequiredMixin, DetailView):
         return context
 
 
+# Modelos con comprobante, por el tipo usado en la URL
+COMPROBANTES = {
+    'recarga': PuntoRecarga,
+    'peaje': Peaje,
+    'mantenimiento': Mantenimiento,
+}
+
+
+@login_required
+@require_http_methods(["GET"])
+def descargar_comprobante(request, tipo, pk):
+    """Muestra el comprobante de un punto de recarga, peaje o mantenimiento (enlazado desde el detalle de costos)."""
+    modelo = COMPROBANTES.get(tipo)
+    if modelo is None:
+        raise Http404('Tipo de comprobante desconocido.')
+    objeto = get_object_or_404(modelo.objects.only('comprobante'), pk=pk)
+    if not objeto.comprobante:
+        raise Http404('No tiene comprobante adjunto.')
+    return respuesta_descarga(request, objeto.comprobante, adjunto=False)
+
+
 class CostosViajeUpdateView(LoginRequiredMixin, UpdateView):
     """Vista para actualizar costos de un viaje."""
     model = CostosViaje
@@ -193,16 +234,17 @@ def agregar_puntos_recarga(request, costos_pk):
                 litros = request.POST.get(f'recarga_litros_{idx}')
                 valor = request.POST.get(f'recarga_valor_{idx}')
                 if ubicacion and kilometraje and litros and valor:
-                    punto = PuntoRecarga.objects.create(
+                    recargas.append(PuntoRecarga(
                         costos_viaje=costos_viaje,
                         orden=int(idx),
                         kilometraje=Decimal(kilometraje),
                         precio_combustible=Decimal(valor),
                         litros_cargados=Decimal(litros),
                         ubicacion=ubicacion
-                    )
-                    recargas.append(punto)
-        costos_viaje.calcular_costo_combustible()
+                    ))
+        PuntoRecarga.objects.bulk_create(recargas)
+        # Recalcular kilómetros y costo de combustible de todo el viaje
+        recalcular_kilometros(costos_viaje)
         costos_viaje.save()
         # Si ya tiene km_final, ir a gestión, si no, pedir km_final
         if costos_viaje.km_final is not None:
@@ -225,8 +267,8 @@ class PuntoRecargaUpdateView(LoginRequiredMixin, UpdateView):
     def form_valid(self, form):
         response = super().form_valid(form)
         
-        # Recalcular el costo total de combustible
-        self.object.costos_viaje.calcular_costo_combustible()
+        # Recalcular kilómetros (el punto siguiente depende de este) y costo de combustible
+        recalcular_kilometros(self.object.costos_viaje)
         self.object.costos_viaje.save()
         
         messages.success(self.request, 'Punto de recarga actualizado exitosamente.')
@@ -246,16 +288,16 @@ class PuntoRecargaDeleteView(LoginRequiredMixin, DeleteView):
     model = PuntoRecarga
     template_name = 'costos/punto_recarga_confirm_delete.html'
 
-    def delete(self, request, *args, **kwargs):
-        punto = self.get_object()
-        costos_viaje = punto.costos_viaje
-        response = super().delete(request, *args, **kwargs)
+    def form_valid(self, form):
+        # Desde Django 4 DeleteView elimina en form_valid (delete() solo atiende DELETE)
+        costos_viaje = self.object.costos_viaje
+        response = super().form_valid(form)
         
-        # Recalcular el costo total de combustible
-        costos_viaje.calcular_costo_combustible()
+        # Recalcular kilómetros del resto de los puntos y el costo total de combustible
+        recalcular_kilometros(costos_viaje)
         costos_viaje.save()
         
-        messages.success(request, 'Punto de recarga eliminado exitosamente.')
+        messages.success(self.request, 'Punto de recarga eliminado exitosamente.')
         return response
 
     def get_success_url(self):
@@ -270,29 +312,103 @@ class PuntoRecargaDeleteView(LoginRequiredMixin, DeleteView):
 class GestionCostosView(LoginRequiredMixin, View):
     """Vista principal para gestionar costos de viajes."""
     template_name = 'costos/gestion_costos.html'
+    por_pagina = 25
+    orden = ['-viaje__fecha_salida', '-pk']
 
     def get(self, request):
-        # Obtener viajes sin costos asignados
-        viajes_con_costos = CostosViaje.objects.values_list('viaje_id', flat=True)
-        viajes_sin_costos = Viaje.objects.exclude(id__in=viajes_con_costos).select_related('bus', 'conductor')[:5]
-
-        # Obtener todos los costos registrados para el CRUD
-        costos_list = CostosViaje.objects.select_related('viaje', 'viaje__bus').prefetch_related('puntos_recarga').all()
+        # Viajes sin costos asignados (los 5 primeros y el total)
+        viajes_sin_costos_qs = Viaje.objects.filter(costos__isnull=True)
+        ultimo_correo = CorreoFormulario.objects.filter(viaje=OuterRef('pk')).order_by('-creado_en', '-pk')
+        viajes_sin_costos = viajes_sin_costos_qs.select_related(
+            'bus', 'conductor', 'lugar_origen', 'lugar_destino'
+        ).annotate(
+            # Estado del último envío del formulario por correo (sin consultas adicionales)
+            estado_correo=Subquery(ultimo_correo.values('estado')[:1]),
+        )[:5]
+
+        # Costos registrados: filtrados, con conteos calculados en la base de datos y paginados por cursor
+        # (subconsultas correlacionadas: solo se cuentan las filas de la página, sin agrupar toda la tabla)
+        filtro_form = FiltroCostosForm(request.GET or None)
+        recargas = PuntoRecarga.objects.filter(costos_viaje=OuterRef('pk')).values('costos_viaje')
+        peajes = Peaje.objects.filter(viaje=OuterRef('viaje_id')).values('viaje')
+        costos_qs = filtro_form.filtrar(
+            CostosViaje.objects.select_related('viaje__bus', 'viaje__lugar_origen', 'viaje__lugar_destino').annotate(
+                num_puntos_recarga=Coalesce(Subquery(recargas.annotate(total=Count('pk')).values('total')), 0),
+                num_peajes=Coalesce(Subquery(peajes.annotate(total=Count('pk')).values('total')), 0),
+            )
+        )
+        pagina = paginar_por_cursor(costos_qs, self.orden, request.GET.get('cursor'), self.por_pagina)
 
-        # Estadísticas
-        total_viajes_con_costos = CostosViaje.objects.count()
-        total_viajes = Viaje.objects.count()
+        # Parámetros de filtro para conservarlos en los enlaces de paginación
+        parametros = request.GET.copy()
+        parametros.pop('cursor', None)
 
         context = {
             'viajes_sin_costos': viajes_sin_costos,
-            'costos_list': costos_list,
-            'total_viajes_con_costos': total_viajes_con_costos,
-            'total_viajes': total_viajes,
+            'total_viajes_sin_costos': viajes_sin_costos_qs.count(),
+            'costos_list': pagina,
+            'pagina': pagina,
+            'filtro_form': filtro_form,
+            'filtros_query': parametros.urlencode(),
+            'total_viajes_con_costos': CostosViaje.objects.count(),
+            'exportar_form': ExportarInformesForm(),
         }
 
         return render(request, self.template_name, context)
 
 
+class AnaliticaCostosView(LoginRequiredMixin, View):
+    """
+    Indicadores de costos (costo por km, por pasajero, participación de combustible
+    y mantenimiento) por bus, conductor, ruta y mes. Con formato='json' entrega los
+    mismos datos como JSON.
+    """
+    template_name = 'costos/analitica_costos.html'
+    formato = 'html'
+
+    def get(self, request):
+        form = AnaliticaCostosForm(request.GET or None)
+        desde = hasta = None
+        if form.is_bound and form.is_valid():
+            desde, hasta = form.cleaned_data['desde'], form.cleaned_data['hasta']
+        analitica = calcular_analitica(desde, hasta)
+        if self.formato == 'json':
+            return JsonResponse(analitica)
+        secciones = [
+            ('Por bus', 'fa-bus', analitica['por_bus']),
+            ('Por conductor', 'fa-id-card', analitica['por_conductor']),
+            ('Por ruta', 'fa-route', analitica['por_ruta']),
+            ('Por mes', 'fa-calendar-alt', analitica['por_mes']),
+        ]
+        return render(request, self.template_name, {
+            'form': form, 'resumen': analitica['resumen'], 'secciones': secciones,
+            'filtros_query': request.GET.urlencode(),
+        })
+
+
+class AnomaliasConsumoView(LoginRequiredMixin, View):
+    """Tramos de recarga con rendimiento anómalo (ver costos.anomalias), del más reciente al más antiguo."""
+    template_name = 'costos/anomalias_consumo.html'
+    por_pagina = 50
+    orden = ['-fecha', '-pk']
+
+    def get(self, request):
+        filtro_form = FiltroAnomaliasForm(request.GET or None)
+        anomalias_qs = filtro_form.filtrar(
+            AnomaliaConsumo.objects.select_related('bus', 'punto_recarga__costos_viaje')
+        )
+        pagina = paginar_por_cursor(anomalias_qs, self.orden, request.GET.get('cursor'), self.por_pagina)
+
+        parametros = request.GET.copy()
+        parametros.pop('cursor', None)
+        return render(request, self.template_name, {
+            'anomalias': pagina,
+            'pagina': pagina,
+            'filtro_form': filtro_form,
+            'filtros_query': parametros.urlencode(),
+        })
+
+
 def calcular_distancia_viaje(request, viaje_id):
     """Vista AJAX para calcular la distancia de un viaje."""
     try:
@@ -339,628 +455,33 @@ def calcular_distancia_viaje(request, viaje_id):
 
 def generar_formulario_costos_pdf(request, viaje_id):
     """Genera un PDF con campos editables para que el conductor registre los costos manualmente."""
-    from reportlab.pdfgen import canvas as pdf_canvas
-    from reportlab.pdfbase import pdfform
-    from reportlab.lib.colors import HexColor
-    
-    viaje = get_object_or_404(Viaje, pk=viaje_id)
-    
-    # Buffer para el PDF base
-    buffer = io.BytesIO()
-    
-    # Crear el PDF usando canvas
-    c = pdf_canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Colores
-    color_azul = HexColor('#1e40af')
-    color_gris = HexColor('#f3f4f6')
-    
-    costos_viaje = CostosViaje.objects.filter(viaje=viaje).first()
-    km_inicial = costos_viaje.km_inicial if costos_viaje and costos_viaje.km_inicial is not None else ''
-    
-    # ================================
-    # PÁGINA 1 - INFORMACIÓN Y RECARGAS
-    # ================================
-    y = height - 50
-    
-    # Título
-    c.setFillColor(color_azul)
-    c.setFont("Helvetica-Bold", 18)
-    c.drawCentredString(width/2, y, "FORMULARIO DE REGISTRO DE COSTOS DE VIAJE")
-    
-    y -= 40
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(50, y, "INFORMACIÓN DEL VIAJE")
-    
-    # Información estática
-    y -= 25
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y, f"Bus: {viaje.bus.placa}    Modelo: {viaje.bus.modelo}")
-    y -= 18
-    c.drawString(50, y, f"Origen: {viaje.get_origen_display()}    Destino: {viaje.get_destino_display()}")
-    y -= 18
-    c.drawString(50, y, f"Conductor: {viaje.conductor.nombre} {viaje.conductor.apellido}")
-    y -= 18
-    c.drawString(50, y, f"Fecha: {viaje.fecha_salida.strftime('%d/%m/%Y')}")
-    
-    # Campos editables para kilometrajes usando acroForm
-    y -= 25
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(50, y, "Kilometraje Inicial:")
-    c.drawString(300, y, "Kilometraje Final:")
-    
-    form = c.acroForm
-    y_campo = y - 18
-    
-    form.textfield(
-        name='km_inicial',
-        tooltip='Kilometraje Inicial',
-        x=180, y=y_campo, width=100, height=18,
-        borderStyle='solid',
-        borderWidth=1,
-        borderColor=colors.grey,
-        fillColor=colors.white,
-        textColor=colors.black,
-        forceBorder=True,
-        value=str(km_inicial) if km_inicial else ''
-    )
-    
-    form.textfield(
-        name='km_final',
-        tooltip='Kilometraje Final',
-        x=430, y=y_campo, width=100, height=18,
-        borderStyle='solid',
-        borderWidth=1,
-        borderColor=colors.grey,
-        fillColor=colors.white,
-        textColor=colors.black,
-        forceBorder=True
-    )
-    
-    # ================================
-    # TABLA RECARGAS DE COMBUSTIBLE
-    # ================================
-    y = y_campo - 30
-    c.setFont("Helvetica-Bold", 12)
-    c.setFillColor(color_azul)
-    c.drawString(50, y, "PUNTOS DE RECARGA DE COMBUSTIBLE")
-    
-    y -= 25
-    # Encabezados de tabla
-    c.setFillColor(color_azul)
-    c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
-    c.setFillColor(colors.white)
-    c.setFont("Helvetica-Bold", 8)
-    headers = ['N°', 'Lugar', 'Sucursal', 'KM', 'Fecha', 'Litros', 'Precio']
-    x_pos = [55, 85, 175, 255, 310, 370, 430]
-    for i, header in enumerate(headers):
-        c.drawString(x_pos[i], y - 12, header)
-    
-    # Filas de la tabla con campos editables
-    y -= 18
-    c.setFillColor(colors.black)
-    
-    for i in range(1, 10):
-        y -= 22
-        c.setFont("Helvetica", 8)
-        c.drawString(58, y + 5, str(i))
-        
-        # Campos de formulario editables
-        form.textfield(name=f'recarga_lugar_{i}', x=80, y=y, width=90, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'recarga_sucursal_{i}', x=172, y=y, width=80, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'recarga_km_{i}', x=254, y=y, width=50, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'recarga_fecha_{i}', x=306, y=y, width=60, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'recarga_litros_{i}', x=368, y=y, width=60, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'recarga_precio_{i}', x=430, y=y, width=60, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-    
-    # Nota sobre sucursales
-    y -= 25
-    c.setFont("Helvetica-Oblique", 7)
-    c.setFillColor(colors.grey)
-    c.drawString(50, y, "* Sucursal: COPEC, Shell, Petrobras, ENEX, Terpel, Otro")
-    
-    # ================================
-    # TABLA MANTENIMIENTOS
-    # ================================
-    y -= 25
-    c.setFont("Helvetica-Bold", 12)
-    c.setFillColor(color_azul)
-    c.drawString(50, y, "MANTENIMIENTOS")
-    
-    y -= 25
-    # Encabezados
-    c.setFillColor(color_azul)
-    c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
-    c.setFillColor(colors.white)
-    c.setFont("Helvetica-Bold", 7)
-    headers_mant = ['N°', 'Fecha', 'Tipo', 'Descripción', 'Costo', 'Proveedor', 'KM', 'Taller']
-    x_pos_mant = [55, 80, 130, 180, 290, 340, 420, 455]
-    for i, header in enumerate(headers_mant):
-        c.drawString(x_pos_mant[i], y - 12, header)
-    
-    # Filas con campos editables
-    y -= 18
-    c.setFillColor(colors.black)
-    
-    for i in range(1, 6):
-        y -= 22
-        c.setFont("Helvetica", 7)
-        c.drawString(58, y + 5, str(i))
-        
-        form.textfield(name=f'mant_fecha_{i}', x=75, y=y, width=50, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'mant_tipo_{i}', x=127, y=y, width=50, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'mant_desc_{i}', x=179, y=y, width=108, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'mant_costo_{i}', x=289, y=y, width=48, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'mant_prov_{i}', x=339, y=y, width=78, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'mant_km_{i}', x=419, y=y, width=33, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'mant_taller_{i}', x=454, y=y, width=88, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-    
-    c.showPage()
-    
-    # ================================
-    # PÁGINA 2 - PEAJES Y OTROS
-    # ================================
-    y = height - 50
-    
-    c.setFont("Helvetica-Bold", 14)
-    c.setFillColor(color_azul)
-    c.drawString(50, y, "REGISTRO DE PEAJES")
-    
-    y -= 30
-    # Encabezados
-    c.setFillColor(color_azul)
-    c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
-    c.setFillColor(colors.white)
-    c.setFont("Helvetica-Bold", 9)
-    c.drawString(60, y - 12, "N°")
-    c.drawString(120, y - 12, "Lugar")
-    c.drawString(350, y - 12, "Monto (CLP)")
-    c.drawString(460, y - 12, "Fecha")
-    
-    # Filas con campos editables
-    y -= 18
-    c.setFillColor(colors.black)
-    
-    for i in range(1, 10):
-        y -= 22
-        c.setFont("Helvetica", 9)
-        c.drawString(63, y + 5, str(i))
-        
-        form.textfield(name=f'peaje_lugar_{i}', x=90, y=y, width=255, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'peaje_monto_{i}', x=347, y=y, width=110, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'peaje_fecha_{i}', x=459, y=y, width=85, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-    
-    # ================================
-    # OTROS COSTOS
-    # ================================
-    y -= 35
-    c.setFont("Helvetica-Bold", 12)
-    c.setFillColor(color_azul)
-    c.drawString(50, y, "OTROS COSTOS")
-    
-    y -= 25
-    # Encabezados
-    c.setFillColor(color_azul)
-    c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
-    c.setFillColor(colors.white)
-    c.setFont("Helvetica-Bold", 9)
-    c.drawString(60, y - 12, "N°")
-    c.drawString(120, y - 12, "Tipo de Costo")
-    c.drawString(280, y - 12, "Descripción")
-    c.drawString(470, y - 12, "Monto")
-    
-    # Filas con campos editables
-    y -= 18
-    c.setFillColor(colors.black)
-    
-    for i in range(1, 6):
-        y -= 22
-        c.setFont("Helvetica", 9)
-        c.drawString(63, y + 5, str(i))
-        
-        form.textfield(name=f'otro_tipo_{i}', x=90, y=y, width=185, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'otro_desc_{i}', x=277, y=y, width=185, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-        
-        form.textfield(name=f'otro_monto_{i}', x=464, y=y, width=80, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, forceBorder=True)
-    
-    # ================================
-    # OBSERVACIONES
-    # ================================
-    y -= 35
-    c.setFont("Helvetica-Bold", 11)
-    c.setFillColor(color_azul)
-    c.drawString(50, y, "OBSERVACIONES GENERALES")
-    
-    y -= 15
-    # Campo de texto para observaciones
-    form.textfield(
-        name='observaciones',
-        tooltip='Observaciones generales del viaje',
-        x=50, y=y - 65, width=width - 100, height=70,
-        borderStyle='solid',
-        borderWidth=1,
-        borderColor=colors.grey,
-        fillColor=colors.white,
-        textColor=colors.black,
-        forceBorder=True
-    )
-    
-    # ================================
-    # FIRMA
-    # ================================
-    y -= 95
-    c.setStrokeColor(colors.black)
-    c.setLineWidth(1)
-    c.line(80, y, 250, y)
-    c.line(350, y, 520, y)
-    
-    c.setFont("Helvetica", 9)
-    c.setFillColor(colors.black)
-    c.drawCentredString(165, y - 15, "Firma del Conductor")
-    c.drawCentredString(435, y - 15, "Fecha")
-    
-    # Footer
-    c.setFont("Helvetica-Oblique", 8)
-    c.setFillColor(colors.grey)
-    c.drawCentredString(width/2, 30, 
-        f"Formulario generado el {datetime.now().strftime('%d/%m/%Y %H:%M')} - Sistema FlotaGest")
-    c.drawCentredString(width/2, 20, 
-        "PDF interactivo - Complete los campos directamente en Adobe Reader, Foxit o cualquier visor PDF")
-    
-    c.save()
-    
-    # Preparar respuesta
-    buffer.seek(0)
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+    viaje = get_object_or_404(Viaje.objects.select_related('bus', 'conductor'), pk=viaje_id)
+    response = HttpResponse(formulario_costos_pdf(viaje, 'descarga'), content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="formulario_costos_viaje_{viaje.id}.pdf"'
-    
     return response
 
 
 def enviar_formulario_email(request, viaje_id):
-    """Envía el formulario PDF de costos por correo electrónico al conductor."""
-    viaje = get_object_or_404(Viaje, pk=viaje_id)
+    """
+    Encola el envío del formulario PDF de costos al conductor. El PDF se genera y
+    se envía en segundo plano (tarea 'costos.enviar_formulario'); el estado del
+    envío se muestra en la gestión de costos.
+    """
+    viaje = get_object_or_404(Viaje.objects.select_related('conductor'), pk=viaje_id)
     conductor = viaje.conductor
     
     if not conductor.email:
         messages.error(request, f'El conductor {conductor.nombre} {conductor.apellido} no tiene un correo electrónico registrado.')
         return redirect('costos:gestion')
     
-    try:
-        # Generar el PDF en memoria usando el mismo código que generar_formulario_costos_pdf
-        from reportlab.pdfgen import canvas as pdf_canvas
-        from reportlab.pdfbase import pdfform
-        from reportlab.lib.colors import HexColor
-        
-        buffer = io.BytesIO()
-        c = pdf_canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-        
-        color_azul = HexColor('#1e40af')
-        color_gris = HexColor('#f3f4f6')
-        
-        costos_viaje = CostosViaje.objects.filter(viaje=viaje).first()
-        km_inicial = costos_viaje.km_inicial if costos_viaje and costos_viaje.km_inicial is not None else ''
-        
-        # PÁGINA 1
-        y = height - 50
-        c.setFillColor(color_azul)
-        c.setFont("Helvetica-Bold", 18)
-        c.drawCentredString(width/2, y, "FORMULARIO DE REGISTRO DE COSTOS DE VIAJE")
-        
-        y -= 40
-        c.setFillColor(colors.black)
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(50, y, "INFORMACIÓN DEL VIAJE")
-        
-        y -= 25
-        c.setFont("Helvetica", 10)
-        c.drawString(50, y, f"Bus: {viaje.bus.placa}    Modelo: {viaje.bus.modelo}")
-        y -= 18
-        c.drawString(50, y, f"Origen: {viaje.get_origen_display()}    Destino: {viaje.get_destino_display()}")
-        y -= 18
-        c.drawString(50, y, f"Conductor: {viaje.conductor.nombre} {viaje.conductor.apellido}")
-        y -= 18
-        c.drawString(50, y, f"Fecha: {viaje.fecha_salida.strftime('%d/%m/%Y')}")
-        
-        y -= 25
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(50, y, "Kilometraje Inicial:")
-        c.drawString(300, y, "Kilometraje Final:")
-        
-        form = c.acroForm
-        y_campo = y - 18
-        
-        form.textfield(name='km_inicial', tooltip='Kilometraje Inicial', x=180, y=y_campo, width=100, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white,
-                      textColor=colors.black, forceBorder=True, value=str(km_inicial) if km_inicial else '')
-        
-        form.textfield(name='km_final', tooltip='Kilometraje Final', x=430, y=y_campo, width=100, height=18,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white,
-                      textColor=colors.black, forceBorder=True)
-        
-        # TABLA RECARGAS
-        y = y_campo - 30
-        c.setFont("Helvetica-Bold", 12)
-        c.setFillColor(color_azul)
-        c.drawString(50, y, "PUNTOS DE RECARGA DE COMBUSTIBLE")
-        
-        y -= 25
-        c.setFillColor(color_azul)
-        c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
-        c.setFillColor(colors.white)
-        c.setFont("Helvetica-Bold", 8)
-        headers = ['N°', 'Lugar', 'Sucursal', 'KM', 'Fecha', 'Litros', 'Precio']
-        x_pos = [55, 85, 175, 255, 310, 370, 430]
-        for i, header in enumerate(headers):
-            c.drawString(x_pos[i], y - 12, header)
-        
-        y -= 18
-        c.setFillColor(colors.black)
-        
-        for i in range(1, 10):
-            y -= 22
-            c.setFont("Helvetica", 8)
-            c.drawString(58, y + 5, str(i))
-            form.textfield(name=f'recarga_lugar_{i}', x=80, y=y, width=90, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'recarga_sucursal_{i}', x=172, y=y, width=80, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'recarga_km_{i}', x=254, y=y, width=50, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'recarga_fecha_{i}', x=306, y=y, width=60, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'recarga_litros_{i}', x=368, y=y, width=60, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'recarga_precio_{i}', x=430, y=y, width=60, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-        
-        y -= 25
-        c.setFont("Helvetica-Oblique", 7)
-        c.setFillColor(colors.grey)
-        c.drawString(50, y, "* Sucursal: COPEC, Shell, Petrobras, ENEX, Terpel, Otro")
-        
-        # TABLA MANTENIMIENTOS
-        y -= 25
-        c.setFont("Helvetica-Bold", 12)
-        c.setFillColor(color_azul)
-        c.drawString(50, y, "MANTENIMIENTOS")
-        
-        y -= 25
-        c.setFillColor(color_azul)
-        c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
-        c.setFillColor(colors.white)
-        c.setFont("Helvetica-Bold", 7)
-        headers_mant = ['N°', 'Fecha', 'Tipo', 'Descripción', 'Costo', 'Proveedor', 'KM', 'Taller']
-        x_pos_mant = [55, 80, 130, 180, 290, 340, 420, 455]
-        for i, header in enumerate(headers_mant):
-            c.drawString(x_pos_mant[i], y - 12, header)
-        
-        y -= 18
-        c.setFillColor(colors.black)
-        
-        for i in range(1, 6):
-            y -= 22
-            c.setFont("Helvetica", 7)
-            c.drawString(58, y + 5, str(i))
-            form.textfield(name=f'mant_fecha_{i}', x=75, y=y, width=50, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'mant_tipo_{i}', x=127, y=y, width=50, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'mant_desc_{i}', x=179, y=y, width=108, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'mant_costo_{i}', x=289, y=y, width=48, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'mant_prov_{i}', x=339, y=y, width=78, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'mant_km_{i}', x=419, y=y, width=33, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'mant_taller_{i}', x=454, y=y, width=88, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-        
-        c.showPage()
-        
-        # PÁGINA 2
-        y = height - 50
-        c.setFont("Helvetica-Bold", 14)
-        c.setFillColor(color_azul)
-        c.drawString(50, y, "REGISTRO DE PEAJES")
-        
-        y -= 30
-        c.setFillColor(color_azul)
-        c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
-        c.setFillColor(colors.white)
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(60, y - 12, "N°")
-        c.drawString(120, y - 12, "Lugar")
-        c.drawString(350, y - 12, "Monto (CLP)")
-        c.drawString(460, y - 12, "Fecha")
-        
-        y -= 18
-        c.setFillColor(colors.black)
-        
-        for i in range(1, 10):
-            y -= 22
-            c.setFont("Helvetica", 9)
-            c.drawString(63, y + 5, str(i))
-            form.textfield(name=f'peaje_lugar_{i}', x=90, y=y, width=255, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'peaje_monto_{i}', x=347, y=y, width=110, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'peaje_fecha_{i}', x=459, y=y, width=85, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-        
-        # OTROS COSTOS
-        y -= 35
-        c.setFont("Helvetica-Bold", 12)
-        c.setFillColor(color_azul)
-        c.drawString(50, y, "OTROS COSTOS")
-        
-        y -= 25
-        c.setFillColor(color_azul)
-        c.rect(50, y - 18, width - 100, 18, fill=True, stroke=False)
-        c.setFillColor(colors.white)
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(60, y - 12, "N°")
-        c.drawString(120, y - 12, "Tipo de Costo")
-        c.drawString(280, y - 12, "Descripción")
-        c.drawString(470, y - 12, "Monto")
-        
-        y -= 18
-        c.setFillColor(colors.black)
-        
-        for i in range(1, 6):
-            y -= 22
-            c.setFont("Helvetica", 9)
-            c.drawString(63, y + 5, str(i))
-            form.textfield(name=f'otro_tipo_{i}', x=90, y=y, width=185, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'otro_desc_{i}', x=277, y=y, width=185, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-            form.textfield(name=f'otro_monto_{i}', x=464, y=y, width=80, height=18,
-                          borderStyle='solid', borderWidth=1, borderColor=colors.grey, fillColor=colors.white, forceBorder=True)
-        
-        # OBSERVACIONES
-        y -= 35
-        c.setFont("Helvetica-Bold", 11)
-        c.setFillColor(color_azul)
-        c.drawString(50, y, "OBSERVACIONES GENERALES")
-        
-        y -= 15
-        form.textfield(name='observaciones', tooltip='Observaciones generales del viaje',
-                      x=50, y=y - 65, width=width - 100, height=70,
-                      borderStyle='solid', borderWidth=1, borderColor=colors.grey,
-                      fillColor=colors.white, textColor=colors.black, forceBorder=True)
-        
-        # FIRMA
-        y -= 95
-        c.setStrokeColor(colors.black)
-        c.setLineWidth(1)
-        c.line(80, y, 250, y)
-        c.line(350, y, 520, y)
-        
-        c.setFont("Helvetica", 9)
-        c.setFillColor(colors.black)
-        c.drawCentredString(165, y - 15, "Firma del Conductor")
-        c.drawCentredString(435, y - 15, "Fecha")
-        
-        # Footer
-        c.setFont("Helvetica-Bold", 9)
-        c.setFillColor(HexColor('#dc2626'))
-        c.drawCentredString(width/2, 40, "📱 IMPORTANTE: Para editar en celulares necesitas Adobe Acrobat Reader, Xodo PDF o Foxit PDF")
-        
-        c.setFont("Helvetica-Oblique", 8)
-        c.setFillColor(colors.grey)
-        c.drawCentredString(width/2, 27, f"Formulario generado el {datetime.now().strftime('%d/%m/%Y %H:%M')} - Sistema FlotaGest")
-        c.drawCentredString(width/2, 17, "Android: Descarga desde Play Store | iOS: Descarga desde App Store")
-        
-        c.save()
-        buffer.seek(0)
-        
-        # Crear el email
-        subject = f'Formulario de Costos - Viaje {viaje.bus.placa} ({viaje.fecha_salida.strftime("%d/%m/%Y")})'
-        body = f"""Estimado/a {conductor.nombre} {conductor.apellido},
-
-Por medio de la presente, adjunto encontrará el formulario para el registro de los costos correspondientes al viaje asignado.
-
-DETALLES DEL VIAJE:
-- Bus: {viaje.bus.placa} - {viaje.bus.modelo}
-- Ruta: {viaje.get_origen_display()} a {viaje.get_destino_display()}
-- Fecha de salida: {viaje.fecha_salida.strftime('%d/%m/%Y %H:%M')}
-- Estado: {viaje.get_estado_display()}
-
-INSTRUCCIONES PARA COMPLETAR EL FORMULARIO:
-
-Para editar el formulario PDF en dispositivos móviles (celulares o tablets), es necesario contar con una aplicación compatible. Las aplicaciones recomendadas son:
-
-- Adobe Acrobat Reader
-- Xodo PDF (recomendado para Android)
-- Foxit PDF
-
-Puede descargar estas aplicaciones desde:
-- Android: Google Play Store
-- iOS: Apple App Store
-
-Por favor, complete el formulario con todos los costos del viaje y envíelo de vuelta a la brevedad posible.
-
-Quedamos atentos a cualquier consulta.
-
-Cordialmente,
-Sistema de Gestión de Flota - FlotaGest"""
-        
-        email = EmailMessage(
-            subject=subject,
-            body=body,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[conductor.email],
-        )
-        
-        # Adjuntar el PDF
-        filename = f'formulario_costos_viaje_{viaje.id}.pdf'
-        email.attach(filename, buffer.getvalue(), 'application/pdf')
-        
-        # Enviar el email
-        email.send()
-        
-        messages.success(request, f'✅ Formulario enviado exitosamente a {conductor.email}')
-        
-    except Exception as e:
-        messages.error(request, f'❌ Error al enviar el correo: {str(e)}')
+    if viaje.correos_formulario.filter(estado='pendiente', destinatario=conductor.email).exists():
+        messages.info(request, f'El formulario para {conductor.email} ya está en cola de envío.')
+        return redirect('costos:gestion')
     
+    with transaction.atomic():
+        correo = CorreoFormulario.objects.create(viaje=viaje, destinatario=conductor.email)
+        encolar('costos.enviar_formulario', correo_id=correo.pk)
+    messages.success(request, f'✅ Formulario en cola de envío a {conductor.email}')
     return redirect('costos:gestion')
 
 
@@ -1010,17 +531,17 @@ def registrar_puntos_recarga(request, costos_pk):
                 litros = request.POST.get(f'recarga_litros_{idx}')
                 valor = request.POST.get(f'recarga_valor_{idx}')
                 if ubicacion and kilometraje and litros and valor:
-                    punto = PuntoRecarga.objects.create(
+                    recargas.append(PuntoRecarga(
                         costos_viaje=costos_viaje,
                         orden=int(idx),
                         kilometraje=Decimal(kilometraje),
                         precio_combustible=Decimal(valor),
                         litros_cargados=Decimal(litros),
                         ubicacion=ubicacion
-                    )
-                    recargas.append(punto)
-        # Recalcular el costo total de combustible
-        costos_viaje.calcular_costo_combustible()
+                    ))
+        PuntoRecarga.objects.bulk_create(recargas)
+        # Recalcular kilómetros y costo total de combustible de todo el viaje
+        recalcular_kilometros(costos_viaje)
         costos_viaje.save()
         # Finalizar flujo, redirigir a registro de km final
         return redirect('costos:registrar_km_final', costos_pk=costos_pk)
@@ -1031,7 +552,9 @@ def registrar_km_inicial(request, costos_pk):
     if request.method == 'POST':
         form = KmInicialForm(request.POST, instance=costos_viaje)
         if form.is_valid():
-            form.save()
+            costos_viaje = form.save()
+            # El primer punto de recarga se mide desde el kilometraje inicial
+            recalcular_kilometros(costos_viaje)
             return redirect('costos:mantenimiento_costos', costos_pk=costos_pk)
     else:
         form = KmInicialForm(instance=costos_viaje)
@@ -1050,6 +573,186 @@ def registrar_km_final(request, costos_pk):
     return render(request, 'costos/km_final_form.html', {'form': form, 'costos_pk': costos_pk})
 
 
+# Prefijos de las filas dinámicas del formulario completo de costos
+PREFIJOS_FILAS = ('nuevo_mant', 'peaje', 'recarga', 'otro_costo')
+
+
+def _filas_dinamicas(datos, archivos):
+    """
+    Agrupa en una sola pasada los campos de las filas dinámicas (p. ej.
+    'recarga_litros_3') por prefijo e índice: {'recarga': {3: {'litros': ...}}}.
+    Los archivos quedan en la misma fila. Las filas se entregan ordenadas por índice.
+    """
+    filas = {prefijo: {} for prefijo in PREFIJOS_FILAS}
+    for origen, limpiar in ((datos, True), (archivos, False)):
+        for clave, valor in origen.items():
+            for prefijo in PREFIJOS_FILAS:
+                if clave.startswith(prefijo + '_'):
+                    campo, _, idx = clave[len(prefijo) + 1:].rpartition('_')
+                    if campo and idx.isdigit():
+                        filas[prefijo].setdefault(int(idx), {})[campo] = valor.strip() if limpiar else valor
+                    break
+    return {prefijo: dict(sorted(grupo.items())) for prefijo, grupo in filas.items()}
+
+
+def _existente(fila, existentes):
+    """Registro existente al que corresponde la fila (por su id oculto) o None si es nueva."""
+    identificador = fila.get('id', '')
+    return existentes.get(int(identificador)) if identificador.isdigit() else None
+
+
+def _aplicar_cambios(objeto, valores):
+    """Asigna los valores que difieren. Retorna True si hubo alguno."""
+    cambios = {campo: valor for campo, valor in valores.items() if getattr(objeto, campo) != valor}
+    for campo, valor in cambios.items():
+        setattr(objeto, campo, valor)
+    return bool(cambios)
+
+
+def _guardar_mantenimientos(request, costos_viaje, filas):
+    """Crea, actualiza y desvincula los mantenimientos del registro de costos según las filas."""
+    existentes = {m.pk: m for m in costos_viaje.mantenimientos.all()}
+    conservados, modificados, nuevos = set(), [], []
+    bus = costos_viaje.viaje.bus
+    for fila in filas.values():
+        fecha, tipo, descripcion = fila.get('fecha', ''), fila.get('tipo', ''), fila.get('descripcion', '')
+        if not (fecha and tipo and descripcion):
+            continue
+        try:
+            valores = {
+                'fecha_mantenimiento': date.fromisoformat(fecha),
+                'tipo': tipo,
+                'costo': int(Decimal(fila['costo'])) if fila.get('costo') else 0,
+                'kilometraje': int(fila['kilometraje']) if fila.get('kilometraje') else 0,
+                'proveedor': fila.get('proveedor') or None,
+                'taller': fila.get('taller', ''),
+                'descripcion': descripcion,
+                'observaciones': fila.get('observaciones', ''),
+            }
+        except (ValueError, ArithmeticError) as e:
+            messages.warning(request, f'No se pudo crear el mantenimiento: {str(e)}')
+            continue
+        mantenimiento = _existente(fila, existentes)
+        if mantenimiento is None:
+            nuevos.append(Mantenimiento(bus=bus, **valores))
+            continue
+        conservados.add(mantenimiento.pk)
+        if _aplicar_cambios(mantenimiento, valores):
+            modificados.append(mantenimiento)
+
+    if modificados:
+        Mantenimiento.objects.bulk_update(modificados, [
+            'fecha_mantenimiento', 'tipo', 'costo', 'kilometraje', 'proveedor', 'taller', 'descripcion', 'observaciones',
+        ])
+    removidos = set(existentes) - conservados
+    if removidos:
+        costos_viaje.mantenimientos.remove(*removidos)
+    if nuevos:
+        # Se guardan uno a uno: en MySQL bulk_create no retorna los ids que necesita la relación
+        for mantenimiento in nuevos:
+            mantenimiento.save()
+        costos_viaje.mantenimientos.add(*nuevos)
+
+
+def _guardar_peajes(request, costos_viaje, filas, es_edicion):
+    """
+    Crea, actualiza y elimina los peajes del viaje según las filas. Retorna el total.
+    Al registrar por primera vez no se tocan los peajes que el viaje ya tuviera.
+    """
+    existentes = {p.pk: p for p in costos_viaje.viaje.peajes.all()} if es_edicion else {}
+    conservados, modificados, nuevos = set(), [], []
+    total = Decimal('0')
+    for fila in filas.values():
+        lugar, monto = fila.get('lugar', ''), fila.get('monto', '')
+        if not (lugar and monto):
+            continue
+        peaje = _existente(fila, existentes)
+        try:
+            monto_decimal = Decimal(monto)
+            # Usar la fecha proporcionada, la que ya tenía o la actual
+            if fila.get('fecha'):
+                fecha_pago = timezone.make_aware(datetime.strptime(fila['fecha'], '%Y-%m-%d'))
+            elif peaje is not None:
+                fecha_pago = peaje.fecha_pago
+            else:
+                fecha_pago = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+        except (ValueError, ArithmeticError) as e:
+            messages.warning(request, f'No se pudo crear el peaje: {str(e)}')
+            continue
+        total += monto_decimal
+        valores = {'costos_viaje_id': costos_viaje.pk, 'lugar': lugar, 'monto': int(monto_decimal), 'fecha_pago': fecha_pago}
+        voucher = fila.get('voucher')
+        if peaje is None:
+            nuevos.append(Peaje(viaje=costos_viaje.viaje, comprobante=voucher or '', **valores))
+            continue
+        conservados.add(peaje.pk)
+        cambio = _aplicar_cambios(peaje, valores)
+        if voucher:
+            # bulk_update no sube archivos: se guardan aquí
+            peaje.comprobante.save(voucher.name, voucher, save=False)
+            cambio = True
+        if cambio:
+            modificados.append(peaje)
+
+    removidos = set(existentes) - conservados
+    if removidos:
+        Peaje.objects.filter(pk__in=removidos).delete()
+    if modificados:
+        Peaje.objects.bulk_update(modificados, ['costos_viaje', 'lugar', 'monto', 'fecha_pago', 'comprobante'])
+    Peaje.objects.bulk_create(nuevos)
+    return total
+
+
+def _guardar_puntos_recarga(request, costos_viaje, filas):
+    """
+    Crea, actualiza y elimina los puntos de recarga según las filas. Los kilómetros
+    recorridos se calculan después con recalcular_kilometros.
+    """
+    existentes = {p.pk: p for p in costos_viaje.puntos_recarga.all()}
+    conservados, modificados, nuevos = set(), [], []
+    for idx, fila in filas.items():
+        lugar, kilometraje = fila.get('lugar', ''), fila.get('kilometraje', '')
+        litros, precio = fila.get('litros', ''), fila.get('precio', '')
+        if not (lugar and kilometraje and litros and precio):
+            continue
+        # Ubicación completa y observaciones con la fecha, si existe
+        ubicacion = f"{lugar} - {fila['sucursal']}" if fila.get('sucursal') else lugar
+        observaciones = f"Fecha de pago: {fila['fecha']}" if fila.get('fecha') else ""
+        try:
+            valores = {
+                'orden': int(fila['orden']) if fila.get('orden') else idx,
+                'kilometraje': int(Decimal(kilometraje)),
+                'precio_combustible': int(Decimal(precio)),
+                'litros_cargados': int(Decimal(litros)),
+                'ubicacion': ubicacion,
+                'observaciones': observaciones,
+            }
+        except (ValueError, ArithmeticError) as e:
+            messages.warning(request, f'No se pudo crear el punto de recarga: {str(e)}')
+            continue
+        punto = _existente(fila, existentes)
+        voucher = fila.get('voucher')
+        if punto is None:
+            nuevos.append(PuntoRecarga(costos_viaje=costos_viaje, comprobante=voucher or '', **valores))
+            continue
+        conservados.add(punto.pk)
+        cambio = _aplicar_cambios(punto, valores)
+        if voucher:
+            punto.comprobante.save(voucher.name, voucher, save=False)
+            cambio = True
+        if cambio:
+            modificados.append(punto)
+
+    removidos = set(existentes) - conservados
+    if removidos:
+        PuntoRecarga.objects.filter(pk__in=removidos).delete()
+    if modificados:
+        PuntoRecarga.objects.bulk_update(modificados, [
+            'orden', 'kilometraje', 'precio_combustible', 'litros_cargados', 'ubicacion', 'observaciones', 'comprobante',
+        ])
+    PuntoRecarga.objects.bulk_create(nuevos)
+
+
 def registrar_costos_completo(request, viaje_id):
     """Vista unificada para registrar/editar todos los costos de un viaje en un solo formulario."""
     from decimal import Decimal
@@ -1067,153 +770,40 @@ def registrar_costos_completo(request, viaje_id):
             form = CostosViajeFormCompleto(request.POST)
         
         if form.is_valid():
-            # Crear o actualizar el registro de costos
-            costos_viaje = form.save(commit=False)
-            if not es_edicion:
+            filas = _filas_dinamicas(request.POST, request.FILES)
+            with transaction.atomic():
+                # Crear o actualizar el registro de costos
+                costos_viaje = form.save(commit=False)
                 costos_viaje.viaje = viaje
-            costos_viaje.save()
-            
-            # Si es edición, eliminar registros antiguos antes de crear nuevos
-            if es_edicion:
-                costos_viaje.puntos_recarga.all().delete()
-                costos_viaje.viaje.peajes.filter(costos_viaje=costos_viaje).delete()
-                costos_viaje.mantenimientos.clear()
-            
-            # Procesar mantenimientos
-            mantenimientos_list = []
-            bus = costos_viaje.viaje.bus
-            for key in request.POST:
-                if key.startswith('nuevo_mant_fecha_'):
-                    idx = key.split('_')[-1]
-                    fecha = request.POST.get(f'nuevo_mant_fecha_{idx}', '').strip()
-                    tipo = request.POST.get(f'nuevo_mant_tipo_{idx}', '').strip()
-                    costo = request.POST.get(f'nuevo_mant_costo_{idx}', '').strip()
-                    kilometraje = request.POST.get(f'nuevo_mant_kilometraje_{idx}', '').strip()
-                    proveedor = request.POST.get(f'nuevo_mant_proveedor_{idx}', '').strip()
-                    taller = request.POST.get(f'nuevo_mant_taller_{idx}', '').strip()
-                    descripcion = request.POST.get(f'nuevo_mant_descripcion_{idx}', '').strip()
-                    observaciones = request.POST.get(f'nuevo_mant_observaciones_{idx}', '').strip()
-                    
-                    if fecha and tipo and descripcion:
-                        try:
-                            costo_mant = Decimal(costo) if costo else Decimal('0')
-                            km_mant = int(kilometraje) if kilometraje else 0
-                            
-                            nuevo_mantenimiento = Mantenimiento.objects.create(
-                                bus=bus,
-                                fecha_mantenimiento=fecha,
-                                tipo=tipo,
-                                costo=costo_mant,
-                                kilometraje=km_mant,
-                                proveedor=proveedor if proveedor else None,
-                                taller=taller,
-                                descripcion=descripcion,
-                                observaciones=observaciones
-                            )
-                            mantenimientos_list.append(nuevo_mantenimiento)
-                        except Exception as e:
-                            messages.warning(request, f'No se pudo crear el mantenimiento: {str(e)}')
-            
-            # Asociar todos los mantenimientos al registro de costos
-            if mantenimientos_list:
-                costos_viaje.mantenimientos.set(mantenimientos_list)
-                costos_viaje.mantenimiento = sum(Decimal(str(m.costo)) for m in mantenimientos_list)
-            
-            # Procesar peajes dinámicos
-            total_peajes = Decimal('0')
-            for key in request.POST:
-                if key.startswith('peaje_lugar_'):
-                    idx = key.split('_')[-1]
-                    lugar = request.POST.get(f'peaje_lugar_{idx}', '').strip()
-                    monto = request.POST.get(f'peaje_monto_{idx}', '').strip()
-                    fecha_pago = request.POST.get(f'peaje_fecha_{idx}', '').strip()
-                    voucher = request.FILES.get(f'peaje_voucher_{idx}')
-                    
-                    if lugar and monto:
-                        try:
-                            monto_decimal = Decimal(monto)
-                            
-                            # Usar la fecha proporcionada o la actual
-                            if fecha_pago:
-                                from datetime import datetime as dt
-                                fecha = dt.strptime(fecha_pago, '%Y-%m-%d').date()
-                            else:
-                                fecha = datetime.now().date()
-                            
-                            peaje = Peaje.objects.create(
-                                viaje=costos_viaje.viaje,
-                                costos_viaje=costos_viaje,
-                                lugar=lugar,
-                                monto=monto_decimal,
-                                fecha_pago=fecha,
-                                comprobante=voucher if voucher else ""
-                            )
-                            total_peajes += monto_decimal
-                        except Exception as e:
-                            messages.warning(request, f'No se pudo crear el peaje: {str(e)}')
-            
-            costos_viaje.peajes = total_peajes
-            
-            # Procesar puntos de recarga dinámicos
-            for key in request.POST:
-                if key.startswith('recarga_lugar_'):
-                    idx = key.split('_')[-1]
-                    orden = request.POST.get(f'recarga_orden_{idx}', '').strip()
-                    lugar = request.POST.get(f'recarga_lugar_{idx}', '').strip()
-                    sucursal = request.POST.get(f'recarga_sucursal_{idx}', '').strip()
-                    kilometraje = request.POST.get(f'recarga_kilometraje_{idx}', '').strip()
-                    litros = request.POST.get(f'recarga_litros_{idx}', '').strip()
-                    precio = request.POST.get(f'recarga_precio_{idx}', '').strip()
-                    fecha_pago = request.POST.get(f'recarga_fecha_{idx}', '').strip()
-                    voucher = request.FILES.get(f'recarga_voucher_{idx}')
-                    
-                    if lugar and kilometraje and litros and precio:
-                        try:
-                            # Crear ubicación completa
-                            ubicacion_completa = lugar
-                            if sucursal:
-                                ubicacion_completa += f" - {sucursal}"
-                            
-                            # Crear observaciones con la fecha si existe
-                            observaciones = ""
-                            if fecha_pago:
-                                observaciones = f"Fecha de pago: {fecha_pago}"
-                            
-                            PuntoRecarga.objects.create(
-                                costos_viaje=costos_viaje,
-                                orden=int(orden) if orden else int(idx),
-                                kilometraje=Decimal(kilometraje),
-                                precio_combustible=Decimal(precio),
-                                litros_cargados=Decimal(litros),
-                                ubicacion=ubicacion_completa,
-                                observaciones=observaciones,
-                                comprobante=voucher if voucher else ""
-                            )
-                        except Exception as e:
-                            messages.warning(request, f'No se pudo crear el punto de recarga: {str(e)}')
-            
-            # Recalcular el costo total de combustible
-            costos_viaje.calcular_costo_combustible()
-            
-            # Procesar otros costos
-            total_otros_costos = Decimal('0')
-            observaciones_otros_costos = []
-            
-            for key in request.POST:
-                if key.startswith('otro_costo_tipo_'):
-                    idx = key.split('_')[-1]
-                    tipo = request.POST.get(f'otro_costo_tipo_{idx}', '').strip()
-                    monto = request.POST.get(f'otro_costo_monto_{idx}', '').strip()
-                    descripcion = request.POST.get(f'otro_costo_descripcion_{idx}', '').strip()
-                    voucher = request.FILES.get(f'otro_costo_voucher_{idx}')
-                    
+                if not es_edicion:
+                    costos_viaje.save()
+
+                # Cada grupo de filas se compara con lo existente: se crean, actualizan
+                # y eliminan solo las filas que cambiaron
+                _guardar_mantenimientos(request, costos_viaje, filas['nuevo_mant'])
+                costos_viaje.peajes = _guardar_peajes(request, costos_viaje, filas['peaje'], es_edicion)
+                _guardar_puntos_recarga(request, costos_viaje, filas['recarga'])
+
+                # Recalcular kilómetros y el costo total de combustible
+                recalcular_kilometros(costos_viaje)
+
+                # Procesar otros costos
+                total_otros_costos = Decimal('0')
+                observaciones_otros_costos = []
+
+                for idx, fila in filas['otro_costo'].items():
+                    tipo = fila.get('tipo', '')
+                    monto = fila.get('monto', '')
+                    descripcion = fila.get('descripcion', '')
+                    voucher = fila.get('voucher')
+
                     if tipo and monto and descripcion:
                         try:
                             # Limpiar el monto de caracteres no numéricos excepto punto y coma
                             monto_limpio = monto.replace(',', '').replace('$', '').replace(' ', '')
                             monto_decimal = Decimal(monto_limpio)
                             total_otros_costos += monto_decimal
-                            
+
                             # Agregar a observaciones
                             obs = f"{tipo.upper()}: {descripcion} - ${monto_decimal}"
                             if voucher:
@@ -1221,17 +811,17 @@ def registrar_costos_completo(request, viaje_id):
                             observaciones_otros_costos.append(obs)
                         except Exception as e:
                             messages.warning(request, f'No se pudo procesar el costo {tipo}: {str(e)}')
-            
-            # Actualizar otros_costos y observaciones
-            costos_viaje.otros_costos = total_otros_costos
-            if observaciones_otros_costos:
-                obs_actuales = costos_viaje.observaciones or ''
-                if obs_actuales:
-                    obs_actuales += '\n\n'
-                obs_actuales += 'OTROS COSTOS:\n' + '\n'.join(observaciones_otros_costos)
-                costos_viaje.observaciones = obs_actuales
-            
-            costos_viaje.save()
+
+                # Actualizar otros_costos y observaciones
+                costos_viaje.otros_costos = total_otros_costos
+                if observaciones_otros_costos:
+                    obs_actuales = costos_viaje.observaciones or ''
+                    if obs_actuales:
+                        obs_actuales += '\n\n'
+                    obs_actuales += 'OTROS COSTOS:\n' + '\n'.join(observaciones_otros_costos)
+                    costos_viaje.observaciones = obs_actuales
+
+                costos_viaje.save()
             
             if es_edicion:
                 messages.success(request, 'Costos del viaje actualizados exitosamente.')
@@ -1345,3 +935,43 @@ def registrar_costos_completo(request, viaje_id):
     }
     
     return render(request, 'costos/costos_completo_form.html', context)
+
+
+@admin_required
+def exportar_informes_costos(request):
+    """
+    Exporta en lote los informes de costos de un rango de fechas o de una lista de ids,
+    como un ZIP que se transmite a medida que se generan o como un único PDF combinado.
+    """
+    form = ExportarInformesForm(request.GET or None)
+    if not form.is_valid():
+        for error in form.non_field_errors() or [e for errores in form.errors.values() for e in errores]:
+            messages.error(request, error)
+        return redirect('costos:gestion')
+
+    datos = form.cleaned_data
+    costos_ids = seleccionar_costos(datos['desde'], datos['hasta'], datos['ids'])
+    if not costos_ids:
+        messages.error(request, 'No hay costos registrados para los criterios indicados.')
+        return redirect('costos:gestion')
+
+    sufijo = datetime.now().strftime('%Y%m%d_%H%M')
+    # Secuencial dentro de la petición: el pool de procesos (INFORMES_LOTE_WORKERS) es solo
+    # para el comando exportar_informes_costos, que no comparte conexiones con el servidor web
+    informes = generar_informes(costos_ids, workers=1)
+    if datos['formato'] == 'pdf':
+        response = HttpResponse(content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="informes_costos_{sufijo}.pdf"'
+        combinar_pdf(informes, response)
+        return response
+
+    response = StreamingHttpResponse(zip_en_streaming(informes), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="informes_costos_{sufijo}.zip"'
+    return response
+
+
+@admin_required
+def exportar_costos(request):
+    """Exporta los costos registrados (con los filtros del listado) en CSV o XLSX, en streaming."""
+    costos = FiltroCostosForm(request.GET or None).filtrar(CostosViaje.objects.all())
+    return respuesta_exportacion('costos_viajes', ENCABEZADOS_COSTOS, filas_costos(costos), request.GET.get('formato'))
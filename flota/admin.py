@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Bus, DocumentoVehiculo, Mantenimiento
+from .models import Bus, DocumentoVehiculo, Mantenimiento, NotificacionVencimiento
 
 
 @admin.register(Bus)
@@ -59,3 +59,11 @@ class MantenimientoAdmin(admin.ModelAdmin):
             'fields': ('observaciones',)
         }),
     )
+
+
+@admin.register(NotificacionVencimiento)
+class NotificacionVencimientoAdmin(admin.ModelAdmin):
+    list_display = ('documento', 'destinatario', 'fecha_vencimiento', 'enviado_en')
+    list_filter = ('enviado_en',)
+    search_fields = ('documento__bus__placa', 'destinatario')
+    list_select_related = ('documento__bus',)
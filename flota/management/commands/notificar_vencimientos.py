@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from flota.notificaciones import notificar_vencimientos
+
+
+class Command(BaseCommand):
+    help = ('Envía por correo, agrupados por destinatario, los documentos de vehículos que vencen en los '
+            'próximos días. No repite avisos ya enviados: puede programarse cada día.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.NOTIFICACIONES_VENCIMIENTO_DIAS,
+                            help='Días de anticipación (por defecto NOTIFICACIONES_VENCIMIENTO_DIAS).')
+        parser.add_argument('--simular', action='store_true',
+                            help='Solo informa cuántos correos se enviarían, sin enviarlos ni registrarlos.')
+
+    def handle(self, *args, **options):
+        correos, avisos = notificar_vencimientos(options['dias'], simular=options['simular'])
+        if not correos:
+            self.stdout.write(self.style.SUCCESS('✓ No hay avisos de vencimiento pendientes.'))
+            return
+        verbo = 'Se enviarían' if options['simular'] else 'Se enviaron'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {verbo} {correos} correo(s) con {avisos} aviso(s) de vencimiento.'
+        ))
@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from flota.models import DocumentoVehiculo
+
+
+class Command(BaseCommand):
+    help = ('Recalcula el estado (vigente, por vencer, vencido) de todos los documentos de vehículos '
+            'según la fecha de hoy. Pensado para ejecutarse cada noche.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', type=date.fromisoformat, default=None,
+                            help='Fecha de referencia (AAAA-MM-DD). Por defecto, hoy.')
+
+    def handle(self, *args, **options):
+        actualizados = DocumentoVehiculo.objects.actualizar_estados(options['fecha'])
+        total = sum(actualizados.values())
+        if not total:
+            self.stdout.write(self.style.SUCCESS('✓ Estados de documentos al día.'))
+            return
+        detalle = ', '.join(f'{cantidad} a {estado}' for estado, cantidad in actualizados.items() if cantidad)
+        self.stdout.write(self.style.SUCCESS(f'✓ Se actualizaron {total} documento(s): {detalle}.'))
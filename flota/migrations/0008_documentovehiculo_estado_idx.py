@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0007_alter_mantenimiento_costo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentovehiculo',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='flota_doc_estado_venc_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0008_documentovehiculo_estado_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionVencimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatario', models.EmailField(max_length=254)),
+                ('fecha_vencimiento', models.DateField(help_text='Fecha de vencimiento informada')),
+                ('enviado_en', models.DateTimeField(auto_now_add=True)),
+                ('documento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones', to='flota.documentovehiculo')),
+            ],
+            options={
+                'verbose_name': 'Notificación de Vencimiento',
+                'verbose_name_plural': 'Notificaciones de Vencimiento',
+                'ordering': ['-enviado_en'],
+                'constraints': [models.UniqueConstraint(fields=('documento', 'destinatario', 'fecha_vencimiento'), name='flota_notificacion_unica')],
+            },
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
-from datetime import date
+from datetime import date, timedelta
+
+# Días antes del vencimiento en que un documento pasa a 'por_vencer'
+DIAS_POR_VENCER = 30
 
 class Bus(models.Model):
     """
@@ -33,6 +36,49 @@ class Bus(models.Model):
         return f"{self.placa} - {self.modelo}"  # SE MANTIENE PLACA EN REPRESENTACIÓN
 
 
+class DocumentoVehiculoQuerySet(models.QuerySet):
+    """
+    El estado guardado solo se recalcula al guardar (y cada noche con el comando
+    refresh_document_status); estas consultas lo derivan de la fecha de hoy.
+    """
+    def _limite_por_vencer(self, hoy):
+        return hoy + timedelta(days=DIAS_POR_VENCER)
+
+    def con_estado_actual(self, hoy=None):
+        """Anota `estado_actual`, calculado en la base de datos a partir de fecha_vencimiento."""
+        hoy = hoy or date.today()
+        return self.annotate(estado_actual=models.Case(
+            models.When(fecha_vencimiento__lt=hoy, then=models.Value('vencido')),
+            models.When(fecha_vencimiento__lte=self._limite_por_vencer(hoy), then=models.Value('por_vencer')),
+            default=models.Value('vigente'),
+            output_field=models.CharField(),
+        ))
+
+    def vencidos(self, hoy=None):
+        return self.filter(fecha_vencimiento__lt=hoy or date.today())
+
+    def por_vencer(self, hoy=None, dias=DIAS_POR_VENCER):
+        hoy = hoy or date.today()
+        return self.filter(fecha_vencimiento__gte=hoy, fecha_vencimiento__lte=hoy + timedelta(days=dias))
+
+    def actualizar_estados(self, hoy=None):
+        """
+        Corrige el estado guardado con un UPDATE por estado, tocando solo las filas
+        desactualizadas. Retorna {estado: filas_actualizadas}.
+        """
+        hoy = hoy or date.today()
+        limite = self._limite_por_vencer(hoy)
+        rangos = {
+            'vencido': models.Q(fecha_vencimiento__lt=hoy),
+            'por_vencer': models.Q(fecha_vencimiento__gte=hoy, fecha_vencimiento__lte=limite),
+            'vigente': models.Q(fecha_vencimiento__gt=limite),
+        }
+        return {
+            estado: self.filter(rango).exclude(estado=estado).update(estado=estado)
+            for estado, rango in rangos.items()
+        }
+
+
 class DocumentoVehiculo(models.Model):
     """
     Modelo para registrar documentos del vehículo (SOAT, REC, etc).
@@ -65,10 +111,15 @@ class DocumentoVehiculo(models.Model):
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
 
+    objects = DocumentoVehiculoQuerySet.as_manager()
+
     class Meta:
         ordering = ['-fecha_vencimiento']
         verbose_name = 'Documento Vehículo'
         verbose_name_plural = 'Documentos Vehículos'
+        indexes = [
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='flota_doc_estado_venc_idx'),
+        ]
 
     def __str__(self):
         return f"{self.bus.placa} - {self.get_tipo_display()}"  # SE MANTIENE PLACA
@@ -86,11 +137,38 @@ class DocumentoVehiculo(models.Model):
         
         if dias_para_vencer < 0:
             self.estado = 'vencido'
-        elif dias_para_vencer <= 30:
+        elif dias_para_vencer <= DIAS_POR_VENCER:
             self.estado = 'por_vencer'
         else:
             self.estado = 'vigente'
 
+    def get_estado_actual_display(self):
+        """Etiqueta del estado anotado por con_estado_actual() (o del guardado si no se anotó)."""
+        return dict(self.ESTADO_DOCUMENTO).get(getattr(self, 'estado_actual', self.estado), self.estado)
+
+
+class NotificacionVencimiento(models.Model):
+    """
+    Aviso de vencimiento ya enviado a un destinatario. Evita repetir el aviso; al
+    renovar el documento cambia su fecha de vencimiento y se vuelve a avisar.
+    """
+    documento = models.ForeignKey(DocumentoVehiculo, on_delete=models.CASCADE, related_name='notificaciones')
+    destinatario = models.EmailField()
+    fecha_vencimiento = models.DateField(help_text='Fecha de vencimiento informada')
+    enviado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-enviado_en']
+        verbose_name = 'Notificación de Vencimiento'
+        verbose_name_plural = 'Notificaciones de Vencimiento'
+        constraints = [
+            models.UniqueConstraint(fields=['documento', 'destinatario', 'fecha_vencimiento'],
+                                    name='flota_notificacion_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.documento} → {self.destinatario} ({self.enviado_en:%d/%m/%Y})"
+
 
 class Mantenimiento(models.Model):
     """
@@ -0,0 +1,99 @@
+"""
+Avisos por correo de documentos de vehículos próximos a vencer.
+
+Se juntan todos los documentos que vencen en los próximos N días, se agrupan por
+destinatario (un solo correo con la lista completa para cada uno) y se envían
+por una única conexión al servidor de correo. Cada aviso enviado queda en
+NotificacionVencimiento, de modo que volver a ejecutar el proceso no repite avisos.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+
+from .models import DocumentoVehiculo, NotificacionVencimiento
+
+
+def destinatarios():
+    """Correos de los administradores (superusuarios o grupo Admin) más los configurados."""
+    correos = User.objects.filter(
+        Q(is_superuser=True) | Q(groups__name='Admin'), is_active=True
+    ).exclude(email='').values_list('email', flat=True).distinct()
+    extra = getattr(settings, 'NOTIFICACIONES_VENCIMIENTO_DESTINATARIOS', [])
+    return sorted({correo.strip().lower() for correo in [*correos, *extra] if correo.strip()})
+
+
+def pendientes_por_destinatario(dias, hoy=None):
+    """
+    Retorna {destinatario: [documentos]} con los documentos que vencen en los
+    próximos `dias` días y que aún no se le avisaron a cada destinatario.
+    """
+    hoy = hoy or date.today()
+    correos = destinatarios()
+    documentos = list(
+        DocumentoVehiculo.objects.por_vencer(hoy, dias).select_related('bus').order_by('fecha_vencimiento', 'pk')
+    )
+    if not correos or not documentos:
+        return {}
+
+    enviados = set(NotificacionVencimiento.objects.filter(
+        documento__in=documentos, destinatario__in=correos
+    ).values_list('documento_id', 'destinatario', 'fecha_vencimiento'))
+    pendientes = {}
+    for correo in correos:
+        faltantes = [d for d in documentos if (d.pk, correo, d.fecha_vencimiento) not in enviados]
+        if faltantes:
+            pendientes[correo] = faltantes
+    return pendientes
+
+
+def construir_mensaje(destinatario, documentos, hoy, connection=None):
+    """Correo con la lista de documentos por vencer de un destinatario."""
+    lineas = [
+        f'- {documento.bus.placa}: {documento.get_tipo_display()} N° {documento.numero_documento}, '
+        f'vence el {documento.fecha_vencimiento:%d/%m/%Y} ({(documento.fecha_vencimiento - hoy).days} días)'
+        for documento in documentos
+    ]
+    cuerpo = (
+        'Estimado/a,\n\n'
+        'Los siguientes documentos de vehículos están próximos a vencer:\n\n'
+        + '\n'.join(lineas)
+        + '\n\nRecuerde renovarlos a tiempo.\n\nSaludos,\nSistema FlotaGest'
+    )
+    return EmailMessage(
+        subject=f'Documentos por vencer: {len(documentos)} documento(s)',
+        body=cuerpo,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[destinatario],
+        connection=connection,
+    )
+
+
+def notificar_vencimientos(dias=None, hoy=None, simular=False):
+    """
+    Envía un correo por destinatario con sus documentos pendientes de aviso.
+    Cada correo se registra apenas se envía: si el servidor falla a mitad de
+    camino, la siguiente ejecución solo reintenta los que faltaron.
+    Retorna (correos_enviados, avisos_registrados).
+    """
+    dias = settings.NOTIFICACIONES_VENCIMIENTO_DIAS if dias is None else dias
+    hoy = hoy or date.today()
+    pendientes = pendientes_por_destinatario(dias, hoy)
+    if simular or not pendientes:
+        return len(pendientes), sum(len(documentos) for documentos in pendientes.values())
+
+    correos = avisos = 0
+    # Una sola conexión (un solo login SMTP) para todos los correos
+    with get_connection() as connection:
+        for destinatario, documentos in pendientes.items():
+            connection.send_messages([construir_mensaje(destinatario, documentos, hoy, connection)])
+            NotificacionVencimiento.objects.bulk_create([
+                NotificacionVencimiento(documento=documento, destinatario=destinatario,
+                                        fecha_vencimiento=documento.fecha_vencimiento)
+                for documento in documentos
+            ], ignore_conflicts=True)
+            correos += 1
+            avisos += len(documentos)
+    return correos, avisos
@@ -1,5 +1,18 @@
-from django.test import TestCase
-from .models import Bus, DocumentoVehiculo, Mantenimiento
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import notificaciones
+from .models import Bus, DocumentoVehiculo, Mantenimiento, NotificacionVencimiento
 
 
 class BusTestCase(TestCase):
@@ -17,3 +30,179 @@ class BusTestCase(TestCase):
     def test_bus_creation(self):
         self.assertEqual(self.bus.placa, 'ABC123')
         self.assertEqual(self.bus.estado, 'activo')
+
+
+class DocumentoVehiculoEstadoTestCase(TestCase):
+    def setUp(self):
+        self.bus = Bus.objects.create(
+            placa='ABC123', modelo='Mercedes Benz O-500', año_fabricacion=2020, capacidad_pasajeros=50,
+            numero_chasis='CH123456789', numero_motor='MO123456789', fecha_adquisicion='2020-05-15'
+        )
+        hoy = date.today()
+        self.documentos = {
+            estado: DocumentoVehiculo.objects.create(
+                bus=self.bus, tipo='soat', numero_documento=f'DOC-{estado}', fecha_emision=hoy - timedelta(days=300),
+                fecha_vencimiento=hoy + timedelta(days=dias)
+            )
+            for estado, dias in [('vencido', -1), ('por_vencer', 0), ('por_vencer_limite', 30), ('vigente', 31)]
+        }
+        # Simula el paso del tiempo: todos quedan guardados como vigentes
+        DocumentoVehiculo.objects.update(estado='vigente')
+
+    def _estados(self, queryset):
+        return dict(queryset.values_list('numero_documento', 'estado_actual'))
+
+    def test_estado_actual_se_deriva_de_la_fecha(self):
+        estados = self._estados(DocumentoVehiculo.objects.con_estado_actual())
+        self.assertEqual(estados, {
+            'DOC-vencido': 'vencido', 'DOC-por_vencer': 'por_vencer',
+            'DOC-por_vencer_limite': 'por_vencer', 'DOC-vigente': 'vigente',
+        })
+        documento = DocumentoVehiculo.objects.con_estado_actual().get(numero_documento='DOC-vencido')
+        self.assertEqual(documento.get_estado_actual_display(), 'Vencido')
+        self.assertEqual(DocumentoVehiculo.objects.vencidos().count(), 1)
+        self.assertEqual(DocumentoVehiculo.objects.por_vencer().count(), 2)
+
+    def test_comando_actualiza_solo_los_desactualizados(self):
+        salida = StringIO()
+        with CaptureQueriesContext(connection) as contexto:
+            call_command('refresh_document_status', stdout=salida)
+        self.assertEqual(len(contexto), 3)
+        self.assertIn('3 documento(s)', salida.getvalue())
+        guardados = dict(DocumentoVehiculo.objects.values_list('numero_documento', 'estado'))
+        self.assertEqual(guardados, self._estados(DocumentoVehiculo.objects.con_estado_actual()))
+        self.assertEqual(DocumentoVehiculo.objects.actualizar_estados(), {'vencido': 0, 'por_vencer': 0, 'vigente': 0})
+
+        # Con una fecha posterior el vigente pasa a por vencer
+        manana = date.today() + timedelta(days=1)
+        self.assertEqual(DocumentoVehiculo.objects.actualizar_estados(manana)['por_vencer'], 1)
+
+
+@override_settings(NOTIFICACIONES_VENCIMIENTO_DESTINATARIOS=['flota@example.com'])
+class NotificarVencimientosTestCase(TestCase):
+    def setUp(self):
+        self.bus = Bus.objects.create(
+            placa='ABC123', modelo='Mercedes Benz O-500', año_fabricacion=2020, capacidad_pasajeros=50,
+            numero_chasis='CH123456789', numero_motor='MO123456789', fecha_adquisicion='2020-05-15'
+        )
+        User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        operador = User.objects.create_user('operador', 'operador@example.com', 'clave')
+        operador.groups.add(Group.objects.create(name='Admin'))
+        User.objects.create_user('usuario', 'usuario@example.com', 'clave')
+        self.hoy = date.today()
+        self.soat = self._documento('soat', 5)
+        self.revision = self._documento('revision', 20)
+        self._documento('matricula', 90)
+
+    def _documento(self, tipo, dias):
+        return DocumentoVehiculo.objects.create(
+            bus=self.bus, tipo=tipo, numero_documento=f'DOC-{tipo}', fecha_emision=self.hoy - timedelta(days=300),
+            fecha_vencimiento=self.hoy + timedelta(days=dias)
+        )
+
+    def test_un_correo_por_destinatario_en_una_conexion(self):
+        with mock.patch.object(notificaciones, 'get_connection', wraps=notificaciones.get_connection) as conexion:
+            call_command('notificar_vencimientos', '--dias', '30', stdout=StringIO())
+        conexion.assert_called_once()
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['admin@example.com', 'flota@example.com', 'operador@example.com'])
+        cuerpo = mail.outbox[0].body
+        self.assertIn('SOAT N° DOC-soat', cuerpo)
+        self.assertIn('Revisión Técnica N° DOC-revision', cuerpo)
+        self.assertNotIn('DOC-matricula', cuerpo)
+        self.assertEqual(NotificacionVencimiento.objects.count(), 6)
+
+    def test_no_repite_avisos(self):
+        notificaciones.notificar_vencimientos(30)
+        mail.outbox = []
+        self.assertEqual(notificaciones.notificar_vencimientos(30), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+        # Un documento nuevo y uno renovado (nueva fecha de vencimiento) se vuelven a avisar
+        self._documento('seguro', 10)
+        self.soat.fecha_vencimiento = self.hoy + timedelta(days=25)
+        self.soat.save()
+        self.assertEqual(notificaciones.notificar_vencimientos(30), (3, 6))
+        self.assertNotIn('DOC-revision', mail.outbox[0].body)
+
+    def test_simular_no_envia(self):
+        self.assertEqual(notificaciones.notificar_vencimientos(30, simular=True), (3, 6))
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(NotificacionVencimiento.objects.exists())
+
+
+class DescargaDocumentoTestCase(TestCase):
+    CONTENIDO = b'%PDF-1.4 documento de prueba 0123456789'
+
+    def setUp(self):
+        bus = Bus.objects.create(
+            placa='ABC123', modelo='Mercedes Benz O-500', año_fabricacion=2020, capacidad_pasajeros=50,
+            numero_chasis='CH123456789', numero_motor='MO123456789', fecha_adquisicion='2020-05-15'
+        )
+        self.documento = DocumentoVehiculo(
+            bus=bus, tipo='soat', numero_documento='SOAT-1', fecha_emision=date.today(),
+            fecha_vencimiento=date.today() + timedelta(days=365)
+        )
+        self.documento.archivo.save('soat.pdf', ContentFile(self.CONTENIDO))
+        self.url = reverse('flota:documento_descargar', args=[self.documento.pk])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+
+    def tearDown(self):
+        self.documento.archivo.delete(save=False)
+
+    def test_descarga_completa_con_validadores(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENIDO)
+        self.assertEqual(response['Content-Length'], str(len(self.CONTENIDO)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertIn('ETag', response)
+
+    def test_tramos(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-12')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENIDO[5:13])
+        self.assertEqual(response['Content-Range'], f'bytes 5-12/{len(self.CONTENIDO)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENIDO[-4:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.CONTENIDO)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.CONTENIDO)}')
+
+        # Varios tramos o un If-Range desactualizado: se envía el archivo completo
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-1,4-5').status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"otro"').status_code, 200)
+
+    def test_no_modificado(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(self.url, HTTP_IF_RANGE=etag, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+
+    @override_settings(DESCARGAS_BACKEND='nginx', DESCARGAS_NGINX_PREFIJO='/protegido/')
+    def test_nginx_x_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protegido/' + self.documento.archivo.name)
+        self.assertEqual(response.content, b'')
+
+    @override_settings(DESCARGAS_BACKEND='apache')
+    def test_apache_x_sendfile(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.documento.archivo.path)
+        self.assertEqual(response.content, b'')
+
+    def test_solo_admin_y_archivo_existente(self):
+        self.client.force_login(User.objects.create_user('usuario', 'usuario@example.com', 'clave'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+        self.client.force_login(User.objects.get(username='admin'))
+        self.documento.archivo.storage.delete(self.documento.archivo.name)
+        self.assertRedirects(self.client.get(self.url), reverse('flota:bus_detail', args=[self.documento.bus_id]))
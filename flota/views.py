@@ -3,14 +3,14 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.utils import timezone
-from django.http import HttpResponseRedirect, FileResponse
+from django.http import HttpResponseRedirect
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_http_methods
 from django.db.models import Sum
-import os
 from .models import Bus, DocumentoVehiculo, Mantenimiento
 from .forms import BusForm, MantenimientoForm, DocumentoVehiculoForm
 from core.permissions import admin_required
+from core.descargas import respuesta_descarga
 
 # Vistas de Buses (Proyecto Principal)
 @method_decorator(admin_required, name='dispatch')
@@ -35,7 +35,7 @@ class BusDetailView(DetailView):
         bus = self.object
         # Agregar mantenimientos y documentos al contexto
         context['mantenimientos'] = bus.mantenimientos.all().order_by('-fecha_mantenimiento')
-        context['documentos'] = bus.documentos.all().order_by('-fecha_vencimiento')
+        context['documentos'] = bus.documentos.con_estado_actual().order_by('-fecha_vencimiento')
         context['today'] = timezone.now().date()
         
         # Calcular costo total de mantenimientos
@@ -78,7 +78,7 @@ class BusDeleteView(View):
     """
     def get(self, request, pk):
         bus = get_object_or_404(Bus, pk=pk)
-        viajes = bus.viajes.all()
+        viajes = bus.viajes.select_related('lugar_origen', 'lugar_destino')
         
         # Si no hay viajes, eliminar directamente
         if not viajes.exists():
@@ -241,17 +241,10 @@ def descargar_documento(request, pk):
         messages.error(request, 'Este documento no tiene un archivo adjunto.')
         return redirect('flota:bus_detail', pk=documento.bus.pk)
     
-    # Obtener la ruta del archivo
-    archivo_path = documento.archivo.path
-    
     # Verificar que el archivo existe
-    if not os.path.exists(archivo_path):
+    if not documento.archivo.storage.exists(documento.archivo.name):
         messages.error(request, 'El archivo no se encontró en el servidor.')
         return redirect('flota:bus_detail', pk=documento.bus.pk)
     
-    # Enviar el archivo para descargar
-    return FileResponse(
-        open(archivo_path, 'rb'),
-        as_attachment=True,
-        filename=os.path.basename(archivo_path)
-    )
\ No newline at end of file
+    # Enviar el archivo (Django, nginx o Apache según DESCARGAS_BACKEND)
+    return respuesta_descarga(request, documento.archivo)
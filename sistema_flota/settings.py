@@ -72,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.permisos',
             ],
         },
     },
@@ -159,3 +160,37 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('EMAIL_HOST_USER', default='noreply@flotagest.com')
+
+# Avisos de vencimiento de documentos (python manage.py notificar_vencimientos).
+# Se envían a los administradores con correo y a estas direcciones adicionales
+NOTIFICACIONES_VENCIMIENTO_DIAS = 30
+NOTIFICACIONES_VENCIMIENTO_DESTINATARIOS = config('NOTIFICACIONES_VENCIMIENTO_DESTINATARIOS', default='', cast=Csv())
+
+# Envío de formularios de costos a conductores (en segundo plano, ver costos/tareas.py).
+# Máximo de correos por minuto para no superar el límite del servidor SMTP
+CORREOS_POR_MINUTO = config('CORREOS_POR_MINUTO', default=20, cast=int)
+
+# Servicio de rutas (OSRM) y caché de distancias
+OSRM_BASE_URL = config('OSRM_BASE_URL', default='http://router.project-osrm.org')
+OSRM_TIMEOUT = 10
+RUTAS_CACHE_TTL_DIAS = 90
+RUTAS_CACHE_MAX_ENTRADAS = 10000
+
+# Cola de tareas en segundo plano (python manage.py procesar_tareas)
+TAREAS_MAX_INTENTOS = 5
+TAREAS_BACKOFF_BASE = 30  # segundos; se duplica en cada reintento
+TAREAS_BACKOFF_MAX = 3600
+TAREAS_TIMEOUT_BLOQUEO = 600  # segundos antes de liberar una tarea de un worker caído
+
+# Fotos de cédula y licencia de conductores (procesadas en segundo plano, ver core/imagenes.py)
+IMAGENES_LADO_MAXIMO = 1600  # px del lado mayor de la foto guardada
+IMAGENES_CALIDAD = 85
+IMAGENES_LADO_MINIATURA = 320
+IMAGENES_CALIDAD_MINIATURA = 75
+
+# Descarga de documentos y comprobantes (ver core/descargas.py): 'python', 'nginx' o 'apache'
+DESCARGAS_BACKEND = config('DESCARGAS_BACKEND', default='python')
+DESCARGAS_NGINX_PREFIJO = config('DESCARGAS_NGINX_PREFIJO', default='/media-protegido/')
+
+# Exportación en lote de informes de costos: procesos en paralelo del comando exportar_informes_costos
+INFORMES_LOTE_WORKERS = config('INFORMES_LOTE_WORKERS', default=4, cast=int)
@@ -0,0 +1,25 @@
+"""
+Configuración para ejecutar los tests sin MySQL (SQLite en memoria).
+
+    python manage.py test --settings=sistema_flota.settings_test
+"""
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+# Hash rápido: los tests crean usuarios constantemente
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+MEDIA_ROOT = tempfile.mkdtemp(prefix='flota_test_media_')
+
+# Los tests nunca deben llamar al servicio de rutas real
+OSRM_BASE_URL = 'http://127.0.0.1:9'
+OSRM_TIMEOUT = 1
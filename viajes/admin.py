@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Viaje
+from .models import Viaje, DistanciaRutaCache
 
 
 @admin.register(Viaje)
@@ -33,4 +33,11 @@ class ViajeAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
-    readonly_fields = ('creado_en', 'actualizado_en', 'latitud_origen', 'longitud_origen', 'latitud_destino', 'longitud_destino')
+    readonly_fields = ('pasajeros_confirmados', 'creado_en', 'actualizado_en', 'latitud_origen', 'longitud_origen', 'latitud_destino', 'longitud_destino')
+
+
+@admin.register(DistanciaRutaCache)
+class DistanciaRutaCacheAdmin(admin.ModelAdmin):
+    list_display = ('lat_origen', 'lon_origen', 'lat_destino', 'lon_destino', 'distancia_km', 'hits', 'misses', 'calculado_en', 'ultimo_uso')
+    list_filter = ('calculado_en',)
+    readonly_fields = ('hits', 'misses', 'calculado_en', 'ultimo_uso', 'creado_en')
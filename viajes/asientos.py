@@ -0,0 +1,204 @@
+"""
+Asignación de asientos por viaje con un mapa de bits de ocupación.
+
+Cada viaje guarda en `Viaje.asientos_ocupados` un mapa de bits (bit i-1 =
+asiento i ocupado, en bytes little-endian), de modo que la disponibilidad se
+responde con operaciones sobre un entero de Python, sin leer filas de
+ViajePasajero. Los asientos se numeran de 1 a `Bus.capacidad_pasajeros`.
+
+Las asignaciones bloquean la fila del viaje (select_for_update) mientras leen y
+reescriben el mapa, y la restricción única (viaje, asiento) de ViajePasajero
+impide duplicados aunque algún código escriba sin pasar por este módulo.
+Al eliminar un ViajePasajero, la señal de viajes/signals.py libera su asiento.
+"""
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Viaje, ViajePasajero
+
+
+def numero_asiento(valor):
+    """'12' -> 12; vacío o no numérico -> None."""
+    valor = str(valor or '').strip()
+    return int(valor) if valor.isdigit() and int(valor) > 0 else None
+
+
+class MapaAsientos:
+    """Ocupación de los asientos de un viaje como mapa de bits."""
+
+    def __init__(self, capacidad, ocupados=0):
+        self.capacidad = max(capacidad or 0, 0)
+        self.ocupados = ocupados
+        self.todos = (1 << self.capacidad) - 1
+
+    @classmethod
+    def desde_bytes(cls, capacidad, datos):
+        return cls(capacidad, int.from_bytes(bytes(datos or b''), 'little'))
+
+    @classmethod
+    def de_viaje(cls, viaje):
+        capacidad = viaje.bus.capacidad_pasajeros if viaje.bus_id else 0
+        return cls.desde_bytes(capacidad, viaje.asientos_ocupados)
+
+    @staticmethod
+    def bits_a_bytes(ocupados):
+        return ocupados.to_bytes((ocupados.bit_length() + 7) // 8, 'little')
+
+    def a_bytes(self):
+        return self.bits_a_bytes(self.ocupados)
+
+    def ocupado(self, asiento):
+        return bool(self.ocupados >> (asiento - 1) & 1)
+
+    def disponible(self, asiento):
+        return 1 <= asiento <= self.capacidad and not self.ocupado(asiento)
+
+    def cantidad_ocupados(self):
+        return (self.ocupados & self.todos).bit_count()
+
+    def cantidad_libres(self):
+        return self.capacidad - self.cantidad_ocupados()
+
+    def libres(self):
+        """Números de los asientos libres, en orden."""
+        libres = ~self.ocupados & self.todos
+        asientos = []
+        while libres:
+            menor = libres & -libres
+            asientos.append(menor.bit_length())
+            libres ^= menor
+        return asientos
+
+    def siguiente_libre(self, desde=1):
+        """Primer asiento libre con número >= desde, o None."""
+        libres = ~self.ocupados & self.todos & ~((1 << (desde - 1)) - 1)
+        return (libres & -libres).bit_length() or None
+
+    def mejor_bloque(self, cantidad):
+        """
+        Primer asiento de un bloque de `cantidad` asientos contiguos libres, o None.
+        Se elige el tramo libre más corto en que caben (y el primero ante empates),
+        para no partir los tramos largos que necesitarán grupos más grandes.
+        """
+        if cantidad < 1:
+            return None
+        libres = ~self.ocupados & self.todos
+        mejor = None
+        while libres:
+            inicio = (libres & -libres).bit_length()
+            tramo = libres >> (inicio - 1)
+            largo = (~tramo & (tramo + 1)).bit_length() - 1
+            if largo >= cantidad and (mejor is None or largo < mejor[1]):
+                mejor = (inicio, largo)
+                if largo == cantidad:
+                    break
+            libres &= ~(((1 << largo) - 1) << (inicio - 1))
+        return mejor[0] if mejor else None
+
+    def ocupar(self, asiento):
+        self.ocupados |= 1 << (asiento - 1)
+
+    def liberar(self, asiento):
+        self.ocupados &= ~(1 << (asiento - 1))
+
+
+@contextmanager
+def mapa_bloqueado(viaje_id):
+    """
+    Abre una transacción, bloquea la fila del viaje y entrega (viaje, mapa).
+    Al salir sin errores guarda el mapa si cambió; si hay una excepción, la
+    transacción se deshace. Lanza ValidationError si el viaje no existe o no
+    tiene bus.
+    """
+    with transaction.atomic():
+        viaje = Viaje.objects.select_for_update().select_related('bus').filter(pk=viaje_id).first()
+        if viaje is None:
+            raise ValidationError('El viaje no existe.')
+        if viaje.bus_id is None:
+            raise ValidationError('El viaje no tiene un bus asignado.')
+        mapa = MapaAsientos.de_viaje(viaje)
+        originales = mapa.ocupados
+        yield viaje, mapa
+        if mapa.ocupados != originales:
+            Viaje.objects.filter(pk=viaje.pk).update(asientos_ocupados=mapa.a_bytes())
+
+
+def _elegir_asiento(mapa, asiento):
+    if asiento in (None, ''):
+        elegido = mapa.siguiente_libre()
+        if elegido is None:
+            raise ValidationError('El bus ha alcanzado su capacidad máxima de pasajeros.')
+        return elegido
+    elegido = numero_asiento(asiento)
+    if elegido is None or elegido > mapa.capacidad:
+        raise ValidationError(f'El asiento debe ser un número entre 1 y {mapa.capacidad}.')
+    if mapa.ocupado(elegido):
+        raise ValidationError(f'El asiento {elegido} ya está ocupado.')
+    return elegido
+
+
+def asignar_asiento(viaje, pasajero, asiento=None, observaciones=''):
+    """
+    Registra al pasajero en el viaje con el asiento indicado o, si no se indica,
+    con el primer asiento libre. Lanza ValidationError si no es posible.
+    """
+    with mapa_bloqueado(viaje.pk) as (viaje, mapa):
+        if ViajePasajero.objects.filter(viaje=viaje, pasajero=pasajero).exists():
+            raise ValidationError(f'El pasajero {pasajero.nombre_completo} ya está registrado en este viaje.')
+        elegido = _elegir_asiento(mapa, asiento)
+        viaje_pasajero = ViajePasajero.objects.create(
+            viaje=viaje, pasajero=pasajero, asiento=str(elegido), observaciones=observaciones,
+        )
+        mapa.ocupar(elegido)
+    return viaje_pasajero
+
+
+def cambiar_asiento(viaje_pasajero, asiento):
+    """
+    Mueve al pasajero a otro asiento libre del viaje; con `asiento` vacío lo deja
+    sin asiento. Si el valor no cambia (incluidos asientos antiguos no numéricos
+    como 'A3') no hace nada.
+    """
+    asiento = str(asiento or '').strip()
+    if asiento == (viaje_pasajero.asiento or ''):
+        return viaje_pasajero
+    with mapa_bloqueado(viaje_pasajero.viaje_id) as (viaje, mapa):
+        actual = numero_asiento(viaje_pasajero.asiento)
+        if actual is not None and actual == numero_asiento(asiento):
+            return viaje_pasajero
+        if actual is not None:
+            mapa.liberar(actual)
+        if asiento:
+            elegido = _elegir_asiento(mapa, asiento)
+            mapa.ocupar(elegido)
+            viaje_pasajero.asiento = str(elegido)
+        else:
+            viaje_pasajero.asiento = None
+        viaje_pasajero.save(update_fields=['asiento'])
+    return viaje_pasajero
+
+
+def liberar_asiento(viaje_id, asiento):
+    """Marca el asiento como libre (lo usa la señal post_delete de ViajePasajero)."""
+    numero = numero_asiento(asiento)
+    if numero is None:
+        return
+    with transaction.atomic():
+        viaje = Viaje.objects.select_for_update().filter(pk=viaje_id).only('asientos_ocupados').first()
+        if viaje is None:
+            return
+        ocupados = int.from_bytes(bytes(viaje.asientos_ocupados or b''), 'little') & ~(1 << (numero - 1))
+        Viaje.objects.filter(pk=viaje_id).update(asientos_ocupados=MapaAsientos.bits_a_bytes(ocupados))
+
+
+def reconstruir_mapa(viaje):
+    """Recalcula el mapa de bits del viaje desde sus ViajePasajero (tras cargas masivas)."""
+    ocupados = 0
+    for asiento in ViajePasajero.objects.filter(viaje=viaje).values_list('asiento', flat=True):
+        numero = numero_asiento(asiento)
+        if numero is not None:
+            ocupados |= 1 << (numero - 1)
+    Viaje.objects.filter(pk=viaje.pk).update(asientos_ocupados=MapaAsientos.bits_a_bytes(ocupados))
+    return ocupados
@@ -0,0 +1,90 @@
+"""
+Detección de conflictos de agenda: un bus o un conductor asignado a dos viajes
+cuyos intervalos [fecha_salida, fecha_llegada_estimada) se superponen.
+Los viajes cancelados no ocupan al bus ni al conductor.
+
+- conflictos_viaje(): valida un viaje nuevo o editado. Dos viajes se cruzan si
+  uno sale antes de que el otro llegue y llega después de que el otro sale; la
+  condición `llegada > salida` se resuelve con los índices (bus, llegada) y
+  (conductor, llegada), que solo recorren los viajes que terminan después de la
+  salida del nuevo, no todo el historial.
+- detectar_conflictos(): revisa la agenda completa con un barrido en orden de
+  salida (O(n log n) más la cantidad de conflictos) y reporta cada par superpuesto.
+"""
+import heapq
+
+from django.db.models import Q
+
+from .models import Viaje
+
+RECURSOS = ('bus', 'conductor')
+
+# Viajes leídos por consulta en el barrido
+TAMANO_LOTE = 5000
+
+
+def viajes_activos():
+    return Viaje.objects.exclude(estado='cancelado')
+
+
+def conflictos_viaje(salida, llegada, bus=None, conductor=None, excluir=None):
+    """
+    Viajes activos del mismo bus o conductor que se cruzan con [salida, llegada),
+    como lista de (recurso, viaje) con recurso 'bus' o 'conductor'.
+    `excluir` es el pk del viaje que se está editando.
+    """
+    if not salida or not llegada:
+        return []
+    cruzados = viajes_activos().filter(fecha_llegada_estimada__gt=salida, fecha_salida__lt=llegada)
+    if excluir is not None:
+        cruzados = cruzados.exclude(pk=excluir)
+    conflictos = []
+    for recurso, valor in zip(RECURSOS, (bus, conductor)):
+        if valor is None:
+            continue
+        viajes = cruzados.filter(**{recurso: valor}).select_related('bus', 'conductor').order_by('fecha_salida', 'pk')
+        conflictos += [(recurso, viaje) for viaje in viajes]
+    return conflictos
+
+
+def _agenda(desde=None):
+    """(pk, bus_id, conductor_id, salida, llegada) de los viajes activos en orden de salida, por lotes."""
+    viajes = viajes_activos()
+    if desde is not None:
+        viajes = viajes.filter(fecha_llegada_estimada__gt=desde)
+    campos = ('fecha_salida', 'pk', 'bus_id', 'conductor_id', 'fecha_llegada_estimada')
+    ultimo = None
+    while True:
+        lote = viajes
+        if ultimo is not None:
+            lote = lote.filter(Q(fecha_salida__gt=ultimo[0]) | Q(fecha_salida=ultimo[0], pk__gt=ultimo[1]))
+        filas = list(lote.order_by('fecha_salida', 'pk').values_list(*campos)[:TAMANO_LOTE])
+        for salida, pk, bus_id, conductor_id, llegada in filas:
+            yield pk, bus_id, conductor_id, salida, llegada
+        if len(filas) < TAMANO_LOTE:
+            return
+        ultimo = filas[-1][:2]
+
+
+def detectar_conflictos(desde=None):
+    """
+    Todos los pares de viajes activos superpuestos del mismo bus o conductor
+    (opcionalmente solo los que terminan después de `desde`), como lista de
+    (recurso, id del bus o conductor, pk del viaje que sale primero, pk del otro).
+
+    Por cada bus y conductor se mantiene un montículo con las llegadas de sus
+    viajes en curso: al llegar a una salida se descartan los que ya terminaron y
+    los que quedan se cruzan con el nuevo viaje.
+    """
+    en_curso = {}
+    conflictos = []
+    for pk, bus_id, conductor_id, salida, llegada in _agenda(desde):
+        for recurso, valor in zip(RECURSOS, (bus_id, conductor_id)):
+            if valor is None:
+                continue
+            activos = en_curso.setdefault((recurso, valor), [])
+            while activos and activos[0][0] <= salida:
+                heapq.heappop(activos)
+            conflictos += [(recurso, valor, otro, pk) for _, otro in sorted(activos, key=lambda a: a[1])]
+            heapq.heappush(activos, (llegada, pk))
+    return conflictos
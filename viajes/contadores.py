@@ -0,0 +1,46 @@
+"""
+Contador de pasajeros por viaje (`Viaje.pasajeros_confirmados`).
+
+Las señales de viajes/signals.py lo mantienen con incrementos atómicos (F())
+al registrar o eliminar un ViajePasajero y al usar `viaje.pasajeros.add()`, de
+modo que listados e informes leen la columna en lugar de contar filas por
+viaje. Las cargas masivas deben llamar a sumar_pasajeros() y el comando
+`reparar_contador_pasajeros` recalcula el contador desde cero.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Viaje, ViajePasajero
+
+# Viajes por UPDATE al reconstruir
+TAMANO_LOTE = 5000
+
+
+def sumar_pasajeros(viaje_ids, cantidad=1):
+    """Suma `cantidad` (puede ser negativa) al contador de los viajes indicados."""
+    if cantidad:
+        Viaje.objects.filter(pk__in=viaje_ids).update(pasajeros_confirmados=F('pasajeros_confirmados') + cantidad)
+
+
+def total_pasajeros():
+    """Expresión con la cantidad real de ViajePasajero del viaje (para anotar o actualizar)."""
+    pasajeros = ViajePasajero.objects.filter(viaje=OuterRef('pk')).order_by().values('viaje').annotate(
+        total=Count('pk')).values('total')
+    return Coalesce(Subquery(pasajeros), 0)
+
+
+def reconstruir_contadores(tamano=TAMANO_LOTE):
+    """
+    Recalcula el contador de todos los viajes por rangos de pk, reescribiendo
+    solo los que no coinciden. Retorna (viajes revisados, viajes corregidos).
+    """
+    revisados = corregidos = 0
+    ultimo = 0
+    while True:
+        pks = list(Viaje.objects.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)[:tamano])
+        if not pks:
+            return revisados, corregidos
+        corregidos += Viaje.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).exclude(
+            pasajeros_confirmados=total_pasajeros()).update(pasajeros_confirmados=total_pasajeros())
+        revisados += len(pks)
+        ultimo = pks[-1]
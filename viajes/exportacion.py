@@ -0,0 +1,67 @@
+"""
+Filas de exportación de viajes y de pasajeros por viaje (ver core/exportacion.py).
+"""
+from core.exportacion import iterar_por_lotes
+from .models import Viaje
+
+ESTADOS = dict(Viaje.ESTADO_VIAJE)
+
+# Campos para armar origen y destino como Viaje.get_origen_display / get_destino_display
+CAMPOS_RUTA = (
+    'origen_nombre', 'origen_ciudad', 'lugar_origen__nombre', 'lugar_origen__ciudad',
+    'destino_nombre', 'destino_ciudad', 'lugar_destino__nombre', 'lugar_destino__ciudad',
+)
+
+
+def lugar_display(nombre, ciudad, lugar_nombre, lugar_ciudad):
+    """Mismo texto que Viaje.get_origen_display, a partir de los valores ya leídos."""
+    if nombre:
+        return f"{nombre}, {ciudad}"
+    if lugar_nombre:
+        return f"{lugar_nombre}, {lugar_ciudad}"
+    return "No especificado"
+
+
+def ruta_display(valores):
+    """(origen, destino) a partir de los valores de CAMPOS_RUTA."""
+    return lugar_display(*valores[:4]), lugar_display(*valores[4:])
+
+
+ENCABEZADOS_VIAJES = [
+    'ID', 'Fecha salida', 'Llegada estimada', 'Llegada real', 'Estado', 'Bus', 'Conductor',
+    'Origen', 'Destino', 'Distancia (km)', 'Pasajeros', 'Observaciones',
+]
+
+
+def filas_viajes(queryset):
+    """Filas de ENCABEZADOS_VIAJES para los viajes de `queryset`, leídas por lotes."""
+    campos = [
+        'pk', 'fecha_salida', 'fecha_llegada_estimada', 'fecha_llegada_real', 'estado', 'bus__placa',
+        'conductor__nombre', 'conductor__apellido', *CAMPOS_RUTA, 'distancia_km', 'pasajeros_confirmados',
+        'observaciones',
+    ]
+    for pk, salida, estimada, real, estado, placa, nombre, apellido, *resto in iterar_por_lotes(queryset, campos):
+        ruta, (distancia, total_pasajeros, observaciones) = resto[:len(CAMPOS_RUTA)], resto[len(CAMPOS_RUTA):]
+        yield [
+            pk, salida, estimada, real, ESTADOS.get(estado, estado), placa or 'Sin bus',
+            f'{nombre} {apellido}', *ruta_display(ruta), distancia, total_pasajeros, observaciones,
+        ]
+
+
+ENCABEZADOS_PASAJEROS = [
+    'ID viaje', 'Fecha salida', 'Bus', 'Origen', 'Destino', 'Pasajero', 'RUT', 'Teléfono', 'Correo',
+    'Asiento', 'Fecha registro', 'Observaciones',
+]
+
+
+def filas_pasajeros(queryset):
+    """Filas de ENCABEZADOS_PASAJEROS para los ViajePasajero de `queryset`, leídas por lotes."""
+    campos = [
+        'viaje_id', 'viaje__fecha_salida', 'viaje__bus__placa', *[f'viaje__{campo}' for campo in CAMPOS_RUTA],
+        'pasajero__nombre_completo', 'pasajero__rut', 'pasajero__telefono', 'pasajero__correo',
+        'asiento', 'fecha_registro', 'observaciones',
+    ]
+    for viaje_id, salida, placa, *resto in iterar_por_lotes(queryset, campos):
+        ruta, datos = resto[:len(CAMPOS_RUTA)], resto[len(CAMPOS_RUTA):]
+        yield [viaje_id, salida, placa or 'Sin bus', *ruta_display(ruta), *datos]
+
@@ -0,0 +1,307 @@
+"""
+Importación de la nómina de pasajeros de un viaje desde un CSV o XLSX.
+
+Cada fila trae RUT (obligatorio), nombre, teléfono, correo y opcionalmente
+asiento y observaciones. Los RUT se normalizan y se valida su dígito
+verificador; los pasajeros que ya existen se buscan con una sola consulta
+`rut_normalizado IN (...)` y los nuevos se crean con bulk_create, igual que sus
+registros en el viaje, en una sola transacción con el viaje bloqueado.
+
+Las filas con errores no se importan y se reportan con su número de fila; el
+resto se importa. El XLSX se lee con zipfile y ElementTree (primera hoja), sin
+dependencias adicionales.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection, transaction
+
+from core.busqueda import formatear_rut, indexar_pasajeros, normalizar_texto, validar_rut
+from core.estadisticas import incrementar
+from core.models import Pasajero
+from .asientos import mapa_bloqueado, numero_asiento
+from .contadores import sumar_pasajeros
+from .models import ViajePasajero
+
+FORMATOS = ('csv', 'xlsx')
+
+# Filas de datos que se aceptan por archivo (una nómina real tiene decenas)
+MAX_FILAS = 1000
+
+# Encabezado (sin tildes, espacios ni signos) -> campo
+COLUMNAS = {
+    'rut': 'rut',
+    'run': 'rut',
+    'nombre': 'nombre_completo',
+    'nombrecompleto': 'nombre_completo',
+    'nombreyapellido': 'nombre_completo',
+    'pasajero': 'nombre_completo',
+    'telefono': 'telefono',
+    'fono': 'telefono',
+    'celular': 'telefono',
+    'correo': 'correo',
+    'email': 'correo',
+    'correoelectronico': 'correo',
+    'asiento': 'asiento',
+    'observaciones': 'observaciones',
+    'observacion': 'observaciones',
+}
+
+_NS_HOJA = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_RELACION = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PAQUETE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+class ResultadoImportacion:
+    """Resumen de una importación: filas agregadas y errores por fila."""
+    def __init__(self):
+        self.agregados = []   # (fila, nombre, asiento)
+        self.errores = []     # (fila, mensaje)
+        self.creados = 0
+        self.existentes = 0
+
+    def error(self, fila, mensaje):
+        self.errores.append((fila, mensaje))
+
+    @property
+    def errores_ordenados(self):
+        return sorted(self.errores)
+
+
+def _columna(encabezado):
+    return COLUMNAS.get(re.sub(r'[^a-z]', '', normalizar_texto(str(encabezado or ''))))
+
+
+def _filas_con_encabezado(filas):
+    """
+    (número de fila, {campo: texto}) de las filas de datos; los números de fila
+    son los de la planilla (el encabezado es la fila 1).
+    """
+    filas = iter(filas)
+    encabezado = next(filas, None)
+    if encabezado is None:
+        raise ValidationError('El archivo está vacío.')
+    campos = [_columna(valor) for valor in encabezado]
+    if 'rut' not in campos:
+        raise ValidationError('El archivo debe tener una columna "RUT" en la primera fila.')
+    for numero, valores in enumerate(filas, start=2):
+        datos = {}
+        for campo, valor in zip(campos, valores):
+            if campo and campo not in datos:
+                datos[campo] = str(valor if valor is not None else '').strip()
+        if any(datos.values()):
+            yield numero, datos
+
+
+def _filas_csv(contenido):
+    texto = contenido.decode('utf-8-sig') if isinstance(contenido, bytes) else contenido
+    try:
+        dialecto = csv.Sniffer().sniff(texto[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    return csv.reader(io.StringIO(texto), dialecto)
+
+
+def _texto_celda(celda, compartidas):
+    tipo = celda.get('t')
+    if tipo == 'inlineStr':
+        return ''.join(t.text or '' for t in celda.iter(f'{_NS_HOJA}t'))
+    valor = celda.findtext(f'{_NS_HOJA}v')
+    if valor is None:
+        return ''
+    if tipo == 's':
+        return compartidas[int(valor)]
+    if tipo in ('str', 'b', 'e'):
+        return valor
+    # Número: un RUT o teléfono sin guion llega como 12345678 o 1.2345678E7
+    try:
+        numero = float(valor)
+    except ValueError:
+        return valor
+    return str(int(numero)) if numero.is_integer() else valor
+
+
+def _indice_columna(referencia):
+    """'C12' -> 2."""
+    indice = 0
+    for letra in re.match(r'[A-Z]*', referencia or '').group():
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+def _filas_xlsx(contenido):
+    try:
+        archivo_zip = zipfile.ZipFile(io.BytesIO(contenido))
+        libro = ElementTree.fromstring(archivo_zip.read('xl/workbook.xml'))
+        relaciones = ElementTree.fromstring(archivo_zip.read('xl/_rels/workbook.xml.rels'))
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError):
+        raise ValidationError('El archivo no es un XLSX válido.')
+
+    hoja = libro.find(f'{_NS_HOJA}sheets/{_NS_HOJA}sheet')
+    destinos = {r.get('Id'): r.get('Target') for r in relaciones.iter(f'{_NS_PAQUETE}Relationship')}
+    destino = destinos.get(hoja.get(f'{_NS_RELACION}id')) if hoja is not None else None
+    if not destino:
+        raise ValidationError('El XLSX no tiene hojas.')
+    ruta_hoja = destino.lstrip('/') if destino.startswith('/') else f'xl/{destino}'
+
+    compartidas = []
+    if 'xl/sharedStrings.xml' in archivo_zip.namelist():
+        for item in ElementTree.fromstring(archivo_zip.read('xl/sharedStrings.xml')).iter(f'{_NS_HOJA}si'):
+            compartidas.append(''.join(t.text or '' for t in item.iter(f'{_NS_HOJA}t')))
+
+    with archivo_zip.open(ruta_hoja) as hoja_xml:
+        leidas = 0
+        for _, elemento in ElementTree.iterparse(hoja_xml):
+            if elemento.tag != f'{_NS_HOJA}row':
+                continue
+            valores = []
+            for celda in elemento.iter(f'{_NS_HOJA}c'):
+                indice = _indice_columna(celda.get('r')) if celda.get('r') else len(valores)
+                valores.extend([''] * (indice - len(valores)))
+                valores.append(_texto_celda(celda, compartidas))
+            elemento.clear()
+            yield valores
+            leidas += 1
+            if leidas > MAX_FILAS + 1:
+                # Basta una fila de más para rechazar el archivo sin descomprimir el resto
+                return
+
+
+def leer_nomina(contenido, formato):
+    """Lista de (número de fila, {campo: texto}) de un CSV o XLSX. Lanza ValidationError si no se puede leer."""
+    if formato not in FORMATOS:
+        raise ValidationError('Formato no soportado: use un archivo CSV o XLSX.')
+    try:
+        filas = _filas_xlsx(contenido) if formato == 'xlsx' else _filas_csv(contenido)
+        datos = list(_filas_con_encabezado(filas))
+    except UnicodeDecodeError:
+        raise ValidationError('El CSV debe estar codificado en UTF-8.')
+    if len(datos) > MAX_FILAS:
+        raise ValidationError(f'El archivo tiene más de {MAX_FILAS} filas.')
+    return datos
+
+
+def _error_pasajero_nuevo(datos):
+    """Mensaje si faltan o son inválidos los datos para crear el pasajero (mismas reglas que PasajeroForm)."""
+    largos = {'nombre_completo': 200, 'telefono': 15}
+    for campo, etiqueta in (('nombre_completo', 'nombre'), ('telefono', 'teléfono'), ('correo', 'correo')):
+        if not datos.get(campo):
+            return f'Pasajero nuevo sin {etiqueta}.'
+        if campo in largos and len(datos[campo]) > largos[campo]:
+            return f'El {etiqueta} supera los {largos[campo]} caracteres.'
+    try:
+        validate_email(datos['correo'])
+    except ValidationError:
+        return f'Correo inválido: "{datos["correo"]}".'
+    return None
+
+
+def importar_nomina(viaje, filas):
+    """
+    Agrega al viaje los pasajeros de `filas` (ver leer_nomina), creando los que
+    no existen. Retorna un ResultadoImportacion; lanza ValidationError solo si
+    no se puede importar ninguna fila (p. ej. el viaje no tiene bus).
+    """
+    resultado = ResultadoImportacion()
+
+    validas = []
+    filas_por_rut = {}
+    for numero, datos in filas:
+        rut = validar_rut(datos.get('rut'))
+        if rut is None:
+            resultado.error(numero, f'RUT inválido: "{datos.get("rut", "")}".')
+        elif rut in filas_por_rut:
+            resultado.error(numero, f'RUT repetido (ya aparece en la fila {filas_por_rut[rut]}).')
+        elif datos.get('asiento') and numero_asiento(datos['asiento']) is None:
+            resultado.error(numero, f'Asiento inválido: "{datos["asiento"]}".')
+        else:
+            filas_por_rut[rut] = numero
+            validas.append((numero, rut, datos))
+
+    existentes = {
+        pasajero.rut_normalizado: pasajero
+        for pasajero in Pasajero.objects.filter(rut_normalizado__in=list(filas_por_rut))
+    }
+
+    with mapa_bloqueado(viaje.pk) as (viaje, mapa):
+        registrados = set(ViajePasajero.objects.filter(
+            viaje=viaje, pasajero__in=[pasajero.pk for pasajero in existentes.values()],
+        ).values_list('pasajero_id', flat=True))
+
+        por_importar = []
+        for numero, rut, datos in validas:
+            pasajero = existentes.get(rut)
+            if pasajero is not None and pasajero.pk in registrados:
+                resultado.error(numero, f'{pasajero.nombre_completo} ya está registrado en este viaje.')
+                continue
+            if pasajero is None:
+                mensaje = _error_pasajero_nuevo(datos)
+                if mensaje:
+                    resultado.error(numero, mensaje)
+                    continue
+            por_importar.append([numero, rut, datos, numero_asiento(datos.get('asiento'))])
+
+        # Primero los asientos pedidos, para que la asignación automática no los ocupe
+        for fila in por_importar:
+            asiento = fila[3]
+            if asiento is None:
+                continue
+            if asiento > mapa.capacidad:
+                resultado.error(fila[0], f'El asiento debe ser un número entre 1 y {mapa.capacidad}.')
+                fila[3] = False
+            elif mapa.ocupado(asiento):
+                resultado.error(fila[0], f'El asiento {asiento} ya está ocupado.')
+                fila[3] = False
+            else:
+                mapa.ocupar(asiento)
+        for fila in por_importar:
+            if fila[3] is None:
+                fila[3] = mapa.siguiente_libre()
+                if fila[3] is None:
+                    resultado.error(fila[0], 'El bus ha alcanzado su capacidad máxima de pasajeros.')
+                    fila[3] = False
+                else:
+                    mapa.ocupar(fila[3])
+        por_importar = [fila for fila in por_importar if fila[3]]
+
+        nuevos = [
+            Pasajero(
+                nombre_completo=datos['nombre_completo'], rut=formatear_rut(rut), rut_normalizado=rut,
+                telefono=datos['telefono'], correo=datos['correo'],
+            )
+            for _, rut, datos, _ in por_importar if rut not in existentes
+        ]
+        if nuevos:
+            try:
+                with transaction.atomic():
+                    Pasajero.objects.bulk_create(nuevos, batch_size=500)
+            except IntegrityError:
+                raise ValidationError('Otro usuario registró alguno de estos RUT durante la importación; intente nuevamente.')
+            if not connection.features.can_return_rows_from_bulk_insert:
+                # MySQL no retorna los ids de un INSERT en lote
+                nuevos = list(Pasajero.objects.filter(rut_normalizado__in=[p.rut_normalizado for p in nuevos]))
+            indexar_pasajeros(nuevos)
+            incrementar(total_pasajeros=len(nuevos))
+            existentes.update((pasajero.rut_normalizado, pasajero) for pasajero in nuevos)
+
+        ViajePasajero.objects.bulk_create([
+            ViajePasajero(
+                viaje=viaje, pasajero=existentes[rut], asiento=str(asiento),
+                observaciones=datos.get('observaciones') or 'Importado desde nómina',
+            )
+            for _, rut, datos, asiento in por_importar
+        ], batch_size=500)
+        # bulk_create no envía post_save: el contador se suma aquí
+        sumar_pasajeros([viaje.pk], len(por_importar))
+
+    resultado.creados = len(nuevos)
+    resultado.existentes = len(por_importar) - len(nuevos)
+    resultado.agregados = [
+        (numero, existentes[rut].nombre_completo, asiento) for numero, rut, _, asiento in por_importar
+    ]
+    return resultado
@@ -0,0 +1,37 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from viajes.conflictos import detectar_conflictos
+
+
+class Command(BaseCommand):
+    help = 'Revisa la agenda de viajes e informa los buses y conductores asignados a viajes superpuestos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Solo viajes que terminan después de esta fecha (AAAA-MM-DD).')
+        parser.add_argument(
+            '--fallar-si-hay-conflictos', action='store_true',
+            help='Termina con error si se encontraron conflictos (útil en tareas programadas).'
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = timezone.make_aware(datetime.strptime(options['desde'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--desde debe tener el formato AAAA-MM-DD.')
+        inicio = time.perf_counter()
+        conflictos = detectar_conflictos(desde)
+        duracion = time.perf_counter() - inicio
+        if not conflictos:
+            self.stdout.write(self.style.SUCCESS(f'✓ Sin conflictos de agenda ({duracion:.1f} s).'))
+            return
+        self.stdout.write(self.style.WARNING(f'Se encontraron {len(conflictos)} conflicto(s) ({duracion:.1f} s):'))
+        for recurso, recurso_id, viaje, otro in conflictos:
+            self.stdout.write(f'  {recurso} {recurso_id}: viaje #{viaje} se superpone con viaje #{otro}')
+        if options['fallar_si_hay_conflictos']:
+            raise CommandError('Hay buses o conductores asignados a viajes superpuestos.')
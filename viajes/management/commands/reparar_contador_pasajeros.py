@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from viajes.contadores import TAMANO_LOTE, reconstruir_contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el contador de pasajeros de cada viaje desde sus registros (tras cargas masivas o inconsistencias).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help=f'Viajes por lote (por defecto {TAMANO_LOTE}).')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        revisados, corregidos = reconstruir_contadores(options['lote'])
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {revisados} viaje(s) revisados, {corregidos} contador(es) corregidos en {duracion:.1f} s.'
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viajes', '0007_remove_viaje_lugar_destino_texto_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistanciaRutaCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lat_origen', models.DecimalField(decimal_places=4, max_digits=8)),
+                ('lon_origen', models.DecimalField(decimal_places=4, max_digits=8)),
+                ('lat_destino', models.DecimalField(decimal_places=4, max_digits=8)),
+                ('lon_destino', models.DecimalField(decimal_places=4, max_digits=8)),
+                ('distancia_km', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('hits', models.PositiveIntegerField(default=0, help_text='Consultas resueltas desde la caché')),
+                ('misses', models.PositiveIntegerField(default=0, help_text='Consultas que requirieron llamar al servicio de rutas')),
+                ('calculado_en', models.DateTimeField(help_text='Momento en que se obtuvo la distancia del servicio de rutas')),
+                ('ultimo_uso', models.DateTimeField(db_index=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Distancia de Ruta (caché)',
+                'verbose_name_plural': 'Distancias de Rutas (caché)',
+                'constraints': [models.UniqueConstraint(fields=('lat_origen', 'lon_origen', 'lat_destino', 'lon_destino'), name='distancia_ruta_cache_unica')],
+            },
+        ),
+    ]
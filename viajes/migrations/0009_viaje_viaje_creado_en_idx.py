@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_estadisticasflota_costosdiarios'),
+        ('flota', '0007_alter_mantenimiento_costo'),
+        ('viajes', '0008_distanciarutacache'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['-creado_en'], name='viaje_creado_en_idx'),
+        ),
+    ]
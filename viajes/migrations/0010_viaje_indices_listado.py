@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_pasajero_busqueda'),
+        ('flota', '0009_notificacionvencimiento'),
+        ('viajes', '0009_viaje_viaje_creado_en_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['fecha_salida'], name='viaje_fecha_salida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['estado', 'fecha_salida'], name='viaje_estado_salida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['bus', 'fecha_salida'], name='viaje_bus_salida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['conductor', 'fecha_salida'], name='viaje_conductor_salida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['origen_ciudad', 'fecha_salida'], name='viaje_origen_ciudad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['destino_ciudad', 'fecha_salida'], name='viaje_destino_ciudad_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_pasajero_busqueda'),
+        ('flota', '0009_notificacionvencimiento'),
+        ('viajes', '0010_viaje_indices_listado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['bus', 'fecha_llegada_estimada'], name='viaje_bus_llegada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['conductor', 'fecha_llegada_estimada'], name='viaje_conductor_llegada_idx'),
+        ),
+    ]
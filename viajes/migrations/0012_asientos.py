@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+# Copia de viajes.asientos al momento de la migración: la migración no debe
+# cambiar si después cambia el formato del mapa de asientos
+def numero_asiento(valor):
+    valor = str(valor or '').strip()
+    return int(valor) if valor.isdigit() and int(valor) > 0 else None
+
+
+def bits_a_bytes(ocupados):
+    return ocupados.to_bytes((ocupados.bit_length() + 7) // 8, 'little')
+
+
+def normalizar_asientos(apps, schema_editor):
+    """
+    Antes de la restricción única: asientos vacíos a NULL, y si un asiento se repite
+    en un viaje, solo el primer registro lo conserva. Luego arma el mapa de bits de
+    cada viaje con los asientos numéricos.
+    """
+    Viaje = apps.get_model('viajes', 'Viaje')
+    ViajePasajero = apps.get_model('viajes', 'ViajePasajero')
+    ViajePasajero.objects.filter(asiento='').update(asiento=None)
+
+    repetidos, mapas = [], {}
+    vistos = set()
+    filas = ViajePasajero.objects.exclude(asiento=None).values_list('pk', 'viaje_id', 'asiento')
+    ultimo = 0
+    while True:
+        lote = list(filas.filter(pk__gt=ultimo).order_by('pk')[:5000])
+        if not lote:
+            break
+        for pk, viaje_id, asiento in lote:
+            if (viaje_id, asiento) in vistos:
+                repetidos.append(pk)
+                continue
+            vistos.add((viaje_id, asiento))
+            numero = numero_asiento(asiento)
+            if numero is not None:
+                mapas[viaje_id] = mapas.get(viaje_id, 0) | 1 << (numero - 1)
+        ultimo = lote[-1][0]
+    for inicio in range(0, len(repetidos), 1000):
+        ViajePasajero.objects.filter(pk__in=repetidos[inicio:inicio + 1000]).update(asiento=None)
+
+    viajes = [Viaje(pk=viaje_id, asientos_ocupados=bits_a_bytes(bits)) for viaje_id, bits in mapas.items()]
+    Viaje.objects.bulk_update(viajes, ['asientos_ocupados'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_pasajero_busqueda'),
+        ('viajes', '0011_viaje_indices_agenda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='viaje',
+            name='asientos_ocupados',
+            field=models.BinaryField(default=b'', help_text='Mapa de bits de asientos ocupados (ver viajes/asientos.py)'),
+        ),
+        migrations.RunPython(normalizar_asientos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='viajepasajero',
+            constraint=models.UniqueConstraint(fields=('viaje', 'asiento'), name='viaje_asiento_unico'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:13
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def recontar_pasajeros(apps, schema_editor):
+    """El contador no se mantenía: se recalcula para todos los viajes, por rangos de pk."""
+    Viaje = apps.get_model('viajes', 'Viaje')
+    ViajePasajero = apps.get_model('viajes', 'ViajePasajero')
+    total = Coalesce(Subquery(
+        ViajePasajero.objects.filter(viaje=OuterRef('pk')).order_by().values('viaje').annotate(
+            total=Count('pk')).values('total')
+    ), 0)
+    ultimo = 0
+    while True:
+        pks = list(Viaje.objects.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)[:5000])
+        if not pks:
+            break
+        Viaje.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(pasajeros_confirmados=total)
+        ultimo = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viajes', '0012_asientos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='viaje',
+            name='pasajeros_confirmados',
+            field=models.IntegerField(default=0, help_text='Cantidad de pasajeros registrados (ver viajes/contadores.py)'),
+        ),
+        migrations.RunPython(recontar_pasajeros, migrations.RunPython.noop),
+    ]
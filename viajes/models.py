@@ -40,7 +40,8 @@ class Viaje(models.Model):
     fecha_llegada_real = models.DateTimeField(null=True, blank=True)
     estado = models.CharField(max_length=20, choices=ESTADO_VIAJE, default='programado')
     pasajeros = models.ManyToManyField(Pasajero, through='ViajePasajero', blank=True, related_name='viajes')
-    pasajeros_confirmados = models.IntegerField(default=0)
+    pasajeros_confirmados = models.IntegerField(default=0, help_text='Cantidad de pasajeros registrados (ver viajes/contadores.py)')
+    asientos_ocupados = models.BinaryField(default=b'', editable=False, help_text='Mapa de bits de asientos ocupados (ver viajes/asientos.py)')
     distancia_km = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text='Distancia calculada en kilómetros')
     observaciones = models.TextField(blank=True)
     creado_en = models.DateTimeField(auto_now_add=True)
@@ -50,6 +51,19 @@ class Viaje(models.Model):
         ordering = ['-fecha_salida']
         verbose_name = 'Viaje'
         verbose_name_plural = 'Viajes'
+        indexes = [
+            models.Index(fields=['-creado_en'], name='viaje_creado_en_idx'),
+            # Listado y filtros por fecha de salida (paginación por cursor sobre fecha_salida, pk)
+            models.Index(fields=['fecha_salida'], name='viaje_fecha_salida_idx'),
+            models.Index(fields=['estado', 'fecha_salida'], name='viaje_estado_salida_idx'),
+            models.Index(fields=['bus', 'fecha_salida'], name='viaje_bus_salida_idx'),
+            models.Index(fields=['conductor', 'fecha_salida'], name='viaje_conductor_salida_idx'),
+            models.Index(fields=['origen_ciudad', 'fecha_salida'], name='viaje_origen_ciudad_idx'),
+            models.Index(fields=['destino_ciudad', 'fecha_salida'], name='viaje_destino_ciudad_idx'),
+            # Detección de conflictos de agenda (viajes que terminan después de una salida dada)
+            models.Index(fields=['bus', 'fecha_llegada_estimada'], name='viaje_bus_llegada_idx'),
+            models.Index(fields=['conductor', 'fecha_llegada_estimada'], name='viaje_conductor_llegada_idx'),
+        ]
 
     def __str__(self):
         origen = self.origen_nombre or (self.lugar_origen.nombre if self.lugar_origen else 'Sin origen')
@@ -57,6 +71,19 @@ class Viaje(models.Model):
         placa = self.bus.placa if self.bus else 'Sin bus'
         return f"{placa} - {origen} -> {destino} ({self.fecha_salida.date()})"
     
+    # Campos que solo se escriben con UPDATE atómicos (mapa de asientos en viajes/asientos.py,
+    # contador de pasajeros en viajes/contadores.py)
+    CAMPOS_MANTENIDOS = ('asientos_ocupados', 'pasajeros_confirmados')
+
+    def save(self, *args, **kwargs):
+        # Guardar una instancia leída antes no debe pisar asignaciones ni contadores concurrentes
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_MANTENIDOS
+            ]
+        super().save(*args, **kwargs)
+
     def get_origen_display(self):
         """Retorna el nombre completo del origen"""
         if self.origen_nombre:
@@ -74,14 +101,18 @@ class Viaje(models.Model):
         return "No especificado"
     
     def get_pasajeros_count(self):
-        return self.pasajeros.count()
+        # Contador mantenido por señales: no cuenta filas en cada llamada
+        return self.pasajeros_confirmados
     
     def calcular_distancia_real(self):
         """
         Calcula la distancia real por carretera usando OSRM API.
         Retorna la distancia en kilómetros.
+
+        Las rutas ya consultadas se resuelven desde DistanciaRutaCache,
+        sin llamadas HTTP al servicio de rutas.
         """
-        import requests
+        from .services import obtener_distancia_km
         
         # Obtener coordenadas
         lat_origen = self.latitud_origen
@@ -93,32 +124,13 @@ class Viaje(models.Model):
         if not all([lat_origen, lon_origen, lat_destino, lon_destino]):
             return None
         
-        try:
-            # Usar OSRM API (gratuita)
-            url = f"http://router.project-osrm.org/route/v1/driving/{lon_origen},{lat_origen};{lon_destino},{lat_destino}"
-            params = {
-                'overview': 'false',
-                'geometries': 'geojson'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('code') == 'Ok' and data.get('routes'):
-                    # La distancia viene en metros, convertir a kilómetros
-                    distancia_metros = data['routes'][0]['distance']
-                    distancia_km = round(distancia_metros / 1000, 2)
-                    
-                    # Guardar la distancia calculada
-                    self.distancia_km = distancia_km
-                    self.save(update_fields=['distancia_km'])
-                    
-                    return distancia_km
-        except Exception as e:
-            print(f"Error al calcular distancia: {e}")
+        distancia_km = obtener_distancia_km(lat_origen, lon_origen, lat_destino, lon_destino)
+        if distancia_km is not None:
+            # Guardar la distancia calculada
+            self.distancia_km = distancia_km
+            self.save(update_fields=['distancia_km'])
         
-        return None
+        return distancia_km
 
 
 class ViajePasajero(models.Model):
@@ -133,8 +145,44 @@ class ViajePasajero(models.Model):
     
     class Meta:
         unique_together = ('viaje', 'pasajero')
+        constraints = [
+            # Un asiento por pasajero en cada viaje (los pasajeros sin asiento tienen NULL)
+            models.UniqueConstraint(fields=['viaje', 'asiento'], name='viaje_asiento_unico'),
+        ]
         verbose_name = 'Pasajero en Viaje'
         verbose_name_plural = 'Pasajeros en Viajes'
     
     def __str__(self):
         return f"{self.pasajero.nombre_completo} - {self.viaje}"
+
+
+class DistanciaRutaCache(models.Model):
+    """
+    Caché persistente de distancias por carretera entre dos coordenadas.
+
+    La clave son las coordenadas de origen y destino redondeadas a 4 decimales
+    (~11 m), de modo que los viajes entre los mismos terminales comparten entrada.
+    """
+    lat_origen = models.DecimalField(max_digits=8, decimal_places=4)
+    lon_origen = models.DecimalField(max_digits=8, decimal_places=4)
+    lat_destino = models.DecimalField(max_digits=8, decimal_places=4)
+    lon_destino = models.DecimalField(max_digits=8, decimal_places=4)
+    distancia_km = models.DecimalField(max_digits=10, decimal_places=2)
+    hits = models.PositiveIntegerField(default=0, help_text='Consultas resueltas desde la caché')
+    misses = models.PositiveIntegerField(default=0, help_text='Consultas que requirieron llamar al servicio de rutas')
+    calculado_en = models.DateTimeField(help_text='Momento en que se obtuvo la distancia del servicio de rutas')
+    ultimo_uso = models.DateTimeField(db_index=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Distancia de Ruta (caché)'
+        verbose_name_plural = 'Distancias de Rutas (caché)'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['lat_origen', 'lon_origen', 'lat_destino', 'lon_destino'],
+                name='distancia_ruta_cache_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f"({self.lat_origen}, {self.lon_origen}) -> ({self.lat_destino}, {self.lon_destino}): {self.distancia_km} km"
@@ -0,0 +1,114 @@
+"""
+Servicios de rutas para viajes: cálculo de distancias por carretera con caché persistente.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DistanciaRutaCache
+
+logger = logging.getLogger(__name__)
+
+PRECISION_CLAVE = Decimal('0.0001')
+
+
+def clave_ruta(lat_origen, lon_origen, lat_destino, lon_destino):
+    """Redondea las coordenadas para usarlas como clave de la caché."""
+    valores = [lat_origen, lon_origen, lat_destino, lon_destino]
+    redondeados = [Decimal(str(v)).quantize(PRECISION_CLAVE, rounding=ROUND_HALF_UP) for v in valores]
+    return dict(zip(['lat_origen', 'lon_origen', 'lat_destino', 'lon_destino'], redondeados))
+
+
+def consultar_osrm(lat_origen, lon_origen, lat_destino, lon_destino):
+    """
+    Consulta el servicio OSRM y retorna la distancia en kilómetros, o None si falla.
+    """
+    base_url = getattr(settings, 'OSRM_BASE_URL', 'http://router.project-osrm.org').rstrip('/')
+    timeout = getattr(settings, 'OSRM_TIMEOUT', 10)
+    url = f"{base_url}/route/v1/driving/{lon_origen},{lat_origen};{lon_destino},{lat_destino}"
+    params = {
+        'overview': 'false',
+        'geometries': 'geojson'
+    }
+    try:
+        response = requests.get(url, params=params, timeout=timeout)
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('code') == 'Ok' and data.get('routes'):
+                # La distancia viene en metros, convertir a kilómetros
+                return round(data['routes'][0]['distance'] / 1000, 2)
+    except Exception as e:
+        logger.warning('Error al calcular distancia: %s', e)
+    return None
+
+
+def obtener_distancia_km(lat_origen, lon_origen, lat_destino, lon_destino):
+    """
+    Retorna la distancia por carretera en kilómetros usando la caché de rutas.
+
+    Solo se llama al servicio de rutas si la ruta no está en caché o si la
+    entrada superó su TTL. Si el servicio falla, se usa la entrada vencida
+    cuando existe.
+    """
+    clave = clave_ruta(lat_origen, lon_origen, lat_destino, lon_destino)
+    ahora = timezone.now()
+    ttl = timedelta(days=getattr(settings, 'RUTAS_CACHE_TTL_DIAS', 90))
+
+    entrada = DistanciaRutaCache.objects.filter(**clave).first()
+    if entrada and entrada.calculado_en >= ahora - ttl:
+        DistanciaRutaCache.objects.filter(pk=entrada.pk).update(hits=F('hits') + 1, ultimo_uso=ahora)
+        return float(entrada.distancia_km)
+
+    distancia = consultar_osrm(
+        clave['lat_origen'], clave['lon_origen'], clave['lat_destino'], clave['lon_destino']
+    )
+
+    if entrada:
+        campos = {'misses': F('misses') + 1, 'ultimo_uso': ahora}
+        if distancia is not None:
+            campos.update(distancia_km=distancia, calculado_en=ahora)
+        DistanciaRutaCache.objects.filter(pk=entrada.pk).update(**campos)
+        return distancia if distancia is not None else float(entrada.distancia_km)
+
+    if distancia is None:
+        return None
+
+    try:
+        with transaction.atomic():
+            DistanciaRutaCache.objects.create(
+                distancia_km=distancia, misses=1, calculado_en=ahora, ultimo_uso=ahora, **clave
+            )
+    except IntegrityError:
+        # Otro proceso guardó la misma ruta en paralelo
+        DistanciaRutaCache.objects.filter(**clave).update(misses=F('misses') + 1, ultimo_uso=ahora)
+    else:
+        expulsar_rutas_cache()
+    return distancia
+
+
+def expulsar_rutas_cache():
+    """
+    Aplica la política de expulsión de la caché: elimina las entradas vencidas
+    sin uso reciente y, si se supera el máximo, las menos usadas recientemente (LRU).
+    Retorna la cantidad de entradas eliminadas.
+    """
+    ahora = timezone.now()
+    ttl = timedelta(days=getattr(settings, 'RUTAS_CACHE_TTL_DIAS', 90))
+    maximo = getattr(settings, 'RUTAS_CACHE_MAX_ENTRADAS', 10000)
+
+    eliminadas, _ = DistanciaRutaCache.objects.filter(ultimo_uso__lt=ahora - ttl).delete()
+
+    exceso = DistanciaRutaCache.objects.count() - maximo
+    if exceso > 0:
+        ids = list(
+            DistanciaRutaCache.objects.order_by('ultimo_uso', 'id').values_list('id', flat=True)[:exceso]
+        )
+        borradas, _ = DistanciaRutaCache.objects.filter(id__in=ids).delete()
+        eliminadas += borradas
+    return eliminadas
@@ -0,0 +1,49 @@
+"""
+Señales de viajes: mantienen el mapa de asientos ocupados (ver viajes/asientos.py)
+y el contador de pasajeros de cada viaje (ver viajes/contadores.py).
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .asientos import liberar_asiento
+from .contadores import sumar_pasajeros
+from .models import Viaje, ViajePasajero
+
+
+def _viaje_eliminado(origen):
+    """True si la eliminación viene de borrar el viaje (no hay mapa ni contador que mantener)."""
+    if isinstance(origen, QuerySet):
+        return origen.model is Viaje
+    return isinstance(origen, Viaje)
+
+
+@receiver(post_delete, sender=ViajePasajero, dispatch_uid='asientos_viaje_pasajero_post_delete')
+def liberar_asiento_eliminado(sender, instance, origin=None, **kwargs):
+    if not _viaje_eliminado(origin):
+        liberar_asiento(instance.viaje_id, instance.asiento)
+
+
+@receiver(post_save, sender=ViajePasajero, dispatch_uid='contador_viaje_pasajero_post_save')
+def contar_pasajero_agregado(sender, instance, created, **kwargs):
+    if created:
+        sumar_pasajeros([instance.viaje_id], 1)
+
+
+# También cubre viaje.pasajeros.remove() y clear(), que eliminan las filas con post_delete
+@receiver(post_delete, sender=ViajePasajero, dispatch_uid='contador_viaje_pasajero_post_delete')
+def descontar_pasajero_eliminado(sender, instance, origin=None, **kwargs):
+    if not _viaje_eliminado(origin):
+        sumar_pasajeros([instance.viaje_id], -1)
+
+
+# viaje.pasajeros.add() inserta con bulk_create (sin post_save); pk_set trae solo los agregados
+@receiver(m2m_changed, sender=Viaje.pasajeros.through, dispatch_uid='contador_viaje_pasajeros_m2m')
+def contar_pasajeros_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # pasajero.viajes.add(...): un pasajero más en cada viaje
+        sumar_pasajeros(pk_set, 1)
+    else:
+        sumar_pasajeros([instance.pk], len(pk_set))
@@ -0,0 +1,16 @@
+"""
+Tareas en segundo plano de la app viajes (ver core/tareas.py).
+"""
+from core.tareas import tarea
+from .models import Viaje
+
+
+@tarea('viajes.calcular_distancia')
+def calcular_distancia(viaje_id):
+    """Calcula y guarda la distancia por carretera de un viaje."""
+    viaje = Viaje.objects.filter(pk=viaje_id).first()
+    if viaje is None or not all([viaje.latitud_origen, viaje.longitud_origen, viaje.latitud_destino, viaje.longitud_destino]):
+        return
+    if viaje.calcular_distancia_real() is None:
+        # Lanzar para que la cola reintente con espera exponencial
+        raise RuntimeError(f'No se pudo obtener la distancia del viaje {viaje_id} desde el servicio de rutas')
@@ -1,7 +1,32 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import zipfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
-from .models import Viaje
-from core.models import Conductor, Lugar
+from .asientos import MapaAsientos, asignar_asiento, cambiar_asiento, mapa_bloqueado, reconstruir_mapa
+from .conflictos import conflictos_viaje, detectar_conflictos
+from .contadores import reconstruir_contadores
+from .importacion import importar_nomina, leer_nomina
+from .models import Viaje, DistanciaRutaCache, ViajePasajero
+from .services import obtener_distancia_km, expulsar_rutas_cache
+from .views import ViajeForm
+from core.busqueda import buscar_pasajeros
+from core.exportacion import xlsx_en_streaming
+from core.models import Conductor, Lugar, Pasajero, Tarea
+from core.tareas import procesar_pendientes
 from flota.models import Bus
 
 
@@ -37,3 +62,554 @@ class ViajeTestCase(TestCase):
             fecha_llegada_estimada=timezone.now()
         )
         self.assertEqual(viaje.estado, 'programado')
+
+
+class _OSRMStubHandler(BaseHTTPRequestHandler):
+    """Servidor de rutas falso: responde siempre 123.456 km."""
+    def do_GET(self):
+        self.server.peticiones.append(self.path)
+        cuerpo = json.dumps({'code': 'Ok', 'routes': [{'distance': 123456.0}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class DistanciaRutaCacheTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = HTTPServer(('127.0.0.1', 0), _OSRMStubHandler)
+        cls.servidor.peticiones = []
+        cls.hilo = threading.Thread(target=cls.servidor.serve_forever, daemon=True)
+        cls.hilo.start()
+        cls.url = f'http://127.0.0.1:{cls.servidor.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.servidor.peticiones.clear()
+        self.ajustes = override_settings(OSRM_BASE_URL=self.url)
+        self.ajustes.enable()
+        self.addCleanup(self.ajustes.disable)
+
+    def test_ruta_repetida_no_llama_al_servicio(self):
+        self.assertEqual(obtener_distancia_km(-33.45, -70.66, -33.04, -71.61), 123.46)
+        # Coordenadas que redondean a la misma clave
+        self.assertEqual(obtener_distancia_km(-33.450001, -70.66, -33.04, -71.61), 123.46)
+        self.assertEqual(len(self.servidor.peticiones), 1)
+        entrada = DistanciaRutaCache.objects.get()
+        self.assertEqual((entrada.hits, entrada.misses), (1, 1))
+
+    def test_entrada_vencida_se_recalcula(self):
+        obtener_distancia_km(-33.45, -70.66, -33.04, -71.61)
+        DistanciaRutaCache.objects.update(calculado_en=timezone.now() - timedelta(days=365))
+        obtener_distancia_km(-33.45, -70.66, -33.04, -71.61)
+        self.assertEqual(len(self.servidor.peticiones), 2)
+        self.assertEqual(DistanciaRutaCache.objects.get().misses, 2)
+
+    @override_settings(RUTAS_CACHE_MAX_ENTRADAS=2)
+    def test_expulsion_lru(self):
+        for lat in (-30, -31, -32):
+            obtener_distancia_km(lat, -70, -33, -71)
+        self.assertEqual(DistanciaRutaCache.objects.count(), 2)
+        self.assertFalse(DistanciaRutaCache.objects.filter(lat_origen=-30).exists())
+        self.assertEqual(expulsar_rutas_cache(), 0)
+
+
+class ViajeDistanciaEnColaTestCase(TestCase):
+    def setUp(self):
+        self.conductor = Conductor.objects.create(
+            nombre='Ana', apellido='Rojas', cedula='99', email='ana@example.com',
+            telefono='1', fecha_contratacion='2024-01-01'
+        )
+        self.bus = Bus.objects.create(
+            placa='XYZ789', marca='Volvo', modelo='B9R', año_fabricacion=2020, capacidad_pasajeros=40,
+            numero_chasis='CH9', numero_motor='MO9', fecha_adquisicion='2020-05-15'
+        )
+
+    def _datos(self, ahora, **cambios):
+        return {
+            'bus': self.bus.pk, 'conductor': self.conductor.pk,
+            'origen_nombre': 'Terminal', 'origen_ciudad': 'Santiago', 'origen_pais': 'Chile',
+            'latitud_origen': '-33.45', 'longitud_origen': '-70.66',
+            'destino_nombre': 'Terminal', 'destino_ciudad': 'Valparaíso', 'destino_pais': 'Chile',
+            'latitud_destino': '-33.04', 'longitud_destino': '-71.61',
+            'fecha_salida': ahora, 'fecha_llegada_estimada': ahora + timedelta(hours=2),
+            'estado': 'programado', **cambios,
+        }
+
+    def test_guardar_viaje_solo_encola_distancia(self):
+        ahora = timezone.now()
+        form = ViajeForm(data=self._datos(ahora))
+        self.assertTrue(form.is_valid(), form.errors)
+        viaje = form.save()
+        self.assertIsNone(viaje.distancia_km)
+        tarea = Tarea.objects.get(tipo='viajes.calcular_distancia')
+        self.assertEqual(tarea.parametros, {'viaje_id': viaje.pk})
+
+        # El worker calcula la distancia desde la caché, sin llamar al servicio de rutas
+        DistanciaRutaCache.objects.create(
+            lat_origen='-33.45', lon_origen='-70.66', lat_destino='-33.04', lon_destino='-71.61',
+            distancia_km='116.20', calculado_en=ahora, ultimo_uso=ahora
+        )
+        procesar_pendientes()
+        viaje.refresh_from_db()
+        self.assertEqual(str(viaje.distancia_km), '116.20')
+
+        # Editar sin tocar las coordenadas no vuelve a encolar; cambiarlas sí
+        ViajeForm(data=self._datos(ahora, estado='en_curso'), instance=viaje).save()
+        self.assertFalse(Tarea.objects.filter(estado='pendiente').exists())
+        ViajeForm(data=self._datos(ahora, latitud_destino='-33.05'), instance=viaje).save()
+        self.assertEqual(Tarea.objects.filter(estado='pendiente').count(), 1)
+
+
+class ViajesFixtureMixin:
+    """Crea conductores, buses y viajes de prueba."""
+    def crear_conductores(self, cantidad=1):
+        return [
+            Conductor.objects.create(nombre='Ana', apellido=f'Rojas{i}', cedula=f'9{i}', email=f'ana{i}@example.com',
+                                     telefono='1', fecha_contratacion='2024-01-01')
+            for i in range(cantidad)
+        ]
+
+    def crear_buses(self, cantidad=1, capacidad=40):
+        return [
+            Bus.objects.create(placa=f'BUS{i}', marca='Volvo', modelo='B9R', año_fabricacion=2020,
+                               capacidad_pasajeros=capacidad, numero_chasis=f'CH{i}', numero_motor=f'MO{i}',
+                               fecha_adquisicion='2020-05-15')
+            for i in range(cantidad)
+        ]
+
+    def crear_viaje(self, bus, conductor, salida=None, horas=2, **campos):
+        salida = salida or timezone.now()
+        return Viaje.objects.create(bus=bus, conductor=conductor, fecha_salida=salida,
+                                    fecha_llegada_estimada=salida + timedelta(hours=horas), **campos)
+
+
+class ExportacionViajesTestCase(ViajesFixtureMixin, TestCase):
+    def setUp(self):
+        [self.conductor], [self.bus] = self.crear_conductores(), self.crear_buses(capacidad=50)
+        origen = Lugar.objects.create(nombre='Quito', ciudad='Quito')
+        self.viajes = []
+        for dias, estado in ((1, 'completado'), (2, 'cancelado'), (40, 'completado')):
+            self.viajes.append(self.crear_viaje(
+                self.bus, self.conductor, timezone.now() - timedelta(days=dias), horas=8,
+                lugar_origen=origen, destino_nombre='Terminal', destino_ciudad='Cuenca', estado=estado,
+            ))
+        for i in range(3):
+            pasajero = Pasajero.objects.create(
+                nombre_completo=f'Pasajero {i}', rut=f'1111111{i}-{i}', telefono='099', correo=f'p{i}@example.com')
+            ViajePasajero.objects.create(viaje=self.viajes[0], pasajero=pasajero, asiento=str(i + 1))
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+
+    def _csv(self, response):
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(contenido)))
+
+    def test_exportar_viajes_csv_con_filtros(self):
+        desde = (timezone.localdate() - timedelta(days=10)).isoformat()
+        response = self.client.get(reverse('viajes:exportar_viajes'), {'formato': 'csv', 'estado': 'completado', 'desde': desde})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="viajes_', response['Content-Disposition'])
+        filas = self._csv(response)
+        self.assertEqual(filas[0][:2], ['ID', 'Fecha salida'])
+        self.assertEqual(len(filas), 2)
+        fila = dict(zip(filas[0], filas[1]))
+        self.assertEqual((fila['ID'], fila['Estado'], fila['Bus']), (str(self.viajes[0].pk), 'Completado', self.bus.placa))
+        self.assertEqual((fila['Origen'], fila['Destino'], fila['Pasajeros']), ('Quito, Quito', 'Terminal, Cuenca', '3'))
+
+    def test_exportar_pasajeros_xlsx(self):
+        response = self.client.get(reverse('viajes:exportar_pasajeros'), {'formato': 'xlsx', 'bus': self.bus.pk})
+        self.assertIn('spreadsheetml', response['Content-Type'])
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archivo:
+            hoja = archivo.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(hoja.count('<row>'), 4)
+        self.assertIn('Pasajero 2', hoja)
+        self.assertIn('11111112-2', hoja)
+
+    def test_exportar_requiere_admin(self):
+        self.client.force_login(User.objects.create_user('operador', 'operador@example.com', 'clave'))
+        response = self.client.get(reverse('viajes:exportar_viajes'))
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+
+class ViajeListFiltrosTestCase(ViajesFixtureMixin, TestCase):
+    def setUp(self):
+        [self.conductor], self.buses = self.crear_conductores(), self.crear_buses(2)
+        guayaquil = Lugar.objects.create(nombre='Terminal Sur', ciudad='Guayaquil')
+        ahora = timezone.now()
+        self.viajes = []
+        for i in range(45):
+            self.viajes.append(self.crear_viaje(
+                self.buses[i % 2], self.conductor, ahora - timedelta(hours=i),
+                estado='completado' if i % 3 else 'programado',
+                origen_nombre='Terminal', origen_ciudad='Quito',
+                lugar_destino=guayaquil if i == 7 else None, destino_nombre='' if i == 7 else 'Terminal',
+                destino_ciudad='' if i == 7 else 'Cuenca',
+            ))
+        pasajero = Pasajero.objects.create(nombre_completo='Ana', rut='11111111-1', telefono='099', correo='a@example.com')
+        ViajePasajero.objects.create(viaje=self.viajes[0], pasajero=pasajero)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+
+    def _recorrer(self, consulta=None):
+        """Pks de todas las páginas siguiendo los cursores y consultas de cada página."""
+        consulta = dict(consulta or {})
+        pks, consultas = [], []
+        while True:
+            with CaptureQueriesContext(connection) as capturadas:
+                response = self.client.get(reverse('viajes:viaje_list'), consulta)
+            consultas.append(len(capturadas))
+            pagina = response.context['pagina']
+            pks += [viaje.pk for viaje in pagina]
+            if not pagina.has_next:
+                return pks, consultas, response
+            consulta['cursor'] = pagina.cursor_siguiente
+
+    def test_paginacion_por_cursor_completa_y_con_consultas_constantes(self):
+        pks, consultas, response = self._recorrer()
+        self.assertEqual(pks, [viaje.pk for viaje in self.viajes])
+        self.assertEqual(len(set(consultas)), 1)
+        primera = self.client.get(reverse('viajes:viaje_list')).context['pagina']
+        self.assertEqual(primera.filas[0].pasajeros_confirmados, 1)
+        self.assertEqual(primera.filas[1].pasajeros_confirmados, 0)
+
+    def test_filtros(self):
+        pks, _, _ = self._recorrer({'estado': 'programado', 'bus': self.buses[0].pk})
+        self.assertEqual(pks, [viaje.pk for i, viaje in enumerate(self.viajes) if i % 6 == 0])
+        pks, _, response = self._recorrer({'ciudad': 'Guayaquil'})
+        self.assertEqual(pks, [self.viajes[7].pk])
+        self.assertContains(response, 'Guayaquil')
+        pks, _, _ = self._recorrer({'ciudad': 'Quito', 'conductor': self.conductor.pk})
+        self.assertEqual(len(pks), 45)
+        self.assertEqual(self._recorrer({'ciudad': 'Loja'})[0], [])
+
+
+class ConflictosAgendaTestCase(ViajesFixtureMixin, TestCase):
+    def setUp(self):
+        self.conductores, self.buses = self.crear_conductores(2), self.crear_buses(2)
+        self.inicio = timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+    def _viaje(self, desde_h, hasta_h, bus=0, conductor=0, estado='programado'):
+        return self.crear_viaje(self.buses[bus], self.conductores[conductor], self.inicio + timedelta(hours=desde_h),
+                                horas=hasta_h - desde_h, estado=estado)
+
+    def _form(self, desde_h, hasta_h, bus=0, conductor=0, instance=None):
+        return ViajeForm(instance=instance, data={
+            'bus': self.buses[bus].pk, 'conductor': self.conductores[conductor].pk,
+            'origen_nombre': 'Terminal', 'origen_ciudad': 'Santiago', 'origen_pais': 'Chile',
+            'latitud_origen': '-33.45', 'longitud_origen': '-70.66',
+            'destino_nombre': 'Terminal', 'destino_ciudad': 'Valparaíso', 'destino_pais': 'Chile',
+            'latitud_destino': '-33.04', 'longitud_destino': '-71.61',
+            'fecha_salida': self.inicio + timedelta(hours=desde_h),
+            'fecha_llegada_estimada': self.inicio + timedelta(hours=hasta_h),
+            'estado': 'programado',
+        })
+
+    def test_formulario_rechaza_bus_y_conductor_ocupados(self):
+        existente = self._viaje(10, 14)
+        form = self._form(12, 16)
+        self.assertFalse(form.is_valid())
+        self.assertIn(f'viaje #{existente.pk}', form.errors['bus'][0])
+        self.assertIn('conductor', form.errors)
+
+        form = self._form(12, 16, bus=1)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(list(form.errors), ['conductor'])
+
+        # Intervalos contiguos, otro bus y conductor, o el mismo viaje al editarlo: sin conflicto
+        self.assertTrue(self._form(14, 18).is_valid())
+        self.assertTrue(self._form(12, 16, bus=1, conductor=1).is_valid())
+        self.assertTrue(self._form(11, 13, instance=existente).is_valid())
+
+    def test_cancelados_no_ocupan_y_llegada_posterior(self):
+        self._viaje(10, 14, estado='cancelado')
+        self.assertTrue(self._form(12, 16).is_valid())
+        form = self._form(12, 12)
+        self.assertFalse(form.is_valid())
+        self.assertIn('fecha_llegada_estimada', form.errors)
+
+    def test_editar_sin_cambiar_agenda_no_consulta_conflictos(self):
+        self._viaje(10, 14)
+        # Cruce creado fuera del formulario (p. ej. dos guardados concurrentes)
+        cruzado = self._viaje(12, 16)
+        form = self._form(12, 16, instance=cruzado)
+        with CaptureQueriesContext(connection) as contexto:
+            self.assertTrue(form.is_valid())
+        self.assertFalse([q for q in contexto.captured_queries if 'viajes_viaje' in q['sql']])
+        self.assertFalse(self._form(12, 17, instance=cruzado).is_valid())
+
+    def test_conflictos_viaje_usa_una_consulta_por_recurso(self):
+        self._viaje(10, 14)
+        with self.assertNumQueries(2):
+            conflictos = conflictos_viaje(self.inicio + timedelta(hours=13), self.inicio + timedelta(hours=15),
+                                          bus=self.buses[0], conductor=self.conductores[1])
+        self.assertEqual([recurso for recurso, _ in conflictos], ['bus'])
+
+    def test_barrido_reporta_todos_los_pares(self):
+        a = self._viaje(0, 10)
+        b = self._viaje(2, 4, conductor=1)
+        c = self._viaje(3, 12, bus=1)
+        d = self._viaje(10, 11, conductor=1)
+        self._viaje(5, 6, bus=1, conductor=1, estado='cancelado')
+        self.assertEqual(detectar_conflictos(), [
+            ('bus', self.buses[0].pk, a.pk, b.pk),
+            ('conductor', self.conductores[0].pk, a.pk, c.pk),
+        ])
+        self.assertEqual(detectar_conflictos(desde=self.inicio + timedelta(hours=10)), [])
+        self.assertNotIn(d.pk, [par[3] for par in detectar_conflictos()])
+        salida = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('detectar_conflictos_viajes', fallar_si_hay_conflictos=True, stdout=salida)
+        self.assertIn('2 conflicto(s)', salida.getvalue())
+
+
+class AsientosTestCase(ViajesFixtureMixin, TestCase):
+    def setUp(self):
+        [conductor], [bus] = self.crear_conductores(), self.crear_buses(capacidad=4)
+        self.viaje = self.crear_viaje(bus, conductor)
+        self.pasajeros = [
+            Pasajero.objects.create(nombre_completo=f'Pasajero {i}', rut=f'1111111{i}-{i}', telefono='099',
+                                    correo=f'p{i}@example.com')
+            for i in range(6)
+        ]
+
+    def _mapa(self):
+        self.viaje.refresh_from_db()
+        return MapaAsientos.de_viaje(self.viaje)
+
+    def test_operaciones_del_mapa(self):
+        mapa = MapaAsientos(10)
+        for asiento in (1, 2, 4, 8, 9):
+            mapa.ocupar(asiento)
+        self.assertEqual(mapa.libres(), [3, 5, 6, 7, 10])
+        self.assertEqual(mapa.siguiente_libre(), 3)
+        self.assertEqual(mapa.siguiente_libre(desde=4), 5)
+        self.assertEqual(mapa.cantidad_libres(), 5)
+        # El tramo 5-7 es el más corto donde caben 2; el 3 y el 10 no alcanzan
+        self.assertEqual(mapa.mejor_bloque(2), 5)
+        self.assertEqual(mapa.mejor_bloque(1), 3)
+        self.assertIsNone(mapa.mejor_bloque(4))
+        copia = MapaAsientos.desde_bytes(10, mapa.a_bytes())
+        self.assertEqual(copia.libres(), mapa.libres())
+        mapa.liberar(9)
+        self.assertEqual(mapa.mejor_bloque(2), 9)
+
+    def test_asignar_liberar_y_cambiar(self):
+        primero = asignar_asiento(self.viaje, self.pasajeros[0])
+        self.assertEqual(primero.asiento, '1')
+        asignar_asiento(self.viaje, self.pasajeros[1], asiento='3')
+        self.assertEqual(asignar_asiento(self.viaje, self.pasajeros[2]).asiento, '2')
+        self.assertEqual(self._mapa().libres(), [4])
+
+        for asiento, pasajero in (('3', self.pasajeros[3]), ('7', self.pasajeros[3]), (None, self.pasajeros[0])):
+            with self.assertRaises(ValidationError):
+                asignar_asiento(self.viaje, pasajero, asiento=asiento)
+        asignar_asiento(self.viaje, self.pasajeros[3])
+        with self.assertRaisesMessage(ValidationError, 'capacidad máxima'):
+            asignar_asiento(self.viaje, self.pasajeros[4])
+
+        # Quitar un pasajero (o eliminarlo) libera su asiento
+        primero.delete()
+        self.pasajeros[1].delete()
+        self.assertEqual(self._mapa().libres(), [1, 3])
+        segundo = ViajePasajero.objects.get(viaje=self.viaje, asiento='2')
+        cambiar_asiento(segundo, '3')
+        self.assertEqual(self._mapa().libres(), [1, 2])
+
+    def test_editar_pasajero_con_asiento_antiguo_o_sin_asiento(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        antiguo = ViajePasajero.objects.create(viaje=self.viaje, pasajero=self.pasajeros[0], asiento='A3')
+        url = reverse('viajes:editar_pasajero_viaje', args=[self.viaje.pk, self.pasajeros[0].pk])
+        response = self.client.post(url, {'asiento': 'A3', 'observaciones': 'Ventana'})
+        self.assertRedirects(response, reverse('viajes:viaje_pasajeros', args=[self.viaje.pk]))
+        antiguo.refresh_from_db()
+        self.assertEqual((antiguo.asiento, antiguo.observaciones), ('A3', 'Ventana'))
+
+        # Vacío al editar quita el asiento (no asigna el primero libre)
+        numerado = asignar_asiento(self.viaje, self.pasajeros[1], asiento='2')
+        cambiar_asiento(numerado, '')
+        numerado.refresh_from_db()
+        self.assertIsNone(numerado.asiento)
+        self.assertEqual(self._mapa().libres(), [1, 2, 3, 4])
+
+    def test_mapa_bloqueado_guarda_al_salir(self):
+        with mapa_bloqueado(self.viaje.pk) as (viaje, mapa):
+            mapa.ocupar(2)
+        self.assertEqual(self._mapa().libres(), [1, 3, 4])
+        # Con una excepción la transacción se deshace y el mapa no se guarda
+        with self.assertRaises(ValidationError):
+            with mapa_bloqueado(self.viaje.pk) as (viaje, mapa):
+                mapa.ocupar(1)
+                raise ValidationError('Cancelado')
+        self.assertEqual(self._mapa().libres(), [1, 3, 4])
+
+    def test_guardar_viaje_no_pisa_el_mapa(self):
+        desactualizado = Viaje.objects.get(pk=self.viaje.pk)
+        asignar_asiento(self.viaje, self.pasajeros[0])
+        desactualizado.observaciones = 'Editado'
+        desactualizado.save()
+        self.assertEqual(self._mapa().libres(), [2, 3, 4])
+
+    def test_restriccion_unica_por_asiento(self):
+        ViajePasajero.objects.create(viaje=self.viaje, pasajero=self.pasajeros[0], asiento='1')
+        ViajePasajero.objects.create(viaje=self.viaje, pasajero=self.pasajeros[1], asiento=None)
+        ViajePasajero.objects.create(viaje=self.viaje, pasajero=self.pasajeros[2], asiento=None)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ViajePasajero.objects.create(viaje=self.viaje, pasajero=self.pasajeros[3], asiento='1')
+        self.assertEqual(reconstruir_mapa(self.viaje), 0b1)
+
+    def test_vista_agregar_asigna_asiento(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        url = reverse('viajes:agregar_pasajero_viaje', args=[self.viaje.pk])
+        self.client.post(url, {'pasajero_id': self.pasajeros[0].pk, 'asiento': '2'})
+        response = self.client.post(url, {'pasajero_id': self.pasajeros[1].pk, 'asiento': '2'}, follow=True)
+        self.assertContains(response, 'El asiento 2 ya está ocupado.')
+        self.client.post(url, {'pasajero_id': self.pasajeros[1].pk, 'asiento': ''})
+        self.assertEqual(
+            list(ViajePasajero.objects.filter(viaje=self.viaje).order_by('asiento').values_list('asiento', flat=True)),
+            ['1', '2'],
+        )
+        self.assertEqual(self._mapa().libres(), [3, 4])
+        self.assertEqual(self.viaje.pasajeros_confirmados, 2)
+
+
+class ImportacionNominaTestCase(ViajesFixtureMixin, TestCase):
+    def setUp(self):
+        [conductor], [bus] = self.crear_conductores(), self.crear_buses(capacidad=5)
+        self.viaje = self.crear_viaje(bus, conductor)
+        self.existente = Pasajero.objects.create(nombre_completo='Marta Soto', rut='12.345.678-5', telefono='099',
+                                                 correo='marta@example.com')
+
+    def _csv(self, filas):
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, delimiter=';')
+        escritor.writerow(['RUT', 'Nombre completo', 'Teléfono', 'Correo', 'Asiento'])
+        escritor.writerows(filas)
+        return buffer.getvalue().encode('utf-8-sig')
+
+    def test_leer_xlsx(self):
+        encabezados = ['Rut', 'Nombre', 'Fono', 'Email', 'Asiento']
+        contenido = b''.join(xlsx_en_streaming(encabezados, [['11111111-1', 'José Pérez', 912345678, 'jose@example.com', 3]]))
+        self.assertEqual(leer_nomina(contenido, 'xlsx'), [(2, {
+            'rut': '11111111-1', 'nombre_completo': 'José Pérez', 'telefono': '912345678',
+            'correo': 'jose@example.com', 'asiento': '3',
+        })])
+        with self.assertRaises(ValidationError):
+            leer_nomina(b'no es un zip', 'xlsx')
+        with self.assertRaisesMessage(ValidationError, 'columna "RUT"'):
+            leer_nomina(b'nombre,correo\nAna,ana@example.com\n', 'csv')
+
+    def test_importar_con_reporte_por_fila(self):
+        contenido = self._csv([
+            ['12345678-5', '', '', '', ''],                                   # existente, asiento automático
+            ['11.111.111-1', 'José Pérez', '0991', 'jose@example.com', '3'],  # nuevo con asiento
+            ['22222222-2', 'Luis Díaz', '0992', 'luis@example.com', ''],
+            ['11111111-1', 'Repetido', '0993', 'rep@example.com', ''],
+            ['12345678-9', 'Dígito Malo', '0994', 'malo@example.com', ''],
+            ['33333333-3', 'Sin Correo', '0995', '', ''],
+            ['44444444-4', 'Asiento Tomado', '0996', 'tomado@example.com', '3'],
+            ['55555555-5', 'Fuera de Rango', '0997', 'rango@example.com', '9'],
+            ['66666666-6', 'Cuarto', '0998', 'cuarto@example.com', ''],
+            ['77777777-7', 'Quinto', '0999', 'quinto@example.com', ''],
+            ['88888888-8', 'Sin Cupo', '0990', 'cupo@example.com', ''],
+        ])
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = importar_nomina(self.viaje, leer_nomina(contenido, 'csv'))
+        self.assertLess(len(consultas), 20)
+
+        self.assertEqual([fila for fila, _ in resultado.errores_ordenados], [5, 6, 7, 8, 9, 12])
+        self.assertEqual(
+            sorted((fila, asiento) for fila, _, asiento in resultado.agregados),
+            [(2, 1), (3, 3), (4, 2), (10, 4), (11, 5)],
+        )
+        self.assertEqual((resultado.creados, resultado.existentes), (4, 1))
+        self.viaje.refresh_from_db()
+        self.assertEqual(self.viaje.pasajeros_confirmados, 5)
+        self.assertEqual(MapaAsientos.de_viaje(self.viaje).cantidad_libres(), 0)
+
+        jose = Pasajero.objects.get(rut_normalizado='111111111')
+        self.assertEqual(jose.rut, '11111111-1')
+        self.assertEqual([p.pk for p in buscar_pasajeros('jose')], [jose.pk])
+
+        # Reimportar: los pasajeros ya registrados se reportan y no se duplican
+        resultado = importar_nomina(self.viaje, leer_nomina(self._csv([['12345678-5', '', '', '', '']]), 'csv'))
+        self.assertEqual(resultado.errores, [(2, 'Marta Soto ya está registrado en este viaje.')])
+        self.assertEqual(ViajePasajero.objects.filter(viaje=self.viaje).count(), 5)
+
+    def test_vista_importar(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        url = reverse('viajes:importar_pasajeros_viaje', args=[self.viaje.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        archivo = SimpleUploadedFile('nomina.csv', self._csv([['12345678-5', '', '', '', '2'], ['1-9', '', '', '', '']]))
+        response = self.client.post(url, {'archivo': archivo})
+        self.assertContains(response, 'RUT inválido')
+        self.assertEqual(ViajePasajero.objects.get(viaje=self.viaje).asiento, '2')
+        archivo = SimpleUploadedFile('nomina.txt', b'rut\n')
+        self.assertContains(self.client.post(url, {'archivo': archivo}), 'Use un archivo CSV o XLSX.')
+
+
+class ContadorPasajerosTestCase(ViajesFixtureMixin, TestCase):
+    def setUp(self):
+        [conductor], [bus] = self.crear_conductores(), self.crear_buses(capacidad=10)
+        salida = timezone.now()
+        self.viajes = [
+            self.crear_viaje(bus, conductor, salida + timedelta(days=i))
+            for i in range(2)
+        ]
+        self.pasajeros = [
+            Pasajero.objects.create(nombre_completo=f'Pasajero {i}', rut=f'2222222{i}-{i}', telefono='099',
+                                    correo=f'c{i}@example.com')
+            for i in range(4)
+        ]
+
+    def _contadores(self):
+        return list(Viaje.objects.order_by('pk').values_list('pasajeros_confirmados', flat=True))
+
+    def test_altas_bajas_y_m2m(self):
+        viaje, otro = self.viajes
+        asignar_asiento(viaje, self.pasajeros[0])
+        ViajePasajero.objects.create(viaje=viaje, pasajero=self.pasajeros[1])
+        viaje.pasajeros.add(self.pasajeros[2], self.pasajeros[3])
+        viaje.pasajeros.add(self.pasajeros[2])  # ya estaba: no cuenta dos veces
+        self.pasajeros[0].viajes.add(otro)
+        self.assertEqual(self._contadores(), [4, 1])
+
+        viaje.pasajeros.remove(self.pasajeros[2])
+        self.pasajeros[3].delete()
+        ViajePasajero.objects.get(viaje=viaje, pasajero=self.pasajeros[1]).delete()
+        self.assertEqual(self._contadores(), [1, 1])
+        viaje.pasajeros.clear()
+        self.assertEqual(self._contadores(), [0, 1])
+
+        # Guardar una instancia desactualizada no pisa el contador
+        otro.observaciones = 'Editado'
+        otro.save()
+        self.assertEqual(self._contadores(), [0, 1])
+
+    def test_eliminar_viaje_no_actualiza_por_pasajero(self):
+        viaje = self.viajes[0]
+        viaje.pasajeros.add(*self.pasajeros)
+        with CaptureQueriesContext(connection) as consultas:
+            viaje.delete()
+        self.assertFalse([q for q in consultas.captured_queries if q['sql'].startswith('UPDATE "viajes_viaje"')])
+
+    def test_reparar_contador(self):
+        viaje, otro = self.viajes
+        viaje.pasajeros.add(*self.pasajeros[:3])
+        Viaje.objects.filter(pk=viaje.pk).update(pasajeros_confirmados=0)
+        Viaje.objects.filter(pk=otro.pk).update(pasajeros_confirmados=7)
+        salida = StringIO()
+        call_command('reparar_contador_pasajeros', lote=1, stdout=salida)
+        self.assertIn('2 viaje(s) revisados, 2 contador(es) corregidos', salida.getvalue())
+        self.assertEqual(self._contadores(), [3, 0])
+        self.assertEqual(reconstruir_contadores(), (2, 0))
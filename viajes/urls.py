@@ -10,11 +10,16 @@ urlpatterns = [
     path('<int:pk>/', views.ViajeDetailView.as_view(), name='viaje_detail'),
     path('<int:pk>/editar/', views.ViajeUpdateView.as_view(), name='viaje_update'),
     path('<int:pk>/eliminar/', views.ViajeDeleteView.as_view(), name='viaje_delete'),
+
+    # Exportación (CSV/XLSX)
+    path('exportar/', views.exportar_viajes, name='exportar_viajes'),
+    path('exportar/pasajeros/', views.exportar_pasajeros, name='exportar_pasajeros'),
     
     # Gestión de pasajeros en viajes
     path('<int:pk>/pasajeros/', views.viaje_pasajeros_view, name='viaje_pasajeros'),
     path('<int:pk>/pasajeros/agregar/', views.agregar_pasajero_viaje, name='agregar_pasajero_viaje'),
     path('<int:pk>/pasajeros/crear/', views.crear_pasajero_desde_viaje, name='crear_pasajero_desde_viaje'),
+    path('<int:pk>/pasajeros/importar/', views.importar_pasajeros_viaje, name='importar_pasajeros_viaje'),
     path('<int:pk>/pasajeros/<int:pasajero_pk>/quitar/', views.quitar_pasajero_viaje, name='quitar_pasajero_viaje'),
     path('<int:pk>/pasajeros/<int:pasajero_pk>/editar/', views.editar_pasajero_viaje, name='editar_pasajero_viaje'),
     path('<int:pk>/pasajeros/pdf/', views.generar_pdf_pasajeros, name='generar_pdf_pasajeros'),
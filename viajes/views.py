@@ -1,5 +1,6 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views import View
+from django.views.generic import DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -8,8 +9,11 @@ from django.forms import ModelForm
 from django import forms
 from django.utils import timezone
 from django.http import JsonResponse, HttpResponse
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Q
 from django.template.loader import get_template
+from datetime import datetime, timedelta
 from io import BytesIO
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
@@ -22,6 +26,13 @@ from core.models import Conductor, Lugar, Pasajero
 from core.views import PasajeroForm
 from flota.models import Bus
 from core.permissions import admin_required, usuario_or_admin_required
+from core.tareas import encolar
+from core.exportacion import respuesta_exportacion
+from core.paginacion import paginar_por_cursor
+from .asientos import MapaAsientos, asignar_asiento, cambiar_asiento
+from .conflictos import conflictos_viaje
+from .importacion import MAX_FILAS, importar_nomina, leer_nomina
+from .exportacion import ENCABEZADOS_PASAJEROS, ENCABEZADOS_VIAJES, filas_pasajeros, filas_viajes
 
 
 class ViajeForm(ModelForm):
@@ -133,29 +144,143 @@ class ViajeForm(ModelForm):
             raise forms.ValidationError('Debe especificar el nombre del lugar de destino.')
         if not cleaned_data.get('destino_ciudad'):
             raise forms.ValidationError('Debe especificar la ciudad de destino.')
-        
+
+        self._validar_agenda(cleaned_data)
         return cleaned_data
+
+    # Campos que pueden crear un cruce de agenda; si no cambia ninguno, no se vuelve a consultar
+    CAMPOS_AGENDA = ('bus', 'conductor', 'fecha_salida', 'fecha_llegada_estimada', 'estado')
+    # Campos de los que depende la distancia calculada por el servicio de rutas
+    CAMPOS_COORDENADAS = ('latitud_origen', 'longitud_origen', 'latitud_destino', 'longitud_destino')
+
+    def _validar_agenda(self, cleaned_data):
+        """
+        Rechaza buses o conductores asignados a otro viaje que se superpone en el tiempo.
+
+        Al editar solo se consulta si cambió alguno de CAMPOS_AGENDA. La consulta no
+        bloquea filas (sin select_for_update), así que dos guardados concurrentes
+        pueden cruzarse; el comando detectar_conflictos_viajes es el respaldo que
+        los encuentra.
+        """
+        salida = cleaned_data.get('fecha_salida')
+        llegada = cleaned_data.get('fecha_llegada_estimada')
+        if not salida or not llegada:
+            return
+        if llegada <= salida:
+            self.add_error('fecha_llegada_estimada', 'La llegada estimada debe ser posterior a la salida.')
+            return
+        if cleaned_data.get('estado') == 'cancelado':
+            return
+        if self.instance.pk and not set(self.CAMPOS_AGENDA) & set(self.changed_data):
+            return
+        conflictos = conflictos_viaje(salida, llegada, bus=cleaned_data.get('bus'),
+                                      conductor=cleaned_data.get('conductor'), excluir=self.instance.pk)
+        for recurso, viaje in conflictos:
+            sujeto = f'El bus {viaje.bus.placa}' if recurso == 'bus' else f'El conductor {viaje.conductor}'
+            inicio = timezone.localtime(viaje.fecha_salida).strftime('%d/%m/%Y %H:%M')
+            fin = timezone.localtime(viaje.fecha_llegada_estimada).strftime('%d/%m/%Y %H:%M')
+            self.add_error(recurso, f'{sujeto} ya está asignado al viaje #{viaje.pk} ({inicio} - {fin}).')
     
     def save(self, commit=True):
         instance = super().save(commit=False)
         if commit:
             instance.save()
-            # Calcular distancia después de guardar
-            if instance.latitud_origen and instance.longitud_origen and instance.latitud_destino and instance.longitud_destino:
-                instance.calcular_distancia_real()
+            # Encolar el cálculo de distancia (lo ejecuta el worker `procesar_tareas`) si
+            # cambiaron las coordenadas o aún no se calculó
+            coordenadas = all(getattr(instance, campo) for campo in self.CAMPOS_COORDENADAS)
+            if coordenadas and (instance.distancia_km is None or set(self.CAMPOS_COORDENADAS) & set(self.changed_data)):
+                encolar('viajes.calcular_distancia', viaje_id=instance.pk)
         return instance
 
 
+class FiltroViajesForm(forms.Form):
+    """Filtros de viajes (fecha de salida, estado, bus, conductor y ciudad de origen o destino)."""
+    desde = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}), label='Desde')
+    hasta = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}), label='Hasta')
+    estado = forms.ChoiceField(choices=[('', 'Todos')] + list(Viaje.ESTADO_VIAJE), required=False,
+                               widget=forms.Select(attrs={'class': 'form-control'}), label='Estado')
+    bus = forms.ModelChoiceField(queryset=Bus.objects.only('placa', 'modelo').order_by('placa'), required=False,
+                                 empty_label='Todos', widget=forms.Select(attrs={'class': 'form-control'}), label='Bus')
+    conductor = forms.ModelChoiceField(queryset=Conductor.objects.only('nombre', 'apellido').order_by('apellido', 'nombre'),
+                                       required=False, empty_label='Todos', widget=forms.Select(attrs={'class': 'form-control'}), label='Conductor')
+    ciudad = forms.CharField(required=False, max_length=100, label='Ciudad',
+                             widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Origen o destino'}))
+
+    def filtrar(self, queryset, prefijo=''):
+        """
+        Aplica los filtros válidos a un queryset de Viaje, o de un modelo relacionado
+        con `prefijo` (p. ej. 'viaje__'). Las fechas se filtran como rango de
+        datetimes, que aprovecha el índice de fecha_salida.
+        """
+        if not self.is_valid():
+            return queryset
+        datos = self.cleaned_data
+        filtro = {}
+        if datos.get('desde'):
+            filtro[f'{prefijo}fecha_salida__gte'] = timezone.make_aware(
+                datetime.combine(datos['desde'], datetime.min.time()))
+        if datos.get('hasta'):
+            filtro[f'{prefijo}fecha_salida__lt'] = timezone.make_aware(
+                datetime.combine(datos['hasta'] + timedelta(days=1), datetime.min.time()))
+        for campo in ('estado', 'bus', 'conductor'):
+            if datos.get(campo):
+                filtro[f'{prefijo}{campo}'] = datos[campo]
+        queryset = queryset.filter(**filtro)
+        ciudad = (datos.get('ciudad') or '').strip()
+        if ciudad:
+            # Igualdad (no LIKE) para usar los índices de ciudad; los lugares se resuelven con subconsultas
+            lugares = Lugar.objects.filter(ciudad=ciudad).values('pk')
+            queryset = queryset.filter(
+                Q(**{f'{prefijo}origen_ciudad': ciudad}) | Q(**{f'{prefijo}destino_ciudad': ciudad})
+                | Q(**{f'{prefijo}lugar_origen__in': lugares}) | Q(**{f'{prefijo}lugar_destino__in': lugares})
+            )
+        return queryset
+
+
 # Vistas para Viajes
 @method_decorator(usuario_or_admin_required, name='dispatch')
-class ViajeListView(ListView):
-    model = Viaje
+class ViajeListView(View):
+    """
+    Listado de viajes filtrable, paginado por cursor (el costo de cada página no
+    depende de su posición). La cantidad de pasajeros es el contador del viaje.
+    """
     template_name = 'viajes/viaje_list.html'
-    context_object_name = 'viajes'
-    paginate_by = 20
+    por_pagina = 20
+    orden = ['-fecha_salida', '-pk']
 
-    def get_queryset(self):
-        return Viaje.objects.all().order_by('-fecha_salida')
+    def get(self, request):
+        filtro_form = FiltroViajesForm(request.GET or None)
+        viajes_qs = filtro_form.filtrar(
+            Viaje.objects.select_related('bus', 'conductor', 'lugar_origen', 'lugar_destino')
+        )
+        pagina = paginar_por_cursor(viajes_qs, self.orden, request.GET.get('cursor'), self.por_pagina)
+
+        # Parámetros de filtro (sin el cursor) para la paginación y los enlaces de exportación
+        parametros = request.GET.copy()
+        parametros.pop('cursor', None)
+
+        context = {
+            'viajes': pagina,
+            'pagina': pagina,
+            'filtro_form': filtro_form,
+            'filtros_query': parametros.urlencode(),
+        }
+        return render(request, self.template_name, context)
+
+
+@admin_required
+def exportar_viajes(request):
+    """Exporta los viajes filtrados en CSV o XLSX (en streaming)."""
+    viajes = FiltroViajesForm(request.GET or None).filtrar(Viaje.objects.all())
+    return respuesta_exportacion('viajes', ENCABEZADOS_VIAJES, filas_viajes(viajes), request.GET.get('formato'))
+
+
+@admin_required
+def exportar_pasajeros(request):
+    """Exporta los pasajeros de los viajes filtrados en CSV o XLSX (en streaming)."""
+    pasajeros = FiltroViajesForm(request.GET or None).filtrar(ViajePasajero.objects.all(), prefijo='viaje__')
+    return respuesta_exportacion(
+        'pasajeros_viajes', ENCABEZADOS_PASAJEROS, filas_pasajeros(pasajeros), request.GET.get('formato'))
 
 
 @method_decorator(usuario_or_admin_required, name='dispatch')
@@ -226,6 +351,7 @@ def viaje_pasajeros_view(request, pk):
         'viaje': viaje,
         'pasajeros_en_viaje': pasajeros_en_viaje,
         'pasajero_form': pasajero_form,
+        'asientos_libres': MapaAsientos.de_viaje(viaje).libres(),
     }
     return render(request, 'viajes/viaje_pasajeros.html', context)
 
@@ -244,27 +370,13 @@ def agregar_pasajero_viaje(request, pk):
         try:
             pasajero = get_object_or_404(Pasajero, pk=pasajero_id)
             
-            # Verificar si el pasajero ya está en el viaje
-            if ViajePasajero.objects.filter(viaje=viaje, pasajero=pasajero).exists():
-                messages.error(request, f'El pasajero {pasajero.nombre_completo} ya está registrado en este viaje.')
-            else:
-                # Verificar capacidad del bus
-                if viaje.get_pasajeros_count() >= viaje.bus.capacidad_pasajeros:
-                    messages.error(request, 'El bus ha alcanzado su capacidad máxima de pasajeros.')
-                else:
-                    ViajePasajero.objects.create(
-                        viaje=viaje,
-                        pasajero=pasajero,
-                        asiento=asiento,
-                        observaciones=observaciones
-                    )
-                    
-                    # Actualizar el contador de pasajeros confirmados
-                    viaje.pasajeros_confirmados = viaje.get_pasajeros_count()
-                    viaje.save()
-                    
-                    messages.success(request, f'Pasajero {pasajero.nombre_completo} agregado al viaje exitosamente.')
+            # Asiento indicado o el primero libre; valida duplicados y capacidad con el viaje bloqueado
+            viaje_pasajero = asignar_asiento(viaje, pasajero, asiento=asiento, observaciones=observaciones)
+            
+            messages.success(request, f'Pasajero {pasajero.nombre_completo} agregado al viaje exitosamente (asiento {viaje_pasajero.asiento}).')
                     
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
         except Pasajero.DoesNotExist:
             messages.error(request, 'Pasajero no encontrado.')
         except Exception as e:
@@ -286,10 +398,6 @@ def quitar_pasajero_viaje(request, pk, pasajero_pk):
             viaje_pasajero = ViajePasajero.objects.get(viaje=viaje, pasajero=pasajero)
             viaje_pasajero.delete()
             
-            # Actualizar el contador de pasajeros confirmados
-            viaje.pasajeros_confirmados = viaje.get_pasajeros_count()
-            viaje.save()
-            
             messages.success(request, f'Pasajero {pasajero.nombre_completo} removido del viaje exitosamente.')
             
         except ViajePasajero.DoesNotExist:
@@ -310,20 +418,25 @@ def editar_pasajero_viaje(request, pk, pasajero_pk):
     viaje_pasajero = get_object_or_404(ViajePasajero, viaje=viaje, pasajero=pasajero)
     
     if request.method == 'POST':
-        asiento = request.POST.get('asiento')
+        asiento = request.POST.get('asiento', '').strip()
         observaciones = request.POST.get('observaciones', '')
         
-        viaje_pasajero.asiento = asiento
-        viaje_pasajero.observaciones = observaciones
-        viaje_pasajero.save()
-        
-        messages.success(request, f'Información del pasajero {pasajero.nombre_completo} actualizada exitosamente.')
-        return redirect('viajes:viaje_pasajeros', pk=pk)
+        try:
+            cambiar_asiento(viaje_pasajero, asiento)
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+        else:
+            viaje_pasajero.observaciones = observaciones
+            viaje_pasajero.save(update_fields=['observaciones'])
+            
+            messages.success(request, f'Información del pasajero {pasajero.nombre_completo} actualizada exitosamente.')
+            return redirect('viajes:viaje_pasajeros', pk=pk)
     
     context = {
         'viaje': viaje,
         'pasajero': pasajero,
         'viaje_pasajero': viaje_pasajero,
+        'asientos_libres': MapaAsientos.de_viaje(viaje).libres(),
     }
     return render(request, 'viajes/editar_pasajero_viaje.html', context)
 
@@ -349,22 +462,15 @@ def crear_pasajero_desde_viaje(request, pk):
                     asiento = request.POST.get('asiento', '').strip()
                     observaciones = request.POST.get('observaciones', '').strip()
                     
-                    # Verificar capacidad del bus
-                    if viaje.get_pasajeros_count() >= viaje.bus.capacidad_pasajeros:
-                        messages.warning(request, f'Pasajero {pasajero.nombre_completo} creado, pero el bus ha alcanzado su capacidad máxima. No se agregó al viaje automáticamente.')
-                    else:
-                        # Agregar automáticamente el pasajero al viaje
-                        ViajePasajero.objects.create(
-                            viaje=viaje,
-                            pasajero=pasajero,
-                            asiento=asiento if asiento else None,
+                    try:
+                        # Agregar automáticamente el pasajero al viaje (asiento indicado o el primero libre)
+                        asignar_asiento(
+                            viaje, pasajero, asiento=asiento,
                             observaciones=observaciones if observaciones else 'Creado desde gestión de viaje'
                         )
-                        
-                        # Actualizar el contador de pasajeros confirmados
-                        viaje.pasajeros_confirmados = viaje.get_pasajeros_count()
-                        viaje.save()
-                        
+                    except ValidationError as e:
+                        messages.warning(request, f'Pasajero {pasajero.nombre_completo} creado, pero no se agregó al viaje: {e.messages[0]}')
+                    else:
                         messages.success(request, f'Pasajero {pasajero.nombre_completo} creado y agregado al viaje exitosamente.')
                     
                     return redirect('viajes:viaje_pasajeros', pk=pk)
@@ -387,6 +493,65 @@ def crear_pasajero_desde_viaje(request, pk):
     return redirect('viajes:viaje_pasajeros', pk=pk)
 
 
+class ImportarNominaForm(forms.Form):
+    TAMANO_MAXIMO = 2 * 1024 * 1024
+
+    archivo = forms.FileField(
+        label='Archivo de nómina',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+        help_text='CSV o XLSX con columnas RUT, Nombre, Teléfono, Correo y opcionalmente Asiento y Observaciones.',
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if archivo.size > self.TAMANO_MAXIMO:
+            raise forms.ValidationError('El archivo no debe superar los 2 MB.')
+        formato = archivo.name.rsplit('.', 1)[-1].lower()
+        if formato not in ('csv', 'xlsx'):
+            raise forms.ValidationError('Use un archivo CSV o XLSX.')
+        self.cleaned_data['formato'] = formato
+        return archivo
+
+
+@login_required(login_url='login')
+@usuario_or_admin_required
+def importar_pasajeros_viaje(request, pk):
+    """
+    Vista para importar la nómina de pasajeros de un viaje desde un CSV o XLSX.
+    Muestra el resultado con los errores de cada fila que no se pudo importar.
+    """
+    viaje = get_object_or_404(Viaje.objects.select_related('bus'), pk=pk)
+    resultado = None
+    
+    if request.method == 'POST':
+        form = ImportarNominaForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                filas = leer_nomina(form.cleaned_data['archivo'].read(), form.cleaned_data['formato'])
+                resultado = importar_nomina(viaje, filas)
+            except ValidationError as e:
+                form.add_error('archivo', e)
+            else:
+                if resultado.agregados:
+                    messages.success(
+                        request,
+                        f'{len(resultado.agregados)} pasajeros agregados al viaje '
+                        f'({resultado.creados} nuevos, {resultado.existentes} ya registrados en el sistema).'
+                    )
+                if resultado.errores:
+                    messages.warning(request, f'{len(resultado.errores)} filas no se importaron; revise el detalle.')
+    else:
+        form = ImportarNominaForm()
+    
+    context = {
+        'viaje': viaje,
+        'form': form,
+        'resultado': resultado,
+        'max_filas': MAX_FILAS,
+    }
+    return render(request, 'viajes/importar_pasajeros.html', context)
+
+
 @login_required(login_url='login')
 def generar_pdf_pasajeros(request, pk):
     """